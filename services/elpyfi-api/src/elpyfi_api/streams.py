@@ -53,7 +53,12 @@ async def event_listener(pool):
 async def handle_db_event(conn, pid, channel, payload):
     """Forward database events to WebSocket clients"""
     event = json.loads(payload)
-    await manager.broadcast(event)
+    if event.get("type") == "batch":
+        # The engine's write pipeline coalesces a flush into one notification
+        for item in event["data"]["events"]:
+            await manager.broadcast(dict(item, timestamp=event["timestamp"]))
+    else:
+        await manager.broadcast(event)
 
 
 async def websocket_endpoint(websocket: WebSocket):
@@ -2,11 +2,25 @@
 PDT Allocator - Decides which strategies get precious day trades
 
 Simple scoring system: confidence × expected_profit × historical_success
+
+historical_success is each strategy's win rate from record_outcome(),
+smoothed toward a prior until it has a track record. Queued requests lose
+half their score every half_life, so a fresh signal beats a stale one of
+the same quality. Because that decay is the same for every request, the
+ranking between two queued requests never changes, and the queue can be
+a bounded min-heap holding only the best max_pending requests: a new
+request costs O(log K) and the batch never sorts the whole backlog. A new
+request for the same symbol and strategy replaces the queued one.
 """
 
-from typing import List, Optional
+import heapq
+import itertools
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from events import TradeRequestEvent
+import clock
 
 
 @dataclass
@@ -14,6 +28,7 @@ class AllocationRequest:
     """Request for day trade allocation"""
     trade_request: TradeRequestEvent
     score: float = 0.0
+    requested_at: Optional[datetime] = None
     
     def calculate_score(self, historical_success: float = 0.8):
         """Score = confidence × profit × history"""
@@ -24,45 +39,169 @@ class AllocationRequest:
             historical_success
         )
         return self.score
+    
+    @property
+    def key(self) -> Tuple[str, str]:
+        signal = self.trade_request.signal_event
+        return signal.symbol, signal.strategy
+
+
+class StrategyStats:
+    """Running win rate per strategy, updated one outcome at a time"""
+    
+    def __init__(self, prior_success: float = 0.8, prior_weight: float = 5.0):
+        self.prior_success = prior_success
+        self.prior_weight = prior_weight  # Outcomes needed before history outweighs the prior
+        self.trades: Dict[str, int] = {}
+        self.wins: Dict[str, int] = {}
+        self.pnl: Dict[str, float] = {}
+        self._rates: Dict[str, float] = {}
+    
+    def record(self, strategy: str, won: bool, pnl: float = 0.0):
+        """Add one closed trade and refresh the cached rate"""
+        self.trades[strategy] = self.trades.get(strategy, 0) + 1
+        self.wins[strategy] = self.wins.get(strategy, 0) + (1 if won else 0)
+        self.pnl[strategy] = self.pnl.get(strategy, 0.0) + pnl
+        self._rates[strategy] = (
+            (self.wins[strategy] + self.prior_success * self.prior_weight) /
+            (self.trades[strategy] + self.prior_weight)
+        )
+    
+    def success_rate(self, strategy: str) -> float:
+        return self._rates.get(strategy, self.prior_success)
+    
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            strategy: {
+                "trades": trades,
+                "wins": self.wins[strategy],
+                "success_rate": self._rates[strategy],
+                "total_pnl": self.pnl[strategy],
+            }
+            for strategy, trades in self.trades.items()
+        }
 
 
 class PDTAllocator:
     """Manages day trade allocation when multiple strategies compete"""
     
-    def __init__(self):
-        self.pending_requests: List[AllocationRequest] = []
+    def __init__(self, max_pending: int = 50, half_life: timedelta = timedelta(days=1),
+                 max_age: timedelta = timedelta(days=5), stats: Optional[StrategyStats] = None):
         self.emergency_reserve = 1  # Keep 1 trade for emergencies
+        self.max_pending = max_pending
+        self.half_life = half_life
+        self.max_age = max_age
+        self.strategy_stats = stats or StrategyStats()
+        
+        # Min-heap of [priority, seq, request, alive]; the weakest request is on top
+        self._heap: List[list] = []
+        self._entries: Dict[Tuple[str, str], list] = {}  # Live entry per (symbol, strategy)
+        self._seq = itertools.count()
+        
+        # Metrics
+        self.requests = 0
+        self.replaced = 0
+        self.evicted = 0
+        self.expired = 0
+    
+    @property
+    def pending_requests(self) -> List[AllocationRequest]:
+        """Queued requests, best first"""
+        return [entry[2] for entry in sorted(self._entries.values(), reverse=True)]
+    
+    def _priority(self, allocation: AllocationRequest) -> Tuple[int, float]:
+        """Heap key whose order matches the decayed score at any later time"""
+        if allocation.score <= 0:
+            return 0, allocation.score  # Worthless requests rank last and don't age
+        # log(score × 0.5^((now - t) / half_life)) = log(score) + t·ln2 / half_life - (same for all)
+        age_bonus = allocation.requested_at.timestamp() * math.log(2) / self.half_life.total_seconds()
+        return 1, math.log(allocation.score) + age_bonus
+    
+    def decayed_score(self, allocation: AllocationRequest, now: Optional[datetime] = None) -> float:
+        """Score after aging"""
+        age = ((now or clock.now()) - allocation.requested_at).total_seconds()
+        return allocation.score * 0.5 ** (max(age, 0) / self.half_life.total_seconds())
     
     def request_allocation(self, trade_request: TradeRequestEvent) -> bool:
         """Request a day trade allocation"""
-        allocation = AllocationRequest(trade_request)
-        allocation.calculate_score()
-        self.pending_requests.append(allocation)
+        signal = trade_request.signal_event
+        allocation = AllocationRequest(trade_request, requested_at=clock.now())
+        allocation.calculate_score(self.strategy_stats.success_rate(signal.strategy))
+        self.requests += 1
+        
+        previous = self._entries.pop(allocation.key, None)
+        if previous is not None:
+            previous[3] = False  # Lazily removed when it reaches the top
+            self.replaced += 1
+        
+        entry = [self._priority(allocation), next(self._seq), allocation, True]
+        self._entries[allocation.key] = entry
+        heapq.heappush(self._heap, entry)
+        
+        while len(self._entries) > self.max_pending:
+            weakest = self._pop_min()
+            del self._entries[weakest.key]
+            self.evicted += 1
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._compact()
         return False  # Always queue for weekly batch
     
+    def _pop_min(self) -> AllocationRequest:
+        while True:
+            _, _, allocation, alive = heapq.heappop(self._heap)
+            if alive:
+                return allocation
+    
+    def _compact(self):
+        """Drop replaced entries from the heap"""
+        self._heap = list(self._entries.values())
+        heapq.heapify(self._heap)
+    
     def get_weekly_allocations(self, available_trades: int) -> List[TradeRequestEvent]:
         """Get top N requests for the week"""
         # Keep emergency reserve
         trades_to_allocate = max(0, available_trades - self.emergency_reserve)
         
-        # Sort by score
-        self.pending_requests.sort(key=lambda x: x.score, reverse=True)
+        cutoff = clock.now() - self.max_age
+        live = []
+        for entry in self._entries.values():
+            if entry[2].requested_at < cutoff:
+                self.expired += 1
+            else:
+                live.append(entry)
         
-        # Get top requests
-        approved = []
-        for i in range(min(trades_to_allocate, len(self.pending_requests))):
-            approved.append(self.pending_requests[i].trade_request)
+        approved = [entry[2].trade_request for entry in heapq.nlargest(trades_to_allocate, live)]
         
         # Clear old requests
-        self.pending_requests = []
+        self._heap = []
+        self._entries = {}
         
         return approved
     
+    def record_outcome(self, symbol: str, strategy: str, won: bool, pnl: float = 0.0):
+        """Feed a closed day trade back into the strategy's success rate"""
+        self.strategy_stats.record(strategy, won, pnl)
+    
+    def get_strategy_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get per-strategy track record"""
+        return self.strategy_stats.get_stats()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get queue size and request counts"""
+        return {
+            "pending": len(self._entries),
+            "requests": self.requests,
+            "replaced": self.replaced,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+    
     def use_emergency_trade(self, trade_request: TradeRequestEvent) -> bool:
         """Use emergency reserve for stop-loss exits"""
         # Only for closing positions at a loss
         signal = trade_request.signal_event
-        if signal.action == "sell" and signal.metadata and signal.metadata.get("stop_loss"):
+        metadata = getattr(signal, "metadata", None)  # SignalEvent has no metadata field
+        if signal.action == "sell" and metadata and metadata.get("stop_loss"):
             return True
         return False
 
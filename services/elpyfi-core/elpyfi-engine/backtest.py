@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Historical Backtest Runner
+
+Replays OHLCV bars through the live engine path:
+process_market_data -> SIGNAL_GENERATED -> PDTTracker -> ExecutionEngine
+
+Orders fill against a simulated broker (instant fills at the last close,
+or execution.simulator.BrokerSimulator with slippage, partial fills and
+rejections) and records go to an in-memory recorder instead of Postgres. Bars are replayed as fast as the CPU
+allows - there is no sleeping between them.
+
+Usage:
+    python backtest.py data/AAPL.csv data/MSFT.csv --k-index 7
+    python backtest.py bars.parquet --strategy solar_flare   # K-index 7 by default
+    python backtest.py store/AAPL.bars store/MSFT.bars   # see bar_store.py
+    python backtest.py data/AAPL.csv --slippage-bps 2 --partial-fill-prob 0.1
+
+Files need timestamp, open, high, low, close and volume columns. A
+symbol column is optional; without one the file name (AAPL.csv) is used.
+The K-index is fixed for the whole replay (--k-index, default 7) so a
+run never depends on today's NOAA reading.
+"""
+
+import argparse
+import csv
+import heapq
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from events import event_bus, EventType, SignalEvent
+from strategies.models import MarketData
+from clock import SimulatedClock, set_clock
+
+logger = logging.getLogger(__name__)
+
+BAR_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+@dataclass
+class Bar:
+    """One OHLCV bar"""
+    symbol: str
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    
+    def to_market_data(self) -> MarketData:
+        return MarketData(
+            symbol=self.symbol,
+            timestamp=self.timestamp,
+            current_price=self.close,
+            volume=self.volume,
+            high=self.high,
+            low=self.low,
+            open=self.open,
+            close=self.close
+        )
+
+
+def _symbol_from_path(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0].upper()
+
+
+def read_csv_bars(path: str, symbol: Optional[str] = None) -> Iterator[Bar]:
+    """Stream bars from a CSV file (must be sorted by timestamp)"""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader)]
+        missing = [name for name in BAR_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"{path} is missing columns: {missing}")
+        
+        ts, o, h, l, c, v = (header.index(name) for name in BAR_COLUMNS)
+        sym = header.index("symbol") if "symbol" in header else None
+        default_symbol = symbol or _symbol_from_path(path)
+        
+        for row in reader:
+            if not row:
+                continue
+            yield Bar(
+                symbol=row[sym] if sym is not None else default_symbol,
+                timestamp=datetime.fromisoformat(row[ts]),
+                open=float(row[o]),
+                high=float(row[h]),
+                low=float(row[l]),
+                close=float(row[c]),
+                volume=float(row[v])
+            )
+
+
+def read_parquet_bars(path: str, symbol: Optional[str] = None) -> Iterator[Bar]:
+    """Stream bars from a Parquet file (requires pandas and pyarrow)"""
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pandas and pyarrow")
+    
+    frame = pd.read_parquet(path)
+    frame.columns = [str(name).lower() for name in frame.columns]
+    default_symbol = symbol or _symbol_from_path(path)
+    symbols = frame["symbol"] if "symbol" in frame.columns else [default_symbol] * len(frame)
+    timestamps = pd.to_datetime(frame["timestamp"]).dt.to_pydatetime()
+    
+    for row in zip(symbols, timestamps, frame["open"], frame["high"],
+                   frame["low"], frame["close"], frame["volume"]):
+        yield Bar(row[0], row[1], float(row[2]), float(row[3]),
+                  float(row[4]), float(row[5]), float(row[6]))
+
+
+def load_bars(paths: Iterable[str]) -> Iterator[Bar]:
+    """Merge bars from several time-sorted files into one timestamp-ordered stream"""
+    streams = []
+    for path in paths:
+        if path.endswith(".parquet"):
+            streams.append(read_parquet_bars(path))
+        elif path.endswith(".bars"):
+            from bar_store import BarStore
+            store = BarStore(os.path.dirname(path) or ".")
+            streams.append(store.iter_bars([_symbol_from_path(path)]))
+        else:
+            streams.append(read_csv_bars(path))
+    return heapq.merge(*streams, key=lambda bar: bar.timestamp)
+
+
+class InMemoryRecorder:
+    """Drop-in replacement for DatabaseWriter that keeps records in lists"""
+    
+    def __init__(self):
+        self.schema_validated = True
+        self.signals: List[Dict] = []
+        self.positions: List[Dict] = []
+    
+    def write_signal(self, signal_event):
+        self.signals.append({
+            "id": len(self.signals) + 1,
+            "strategy": signal_event.strategy,
+            "symbol": signal_event.symbol,
+            "action": signal_event.action,
+            "confidence": signal_event.confidence,
+            "expected_profit": signal_event.estimated_profit,
+            "timestamp": signal_event.timestamp,
+        })
+        return len(self.signals)
+    
+    def write_position_opened(self, symbol: str, quantity: float, entry_price: float,
+                              strategy: str, order_id: str):
+        self.positions.append({
+            "id": len(self.positions) + 1,
+            "symbol": symbol,
+            "quantity": quantity,
+            "entry_price": entry_price,
+            "strategy": strategy,
+            "order_id": order_id,
+            "status": "open",
+        })
+        return len(self.positions)
+    
+    def write_position_closed(self, position_id: int, exit_price: float, realized_pl: float):
+        position = self.positions[position_id - 1]
+        position.update(status="closed", exit_price=exit_price, realized_pl=realized_pl)
+    
+    def write_position_reduced(self, order_id: str, quantity: float, exit_price: float,
+                               realized_pl: float, fully_closed: bool):
+        for position in self.positions:
+            if position["order_id"] == order_id and position["status"] == "open":
+                position["realized_pl"] = position.get("realized_pl", 0.0) + realized_pl
+                position["exit_price"] = exit_price
+                if fully_closed:
+                    position["status"] = "closed"
+                else:
+                    position["quantity"] += quantity if position["quantity"] < 0 else -quantity
+                return
+
+
+class SimulatedBroker:
+    """Fills every order immediately at the last replayed close"""
+    
+    def __init__(self, portfolio_value: float = 100000, position_pct: float = 0.02):
+        self.portfolio_value = portfolio_value
+        self.position_pct = position_pct
+        self.last_prices: Dict[str, float] = {}
+        self.order_count = 0
+    
+    def update_price(self, symbol: str, price: float):
+        self.last_prices[symbol] = price
+    
+    def execute(self, signal: SignalEvent):
+        """Return (order_id, quantity, price) like the ExecutionEngine paths"""
+        price = self.last_prices[signal.symbol]
+        quantity = float(max(int(self.portfolio_value * self.position_pct / price), 1))
+        self.order_count += 1
+        return f"SIM_{signal.symbol}_{self.order_count}", quantity, price
+
+
+@dataclass
+class BacktestResult:
+    """Summary of a backtest run"""
+    bars: int
+    skipped_bars: int
+    elapsed: float
+    signals: List[Dict] = field(default_factory=list)
+    positions: List[Dict] = field(default_factory=list)
+    pdt_status: Dict = field(default_factory=dict)
+    
+    @property
+    def bars_per_second(self) -> float:
+        return self.bars / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BacktestRunner:
+    """Replays bars through a TradingEngine with simulated execution"""
+    
+    def __init__(self, strategy_config: Dict, bars: Iterable[Bar],
+                 portfolio_value: float = 100000, engine_config: Optional[Dict] = None,
+                 broker=None):
+        self.strategy_config = strategy_config
+        self.bars = bars
+        self.engine_config = engine_config or {}
+        self.recorder = InMemoryRecorder()
+        self.portfolio_value = portfolio_value
+        # Anything with update_price() and execute(signal), e.g. BrokerSimulator
+        self.broker = broker or SimulatedBroker(portfolio_value)
+    
+    def run(self) -> BacktestResult:
+        # Imported here so loading bars doesn't require the full engine
+        from engine import TradingEngine
+        from db_writer import set_db_writer
+        from execution.positions import PositionBook
+        from execution.risk import RiskEngine
+        from allocator import PDTAllocator
+        
+        config = dict(self.engine_config, strategies=self.strategy_config, database=False)
+        engine = TradingEngine(config)
+        engine.initialize()
+        execution_engine, pdt_tracker = engine.execution_engine, engine.pdt_tracker
+        
+        previous_writer = set_db_writer(self.recorder)
+        previous_broker = execution_engine.set_broker(self.broker)
+        # Each run trades its own book, so earlier runs and live positions don't count against it
+        book = PositionBook()
+        previous_positions, previous_risk = execution_engine.set_book(
+            book, RiskEngine(book, rules=execution_engine.risk.rules, portfolio_value=self.portfolio_value))
+        event_bus.subscribe(EventType.SIGNAL_GENERATED, self.recorder.write_signal)
+        # The trade path runs through the shared engine and tracker; wire back any the bus lost
+        rewired = [(event_type, handler)
+                   for event_type, handler in execution_engine.subscriptions() + pdt_tracker.subscriptions()
+                   if not event_bus.is_subscribed(event_type, handler)]
+        for event_type, handler in rewired:
+            event_bus.subscribe(event_type, handler)
+        # Replayed trades start from an empty PDT window and must not touch the live one
+        previous_pdt = pdt_tracker.snapshot()
+        previous_state_path, pdt_tracker.state_path = pdt_tracker.state_path, None
+        pdt_tracker.reset()
+        pdt_tracker.allocator = PDTAllocator()
+        
+        # Engine time follows the replayed bars instead of the wall clock
+        sim_clock = None
+        previous_clock = None
+        
+        bars = 0
+        skipped = 0
+        start = time.perf_counter()
+        try:
+            for bar in self.bars:
+                try:
+                    data = bar.to_market_data()
+                except ValueError as e:
+                    skipped += 1
+                    logger.debug(f"Skipping bad bar {bar.symbol} {bar.timestamp}: {e}")
+                    continue
+                if sim_clock is None:
+                    sim_clock = SimulatedClock(bar.timestamp)
+                    previous_clock = set_clock(sim_clock)
+                else:
+                    sim_clock.set(bar.timestamp)
+                self.broker.update_price(bar.symbol, bar.close)
+                engine.process_market_data(data)
+                bars += 1
+            event_bus.drain()
+            pdt_status = pdt_tracker.get_status()
+        finally:
+            elapsed = time.perf_counter() - start
+            event_bus.unsubscribe(EventType.SIGNAL_GENERATED, self.recorder.write_signal)
+            event_bus.unsubscribe(EventType.MARKET_DATA_RECEIVED, engine.process_market_data)
+            for event_type, handler in rewired:
+                event_bus.unsubscribe(event_type, handler)
+            execution_engine.set_broker(previous_broker)
+            execution_engine.set_book(previous_positions, previous_risk)
+            set_db_writer(previous_writer)
+            pdt_tracker.state_path = previous_state_path
+            pdt_tracker.restore(previous_pdt)
+            if previous_clock is not None:
+                set_clock(previous_clock)
+            engine.stop(stop_execution=False)
+        
+        return BacktestResult(
+            bars=bars,
+            skipped_bars=skipped,
+            elapsed=elapsed,
+            signals=self.recorder.signals,
+            positions=self.recorder.positions,
+            pdt_status=pdt_status
+        )
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description="Replay historical bars through the engine")
+    parser.add_argument("files", nargs="+", help="CSV or Parquet bar files")
+    parser.add_argument("--strategy", action="append", default=None,
+                        help="Strategy to load (repeatable, default: solar_flare)")
+    parser.add_argument("--k-index", type=int, default=7,
+                        help="Fixed K-index for the whole replay (default: 7)")
+    parser.add_argument("--portfolio", type=float, default=100000, help="Starting portfolio value")
+    parser.add_argument("--slippage-bps", type=float, default=None,
+                        help="Fill through BrokerSimulator with this much slippage")
+    parser.add_argument("--partial-fill-prob", type=float, default=0.0, help="BrokerSimulator partial fill rate")
+    parser.add_argument("--reject-prob", type=float, default=0.0, help="BrokerSimulator rejection rate")
+    parser.add_argument("--seed", type=int, default=None, help="BrokerSimulator random seed")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    # Replays use a fixed K-index, never the live NOAA feed
+    from strategies.k_index import KIndexProvider, StaticKIndexSource
+    provider = KIndexProvider(StaticKIndexSource(args.k_index))
+    provider.refresh()
+    settings = {'k_index_provider': provider}
+    
+    strategy_config = {name: dict(settings) for name in (args.strategy or ['solar_flare'])}
+    broker = None
+    if args.slippage_bps is not None or args.partial_fill_prob or args.reject_prob:
+        from execution.simulator import BrokerSimulator, FillModel
+        fill_model = FillModel(slippage_bps=args.slippage_bps or 0.0,
+                               partial_fill_prob=args.partial_fill_prob,
+                               reject_prob=args.reject_prob)
+        broker = BrokerSimulator(fill_model=fill_model, portfolio_value=args.portfolio, seed=args.seed)
+    
+    runner = BacktestRunner(strategy_config, load_bars(args.files), portfolio_value=args.portfolio,
+                            broker=broker)
+    result = runner.run()
+    
+    print(f"Bars replayed:   {result.bars:,} ({result.skipped_bars} skipped)")
+    print(f"Elapsed:         {result.elapsed:.2f}s ({result.bars_per_second:,.0f} bars/s)")
+    print(f"Signals:         {len(result.signals):,}")
+    print(f"Positions:       {len(result.positions):,}")
+    print(f"PDT trades used: {result.pdt_status['trades_used']}")
+    if broker is not None:
+        stats = broker.get_stats()
+        print(f"Fills:           {stats['filled']:,} full, {stats['partially_filled']:,} partial, "
+              f"{stats['rejected']:,} rejected ({stats['avg_slippage_bps']:.1f} bps slippage)")
+
+
+if __name__ == "__main__":
+    main()
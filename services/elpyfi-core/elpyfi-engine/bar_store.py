@@ -0,0 +1,229 @@
+"""
+Memory-Mapped Bar Store
+
+Compact on-disk storage for per-symbol OHLCV bars used by backtests and
+indicator warm-up. Each symbol is one file of fixed-width 48-byte records
+(timestamp, open, high, low, close, volume) sorted by timestamp:
+
+    <root>/<SYMBOL>.bars
+
+Files are opened with numpy.memmap, so opening a multi-GB history is
+constant time and date-range slices are zero-copy views found by binary
+search on the timestamp column.
+
+Usage:
+    python bar_store.py store/ data/AAPL.csv data/MSFT.csv
+"""
+
+import heapq
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from strategies.models import MarketData, MarketSnapshot
+
+BAR_DTYPE = np.dtype([
+    ("timestamp", "M8[ns]"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+BAR_EXTENSION = ".bars"
+
+
+def _to_datetime64(when: Optional[datetime]) -> Optional[np.datetime64]:
+    return None if when is None else np.datetime64(when, "ns")
+
+
+class BarStore:
+    """Directory of memory-mapped per-symbol bar files"""
+    
+    def __init__(self, root: str):
+        self.root = root
+        self._maps: Dict[str, np.memmap] = {}
+        os.makedirs(root, exist_ok=True)
+    
+    def path_for(self, symbol: str) -> str:
+        return os.path.join(self.root, symbol.upper() + BAR_EXTENSION)
+    
+    def symbols(self) -> List[str]:
+        """Symbols with a bar file in the store"""
+        return sorted(
+            name[:-len(BAR_EXTENSION)] for name in os.listdir(self.root)
+            if name.endswith(BAR_EXTENSION)
+        )
+    
+    # Writing
+    
+    def write(self, symbol: str, bars: np.ndarray, append: bool = False):
+        """Write (or append) BAR_DTYPE records for a symbol.
+        
+        Records are sorted by timestamp before writing. Appended records
+        must not start before the last stored bar.
+        """
+        bars = np.sort(np.asarray(bars, dtype=BAR_DTYPE), order="timestamp")
+        path = self.path_for(symbol)
+        if append and len(bars) and os.path.exists(path):
+            existing = self.open(symbol)
+            if len(existing) and bars["timestamp"][0] < existing["timestamp"][-1]:
+                raise ValueError(f"Appended bars for {symbol} start before the stored history")
+        
+        self._maps.pop(symbol.upper(), None)
+        with open(path, "ab" if append else "wb") as f:
+            bars.tofile(f)
+    
+    def import_csv(self, path: str, symbol: Optional[str] = None, chunk_size: int = 100000) -> int:
+        """Import a time-sorted CSV (same format as backtest files) in chunks.
+        
+        Returns the number of bars imported.
+        """
+        from backtest import read_csv_bars
+        
+        buffers: Dict[str, List[tuple]] = {}
+        written = 0
+        started = set()
+        
+        def flush(sym: str):
+            rows = buffers.pop(sym, [])
+            if rows:
+                self.write(sym, np.array(rows, dtype=BAR_DTYPE), append=sym in started)
+                started.add(sym)
+        
+        for bar in read_csv_bars(path, symbol):
+            rows = buffers.setdefault(bar.symbol, [])
+            rows.append((np.datetime64(bar.timestamp, "ns"), bar.open, bar.high,
+                         bar.low, bar.close, bar.volume))
+            written += 1
+            if len(rows) >= chunk_size:
+                flush(bar.symbol)
+        
+        for sym in list(buffers):
+            flush(sym)
+        return written
+    
+    # Reading
+    
+    def open(self, symbol: str) -> np.ndarray:
+        """Memory-map a symbol's bars (read-only, cached)"""
+        symbol = symbol.upper()
+        bars = self._maps.get(symbol)
+        if bars is None:
+            path = self.path_for(symbol)
+            if not os.path.exists(path):
+                raise KeyError(f"No bars stored for {symbol}")
+            if os.path.getsize(path) == 0:
+                bars = np.empty(0, dtype=BAR_DTYPE)
+            else:
+                bars = np.memmap(path, dtype=BAR_DTYPE, mode="r")
+            self._maps[symbol] = bars
+        return bars
+    
+    def slice(self, symbol: str, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> np.ndarray:
+        """Zero-copy view of bars with start <= timestamp < end"""
+        bars = self.open(symbol)
+        timestamps = bars["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, _to_datetime64(start), "left"))
+        hi = len(bars) if end is None else int(np.searchsorted(timestamps, _to_datetime64(end), "left"))
+        return bars[lo:hi]
+    
+    def iter_market_data(self, symbols: Iterable[str], start: Optional[datetime] = None,
+                         end: Optional[datetime] = None,
+                         batch_size: int = 1000) -> Iterator[List[MarketData]]:
+        """Yield timestamp-ordered batches of MarketData across symbols"""
+        batch = []
+        for bar in self.iter_bars(symbols, start, end):
+            batch.append(bar.to_market_data())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def iter_bars(self, symbols: Iterable[str], start: Optional[datetime] = None,
+                  end: Optional[datetime] = None):
+        """Yield backtest Bars across symbols in timestamp order"""
+        streams = [self._iter_symbol(symbol, start, end) for symbol in symbols]
+        return heapq.merge(*streams, key=lambda bar: bar.timestamp)
+    
+    def _iter_symbol(self, symbol: str, start: Optional[datetime], end: Optional[datetime],
+                     chunk_size: int = 65536):
+        from backtest import Bar
+        
+        bars = self.slice(symbol, start, end)
+        symbol = symbol.upper()
+        # Convert a chunk at a time so only a small window is ever paged in as Python objects
+        for offset in range(0, len(bars), chunk_size):
+            chunk = bars[offset:offset + chunk_size]
+            timestamps = chunk["timestamp"].astype("M8[us]").tolist()
+            for ts, o, h, l, c, v in zip(timestamps, chunk["open"].tolist(), chunk["high"].tolist(),
+                                         chunk["low"].tolist(), chunk["close"].tolist(),
+                                         chunk["volume"].tolist()):
+                yield Bar(symbol, ts, o, h, l, c, v)
+    
+    def iter_snapshots(self, symbols: Iterable[str], start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> Iterator[MarketSnapshot]:
+        """Yield one columnar MarketSnapshot per timestamp.
+        
+        Each snapshot holds the symbols that have a bar at that timestamp.
+        The range is merged across symbols and sorted by timestamp once, so
+        each step is a contiguous slice of the merged columns rather than a
+        per-symbol lookup.
+        """
+        symbols = [symbol.upper() for symbol in symbols]
+        slices = [self.slice(symbol, start, end) for symbol in symbols]
+        lengths = [len(s) for s in slices]
+        if not sum(lengths):
+            return
+        
+        # One gather puts every bar in (timestamp, symbol order) order
+        merged = np.concatenate(slices)
+        order = np.argsort(merged["timestamp"], kind="stable")
+        owner = np.repeat(np.arange(len(symbols)), lengths)[order]
+        columns = {field: merged[field][order] for field in ("open", "high", "low", "close", "volume")}
+        timestamps = merged["timestamp"][order]
+        
+        steps = np.unique(timestamps)
+        bounds = np.append(np.searchsorted(timestamps, steps), len(timestamps))
+        names = np.array(symbols, dtype=object)
+        
+        for k, when in enumerate(steps.astype("M8[us]").tolist()):
+            lo, hi = bounds[k], bounds[k + 1]
+            close = columns["close"][lo:hi]
+            yield MarketSnapshot(
+                symbols=names[owner[lo:hi]].tolist(),
+                timestamp=when,
+                current_price=close,
+                volume=columns["volume"][lo:hi],
+                high=columns["high"][lo:hi],
+                low=columns["low"][lo:hi],
+                open=columns["open"][lo:hi],
+                close=close
+            )
+    
+    def warm_up(self, indicator_engine, symbols: Iterable[str], end: datetime, bars: int = 100):
+        """Feed the last `bars` bars before `end` into an IndicatorEngine"""
+        for symbol in symbols:
+            history = self.slice(symbol, end=end)[-bars:]
+            indicator_engine.seed(symbol.upper(), history["close"].tolist(), history["volume"].tolist())
+
+
+def main():
+    """Import CSV files into a bar store: python bar_store.py <store_dir> <file.csv>..."""
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python bar_store.py <store_dir> <file.csv> [<file.csv> ...]")
+        sys.exit(1)
+    
+    store = BarStore(sys.argv[1])
+    for path in sys.argv[2:]:
+        count = store.import_csv(path)
+        print(f"Imported {count:,} bars from {path}")
+    print(f"Store now holds: {', '.join(store.symbols())}")
+
+
+if __name__ == "__main__":
+    main()
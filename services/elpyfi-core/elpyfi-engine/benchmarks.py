@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the ElPyFi Engine hot paths
+
+Usage:
+    python benchmarks.py              # run all benchmarks
+    python benchmarks.py analyze      # run one benchmark
+"""
+
+import sys
+import time
+import logging
+from datetime import datetime
+import numpy as np
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def make_snapshot(n: int, seed: int = 42):
+    """Random snapshot of n symbols around $100 with some volume spikes"""
+    from strategies.models import MarketSnapshot
+    rng = np.random.default_rng(seed)
+    price = 100 + rng.normal(0, 1, n)
+    volume = rng.uniform(5e5, 2e6, n)
+    return MarketSnapshot(
+        symbols=[f"SYM{i}" for i in range(n)],
+        timestamp=datetime(2024, 1, 2, 12, 0),
+        current_price=price,
+        volume=volume,
+        high=price * 1.01,
+        low=price * 0.99,
+        open=price,
+        close=price,
+        indicators={"vwap": price * (1 + rng.normal(0, 0.004, n)), "avg_volume": np.full(n, 1e6)}
+    )
+
+
+def bench_analyze_batch(n: int = 5000, repeat: int = 5):
+    """Per-row analyze() fallback vs vectorized SolarFlareStrategy.analyze_batch"""
+    from strategies import Strategy, SolarFlareStrategy
+    
+    strategy = SolarFlareStrategy(test_mode=True)
+    snapshot = make_snapshot(n)
+    logging.getLogger('strategies.solar_flare').setLevel(logging.WARNING)
+    
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(snapshot)
+            best = min(best, time.perf_counter() - start)
+        return best
+    
+    row_time = timed(lambda s: Strategy.analyze_batch(strategy, s))
+    batch_time = timed(strategy.analyze_batch)
+    
+    print(f"analyze_batch ({n} symbols)")
+    print(f"  per-row fallback: {row_time * 1000:8.2f} ms")
+    print(f"  vectorized:       {batch_time * 1000:8.2f} ms")
+    print(f"  speedup:          {row_time / batch_time:8.1f}x")
+
+
+def bench_write_statements(n: int = 100000):
+    """Per-call SQL building (previous write_signal) vs the compiled statement cache"""
+    import json
+    from unittest import mock
+    from db_writer import DatabaseWriter
+    from events import SignalEvent
+    
+    # No server needed: only the client-side statement preparation is timed
+    with mock.patch.object(DatabaseWriter, "_connect"), mock.patch.object(DatabaseWriter, "_validate_schema"):
+        writer = DatabaseWriter()
+    writer.available_columns = {t: list(c) for t, c in DatabaseWriter.EXPECTED_SCHEMA.items()}
+    writer._refresh_statements()
+    signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 12.5, datetime(2024, 1, 2))
+    
+    def per_call(signal_event):
+        columns = ['strategy', 'symbol', 'action', 'confidence']
+        values = [signal_event.strategy, signal_event.symbol, signal_event.action, signal_event.confidence]
+        signals_columns = writer.available_columns.get('signals', [])
+        if 'expected_profit' in signals_columns or not signals_columns:
+            columns.append('expected_profit')
+            values.append(getattr(signal_event, 'estimated_profit', None))
+        if 'metadata' in signals_columns or not signals_columns:
+            columns.append('metadata')
+            values.append(json.dumps(signal_event.metadata) if hasattr(signal_event, 'metadata') else None)
+        placeholders = ['%s'] * len(values)
+        query = f"""
+            INSERT INTO signals 
+            ({', '.join(columns)})
+            VALUES ({', '.join(placeholders)})
+            RETURNING id
+        """
+        return query, values
+    
+    def compiled(signal_event):
+        statement = writer._statements["insert_signal"]
+        return statement.execute_sql, statement.values(signal_event)
+    
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn(signal)
+        return time.perf_counter() - start
+    
+    build_time = timed(per_call)
+    cached_time = timed(compiled)
+    
+    print(f"write_signal statement preparation ({n:,} writes)")
+    print(f"  per-call SQL build: {build_time / n * 1e6:8.2f} us/write")
+    print(f"  compiled cache:     {cached_time / n * 1e6:8.2f} us/write")
+    print(f"  speedup:            {build_time / cached_time:8.1f}x")
+    print("  (server-side: one PREPARE per connection instead of a parse/plan per INSERT)")
+
+
+def bench_order_gateway(n: int = 200, broker_ms: float = 20.0):
+    """Inline order submission vs the OrderGateway worker pool against a slow broker"""
+    from events import EventBus, SignalEvent
+    from execution.gateway import OrderGateway
+    
+    def submit(signal_event):
+        time.sleep(broker_ms / 1000)  # Broker round-trip
+        return f"ORD_{signal_event.symbol}", 10.0, 100.0
+    
+    signals = [SignalEvent("solar_flare", f"SYM{i}", "buy", 0.8, 1.0, datetime(2024, 1, 2)) for i in range(n)]
+    
+    start = time.perf_counter()
+    for signal in signals:
+        submit(signal)
+    inline_time = time.perf_counter() - start
+    
+    gateway = OrderGateway(submit, workers=16, max_in_flight=16, bus=EventBus()).start()
+    start = time.perf_counter()
+    for signal in signals:
+        gateway.submit(signal)
+    gateway.drain()
+    gateway_time = time.perf_counter() - start
+    stats = gateway.get_stats()
+    gateway.stop()
+    
+    print(f"order submission ({n} signals, {broker_ms:.0f} ms broker latency)")
+    print(f"  inline:           {inline_time * 1000:8.1f} ms")
+    print(f"  gateway (16):     {gateway_time * 1000:8.1f} ms")
+    print(f"  speedup:          {inline_time / gateway_time:8.1f}x")
+    print(f"  submit p50/p99:   {stats['submit_p50_ms']:.1f} / {stats['submit_p99_ms']:.1f} ms")
+
+
+def bench_broker_simulator(n: int = 20000, latency_ms: float = 5.0, workers: int = 32):
+    """Execution path throughput against BrokerSimulator, offline"""
+    from events import EventBus, SignalEvent
+    from execution.gateway import OrderGateway
+    from execution.simulator import BrokerSimulator, FillModel, LatencyModel, OrderRejected
+    
+    logging.getLogger('execution.gateway').setLevel(logging.CRITICAL)  # Rejections are expected
+    model = FillModel(slippage_bps=1.0, partial_fill_prob=0.1, reject_prob=0.01)
+    signals = [SignalEvent("solar_flare", f"SYM{i % 500}", "buy", 0.8, 1.0, datetime(2024, 1, 2)) for i in range(n)]
+    
+    broker = BrokerSimulator(fill_model=model, seed=1)
+    for i in range(500):
+        broker.update_price(f"SYM{i}", 100.0 + i)
+    start = time.perf_counter()
+    for signal in signals:
+        try:
+            broker.execute(signal)
+        except OrderRejected:
+            pass
+    direct_time = time.perf_counter() - start
+    
+    slow = BrokerSimulator(fill_model=model, latency=LatencyModel.lognormal(latency_ms), seed=1)
+    slow.last_prices = dict(broker.last_prices)
+    gateway = OrderGateway(slow.execute, workers=workers, max_in_flight=workers,
+                           max_queue_size=n, bus=EventBus()).start()
+    m = n // 10
+    start = time.perf_counter()
+    for signal in signals[:m]:
+        gateway.submit(signal)
+    gateway.drain()
+    gateway_time = time.perf_counter() - start
+    stats = gateway.get_stats()
+    gateway.stop()
+    
+    print(f"broker simulator ({n:,} orders direct, {m:,} through the gateway)")
+    print(f"  direct, no latency:        {n / direct_time:10,.0f} orders/s")
+    print(f"  gateway ({workers}), {latency_ms:.0f} ms median: {m / gateway_time:10,.0f} orders/s "
+          f"(p50 {stats['submit_p50_ms']:.1f} ms, p99 {stats['submit_p99_ms']:.1f} ms)")
+
+
+def bench_import_time(repeat: int = 5):
+    """Cold `import engine` in a fresh interpreter, and what it drags in"""
+    import os
+    import subprocess
+    
+    probe = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import engine\n"
+        "elapsed = time.perf_counter() - start\n"
+        "import execution, pdt_tracker\n"
+        "heavy = sorted({m.split('.')[0] for m in sys.modules} & {'alpaca', 'pandas', 'requests'})\n"
+        "built = [n for n, v in (('execution_engine', execution._execution_engine),\n"
+        "                        ('pdt_tracker', pdt_tracker._pdt_tracker)) if v is not None]\n"
+        "print(elapsed, ','.join(heavy), ','.join(built))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=here, capture_output=True,
+                             text=True, check=True).stdout.split("\n")[-2]
+        elapsed, heavy, built = (out.split(" ") + ["", ""])[:3]
+        times.append(float(elapsed))
+    
+    print(f"import engine (fresh interpreter, {repeat} runs)")
+    print(f"  median:               {sorted(times)[len(times) // 2] * 1000:8.1f} ms")
+    print(f"  heavy SDKs loaded:    {heavy or 'none'}")
+    print(f"  singletons built:     {built or 'none'}")
+
+
+BENCHMARKS = {
+    "analyze": bench_analyze_batch,
+    "db_statements": bench_write_statements,
+    "order_gateway": bench_order_gateway,
+    "broker_sim": bench_broker_simulator,
+    "import_time": bench_import_time,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Engine Clock
+
+Single source of "now" for the engine. Live trading uses the wall clock;
+backtests and tests install a SimulatedClock and move it forward event by
+event, so replays never sleep and PDT week rollover follows market time.
+
+Usage:
+    import clock
+    clock.now()                                  # instead of datetime.now()
+    clock.set_clock(SimulatedClock(start))       # replay / tests
+"""
+
+from datetime import datetime, timedelta, tzinfo
+from typing import Optional
+import threading
+
+
+class Clock:
+    """Base clock interface"""
+    
+    def now(self) -> datetime:
+        raise NotImplementedError
+
+
+class WallClock(Clock):
+    """Real time. Naive local time by default, like datetime.now()."""
+    
+    def __init__(self, tz: Optional[tzinfo] = None):
+        self.tz = tz
+    
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+
+class SimulatedClock(Clock):
+    """Manually driven time for replay and tests"""
+    
+    def __init__(self, start: datetime):
+        self._now = start
+        self._lock = threading.Lock()
+    
+    def now(self) -> datetime:
+        return self._now
+    
+    def set(self, when: datetime):
+        """Jump to a point in time (never moves backwards)"""
+        if (when.tzinfo is None) != (self._now.tzinfo is None):
+            raise ValueError("Cannot mix naive and timezone-aware datetimes")
+        with self._lock:
+            if when > self._now:
+                self._now = when
+    
+    def advance(self, delta: timedelta):
+        """Move time forward by delta"""
+        if delta < timedelta(0):
+            raise ValueError("Cannot move the clock backwards")
+        with self._lock:
+            self._now = self._now + delta
+
+
+# Global engine clock
+_clock: Clock = WallClock()
+
+def now() -> datetime:
+    """Current engine time"""
+    return _clock.now()
+
+def get_clock() -> Clock:
+    """Get the installed clock"""
+    return _clock
+
+def set_clock(new_clock: Clock) -> Clock:
+    """Install a clock for the whole engine. Returns the previous one."""
+    global _clock
+    previous = _clock
+    _clock = new_clock
+    return previous
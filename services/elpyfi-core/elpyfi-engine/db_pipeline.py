@@ -0,0 +1,426 @@
+"""
+Pipelined Database Writes
+
+Wraps a DatabaseWriter so write_signal, write_position_opened,
+write_position_closed and write_position_reduced return immediately. Writes are queued and a
+background thread flushes them in batches: one multi-row INSERT per
+table and column set, all inside a single transaction, followed by one
+coalesced pg_notify for the whole flush. Positions are closed by
+order_id, so a close queued right behind its open needs no row id.
+
+Coalesced notifications have type "batch" and carry the individual
+events (same type/data as the unbatched writer) in data.events. Batches
+that would exceed Postgres' NOTIFY payload limit are split.
+
+When the queue is full the policy decides: "sync" writes on the caller's
+thread (no data loss), "block" waits up to block_timeout and then drops,
+"drop" discards the write immediately. Dropped writes are counted.
+
+A batch that fails for any reason is rolled back and retried row by row;
+a row that still fails is logged and counted (write_errors), and the
+flush thread carries on with the next batch.
+
+Every other attribute (schema_validated, attempt_schema_revalidation,
+close, ...) is forwarded to the wrapped writer.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from psycopg2.extras import execute_values
+import clock
+from db_writer import REDUCE_POSITIONS_SQL, REDUCE_POSITIONS_TEMPLATE, merge_reductions
+from metrics import DB_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FULL_POLICIES = ("block", "drop", "sync")
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7500
+
+
+class WritePipeline:
+    """Queues DatabaseWriter writes and flushes them in batches"""
+    
+    def __init__(self, writer, flush_size: int = 500, flush_interval: float = 0.25,
+                 max_queue_size: int = 10000, queue_full_policy: str = "sync",
+                 block_timeout: float = 1.0):
+        if queue_full_policy not in QUEUE_FULL_POLICIES:
+            raise ValueError(f"queue_full_policy must be one of {QUEUE_FULL_POLICIES}")
+        if flush_size < 1:
+            raise ValueError("flush_size must be at least 1")
+        self.writer = writer
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue_full_policy = queue_full_policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sync_writes = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.write_errors = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_time = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+    
+    def __getattr__(self, name):
+        # Only called for attributes not found on the pipeline itself
+        return getattr(self.writer, name)
+    
+    # Lifecycle
+    
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="DBWritePipeline")
+        self._thread.start()
+        logger.info(f"DB write pipeline started (flush_size={self.flush_size}, "
+                    f"flush_interval={self.flush_interval}s, policy={self.queue_full_policy})")
+        return self
+    
+    def stop(self, timeout: float = 10.0):
+        """Stop the flush thread after writing everything still queued"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        logger.info("DB write pipeline stopped")
+    
+    def close(self):
+        """Flush pending writes, then close the wrapped writer"""
+        self.stop()
+        self.writer.close()
+    
+    # Write API (same signatures as DatabaseWriter)
+    
+    def write_signal(self, signal_event):
+        """Queue a signal insert (returns None; the id is assigned at flush)"""
+        self._enqueue(("signal", signal_event), self.writer.write_signal, (signal_event,))
+    
+    def write_position_opened(self, symbol: str, quantity: float, entry_price: float,
+                              strategy: str, order_id: str):
+        """Queue a position insert (returns None; the id is assigned at flush)"""
+        args = (symbol, quantity, entry_price, strategy, order_id)
+        self._enqueue(("position.opened", args), self.writer.write_position_opened, args)
+    
+    def write_position_closed(self, position_id: int, exit_price: float, realized_pl: float):
+        """Queue a position close"""
+        args = (position_id, exit_price, realized_pl)
+        self._enqueue(("position.closed", args), self.writer.write_position_closed, args)
+    
+    def write_position_reduced(self, order_id: str, quantity: float, exit_price: float,
+                               realized_pl: float, fully_closed: bool):
+        """Queue a (partial or full) close of the position opened by order_id"""
+        args = (order_id, quantity, exit_price, realized_pl, fully_closed)
+        self._enqueue(("position.reduced", args), self.writer.write_position_reduced, args)
+    
+    def _enqueue(self, item: Tuple[str, Any], sync_write, args: tuple):
+        entry = (time.monotonic(), item)
+        try:
+            if self.queue_full_policy == "block":
+                self.queue.put(entry, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(entry)
+        except queue.Full:
+            if self.queue_full_policy == "sync":
+                with self._stats_lock:
+                    self.sync_writes += 1
+                sync_write(*args)
+                return
+            with self._stats_lock:
+                self.dropped += 1
+            logger.warning(f"DB write queue full - dropped {item[0]} write")
+            return
+        with self._stats_lock:
+            self.enqueued += 1
+    
+    # Flushing
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # Give a partial batch up to flush_interval to fill up
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush_batch(batch)
+            except Exception as e:
+                # Never let one bad batch stop the flush thread
+                logger.error(f"DB write flush failed: {e}")
+    
+    def flush(self) -> int:
+        """Write everything currently queued on the caller's thread"""
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.flush_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return written
+            self._flush_batch(batch)
+            written += len(batch)
+    
+    def _flush_batch(self, batch: List[Tuple[float, Tuple[str, Any]]]):
+        start = time.perf_counter()
+        items = [item for _, item in batch]
+        with self._flush_lock:
+            errors = 0
+            try:
+                self._write_batch(items)
+                failed = False
+            except Exception as e:
+                failed = True
+                logger.error(f"Batch write of {len(items)} records failed ({e}) - "
+                             f"falling back to individual writes")
+            if failed:
+                # Row-at-a-time writes reuse the writer's schema fallback and spooling
+                errors = self._write_individually(items)
+        
+        now = time.monotonic()
+        elapsed = time.perf_counter() - start
+        DB_WRITE_SECONDS.observe(elapsed, "batch_flush")
+        lag = (now - batch[0][0]) * 1000
+        with self._stats_lock:
+            self.flushes += 1
+            self.written += len(batch) - errors
+            self.write_errors += errors
+            self.flush_failures += failed
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_flush_ms = elapsed * 1000
+            self.total_flush_time += elapsed
+            self.last_lag_ms = lag
+            self.max_lag_ms = max(self.max_lag_ms, lag)
+    
+    def _write_batch(self, items: List[Tuple[str, Any]]):
+        """Write every item in one transaction and send one notification"""
+        with self.writer.cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                events = []
+                events += self._insert_signals(cur, [p for kind, p in items if kind == "signal"])
+                events += self._insert_positions(cur, [p for kind, p in items if kind == "position.opened"])
+                events += self._close_positions(cur, [p for kind, p in items if kind == "position.closed"])
+                events += self._reduce_positions(cur, [p for kind, p in items if kind == "position.reduced"])
+                for payload in self._notification_payloads(events):
+                    cur.execute("SELECT pg_notify('trading_events', %s)", (payload,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        logger.debug(f"Flushed {len(items)} records in one transaction")
+    
+    def _insert_rows(self, cur, table: str, records: List[Tuple[List[str], List[Any]]]) -> List[int]:
+        """Multi-row INSERT ... RETURNING id, grouped by column set"""
+        ids: List[Optional[int]] = [None] * len(records)
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for i, (columns, _) in enumerate(records):
+            groups.setdefault(tuple(columns), []).append(i)
+        
+        for columns, indexes in groups.items():
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s RETURNING id"
+            rows = execute_values(cur, query, [records[i][1] for i in indexes],
+                                  page_size=len(indexes), fetch=True)
+            for i, row in zip(indexes, rows):
+                ids[i] = row[0]
+        return ids
+    
+    def _insert_signals(self, cur, signals: List[Any]) -> List[Dict[str, Any]]:
+        if not signals:
+            return []
+        records = [self.writer._signal_record(signal) for signal in signals]
+        ids = self._insert_rows(cur, "signals", records)
+        return [{
+            "type": "signal.generated",
+            "data": {
+                "id": signal_id,
+                "strategy": signal.strategy,
+                "symbol": signal.symbol,
+                "action": signal.action,
+                "confidence": signal.confidence,
+                "expected_profit": getattr(signal, 'estimated_profit', None)
+            }
+        } for signal_id, signal in zip(ids, signals)]
+    
+    def _insert_positions(self, cur, positions: List[tuple]) -> List[Dict[str, Any]]:
+        if not positions:
+            return []
+        records = [self.writer._position_record(*args) for args in positions]
+        ids = self._insert_rows(cur, "positions", records)
+        return [{
+            "type": "position.opened",
+            "data": {
+                "id": position_id,
+                "symbol": symbol,
+                "quantity": quantity,
+                "entry_price": entry_price,
+                "strategy": strategy,
+                "order_id": order_id
+            }
+        } for position_id, (symbol, quantity, entry_price, strategy, order_id) in zip(ids, positions)]
+    
+    def _close_positions(self, cur, closes: List[tuple]) -> List[Dict[str, Any]]:
+        if not closes:
+            return []
+        rows = execute_values(cur, """
+            UPDATE positions AS p
+            SET status = 'closed',
+                current_price = v.exit_price,
+                realized_pl = v.realized_pl,
+                closed_at = NOW()
+            FROM (VALUES %s) AS v (id, exit_price, realized_pl)
+            WHERE p.id = v.id
+            RETURNING p.id, p.symbol, p.quantity, p.strategy
+        """, closes, template="(%s::integer, %s::numeric, %s::numeric)",
+            page_size=len(closes), fetch=True)
+        
+        by_id = {row[0]: row[1:] for row in rows}
+        events = []
+        for position_id, exit_price, realized_pl in closes:
+            if position_id not in by_id:
+                continue
+            symbol, quantity, strategy = by_id[position_id]
+            events.append({
+                "type": "position.closed",
+                "data": {
+                    "id": position_id,
+                    "symbol": symbol,
+                    "quantity": quantity,
+                    "exit_price": exit_price,
+                    "realized_pl": realized_pl,
+                    "strategy": strategy
+                }
+            })
+        return events
+    
+    def _reduce_positions(self, cur, reductions: List[tuple]) -> List[Dict[str, Any]]:
+        if not reductions:
+            return []
+        if 'order_id' not in self.writer._statements["insert_position"].columns:
+            logger.warning(f"Column 'order_id' not available in positions table - "
+                           f"{len(reductions)} position closes not written")
+            return []
+        reductions = merge_reductions(reductions)
+        rows = execute_values(cur, REDUCE_POSITIONS_SQL, reductions, template=REDUCE_POSITIONS_TEMPLATE,
+                              page_size=len(reductions), fetch=True)
+        
+        by_order = {row[0]: row[1:] for row in rows}
+        events = []
+        for order_id, quantity, exit_price, realized_pl, fully_closed in reductions:
+            if order_id not in by_order:
+                continue
+            position_id, symbol, remaining, strategy = by_order[order_id]
+            events.append({
+                "type": "position.closed" if fully_closed else "position.reduced",
+                "data": {
+                    "id": position_id,
+                    "symbol": symbol,
+                    "quantity": remaining,
+                    "exit_price": exit_price,
+                    "realized_pl": realized_pl,
+                    "strategy": strategy,
+                    "order_id": order_id
+                }
+            })
+        return events
+    
+    def _notification_payloads(self, events: List[Dict[str, Any]]) -> List[str]:
+        """Coalesce events into as few NOTIFY payloads as the size limit allows"""
+        if not events:
+            return []
+        timestamp = clock.now().isoformat()
+        
+        def payload(chunk):
+            return json.dumps({
+                "type": "batch",
+                "data": {"events": chunk},
+                "timestamp": timestamp
+            }, default=str)
+        
+        payloads = []
+        chunk: List[Dict[str, Any]] = []
+        size = len(payload([]))
+        for event in events:
+            event_size = len(json.dumps(event, default=str)) + 2
+            if chunk and size + event_size > MAX_NOTIFY_BYTES:
+                payloads.append(payload(chunk))
+                chunk = []
+                size = len(payload([]))
+            chunk.append(event)
+            size += event_size
+        payloads.append(payload(chunk))
+        return payloads
+    
+    def _write_individually(self, items: List[Tuple[str, Any]]) -> int:
+        """Write items one at a time. Returns how many raised."""
+        errors = 0
+        for kind, payload in items:
+            try:
+                if kind == "signal":
+                    self.writer.write_signal(payload)
+                elif kind == "position.opened":
+                    self.writer.write_position_opened(*payload)
+                elif kind == "position.reduced":
+                    self.writer.write_position_reduced(*payload)
+                else:
+                    self.writer.write_position_closed(*payload)
+            except Exception as e:
+                errors += 1
+                logger.error(f"Failed to write {kind} record: {e}")
+        return errors
+    
+    # Metrics
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, flush and lag metrics"""
+        depth = self.queue.qsize()
+        with self._stats_lock:
+            return {
+                "queue_depth": depth,
+                "max_queue_size": self.queue.maxsize,
+                "queue_full_policy": self.queue_full_policy,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "sync_writes": self.sync_writes,
+                "flushes": self.flushes,
+                "flush_failures": self.flush_failures,
+                "write_errors": self.write_errors,
+                "avg_batch_size": self.written / self.flushes if self.flushes else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "last_flush_ms": self.last_flush_ms,
+                "avg_flush_ms": self.total_flush_time * 1000 / self.flushes if self.flushes else 0.0,
+                "last_lag_ms": self.last_lag_ms,
+                "max_lag_ms": self.max_lag_ms,
+            }
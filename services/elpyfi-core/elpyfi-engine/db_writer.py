@@ -3,16 +3,70 @@ Database Writer Module
 
 Handles all database operations and pg_notify events for the engine.
 Uses synchronous psycopg2 to fit with existing codebase.
+
+Connections come from a bounded thread-safe pool and are checked out per
+call, so the engine thread, the schema monitor and execution callbacks
+can write concurrently without sharing a cursor.
+
+Write statements are compiled once per schema shape (the set of columns
+_validate_schema found) and run as server-side prepared statements, so
+neither the client nor Postgres rebuilds or re-plans them per write.
+
+Schema validation is one catalog query for every expected table. Results
+are cached by schema fingerprint and repeated checks are rate limited, so
+a burst of write errors costs one catalog query rather than one each.
+
+With a spool attached (see spool.py), writes that fail because the
+database is unreachable or mismatched are kept on local disk and
+replayed later instead of being dropped.
 """
 
 import psycopg2
 from psycopg2 import errors as pg_errors
+from psycopg2.extras import execute_batch, execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+import hashlib
 import json
 import logging
+import threading
+from contextlib import contextmanager
+from operator import attrgetter
 from datetime import datetime
-from typing import Dict, Optional, Any, List, Tuple
-from dataclasses import asdict
+from typing import Dict, Optional, Any, List, Set, Tuple
+from dataclasses import asdict, dataclass
 import time
+import clock
+from metrics import DB_WRITE_SECONDS
+from spool import signal_record
+
+# Takes quantity off the open position opened by order_id and adds the
+# realized P&L; fully_closed rows are marked closed. Shared with the write
+# pipeline and spool replay so every path closes positions the same way.
+REDUCE_POSITIONS_SQL = """
+    UPDATE positions AS p
+    SET quantity = CASE WHEN v.fully_closed THEN p.quantity
+                        ELSE p.quantity - SIGN(p.quantity) * v.quantity END,
+        current_price = v.exit_price,
+        realized_pl = COALESCE(p.realized_pl, 0) + v.realized_pl,
+        status = CASE WHEN v.fully_closed THEN 'closed' ELSE p.status END,
+        closed_at = CASE WHEN v.fully_closed THEN NOW() ELSE p.closed_at END
+    FROM (VALUES %s) AS v (order_id, quantity, exit_price, realized_pl, fully_closed)
+    WHERE p.order_id = v.order_id AND p.status = 'open'
+    RETURNING p.order_id, p.id, p.symbol, p.quantity, p.strategy
+"""
+REDUCE_POSITIONS_TEMPLATE = "(%s, %s::numeric, %s::numeric, %s::numeric, %s::boolean)"
+
+
+def merge_reductions(reductions: List[Tuple[str, float, float, float, bool]]) -> List[Tuple[str, float, float, float, bool]]:
+    """Combine reductions of the same order into one row (an UPDATE ... FROM applies only one per row)"""
+    merged: Dict[str, Tuple[str, float, float, float, bool]] = {}
+    for order_id, quantity, exit_price, realized_pl, fully_closed in reductions:
+        if order_id in merged:
+            _, total, _, pnl, closed = merged[order_id]
+            merged[order_id] = (order_id, total + quantity, exit_price, pnl + realized_pl, closed or fully_closed)
+        else:
+            merged[order_id] = (order_id, quantity, exit_price, realized_pl, fully_closed)
+    return list(merged.values())
 
 logger = logging.getLogger(__name__)
 
@@ -90,9 +144,74 @@ class SchemaMismatchError(Exception):
         return '\n'.join(sql_statements) if sql_statements else ''
 
 
+@dataclass
+class SchemaSnapshot:
+    """Validated column map for one schema fingerprint"""
+    fingerprint: str
+    columns: Dict[str, List[str]]
+    missing_tables: List[str]
+    schema_issues: Dict[str, List[str]]
+    
+    @property
+    def valid(self) -> bool:
+        return not self.missing_tables and not self.schema_issues
+    
+    def error(self) -> Optional[SchemaMismatchError]:
+        """Build the SchemaMismatchError for this snapshot (None if valid)"""
+        if self.valid:
+            return None
+        error_msg = "Database schema mismatch detected:\n"
+        if self.missing_tables:
+            error_msg += f"Missing tables: {self.missing_tables}\n"
+        for table, cols in self.schema_issues.items():
+            error_msg += f"Table '{table}' missing columns: {cols}\n"
+        return SchemaMismatchError(
+            error_msg,
+            missing_columns=[col for cols in self.schema_issues.values() for col in cols],
+            missing_tables=list(self.missing_tables),
+            schema_issues=dict(self.schema_issues)
+        )
+
+
+class PreparedStatement:
+    """A write statement compiled for one schema shape"""
+    
+    def __init__(self, name: str, template: str, columns: List[str], num_params: int,
+                 values=None):
+        self.name = name
+        self.columns = columns
+        self.values = values  # builds the parameter list for one write
+        placeholders = ['%s'] * num_params
+        # Plain form for one-off execution; PREPARE/EXECUTE form for the hot path
+        self.sql = template.format(*placeholders)
+        self.prepare_sql = f"PREPARE {name} AS " + template.format(*(f"${i + 1}" for i in range(num_params)))
+        self.execute_sql = f"EXECUTE {name} ({', '.join(placeholders)})"
+
+
 class DatabaseWriter:
     """Handles database writes and notifications"""
     
+    # Columns written by the INSERT statements; optional ones are only
+    # included when the table has them (or the schema is not known yet)
+    SIGNAL_INSERT_COLUMNS = ['strategy', 'symbol', 'action', 'confidence', 'expected_profit', 'metadata']
+    POSITION_INSERT_COLUMNS = ['symbol', 'quantity', 'entry_price', 'current_price',
+                               'unrealized_pl', 'strategy', 'status', 'order_id']
+    OPTIONAL_COLUMNS = {'expected_profit', 'metadata', 'order_id'}
+    
+    # Every column of every expected table in one round-trip
+    SCHEMA_QUERY = """
+        SELECT c.relname, a.attname
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'p')
+          AND c.relname = ANY(%s)
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        ORDER BY c.relname, a.attnum
+    """
+    
     # Expected schema definition
     EXPECTED_SCHEMA = {
         'positions': [
@@ -105,20 +224,61 @@ class DatabaseWriter:
         ]
     }
     
-    def __init__(self, connection_string: str = "postgresql://d@localhost/elpyfi"):
+    def __init__(self, connection_string: str = "postgresql://d@localhost/elpyfi",
+                 min_connections: int = 1, max_connections: int = 5,
+                 checkout_timeout: float = 5.0, health_check_interval: float = 30.0,
+                 prepare_statements: bool = True, min_schema_check_interval: float = 5.0,
+                 spool=None):
+        if max_connections < 1 or min_connections > max_connections:
+            raise ValueError("need 1 <= max_connections and min_connections <= max_connections")
         self.connection_string = connection_string
-        self.conn = None
-        self.cur = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.prepare_statements = prepare_statements
+        self.spool = spool  # Optional WriteSpool for writes the database can't take
+        self.pool = None
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._last_used: Dict[int, float] = {}
+        self._stats_lock = threading.Lock()
+        
+        # Pool metrics
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.total_checkout_wait = 0.0
+        self.max_checkout_wait = 0.0
+        self.discarded_connections = 0
+        self.health_check_failures = 0
+        
         self.schema_validated = False
         self.last_schema_error = None
         self._schema_retry_count = 0
         self._max_schema_retries = 3
         self.available_columns = {}  # Track which columns actually exist
+        
+        # Schema validation cache
+        self.min_schema_check_interval = min_schema_check_interval
+        self.schema_fingerprint = None
+        self._schema_snapshot: Optional[SchemaSnapshot] = None
+        self._schema_cache: Dict[str, SchemaSnapshot] = {}
+        self._schema_lock = threading.Lock()
+        self._last_schema_check = None
+        self.schema_queries = 0
+        self.schema_checks_skipped = 0
+        
+        # Compiled write statements, rebuilt only when the schema shape changes
+        self._statements: Dict[str, PreparedStatement] = {}
+        self._statement_shape = None
+        self.schema_version = 0
+        self._prepared: Dict[int, Tuple[int, Set[str]]] = {}  # id(conn) -> (version, names)
+        self._refresh_statements()
+        
         self._connect()
         
         # Validate schema but don't fail initialization
         try:
-            self._validate_schema()
+            self._validate_schema(force=True)
         except SchemaMismatchError as e:
             self.last_schema_error = e
             logger.warning("Schema validation failed on initialization - continuing with degraded mode")
@@ -126,13 +286,14 @@ class DatabaseWriter:
             raise
     
     def _connect(self, max_retries: int = 3, retry_delay: float = 1.0):
-        """Establish database connection with retry logic"""
+        """Create the connection pool with retry logic"""
         for attempt in range(max_retries):
             try:
-                self.conn = psycopg2.connect(self.connection_string)
-                self.conn.autocommit = True  # Required for NOTIFY to work
-                self.cur = self.conn.cursor()
-                logger.info("Connected to PostgreSQL database")
+                self.pool = ThreadedConnectionPool(
+                    self.min_connections, self.max_connections, self.connection_string
+                )
+                logger.info(f"Connected to PostgreSQL database "
+                            f"(pool of {self.min_connections}-{self.max_connections} connections)")
                 return
             except psycopg2.OperationalError as e:
                 if attempt < max_retries - 1:
@@ -145,73 +306,197 @@ class DatabaseWriter:
                 logger.error(f"Unexpected error connecting to database: {e}")
                 raise
     
-    def _validate_schema(self):
-        """Validate that database tables exist with expected columns"""
-        if not self.conn:
-            logger.warning("Cannot validate schema - no database connection")
-            return
+    @contextmanager
+    def connection(self):
+        """Check out a healthy autocommit connection for the duration of a block.
         
-        missing_tables = []
-        schema_issues = {}
+        Connections that fail with a connection-level error are closed
+        instead of being returned, so the next checkout reconnects.
+        """
+        if self.pool is None:
+            raise psycopg2.OperationalError("Database connection pool is not available")
         
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise PoolError(
+                f"No database connection available within {self.checkout_timeout}s"
+            )
+        
+        conn = None
+        broken = False
         try:
-            for table_name, expected_columns in self.EXPECTED_SCHEMA.items():
-                # Check if table exists
-                self.cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = %s
-                    );
-                """, (table_name,))
-                
-                table_exists = self.cur.fetchone()[0]
-                
-                if not table_exists:
-                    missing_tables.append(table_name)
-                    logger.error(f"Required table '{table_name}' does not exist")
+            conn = self._checkout()
+            wait = time.monotonic() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_checkout_wait += wait
+                self.max_checkout_wait = max(self.max_checkout_wait, wait)
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                self._release(conn, broken or bool(conn.closed))
+            self._slots.release()
+    
+    @contextmanager
+    def cursor(self):
+        """Check out a connection and open a cursor on it"""
+        start = time.perf_counter()
+        try:
+            with self.connection() as conn:
+                cur = conn.cursor()
+                try:
+                    yield cur
+                finally:
+                    cur.close()
+        finally:
+            DB_WRITE_SECONDS.observe(time.perf_counter() - start, "statement")
+    
+    def _checkout(self):
+        """Get a connection from the pool, replacing dead or unresponsive ones"""
+        for _ in range(self.max_connections + 1):
+            conn = self.pool.getconn()
+            if conn.closed:
+                self._release(conn, broken=True)
+                continue
+            
+            # Ping connections that have sat idle longer than the health-check interval
+            last_used = self._last_used.get(id(conn))
+            if last_used is not None and time.monotonic() - last_used > self.health_check_interval:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                except psycopg2.Error:
+                    with self._stats_lock:
+                        self.health_check_failures += 1
+                    self._release(conn, broken=True)
                     continue
-                
-                # Check columns if table exists
-                self.cur.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'public' 
-                    AND table_name = %s;
-                """, (table_name,))
-                
-                existing_columns = {row[0] for row in self.cur.fetchall()}
-                missing_columns = [col for col in expected_columns if col not in existing_columns]
-                
-                # Track available columns for fallback behavior
-                self.available_columns[table_name] = list(existing_columns)
-                
-                if missing_columns:
-                    schema_issues[table_name] = missing_columns
-                    logger.error(f"Table '{table_name}' is missing columns: {missing_columns}")
             
-            # If there are schema issues, raise detailed error
-            if missing_tables or schema_issues:
-                error_msg = "Database schema mismatch detected:\n"
-                if missing_tables:
-                    error_msg += f"Missing tables: {missing_tables}\n"
-                if schema_issues:
-                    for table, cols in schema_issues.items():
-                        error_msg += f"Table '{table}' missing columns: {cols}\n"
-                
-                raise SchemaMismatchError(
-                    error_msg,
-                    missing_columns=[col for cols in schema_issues.values() for col in cols],
-                    missing_tables=missing_tables,
-                    schema_issues=schema_issues
-                )
+            if not conn.autocommit:
+                conn.autocommit = True  # Required for NOTIFY to work
+            return conn
+        raise psycopg2.OperationalError("Could not obtain a healthy database connection")
+    
+    def _release(self, conn, broken: bool = False):
+        if broken:
+            self._last_used.pop(id(conn), None)
+            self._prepared.pop(id(conn), None)
+            with self._stats_lock:
+                self.discarded_connections += 1
+            logger.warning("Discarding broken database connection")
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        try:
+            self.pool.putconn(conn, close=broken)
+        except PoolError as e:
+            logger.error(f"Failed to return connection to pool: {e}")
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage metrics"""
+        idle = len(getattr(self.pool, '_pool', []))
+        in_use = len(getattr(self.pool, '_used', {}))
+        with self._stats_lock:
+            return {
+                "min_connections": self.min_connections,
+                "max_connections": self.max_connections,
+                "in_use": in_use,
+                "idle": idle,
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "avg_checkout_wait_ms": self.total_checkout_wait * 1000 / self.checkouts if self.checkouts else 0.0,
+                "max_checkout_wait_ms": self.max_checkout_wait * 1000,
+                "discarded_connections": self.discarded_connections,
+                "health_check_failures": self.health_check_failures,
+            }
+    
+    def _validate_schema(self, force: bool = False):
+        """Validate that database tables exist with expected columns
+        
+        Checks within min_schema_check_interval of the previous one reuse
+        its result (unless forced), and concurrent callers share one query.
+        """
+        if not self.pool:
+            logger.warning("Cannot validate schema - no database connection")
+            return
+        
+        with self._schema_lock:
+            if (not force and self._schema_snapshot is not None
+                    and time.monotonic() - self._last_schema_check < self.min_schema_check_interval):
+                self.schema_checks_skipped += 1
+                error = self._schema_snapshot.error()
+                if error:
+                    raise error
+                return
             
-            self.schema_validated = True
-            logger.info("Database schema validation passed")
+            try:
+                with self.cursor() as cur:
+                    cur.execute(self.SCHEMA_QUERY, (list(self.EXPECTED_SCHEMA),))
+                    rows = cur.fetchall()
+            except psycopg2.Error as e:
+                logger.error(f"Error validating schema: {e}")
+                raise
             
-        except psycopg2.Error as e:
-            logger.error(f"Error validating schema: {e}")
-            raise
+            self._last_schema_check = time.monotonic()
+            self.schema_queries += 1
+            fingerprint = hashlib.sha1(repr(rows).encode()).hexdigest()
+            changed = fingerprint != self.schema_fingerprint
+            
+            snapshot = self._schema_cache.get(fingerprint)
+            if snapshot is None:
+                snapshot = self._build_schema_snapshot(fingerprint, rows)
+                self._schema_cache[fingerprint] = snapshot
+            
+            self.schema_fingerprint = fingerprint
+            self._schema_snapshot = snapshot
+            if changed:
+                # Track available columns for fallback behavior
+                self.available_columns = {t: list(c) for t, c in snapshot.columns.items()}
+                self._refresh_statements()
+            
+            error = snapshot.error()
+            self.schema_validated = error is None
+            if error:
+                raise error
+            if changed:
+                logger.info("Database schema validation passed")
+    
+    def _build_schema_snapshot(self, fingerprint: str, rows: List[Tuple[str, str]]) -> SchemaSnapshot:
+        """Compare catalog rows against EXPECTED_SCHEMA"""
+        columns: Dict[str, List[str]] = {}
+        for table_name, column_name in rows:
+            columns.setdefault(table_name, []).append(column_name)
+        
+        missing_tables = []
+        schema_issues = {}
+        for table_name, expected_columns in self.EXPECTED_SCHEMA.items():
+            if table_name not in columns:
+                missing_tables.append(table_name)
+                logger.error(f"Required table '{table_name}' does not exist")
+                continue
+            
+            missing_columns = [col for col in expected_columns if col not in columns[table_name]]
+            if missing_columns:
+                schema_issues[table_name] = missing_columns
+                logger.error(f"Table '{table_name}' is missing columns: {missing_columns}")
+        
+        return SchemaSnapshot(fingerprint, columns, missing_tables, schema_issues)
+    
+    def get_schema_stats(self) -> Dict[str, Any]:
+        """Get schema validation cache metrics"""
+        return {
+            "fingerprint": self.schema_fingerprint,
+            "schema_version": self.schema_version,
+            "validated": self.schema_validated,
+            "catalog_queries": self.schema_queries,
+            "checks_skipped": self.schema_checks_skipped,
+            "cached_shapes": len(self._schema_cache),
+            "last_check_age_seconds": (time.monotonic() - self._last_schema_check
+                                       if self._last_schema_check is not None else None),
+        }
     
     def get_schema_creation_sql(self) -> str:
         """Generate SQL to create the expected schema"""
@@ -274,15 +559,15 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
                 return False
         return self.schema_validated
     
-    def _notify(self, event_type: str, data: Dict[str, Any]):
-        """Send pg_notify event"""
+    def _notify(self, cur, event_type: str, data: Dict[str, Any]):
+        """Send pg_notify event on the caller's checked-out cursor"""
         event = {
             "type": event_type,
             "data": data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": clock.now().isoformat()
         }
         try:
-            self.cur.execute(
+            cur.execute(
                 "SELECT pg_notify('trading_events', %s)",
                 (json.dumps(event),)
             )
@@ -315,50 +600,132 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
             return "data_validation", f"Check constraint violation: {error_msg}", details
         elif isinstance(error, pg_errors.UniqueViolation):
             return "data_validation", f"Unique constraint violation: {error_msg}", details
-        elif isinstance(error, psycopg2.OperationalError):
+        elif isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)):
             return "connection", f"Database connection error: {error_msg}", details
         else:
             return "unknown", error_msg, details
     
+    def _insert_columns(self, table: str, columns: List[str]) -> List[str]:
+        """Columns to write for a table, dropping optional ones it doesn't have"""
+        available = self.available_columns.get(table, [])
+        if not available:
+            # Include everything if we don't know the schema (first attempt)
+            return list(columns)
+        return [c for c in columns if c not in self.OPTIONAL_COLUMNS or c in available]
+    
+    def _refresh_statements(self) -> bool:
+        """Recompile write statements if the schema shape changed. Returns True if rebuilt."""
+        signal_columns = self._insert_columns('signals', self.SIGNAL_INSERT_COLUMNS)
+        position_columns = self._insert_columns('positions', self.POSITION_INSERT_COLUMNS)
+        shape = (tuple(signal_columns), tuple(position_columns))
+        if shape == self._statement_shape:
+            return False
+        
+        if 'order_id' not in position_columns:
+            logger.warning(f"Column 'order_id' not available in positions table - skipping")
+            logger.warning(f"Order IDs will not be recorded in database")
+        
+        version = self.schema_version + 1
+        
+        def insert(table, columns):
+            return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['{}'] * len(columns))}) RETURNING id"
+        
+        # Value extractors are compiled too, so a write does no per-column lookups
+        get_signal_fields = attrgetter(*(
+            'estimated_profit' if c == 'expected_profit' else c
+            for c in signal_columns if c != 'metadata'
+        ))
+        with_metadata = 'metadata' in signal_columns
+        
+        def signal_values(signal_event):
+            values = list(get_signal_fields(signal_event))
+            if with_metadata:
+                values.append(json.dumps(signal_event.metadata) if hasattr(signal_event, 'metadata') else None)
+            return values
+        
+        position_indexes = [self.POSITION_INSERT_COLUMNS.index(c) for c in position_columns]
+        
+        def position_values(symbol, quantity, entry_price, strategy, order_id):
+            row = (symbol, quantity, entry_price, entry_price, 0.0, strategy, 'open', order_id)
+            return [row[i] for i in position_indexes]
+        
+        self._statements = {
+            "insert_signal": PreparedStatement(
+                f"elpyfi_insert_signal_v{version}", insert('signals', signal_columns),
+                signal_columns, len(signal_columns), signal_values
+            ),
+            "insert_position": PreparedStatement(
+                f"elpyfi_insert_position_v{version}", insert('positions', position_columns),
+                position_columns, len(position_columns), position_values
+            ),
+            "close_position": PreparedStatement(
+                f"elpyfi_close_position_v{version}",
+                "UPDATE positions SET status = 'closed', current_price = {}, realized_pl = {}, "
+                "closed_at = NOW() WHERE id = {} RETURNING symbol, quantity, strategy",
+                ['current_price', 'realized_pl', 'id'], 3
+            ),
+        }
+        self._statement_shape = shape
+        self.schema_version = version
+        logger.info(f"Compiled write statements for schema version {version}")
+        return True
+    
+    def _execute(self, cur, statement: PreparedStatement, values: List[Any]):
+        """Run a compiled statement, preparing it on this connection on first use"""
+        if not self.prepare_statements:
+            cur.execute(statement.sql, values)
+            return
+        
+        key = id(cur.connection)
+        version, prepared = self._prepared.get(key, (None, None))
+        if version != self.schema_version:
+            if version is not None:
+                # Statements from an older schema shape are no longer used
+                cur.execute("DEALLOCATE ALL")
+            prepared = set()
+            self._prepared[key] = (self.schema_version, prepared)
+        
+        if statement.name not in prepared:
+            cur.execute(statement.prepare_sql)
+            prepared.add(statement.name)
+        try:
+            cur.execute(statement.execute_sql, values)
+        except pg_errors.InvalidSqlStatementName:
+            # The server dropped it (e.g. session reset) - prepare again once
+            cur.execute(statement.prepare_sql)
+            cur.execute(statement.execute_sql, values)
+    
+    def _position_record(self, symbol: str, quantity: float, entry_price: float,
+                         strategy: str, order_id: str) -> Tuple[List[str], List[Any]]:
+        """Columns and values for a positions INSERT, based on the compiled statement"""
+        statement = self._statements["insert_position"]
+        return statement.columns, statement.values(symbol, quantity, entry_price, strategy, order_id)
+    
+    def _signal_record(self, signal_event) -> Tuple[List[str], List[Any]]:
+        """Columns and values for a signals INSERT, based on the compiled statement"""
+        statement = self._statements["insert_signal"]
+        return statement.columns, statement.values(signal_event)
+    
     def write_position_opened(self, symbol: str, quantity: float, entry_price: float, 
                             strategy: str, order_id: str):
         """Write new position to database and notify with graceful fallback"""
         try:
-            # Always include core columns
-            columns = ['symbol', 'quantity', 'entry_price', 'current_price', 'unrealized_pl', 'strategy', 'status']
-            values = [symbol, quantity, entry_price, entry_price, 0.0, strategy, 'open']
+            statement = self._statements["insert_position"]
+            columns, values = self._position_record(symbol, quantity, entry_price, strategy, order_id)
             
-            # Check if order_id column exists
-            positions_columns = self.available_columns.get('positions', [])
-            if 'order_id' in positions_columns or not positions_columns:
-                # Include order_id if column exists or if we don't know (first attempt)
-                columns.append('order_id')
-                values.append(order_id)
-            else:
-                logger.warning(f"Column 'order_id' not available in positions table - skipping")
-                logger.warning(f"Order ID '{order_id}' will not be recorded in database")
-            
-            # Build query
-            placeholders = ['%s'] * len(values)
-            query = f"""
-                INSERT INTO positions 
-                ({', '.join(columns)})
-                VALUES ({', '.join(placeholders)})
-                RETURNING id
-            """
-            
-            self.cur.execute(query, values)
-            position_id = self.cur.fetchone()[0]
-            
-            # Send notification (always include order_id in notification)
-            self._notify("position.opened", {
-                "id": position_id,
-                "symbol": symbol,
-                "quantity": quantity,
-                "entry_price": entry_price,
-                "strategy": strategy,
-                "order_id": order_id
-            })
+            with self.cursor() as cur:
+                self._execute(cur, statement, values)
+                position_id = cur.fetchone()[0]
+                
+                # Send notification (always include order_id in notification)
+                self._notify(cur, "position.opened", {
+                    "id": position_id,
+                    "symbol": symbol,
+                    "quantity": quantity,
+                    "entry_price": entry_price,
+                    "strategy": strategy,
+                    "order_id": order_id
+                })
             
             logger.info(f"Recorded position opened: {symbol} x{quantity} @ ${entry_price}")
             return position_id
@@ -371,35 +738,29 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
                 if details.get('column') == 'order_id' and 'order_id' in columns:
                     logger.warning(f"Column 'order_id' does not exist - retrying without it")
                     
-                    # Update our tracked columns
-                    if 'positions' in self.available_columns:
-                        self.available_columns['positions'] = [c for c in self.available_columns['positions'] if c != 'order_id']
+                    # Update our tracked columns and recompile without order_id
+                    known = self.available_columns.get('positions') or self.EXPECTED_SCHEMA['positions']
+                    self.available_columns['positions'] = [c for c in known if c != 'order_id']
+                    self._refresh_statements()
                     
                     # Retry without order_id
                     try:
-                        columns_retry = ['symbol', 'quantity', 'entry_price', 'current_price', 'unrealized_pl', 'strategy', 'status']
-                        values_retry = [symbol, quantity, entry_price, entry_price, 0.0, strategy, 'open']
-                        placeholders_retry = ['%s'] * len(values_retry)
-                        
-                        query_retry = f"""
-                            INSERT INTO positions 
-                            ({', '.join(columns_retry)})
-                            VALUES ({', '.join(placeholders_retry)})
-                            RETURNING id
-                        """
+                        statement = self._statements["insert_position"]
+                        _, values_retry = self._position_record(symbol, quantity, entry_price, strategy, order_id)
                         
-                        self.cur.execute(query_retry, values_retry)
-                        position_id = self.cur.fetchone()[0]
-                        
-                        # Still send full notification
-                        self._notify("position.opened", {
-                            "id": position_id,
-                            "symbol": symbol,
-                            "quantity": quantity,
-                            "entry_price": entry_price,
-                            "strategy": strategy,
-                            "order_id": order_id
-                        })
+                        with self.cursor() as cur:
+                            self._execute(cur, statement, values_retry)
+                            position_id = cur.fetchone()[0]
+                            
+                            # Still send full notification
+                            self._notify(cur, "position.opened", {
+                                "id": position_id,
+                                "symbol": symbol,
+                                "quantity": quantity,
+                                "entry_price": entry_price,
+                                "strategy": strategy,
+                                "order_id": order_id
+                            })
                         
                         logger.warning(f"Position recorded successfully without order_id column")
                         logger.warning(f"Consider adding the column: ALTER TABLE positions ADD COLUMN order_id VARCHAR(100);")
@@ -422,15 +783,18 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
                     
             elif error_type == "connection":
                 logger.error(f"Database connection lost: {error_msg}")
-                # Try to reconnect
-                try:
-                    self._connect(max_retries=1)
-                    logger.info("Reconnected to database")
-                except Exception:
-                    logger.error("Failed to reconnect to database")
+                # The pool already discarded the broken connection
+                logger.info("Next write will check out a fresh connection")
             else:
                 logger.error(f"Database error ({error_type}): {error_msg}")
             
+            self._spool_write(error_type, "position.opened", {
+                "symbol": symbol,
+                "quantity": quantity,
+                "entry_price": entry_price,
+                "strategy": strategy,
+                "order_id": order_id,
+            })
             return None
         except Exception as e:
             logger.error(f"Unexpected error writing position: {e}")
@@ -440,31 +804,25 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
         """Update position as closed and notify"""
         try:
             # Update position
-            self.cur.execute("""
-                UPDATE positions 
-                SET status = 'closed',
-                    current_price = %s,
-                    realized_pl = %s,
-                    closed_at = NOW()
-                WHERE id = %s
-                RETURNING symbol, quantity, strategy
-            """, (exit_price, realized_pl, position_id))
-            
-            result = self.cur.fetchone()
-            if result:
-                symbol, quantity, strategy = result
-                
-                # Send notification
-                self._notify("position.closed", {
-                    "id": position_id,
-                    "symbol": symbol,
-                    "quantity": quantity,
-                    "exit_price": exit_price,
-                    "realized_pl": realized_pl,
-                    "strategy": strategy
-                })
+            with self.cursor() as cur:
+                self._execute(cur, self._statements["close_position"],
+                              [exit_price, realized_pl, position_id])
                 
-                logger.info(f"Recorded position closed: {symbol} @ ${exit_price}, PL: ${realized_pl}")
+                result = cur.fetchone()
+                if result:
+                    symbol, quantity, strategy = result
+                    
+                    # Send notification
+                    self._notify(cur, "position.closed", {
+                        "id": position_id,
+                        "symbol": symbol,
+                        "quantity": quantity,
+                        "exit_price": exit_price,
+                        "realized_pl": realized_pl,
+                        "strategy": strategy
+                    })
+                    
+                    logger.info(f"Recorded position closed: {symbol} @ ${exit_price}, PL: ${realized_pl}")
             
         except psycopg2.Error as e:
             error_type, error_msg, details = self._parse_db_error(e)
@@ -484,57 +842,110 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
                         logger.critical("-" * 80)
             elif error_type == "connection":
                 logger.error(f"Database connection lost: {error_msg}")
-                try:
-                    self._connect(max_retries=1)
-                except Exception:
-                    logger.error("Failed to reconnect to database")
+                # The pool already discarded the broken connection
+                logger.info("Next write will check out a fresh connection")
             else:
                 logger.error(f"Database error ({error_type}): {error_msg}")
+            
+            self._spool_write(error_type, "position.closed", {
+                "position_id": position_id,
+                "exit_price": exit_price,
+                "realized_pl": realized_pl,
+            })
         except Exception as e:
             logger.error(f"Unexpected error closing position: {e}")
     
+    def write_position_reduced(self, order_id: str, quantity: float, exit_price: float,
+                               realized_pl: float, fully_closed: bool):
+        """Take quantity off the open position opened by order_id; close it if fully_closed"""
+        if 'order_id' not in self._statements["insert_position"].columns:
+            logger.warning(f"Column 'order_id' not available in positions table - close of {order_id} not written")
+            return
+        try:
+            with self.cursor() as cur:
+                rows = execute_values(cur, REDUCE_POSITIONS_SQL,
+                                      [(order_id, quantity, exit_price, realized_pl, fully_closed)],
+                                      template=REDUCE_POSITIONS_TEMPLATE, fetch=True)
+                if rows:
+                    _, position_id, symbol, remaining, strategy = rows[0]
+                    self._notify(cur, "position.closed" if fully_closed else "position.reduced", {
+                        "id": position_id,
+                        "symbol": symbol,
+                        "quantity": remaining,
+                        "exit_price": exit_price,
+                        "realized_pl": realized_pl,
+                        "strategy": strategy,
+                        "order_id": order_id
+                    })
+                    logger.info(f"Recorded position {'closed' if fully_closed else 'reduced'}: "
+                                f"{symbol} {quantity} @ ${exit_price}, PL: ${realized_pl}")
+        except psycopg2.Error as e:
+            error_type, error_msg, _ = self._parse_db_error(e)
+            logger.error(f"Database error ({error_type}) closing position {order_id}: {error_msg}")
+            self._spool_write(error_type, "position.reduced", {
+                "order_id": order_id,
+                "quantity": quantity,
+                "exit_price": exit_price,
+                "realized_pl": realized_pl,
+                "fully_closed": fully_closed,
+            })
+        except Exception as e:
+            logger.error(f"Unexpected error closing position {order_id}: {e}")
+    
+    def write_position_marks(self, marks: List[Tuple[str, float, float, float]]) -> Optional[int]:
+        """Bulk-update current_price, unrealized_pl and quantity of open positions.
+        
+        marks are (order_id, current_price, unrealized_pl, quantity) rows,
+        with quantity signed (negative for shorts); all of them
+        go out in one UPDATE ... FROM (VALUES ...). Returns the number of
+        rows updated, or None if the write failed and should be retried.
+        """
+        if not marks:
+            return 0
+        if 'order_id' not in self._statements["insert_position"].columns:
+            logger.warning("Column 'order_id' not available in positions table - position marks not written")
+            return 0
+        try:
+            with self.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE positions AS p
+                    SET current_price = v.current_price,
+                        unrealized_pl = v.unrealized_pl,
+                        quantity = v.quantity
+                    FROM (VALUES %s) AS v (order_id, current_price, unrealized_pl, quantity)
+                    WHERE p.order_id = v.order_id AND p.status = 'open'
+                """, marks, template="(%s, %s::numeric, %s::numeric, %s::numeric)", page_size=len(marks))
+                updated = cur.rowcount
+            logger.debug(f"Updated marks for {updated} open positions")
+            return updated
+        except psycopg2.Error as e:
+            error_type, error_msg, _ = self._parse_db_error(e)
+            logger.error(f"Database error ({error_type}) writing position marks: {error_msg}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error writing position marks: {e}")
+            return None
+    
     def write_signal(self, signal_event):
         """Write trading signal to database and notify with graceful fallback"""
         try:
-            # Build dynamic query based on available columns
-            columns = ['strategy', 'symbol', 'action', 'confidence']
-            values = [signal_event.strategy, signal_event.symbol, signal_event.action, signal_event.confidence]
+            # Statement compiled for the current schema shape
+            statement = self._statements["insert_signal"]
+            _, values = self._signal_record(signal_event)
             
-            # Check which optional columns exist
-            signals_columns = self.available_columns.get('signals', [])
-            
-            # Add expected_profit if available
-            if 'expected_profit' in signals_columns or not signals_columns:
-                columns.append('expected_profit')
-                values.append(getattr(signal_event, 'estimated_profit', None))
-            
-            # Add metadata if available
-            if 'metadata' in signals_columns or not signals_columns:
-                columns.append('metadata')
-                metadata_value = json.dumps(signal_event.metadata) if hasattr(signal_event, 'metadata') else None
-                values.append(metadata_value)
-            
-            # Build query
-            placeholders = ['%s'] * len(values)
-            query = f"""
-                INSERT INTO signals 
-                ({', '.join(columns)})
-                VALUES ({', '.join(placeholders)})
-                RETURNING id
-            """
-            
-            self.cur.execute(query, values)
-            signal_id = self.cur.fetchone()[0]
-            
-            # Send notification
-            self._notify("signal.generated", {
-                "id": signal_id,
-                "strategy": signal_event.strategy,
-                "symbol": signal_event.symbol,
-                "action": signal_event.action,
-                "confidence": signal_event.confidence,
-                "expected_profit": getattr(signal_event, 'estimated_profit', None)
-            })
+            with self.cursor() as cur:
+                self._execute(cur, statement, values)
+                signal_id = cur.fetchone()[0]
+                
+                # Send notification
+                self._notify(cur, "signal.generated", {
+                    "id": signal_id,
+                    "strategy": signal_event.strategy,
+                    "symbol": signal_event.symbol,
+                    "action": signal_event.action,
+                    "confidence": signal_event.confidence,
+                    "expected_profit": getattr(signal_event, 'estimated_profit', None)
+                })
             
             logger.info(f"Recorded signal: {signal_event.action} {signal_event.symbol} @ {signal_event.confidence:.2f}")
             return signal_id
@@ -556,38 +967,151 @@ CREATE INDEX idx_signals_created_at ON signals(created_at);
                         logger.critical("-" * 80)
             elif error_type == "connection":
                 logger.error(f"Database connection lost: {error_msg}")
-                try:
-                    self._connect(max_retries=1)
-                except Exception:
-                    logger.error("Failed to reconnect to database")
+                # The pool already discarded the broken connection
+                logger.info("Next write will check out a fresh connection")
             else:
                 logger.error(f"Database error ({error_type}): {error_msg}")
             
+            self._spool_write(error_type, "signal", signal_record(signal_event))
             return None
         except Exception as e:
             logger.error(f"Unexpected error writing signal: {e}")
             return None
     
+    def _spool_write(self, error_type: str, kind: str, data: Dict[str, Any]):
+        """Keep a failed write on local disk if the database, not the record, is the problem"""
+        if self.spool is None or error_type not in ("connection", "schema_mismatch"):
+            return
+        try:
+            self.spool.append(kind, data)
+            logger.warning(f"Spooled {kind} write for replay once the database is healthy")
+        except OSError as e:
+            logger.error(f"Failed to spool {kind} write: {e}")
+    
+    # Casts for spooled values, which reach Postgres as untyped literals
+    REPLAY_CASTS = {
+        'quantity': 'numeric', 'entry_price': 'numeric', 'current_price': 'numeric',
+        'unrealized_pl': 'numeric', 'confidence': 'numeric', 'expected_profit': 'numeric',
+        'metadata': 'jsonb', 'created_at': 'timestamp',
+    }
+    
+    def replay_spooled(self, records: List[Dict[str, Any]]) -> int:
+        """Write spooled records in one transaction, skipping ones already written.
+        
+        Signals carry their spool id in metadata and positions are keyed by
+        order_id, so replaying a batch twice doesn't duplicate rows (when
+        those columns exist). Closes only touch positions still open; a
+        partial close replayed again after a crash between commit and
+        checkpoint is applied twice. Returns the number of records processed.
+        """
+        signals = [r for r in records if r["kind"] == "signal"]
+        opened = [r for r in records if r["kind"] == "position.opened"]
+        closed = [r for r in records if r["kind"] == "position.closed"]
+        reduced = [r for r in records if r["kind"] == "position.reduced"]
+        
+        with self.cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                if signals:
+                    self._replay_signals(cur, signals)
+                if opened:
+                    self._replay_positions(cur, opened)
+                if closed:
+                    execute_batch(cur, """
+                        UPDATE positions
+                        SET status = 'closed', current_price = %s, realized_pl = %s, closed_at = NOW()
+                        WHERE id = %s AND status <> 'closed'
+                    """, [(r["data"]["exit_price"], r["data"]["realized_pl"], r["data"]["position_id"])
+                          for r in closed], page_size=len(closed))
+                if reduced:
+                    rows = merge_reductions([
+                        (r["data"]["order_id"], r["data"]["quantity"], r["data"]["exit_price"],
+                         r["data"]["realized_pl"], r["data"]["fully_closed"])
+                        for r in reduced
+                    ])
+                    execute_values(cur, REDUCE_POSITIONS_SQL, rows,
+                                   template=REDUCE_POSITIONS_TEMPLATE, page_size=len(rows))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return len(records)
+    
+    def _replay_select(self, columns: List[str]) -> str:
+        return ', '.join(f"%s::{self.REPLAY_CASTS[c]}" if c in self.REPLAY_CASTS else "%s" for c in columns)
+    
+    def _replay_signals(self, cur, records: List[Dict[str, Any]]):
+        columns = list(self._statements["insert_signal"].columns)
+        keyed = 'metadata' in columns
+        if 'created_at' in self.available_columns.get('signals', []):
+            columns.append('created_at')
+        
+        rows = []
+        for record in records:
+            data = record["data"]
+            fields = {
+                'strategy': data["strategy"],
+                'symbol': data["symbol"],
+                'action': data["action"],
+                'confidence': data["confidence"],
+                'expected_profit': data.get("estimated_profit"),
+                'metadata': json.dumps(dict(data.get("metadata") or {}, spool_id=record["id"])),
+                'created_at': data.get("timestamp"),
+            }
+            row = [fields[c] for c in columns]
+            if keyed:
+                row.append(record["id"])
+            rows.append(row)
+        
+        sql = f"INSERT INTO signals ({', '.join(columns)}) SELECT {self._replay_select(columns)}"
+        if keyed:
+            sql += " WHERE NOT EXISTS (SELECT 1 FROM signals WHERE metadata->>'spool_id' = %s)"
+        execute_batch(cur, sql, rows, page_size=len(rows))
+    
+    def _replay_positions(self, cur, records: List[Dict[str, Any]]):
+        columns = self._statements["insert_position"].columns
+        keyed = 'order_id' in columns
+        values = self._statements["insert_position"].values
+        
+        rows = []
+        for record in records:
+            data = record["data"]
+            row = values(data["symbol"], data["quantity"], data["entry_price"],
+                         data["strategy"], data["order_id"])
+            if keyed:
+                row.append(data["order_id"])
+            rows.append(row)
+        
+        sql = f"INSERT INTO positions ({', '.join(columns)}) SELECT {self._replay_select(columns)}"
+        if keyed:
+            sql += " WHERE NOT EXISTS (SELECT 1 FROM positions WHERE order_id = %s)"
+        execute_batch(cur, sql, rows, page_size=len(rows))
+    
     def close(self):
-        """Close database connection"""
-        if self.cur:
-            self.cur.close()
-        if self.conn:
-            self.conn.close()
+        """Close every pooled database connection"""
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
+        self._prepared.clear()
         logger.info("Database connection closed")
 
 
 # Global database writer instance
 db_writer = None
 
-def initialize_db_writer(connection_string: Optional[str] = None):
-    """Initialize the global database writer with improved error handling"""
+def initialize_db_writer(connection_string: Optional[str] = None, **pool_settings):
+    """Initialize the global database writer with improved error handling
+    
+    pool_settings are passed to DatabaseWriter (min_connections,
+    max_connections, checkout_timeout, health_check_interval,
+    prepare_statements, min_schema_check_interval, spool).
+    """
     global db_writer
     try:
         if connection_string:
-            db_writer = DatabaseWriter(connection_string)
+            db_writer = DatabaseWriter(connection_string, **pool_settings)
         else:
-            db_writer = DatabaseWriter()
+            db_writer = DatabaseWriter(**pool_settings)
         logger.info("Database writer initialized successfully")
         return db_writer
     except SchemaMismatchError as e:
@@ -607,6 +1131,16 @@ def initialize_db_writer(connection_string: Optional[str] = None):
         logger.error(f"Unexpected error initializing database writer: {e}")
         raise
 
+def set_db_writer(writer):
+    """Install a writer (e.g. an in-memory recorder) as the global instance.
+    
+    Returns the previous writer so callers can restore it.
+    """
+    global db_writer
+    previous = db_writer
+    db_writer = writer
+    return previous
+
 def get_db_writer() -> DatabaseWriter:
     """Get the global database writer instance"""
     if db_writer is None:
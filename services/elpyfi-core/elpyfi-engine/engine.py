@@ -6,15 +6,22 @@ Target: ~50 lines of core logic
 """
 
 import logging
+import os
 import time
 from typing import Dict, List
 from events import event_bus, EventType, SignalEvent
-from strategies import load_strategies, Strategy, MarketData
-from execution import execution_engine
-from pdt_tracker import pdt_tracker
-from db_writer import initialize_db_writer, SchemaMismatchError, DatabaseWriter, get_db_writer
-from datetime import datetime
+from strategies import load_strategies, Strategy, MarketData, MarketSnapshot
+from execution import get_execution_engine
+from pdt_tracker import get_pdt_tracker
+from sharding import ShardedStrategyRunner
+from indicators import IndicatorEngine
+from db_writer import initialize_db_writer, SchemaMismatchError, DatabaseWriter, get_db_writer, set_db_writer
+from db_pipeline import WritePipeline
+from spool import WriteSpool, SpoolWriter, SpoolReplayer
+from market_data import MarketDataFeed, TickConflator
+from metrics import registry, MetricsServer, ANALYZE_SECONDS, SIGNALS_EMITTED
 import threading
+import clock
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,38 +37,127 @@ class TradingEngine:
         self.db_initialized = False
         self.schema_monitor_thread = None
         self.last_schema_check = None
+        self.shard_runner = None
+        self.write_pipeline = None
+        self.spool = None
+        self.spool_replayer = None
+        self.pdt_tracker = None
+        self.execution_engine = None
+        self.market_data_feed = None
+        self.conflator = None
+        self.metrics_server = None
+        self._async_events = []  # Lanes this engine enabled (and stops)
+        self._stop_event = threading.Event()
+        self.indicator_engine = IndicatorEngine(**config.get('indicators', {}))
         
     def initialize(self):
         """Initialize engine components"""
         logger.info("Initializing ElPyFi Engine...")
         
-        # Initialize database writer with enhanced error handling
-        self._initialize_database()
+        # Health endpoint comes up first so start-up shows as "starting" rather than down
+        http_config = self.config.get('http')
+        if http_config is not None:
+            self._register_metrics()
+            self.metrics_server = MetricsServer(registry, health=self.health, **http_config).start()
         
-        # Set up periodic schema validation
-        self._setup_schema_monitoring()
+        if self.config.get('database', True):
+            # Local spool keeps writes the database can't take right now
+            spool_config = self.config.get('spool')
+            if spool_config is not None:
+                self.spool = WriteSpool(**spool_config)
+                self.spool_replayer = SpoolReplayer(self.spool, get_db_writer).start()
+            
+            # Initialize database writer with enhanced error handling
+            self._initialize_database()
+            
+            # Set up periodic schema validation
+            self._setup_schema_monitoring()
         
         # Load strategies
         strategy_config = self.config.get('strategies', {})
         self.strategies = load_strategies(strategy_config)
         logger.info(f"Loaded {len(self.strategies)} strategies")
         
-        # Execution engine initializes itself
+        # Optionally fan strategies out to worker processes by symbol
+        num_shards = self.config.get('shards', 0)
+        if num_shards > 1:
+            self.shard_runner = ShardedStrategyRunner(strategy_config, num_shards=num_shards)
+            self.shard_runner.start()
+        
+        # PDT approvals and execution subscribe to the event bus when first built
+        self.pdt_tracker = get_pdt_tracker()
+        self.execution_engine = get_execution_engine()
+        gateway_config = self.config.get('order_gateway')
+        if gateway_config is not None:
+            # Broker calls run on a worker pool instead of the approval callback
+            self.execution_engine.enable_gateway(**gateway_config)
+        marks_config = self.config.get('position_marks')
+        if marks_config is not None and self.config.get('database', True):
+            # Unrealized P&L in the positions table, updated in bulk
+            self.execution_engine.enable_mark_flusher(**marks_config)
         logger.info("Execution engine ready")
         
         # Set up market data listener
-        event_bus.subscribe(EventType.MARKET_DATA_RECEIVED, self.process_market_data)
+        if self.config.get('conflation') is not None:
+            # Strategies only ever see the latest tick per symbol, however far behind they are.
+            # Indicators still see every tick (volume, VWAP), so they update ahead of the conflator.
+            self.conflator = TickConflator(self.run_strategies).start()
+            event_bus.subscribe(EventType.MARKET_DATA_RECEIVED, self.indicator_engine.update)
+            event_bus.subscribe(EventType.MARKET_DATA_RECEIVED, self.conflator.put)
+        else:
+            event_bus.subscribe(EventType.MARKET_DATA_RECEIVED, self.process_market_data)
+        market_data_config = self.config.get('market_data')
+        if market_data_config is not None:
+            quote_feed = self.execution_engine.quote_feed
+            if market_data_config.get('source') == 'alpaca' and quote_feed is not None:
+                # One Alpaca data connection per account: bars ride on the quote stream
+                market_data_config = dict(market_data_config, stream_owner=quote_feed)
+            # Ticks are decoded on an ingest thread and reach strategies through a bounded queue
+            self.market_data_feed = MarketDataFeed.from_config(market_data_config)
+        
+        # Optional async dispatch so slow subscribers (DB, broker) stay off the tick path
+        for event_type, lane_config in self.config.get('async_events', {}).items():
+            event_bus.enable_async(event_type, **lane_config)
+            self._async_events.append(event_type)
         
     def process_market_data(self, data: MarketData):
         """Run all strategies against new market data"""
+        # Indicators are computed once here and shared by every strategy
+        self.indicator_engine.update(data)
+        self.run_strategies(data)
+    
+    def run_strategies(self, data: MarketData):
+        """Run all strategies against a tick whose indicators are already filled in"""
+        if self.shard_runner:
+            self.shard_runner.submit(data)
+            return
+        
         for strategy in self.strategies:
             try:
+                started = time.perf_counter()
                 signal = strategy.analyze(data)
+                ANALYZE_SECONDS.observe(time.perf_counter() - started, strategy.name)
                 if strategy.should_emit_signal(signal):
                     self.emit_signal(strategy, signal)
             except Exception as e:
                 logger.error(f"Strategy {strategy.name} error: {e}")
     
+    def process_market_snapshot(self, snapshot: MarketSnapshot):
+        """Run all strategies against a columnar snapshot of many symbols"""
+        self.indicator_engine.update_snapshot(snapshot)
+        
+        for strategy in self.strategies:
+            try:
+                started = time.perf_counter()
+                batch = strategy.analyze_batch(snapshot)
+                ANALYZE_SECONDS.observe(time.perf_counter() - started, strategy.name)
+                for i in batch.active_rows():
+                    signal = batch.to_signal(i, snapshot.symbols[i])
+                    if strategy.should_emit_signal(signal):
+                        self.emit_signal(strategy, signal)
+            except Exception as e:
+                logger.error(f"Strategy {strategy.name} batch error: {e}")
+    
     def emit_signal(self, strategy: Strategy, signal):
         """Emit a trading signal event"""
         signal_event = SignalEvent(
@@ -70,10 +166,52 @@ class TradingEngine:
             action=signal.action,
             confidence=signal.confidence,
             estimated_profit=strategy.estimate_profit(signal),
-            timestamp=datetime.now()
+            timestamp=clock.now()
         )
+        SIGNALS_EMITTED.inc(strategy.name)
         event_bus.emit(EventType.SIGNAL_GENERATED, signal_event)
     
+    def health(self):
+        """Readiness for /health. Returns (healthy, details); a configured feed must be alive."""
+        feed = self.market_data_feed
+        feed_alive = feed.is_alive() if feed else None
+        healthy = self.running and feed_alive is not False
+        if not self.running:
+            status = "starting"
+        else:
+            status = "ok" if healthy else "market data down"
+        details = {
+            "status": status,
+            "strategies": len(self.strategies),
+            "database": self.db_initialized,
+            "market_data": feed.source.name if feed else None,
+            "market_data_alive": feed_alive,
+        }
+        return healthy, details
+    
+    def _register_metrics(self):
+        """Scrape-time gauges for queue depths (nothing is tracked on the tick path)"""
+        registry.gauge("elpyfi_event_queue_depth", "Events waiting on each async event lane",
+                       lambda: {name: stats["depth"] for name, stats in event_bus.get_lane_stats().items()},
+                       label="event_type")
+        registry.gauge("elpyfi_event_dropped_total", "Events dropped because an async lane was full",
+                       lambda: {name: stats["dropped"] for name, stats in event_bus.get_lane_stats().items()},
+                       label="event_type", kind="counter")
+        registry.gauge("elpyfi_market_data_queue_depth", "Ticks waiting between ingest and strategies",
+                       lambda: self.market_data_feed.queue.qsize() if self.market_data_feed else None)
+        registry.gauge("elpyfi_market_data_dropped_total", "Ticks dropped by market data backpressure",
+                       lambda: self.market_data_feed.get_stats()["dropped_by_symbol"] if self.market_data_feed else None,
+                       label="symbol", kind="counter")
+        registry.gauge("elpyfi_conflated_ticks_total", "Stale ticks replaced before strategies saw them",
+                       lambda: self.conflator.get_stats()["conflated_by_symbol"] if self.conflator else None,
+                       label="symbol", kind="counter")
+        registry.gauge("elpyfi_db_pipeline_queue_depth", "Records waiting for the next batched DB write",
+                       lambda: self.write_pipeline.get_stats()["queue_depth"] if self.write_pipeline else None)
+        registry.gauge("elpyfi_open_positions", "Positions on the execution engine's book",
+                       lambda: len(self.execution_engine.positions) if self.execution_engine else None)
+        registry.gauge("elpyfi_engine_running", "1 while the engine main loop is running",
+                       lambda: 1 if self.running else 0)
+    
     def start(self):
         """Start the engine"""
         self.running = True
@@ -81,26 +219,54 @@ class TradingEngine:
         
         # Schema monitoring thread will start checking after engine starts
         
+        if self.market_data_feed:
+            self.market_data_feed.start()
+        else:
+            logger.warning("No market data source configured - waiting for injected data")
+        
         while self.running:
-            time.sleep(0.1)  # Main loop
+            self._stop_event.wait(1.0)
             
-    def stop(self):
-        """Stop the engine"""
+    def stop(self, stop_execution: bool = True):
+        """Stop the engine.
+        
+        stop_execution=False leaves the shared execution engine running, for
+        an engine (e.g. a backtest) that borrowed it from a live one.
+        """
         self.running = False
+        self._stop_event.set()
+        if self.market_data_feed:
+            self.market_data_feed.stop()
+        if self.conflator:
+            self.conflator.stop()
+        if self.shard_runner:
+            self.shard_runner.stop()
+        for event_type in self._async_events:
+            event_bus.disable_async(event_type)
+        self._async_events = []
+        if self.write_pipeline:
+            self.write_pipeline.stop()
+        if self.execution_engine and stop_execution:
+            self.execution_engine.stop()
+        if self.spool_replayer:
+            self.spool_replayer.stop()
+        if self.spool:
+            self.spool.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
         logger.info("Engine stopped")
     
     def inject_market_data(self, symbol: str, price: float, volume: float):
         """Inject market data for testing"""
         data = MarketData(
             symbol=symbol,
-            timestamp=datetime.now(),
+            timestamp=clock.now(),
             current_price=price,
             volume=volume,
             high=price * 1.01,
             low=price * 0.99,
             open=price,
-            close=price,
-            indicators={"vwap": price, "avg_volume": volume * 0.8}
+            close=price
         )
         event_bus.emit(EventType.MARKET_DATA_RECEIVED, data)
     
@@ -110,22 +276,40 @@ class TradingEngine:
             import os
             # PM Claude sets CORE_DATABASE_URL for this service
             db_url = os.environ.get('CORE_DATABASE_URL', 'postgresql://d@localhost/elpyfi')
-            initialize_db_writer(db_url)
+            writer = initialize_db_writer(db_url, spool=self.spool, **self.config.get('db_pool', {}))
             self.db_initialized = True
             logger.info("Database writer initialized successfully")
             
+            # Optionally move inserts and notifications off the caller's thread
+            pipeline_config = self.config.get('db_pipeline')
+            if pipeline_config is not None:
+                self.write_pipeline = WritePipeline(writer, **pipeline_config).start()
+                set_db_writer(self.write_pipeline)
+            
             # Perform initial schema check and log warnings
             self._check_schema_health()
             
+            # Drain anything spooled while the database was unavailable
+            if self.spool_replayer:
+                self.spool_replayer.trigger()
+            
         except SchemaMismatchError as e:
             self._handle_schema_mismatch(e)
             logger.warning("Engine starting with degraded database functionality")
             logger.warning("Schema validation will be retried periodically")
+            self._use_spool_writer()
             
         except Exception as e:
             logger.warning(f"Database connection failed: {e}")
             logger.warning("Engine starting without database functionality")
             logger.warning("This may impact trade recording and historical analysis")
+            self._use_spool_writer()
+    
+    def _use_spool_writer(self):
+        """Send writes to the local spool until the database is back"""
+        if self.spool is not None:
+            set_db_writer(SpoolWriter(self.spool))
+            logger.warning(f"Database writes will be spooled to {self.spool.directory} and replayed later")
     
     def _handle_schema_mismatch(self, error: SchemaMismatchError):
         """Handle schema mismatch with detailed logging and instructions"""
@@ -179,7 +363,7 @@ class TradingEngine:
             if db and hasattr(db, 'schema_validated'):
                 if db.schema_validated:
                     logger.info("✅ Database schema validation: PASSED")
-                    self.last_schema_check = datetime.now()
+                    self.last_schema_check = clock.now()
                 else:
                     logger.warning("⚠️  Database schema validation: FAILED")
                     if hasattr(db, 'last_schema_error') and db.last_schema_error:
@@ -204,7 +388,7 @@ class TradingEngine:
                 action="test",
                 confidence=0.0,
                 estimated_profit=0.0,
-                timestamp=datetime.now()
+                timestamp=clock.now()
             )
             
             # We don't actually want to pollute the DB, so just check if method exists
@@ -221,11 +405,12 @@ class TradingEngine:
             retry_intervals = [30, 60, 300, 600]  # 30s, 1m, 5m, 10m
             retry_count = 0
             
-            while self.running:
+            while not self._stop_event.is_set():
                 try:
                     # Wait for appropriate interval
                     interval = retry_intervals[min(retry_count, len(retry_intervals) - 1)]
-                    time.sleep(interval)
+                    if self._stop_event.wait(interval):
+                        break
                     
                     if not self.db_initialized:
                         # Try to reinitialize database
@@ -239,6 +424,8 @@ class TradingEngine:
                             logger.info("✅ Schema revalidation successful!")
                             self.db_initialized = True
                             retry_count = 0  # Reset retry counter on success
+                            if self.spool_replayer:
+                                self.spool_replayer.trigger()
                         else:
                             retry_count += 1
                             
@@ -261,7 +448,34 @@ def main():
     config = {
         'strategies': {
             'solar_flare': {}  # Load solar flare strategy with default params
-        }
+        },
+        # Event types dispatched on background worker lanes instead of inline
+        'async_events': {
+            # Single worker keeps PDT approval decisions serialized
+            EventType.SIGNAL_GENERATED: {'workers': 1, 'max_queue_size': 1000},
+            # Approvals hold a PDT day trade, so a full lane makes the emitter wait rather than drop
+            EventType.DAY_TRADE_APPROVED: {'workers': 2, 'max_queue_size': 1000, 'block': True},
+        },
+        # Parallel order submission (Alpaca allows 200 requests/minute by default)
+        'order_gateway': {'workers': 8, 'max_in_flight': 8, 'rate_limit': 3, 'burst': 10},
+        # Batched background DB writes (one transaction + one NOTIFY per flush)
+        'db_pipeline': {'flush_size': 500, 'flush_interval': 0.25, 'queue_full_policy': 'sync'},
+        # Writes made while Postgres is down or mismatched are replayed from here
+        'spool': {'directory': os.environ.get('ELPYFI_SPOOL_DIR', 'spool')},
+        # Open positions re-marked from quotes and flushed to Postgres in one UPDATE
+        'position_marks': {'interval': 5.0},
+        # Live bars from Alpaca; drop the oldest tick rather than fall behind the market
+        'market_data': {
+            'source': 'alpaca',
+            'symbols': os.environ.get('ELPYFI_SYMBOLS', 'SPY,QQQ,AAPL,MSFT,NVDA,TSLA').split(','),
+            'feed': os.environ.get('ALPACA_DATA_FEED', 'iex'),
+            'max_queue_size': 10000,
+            'policy': 'drop_oldest',
+        },
+        # Skip stale ticks for a symbol when strategies fall behind it
+        'conflation': {},
+        # /health and /metrics (Prometheus) - config/services.yaml health-checks this port
+        'http': {'port': int(os.environ.get('ELPYFI_HTTP_PORT', '9001'))},
     }
     
     engine = TradingEngine(config)
@@ -278,8 +492,7 @@ def main():
         time.sleep(1)
         
         # Check PDT status
-        from pdt_tracker import pdt_tracker
-        logger.info(f"PDT Status: {pdt_tracker.get_status()}")
+        logger.info(f"PDT Status: {engine.pdt_tracker.get_status()}")
     else:
         try:
             engine.start()
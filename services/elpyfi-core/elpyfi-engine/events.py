@@ -2,25 +2,219 @@ from typing import Dict, List, Callable, Any, Optional
 from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventLane:
+    """Bounded queue plus worker threads that dispatch one event type.
+    
+    A full lane drops new events, or with block=True makes the emitter
+    wait for room (for events that must not be lost, e.g. approvals).
+    """
+    
+    def __init__(self, bus: "EventBus", event_type: str, workers: int = 1,
+                 max_queue_size: int = 1000, block: bool = False):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.bus = bus
+        self.event_type = event_type
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self.max_queue_size = max_queue_size
+        self.block = block
+        self.workers: List[threading.Thread] = []
+        self.running = True
+        
+        # Counters (updated by workers under the stats lock)
+        self._stats_lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_handler_time = 0.0
+        self.max_handler_time = 0.0
+        
+        for i in range(workers):
+            worker = threading.Thread(
+                target=self._run,
+                daemon=True,
+                name=f"EventLane-{event_type}-{i}"
+            )
+            worker.start()
+            self.workers.append(worker)
+    
+    def submit(self, data: Any) -> bool:
+        """Queue an event. Returns False if it was dropped.
+        
+        Without block, a full lane drops the event at once; with block, the
+        emitter waits for room and only drops once the lane is stopped.
+        """
+        item = (time.perf_counter(), data)
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.block:
+            with self._stats_lock:
+                self.blocked += 1
+            while self.running:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+        with self._stats_lock:
+            self.dropped += 1
+        logger.warning(f"Event lane '{self.event_type}' full - dropping event")
+        return False
+    
+    def _run(self):
+        """Worker loop: pull events and hand them to the bus subscribers"""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                enqueued_at, data = item
+                started = time.perf_counter()
+                errors = self.bus._dispatch(self.event_type, data)
+                finished = time.perf_counter()
+                
+                wait = started - enqueued_at
+                handler_time = finished - started
+                with self._stats_lock:
+                    self.processed += 1
+                    self.errors += errors
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                    self.total_handler_time += handler_time
+                    self.max_handler_time = max(self.max_handler_time, handler_time)
+            finally:
+                self.queue.task_done()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Stop workers after the events already queued have been handled.
+        
+        With a timeout, gives up after that long overall - including when
+        the queue is too full (e.g. behind a stuck handler) to take the
+        stop markers - and leaves the daemon workers behind.
+        """
+        if not self.running:
+            return
+        self.running = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        def remaining():
+            return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        
+        for _ in self.workers:
+            try:
+                self.queue.put(None, timeout=remaining())
+            except queue.Full:
+                logger.warning(f"Event lane '{self.event_type}' did not drain within {timeout}s")
+                return
+        for worker in self.workers:
+            worker.join(remaining())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and latency counters for this lane"""
+        with self._stats_lock:
+            processed = self.processed
+            return {
+                "workers": len(self.workers),
+                "depth": self.queue.qsize(),
+                "max_queue_size": self.max_queue_size,
+                "processed": processed,
+                "dropped": self.dropped,
+                "blocked": self.blocked,
+                "errors": self.errors,
+                "avg_wait_ms": (self.total_wait / processed * 1000) if processed else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+                "avg_handler_ms": (self.total_handler_time / processed * 1000) if processed else 0.0,
+                "max_handler_ms": self.max_handler_time * 1000,
+            }
 
 
 class EventBus:
     def __init__(self):
         self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+        self._lanes: Dict[str, EventLane] = {}
     
     def subscribe(self, event_type: str, handler: Callable) -> None:
         """Subscribe a handler function to an event type."""
         self._subscribers[event_type].append(handler)
     
     def emit(self, event_type: str, data: Any = None) -> None:
-        """Emit an event to all subscribed handlers."""
+        """Emit an event to all subscribed handlers.
+        
+        Event types with an async lane are queued and return immediately;
+        everything else is dispatched inline on the caller's thread.
+        """
+        lane = self._lanes.get(event_type)
+        if lane is not None:
+            lane.submit(data)
+            return
         for handler in self._subscribers[event_type]:
             handler(data)
     
+    def is_subscribed(self, event_type: str, handler: Callable) -> bool:
+        """Check whether a handler is subscribed to an event type."""
+        return handler in self._subscribers.get(event_type, ())
+    
     def unsubscribe(self, event_type: str, handler: Callable) -> None:
         """Remove a handler from an event type."""
         if handler in self._subscribers[event_type]:
             self._subscribers[event_type].remove(handler)
+    
+    def enable_async(self, event_type: str, workers: int = 1, max_queue_size: int = 1000,
+                     block: bool = False) -> EventLane:
+        """Dispatch an event type on its own bounded queue and worker threads.
+        
+        With more than one worker, handlers for the same event type may run
+        concurrently and out of order. block=True makes emit wait for room
+        in a full lane instead of dropping the event.
+        """
+        self.disable_async(event_type)
+        lane = EventLane(self, event_type, workers=workers, max_queue_size=max_queue_size, block=block)
+        self._lanes[event_type] = lane
+        logger.info(f"Async event lane enabled: {event_type} "
+                    f"({workers} workers, queue size {max_queue_size}, {'blocking' if block else 'dropping'})")
+        return lane
+    
+    def disable_async(self, event_type: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        """Drain and stop async lanes, returning to inline dispatch"""
+        event_types = [event_type] if event_type else list(self._lanes)
+        for name in event_types:
+            lane = self._lanes.pop(name, None)
+            if lane:
+                lane.stop(timeout)
+    
+    def drain(self) -> None:
+        """Block until every queued event has been handled"""
+        for lane in list(self._lanes.values()):
+            lane.queue.join()
+    
+    def get_lane_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get depth and latency counters for each async lane"""
+        return {name: lane.get_stats() for name, lane in list(self._lanes.items())}
+    
+    def _dispatch(self, event_type: str, data: Any) -> int:
+        """Call subscribers from a lane worker. Returns the number of handler errors."""
+        errors = 0
+        for handler in list(self._subscribers[event_type]):
+            try:
+                handler(data)
+            except Exception as e:
+                errors += 1
+                logger.error(f"Event handler error on '{event_type}': {e}")
+        return errors
 
 
 # Event types
@@ -32,6 +226,10 @@ class EventType:
     POSITION_CLOSED = "position_closed"
     METRICS_UPDATED = "metrics_updated"
     MARKET_DATA_RECEIVED = "market_data_received"
+    ORDER_SUBMITTED = "order_submitted"
+    ORDER_FAILED = "order_failed"
+    ORDER_UPDATED = "order_updated"
+    RISK_REJECTED = "risk_rejected"
 
 
 # Event data classes
@@ -64,6 +262,23 @@ class PositionEvent:
     price: float
     timestamp: datetime
     order_id: str
+    strategy: Optional[str] = None
+    realized_pl: Optional[float] = None  # Set on "closed"
+
+@dataclass
+class OrderEvent:
+    symbol: str
+    action: str
+    status: str  # "submitted", "failed" or an OrderState for ORDER_UPDATED
+    timestamp: datetime
+    order_id: Optional[str] = None
+    quantity: Optional[float] = None
+    price: Optional[float] = None
+    strategy: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: float = 0.0  # Broker submit call
+    queue_ms: float = 0.0  # Time waiting in the gateway queue
+    signal_event: Optional[SignalEvent] = None  # The signal the order was placed for
 
 @dataclass
 class MetricsEvent:
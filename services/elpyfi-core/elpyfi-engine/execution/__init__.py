@@ -6,21 +6,35 @@ This module handles:
 - Placing orders with brokers
 - Tracking order status
 - Emitting position events
+
+Orders followed on the broker's trade-update stream are booked from
+their actual fills (quantity and average price) once they finish; a
+rejected or cancelled order releases its risk reservation without
+touching the book. Orders without a stream are booked at submission.
+
+Nothing is built at import: get_execution_engine() creates the shared
+ExecutionEngine on first use, and alpaca-py is only imported once API
+keys are configured.
 """
 
-from events import event_bus, EventType, SignalEvent, PositionEvent, TradeRequestEvent
+from events import event_bus, EventType, SignalEvent, PositionEvent, TradeRequestEvent, OrderEvent
 from datetime import datetime
 import logging
 import os
+import threading
+import time
+import uuid
 from decimal import Decimal
+from typing import Optional
+from allocator import get_position_size
 from db_writer import get_db_writer
-
-# Alpaca imports
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import MarketOrderRequest, LimitOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
-from alpaca.data.live import StockDataStream
-from alpaca.data.requests import StockLatestQuoteRequest
+import clock
+from metrics import ORDER_SUBMIT_SECONDS
+from execution.quotes import QuoteCache, QuoteFeed, FakeQuoteStream
+from execution.gateway import OrderGateway
+from execution.orders import OrderTracker, TradeUpdateFeed, FakeTradingStream, TERMINAL_STATES
+from execution.positions import PositionBook, MarkFlusher
+from execution.risk import RiskEngine
 
 logger = logging.getLogger(__name__)
 
@@ -29,10 +43,22 @@ class ExecutionEngine:
     """Handles order execution and position management"""
     
     def __init__(self):
-        self.pending_orders = {}
-        self.positions = {}
+        self.order_tracker = OrderTracker()
+        self.trade_feed = None
+        self.positions = PositionBook()
+        self.mark_flusher = None
         self.alpaca_client = None
+        self.data_client = None  # Long-lived REST client for quote fallbacks
+        self.quote_cache = QuoteCache(max_age=float(os.environ.get('ALPACA_QUOTE_MAX_AGE', '2.0')))
+        self.quote_feed = None
+        self.rest_quote_requests = 0
+        self.broker = None  # Optional simulated broker, takes priority over Alpaca
+        self.gateway = None  # Optional OrderGateway for submitting off the event-bus thread
         self.portfolio_value = 100000  # Default, will be updated from account
+        self.risk = RiskEngine(self.positions, portfolio_value=self.portfolio_value)
+        self._risk_tokens = {}  # id(signal) -> reservations held until each fill is on the book
+        self._risk_lock = threading.Lock()
+        self._settle_lock = threading.Lock()
         self._initialize_alpaca()
         self._setup_listeners()
     
@@ -49,6 +75,13 @@ class ExecutionEngine:
                 logger.warning("Set ALPACA_API_KEY and ALPACA_SECRET_KEY environment variables")
                 logger.warning("Continuing with stub execution mode")
                 return
+            
+            # The SDK is only loaded for a live broker
+            from alpaca.trading.client import TradingClient
+            from alpaca.trading.stream import TradingStream
+            from alpaca.data.live import StockDataStream
+            from alpaca.data.historical import StockHistoricalDataClient
+            from alpaca.data.enums import DataFeed
                 
             # Initialize Alpaca client
             self.alpaca_client = TradingClient(
@@ -57,10 +90,26 @@ class ExecutionEngine:
                 paper=paper
             )
             
+            # Order state comes from the trade-update stream, not per-order polling
+            self.order_tracker.client = self.alpaca_client
+            try:
+                self.set_trade_stream(TradingStream(api_key, secret_key, paper=paper))
+            except Exception as e:
+                logger.warning(f"Trade update stream unavailable: {e}")
+            
+            # One data client and one quote stream for the life of the engine
+            self.data_client = StockHistoricalDataClient(api_key=api_key, secret_key=secret_key)
+            try:
+                feed = DataFeed(os.environ.get('ALPACA_DATA_FEED', 'iex'))
+                self.set_quote_stream(StockDataStream(api_key, secret_key, feed=feed))
+            except Exception as e:
+                logger.warning(f"Quote stream unavailable, sizing will use REST quotes: {e}")
+            
             # Get account info to update portfolio value
             try:
                 account = self.alpaca_client.get_account()
                 self.portfolio_value = float(account.portfolio_value)
+                self.risk.portfolio_value = self.portfolio_value
                 logger.info(f"Connected to Alpaca ({'Paper' if paper else 'Live'} trading)")
                 logger.info(f"Account portfolio value: ${self.portfolio_value:,.2f}")
             except Exception as e:
@@ -70,10 +119,18 @@ class ExecutionEngine:
             logger.error(f"Failed to initialize Alpaca client: {e}")
             logger.warning("Continuing with stub execution mode")
     
+    def subscriptions(self):
+        """(event type, handler) pairs the engine listens on"""
+        return [
+            (EventType.SIGNAL_GENERATED, self.handle_signal),
+            (EventType.DAY_TRADE_APPROVED, self.handle_approved_trade),
+            (EventType.ORDER_UPDATED, self.handle_order_update),
+        ]
+    
     def _setup_listeners(self):
         """Subscribe to relevant events"""
-        event_bus.subscribe(EventType.SIGNAL_GENERATED, self.handle_signal)
-        event_bus.subscribe(EventType.DAY_TRADE_APPROVED, self.handle_approved_trade)
+        for event_type, handler in self.subscriptions():
+            event_bus.subscribe(event_type, handler)
     
     def handle_signal(self, signal_event: SignalEvent):
         """Process trading signals"""
@@ -97,54 +154,308 @@ class ExecutionEngine:
     def handle_approved_trade(self, approval_event):
         """Execute approved trades"""
         if approval_event.approved:
-            self.execute_trade(approval_event.trade_request.signal_event)
+            self.submit_approved([approval_event.trade_request.signal_event])
+    
+    def handle_order_update(self, order_event: OrderEvent):
+        """Book a streamed order's actual fills once it is filled, cancelled or rejected"""
+        if order_event.status not in TERMINAL_STATES:
+            return
+        order = self.order_tracker.get_completed(order_event.order_id)
+        if order is not None:
+            self._settle(order)
+    
+    def _settle(self, order):
+        """Put a finished order's fills on the book and release its reservation (once)"""
+        signal = order.context
+        if not order.is_terminal or not isinstance(signal, SignalEvent):
+            return  # Not ours, or track() hasn't attached the signal yet
+        with self._settle_lock:
+            if order.settled:
+                return
+            order.settled = True
+        try:
+            if order.filled_qty > 0 and order.avg_fill_price:
+                self._book_fill(signal, order.order_id, order.filled_qty, order.avg_fill_price)
+            else:
+                logger.warning(f"Order {order.order_id} for {signal.symbol} {order.state} with nothing filled")
+        finally:
+            self._release_risk(signal)
+    
+    def submit_approved(self, signals):
+        """Pre-trade risk check (one pass for all of signals), then submit the orders that pass"""
+        if not signals:
+            return
+        notional = get_position_size(self.portfolio_value)
+        results = self.risk.reserve_batch([(s.symbol, s.action, notional) for s in signals])
+        for signal, (approved, reason, token) in zip(signals, results):
+            if not approved:
+                logger.warning(f"Risk rejected {signal.action} {signal.symbol}: {reason}")
+                event_bus.emit(EventType.RISK_REJECTED, OrderEvent(
+                    symbol=signal.symbol,
+                    action=signal.action,
+                    status="risk_rejected",
+                    timestamp=clock.now(),
+                    strategy=signal.strategy,
+                    error=reason,
+                    signal_event=signal
+                ))
+                continue
+            if token is not None:
+                with self._risk_lock:
+                    # A signal approved again while its first order is in flight holds two
+                    self._risk_tokens.setdefault(id(signal), []).append(token)
+            if self.gateway:
+                if not self.gateway.submit(signal):
+                    self._release_risk(signal)
+            else:
+                self.execute_trade(signal)
+    
+    def _release_risk(self, signal: SignalEvent):
+        """Release one reservation held for signal (they're interchangeable, so oldest first)"""
+        with self._risk_lock:
+            tokens = self._risk_tokens.get(id(signal))
+            if not tokens:
+                return
+            token = tokens.pop(0)
+            if not tokens:
+                del self._risk_tokens[id(signal)]
+        self.risk.release(token)
     
     def execute_trade(self, signal: SignalEvent):
         """Execute a trade via Alpaca and record in database"""
         try:
-            # Use Alpaca if available, otherwise fall back to stub
-            if self.alpaca_client:
-                order_result = self._execute_alpaca_trade(signal)
-                if order_result:
-                    order_id = order_result['order_id']
-                    quantity = order_result['quantity']
-                    price = order_result['price']
-                else:
-                    # Alpaca execution failed, use stub
-                    order_id, quantity, price = self._execute_stub_trade(signal)
-            else:
-                # No Alpaca client, use stub
-                order_id, quantity, price = self._execute_stub_trade(signal)
-            
-            # Write to database and notify
-            db = get_db_writer()
-            position_id = db.write_position_opened(
+            order_id, quantity, price = self.place_order(signal)
+        except Exception as e:
+            logger.error(f"Failed to execute trade: {e}")
+            self._release_risk(signal)
+            event_bus.emit(EventType.ORDER_FAILED, OrderEvent(
                 symbol=signal.symbol,
-                quantity=quantity,
-                entry_price=price,
+                action=signal.action,
+                status="failed",
+                timestamp=clock.now(),
                 strategy=signal.strategy,
-                order_id=order_id
-            )
-            
-            # Emit position event
-            position_event = PositionEvent(
-                symbol=signal.symbol,
-                action="opened",
-                size=quantity,
-                price=price,
-                timestamp=datetime.now(),
-                order_id=order_id
-            )
-            event_bus.emit(EventType.POSITION_OPENED, position_event)
-            
-            logger.info(f"Executed trade: {order_id} - {quantity} shares @ ${price:.2f}")
-            
+                error=str(e),
+                signal_event=signal
+            ))
+            return
+        try:
+            self.record_position(signal, order_id, quantity, price)  # Releases the reservation
         except Exception as e:
-            logger.error(f"Failed to execute trade: {e}")
-            
+            logger.error(f"Failed to record trade {order_id}: {e}")
+    
+    def _place_gateway_order(self, signal: SignalEvent):
+        try:
+            return self.place_order(signal, fallback_to_stub=False)
+        except Exception:
+            self._release_risk(signal)
+            raise
+    
+    def place_order(self, signal: SignalEvent, fallback_to_stub: bool = True):
+        """Submit an order to the broker. Returns (order_id, quantity, price)."""
+        # Use a simulated broker if one is set, then Alpaca, otherwise fall back to stub
+        if self.broker:
+            broker = "simulator"
+        elif self.alpaca_client:
+            broker = "alpaca"
+        else:
+            broker = "stub"
+        start = time.perf_counter()
+        try:
+            if self.broker:
+                return self.broker.execute(signal)
+            if self.alpaca_client:
+                order_result = self._execute_alpaca_trade(signal)
+                if order_result:
+                    return order_result['order_id'], order_result['quantity'], order_result['price']
+                if not fallback_to_stub:
+                    raise RuntimeError(f"Alpaca order for {signal.symbol} was not submitted")
+                # Alpaca execution failed, use stub
+            return self._execute_stub_trade(signal)
+        finally:
+            ORDER_SUBMIT_SECONDS.observe(time.perf_counter() - start, broker)
+    
+    def record_position(self, signal: SignalEvent, order_id: str, quantity: float, price: float):
+        """Book a submitted order, or leave it for its fills if the trade-update stream follows it"""
+        streamed = self._streamed_order(order_id)
+        if streamed is not None:
+            self._settle(streamed)  # Only if it already finished
+            return
+        try:
+            self._book_fill(signal, order_id, quantity, price)
+        finally:
+            self._release_risk(signal)  # Exposure is on the book now
+    
+    def _streamed_order(self, order_id: str):
+        # Finished in the tracker: its fills already came through ORDER_UPDATED (feed or simulator)
+        completed = self.order_tracker.get_completed(order_id)
+        if completed is not None or self.trade_feed is None:
+            return completed
+        return self.order_tracker.get(order_id)  # Still open; the feed will finish it
+    
+    def _book_fill(self, signal: SignalEvent, order_id: str, quantity: float, price: float):
+        """Apply a fill to the book: close opposite positions first (oldest first), open the rest"""
+        strategies = {p.order_id: p.strategy for p in self.positions.positions(signal.symbol)}
+        fills, remaining = self.positions.reduce(signal.symbol, quantity, price, signal.action)
+        realized = 0.0
+        for closed_id, closed_quantity, pnl, fully_closed in fills:
+            realized += pnl
+            self._record_close(signal.symbol, strategies.get(closed_id), closed_id, closed_quantity,
+                               price, pnl, fully_closed)
+        if fills:
+            self.risk.record_realized(realized)
+        if remaining > 1e-9:
+            self._record_open(signal, order_id, remaining, price)
+    
+    def _record_open(self, signal: SignalEvent, order_id: str, quantity: float, price: float):
+        """Write the opened position to the database and emit POSITION_OPENED"""
+        self.positions.open(order_id, signal.symbol, signal.strategy, quantity, price, side=signal.action)
+        db = get_db_writer()
+        db.write_position_opened(
+            symbol=signal.symbol,
+            quantity=quantity if signal.action == "buy" else -quantity,  # Shorts are stored negative
+            entry_price=price,
+            strategy=signal.strategy,
+            order_id=order_id
+        )
+        
+        # Emit position event
+        position_event = PositionEvent(
+            symbol=signal.symbol,
+            action="opened",
+            size=quantity,
+            price=price,
+            timestamp=clock.now(),
+            order_id=order_id
+        )
+        event_bus.emit(EventType.POSITION_OPENED, position_event)
+        
+        logger.info(f"Executed trade: {order_id} - {quantity} shares @ ${price:.2f}")
+    
+    def _record_close(self, symbol: str, strategy: Optional[str], order_id: str, quantity: float,
+                      price: float, realized: float, fully_closed: bool):
+        """Write a closed position to the database and emit POSITION_CLOSED"""
+        # By order_id: batched and spooled writers only learn the row id at flush
+        get_db_writer().write_position_reduced(order_id, quantity, price, realized, fully_closed)
+        event_bus.emit(EventType.POSITION_CLOSED, PositionEvent(
+            symbol=symbol,
+            action="closed",
+            size=quantity,
+            price=price,
+            timestamp=clock.now(),
+            order_id=order_id,
+            strategy=strategy,
+            realized_pl=realized
+        ))
+        logger.info(f"Closed {quantity} {symbol} from {order_id} @ ${price:.2f} (P&L ${realized:,.2f})")
+    
+    def close_position(self, order_id: str, exit_price: float):
+        """Take a position off the book and count its P&L toward the daily loss limit"""
+        position = self.positions.get(order_id)
+        realized = self.positions.close(order_id, exit_price)
+        if realized is not None:
+            self.risk.record_realized(realized)
+            self._record_close(position.symbol, position.strategy, position.order_id,
+                               abs(position.quantity), exit_price, realized, True)
+        return realized
+    
+    def enable_gateway(self, **config):
+        """Submit approved trades from an OrderGateway worker pool.
+        
+        config is passed to OrderGateway (workers, max_in_flight, rate_limit,
+        burst, max_queue_size). Alpaca failures become ORDER_FAILED events
+        instead of falling back to a stub fill.
+        """
+        self.disable_gateway()
+        self.gateway = OrderGateway(
+            self._place_gateway_order,
+            on_submitted=self.record_position,
+            **config
+        ).start()
+        return self.gateway
+    
+    def disable_gateway(self):
+        """Submit what's queued, then go back to inline execution"""
+        if self.gateway:
+            self.gateway.stop()
+            self.gateway = None
+    
+    def enable_mark_flusher(self, interval: float = 5.0):
+        """Periodically mark open positions to the quote cache and bulk-write changed marks"""
+        self.disable_mark_flusher()
+        self.mark_flusher = MarkFlusher(self.positions, get_db_writer, quotes=self.quote_cache,
+                                        interval=interval).start()
+        return self.mark_flusher
+    
+    def disable_mark_flusher(self):
+        """Write the last marks and stop the flusher"""
+        if self.mark_flusher:
+            self.mark_flusher.stop()
+            self.mark_flusher = None
+    
+    def set_broker(self, broker):
+        """Route executions to a simulated broker (None restores Alpaca/stub)"""
+        previous = self.broker
+        self.broker = broker
+        return previous
+    
+    def set_book(self, positions: PositionBook, risk: RiskEngine):
+        """Swap in a position book and the risk engine checking it (e.g. for a replay).
+        Returns the previous (positions, risk)."""
+        previous = (self.positions, self.risk)
+        self.positions = positions
+        self.risk = risk
+        return previous
+    
+    def set_quote_stream(self, stream, symbols=()):
+        """Feed the quote cache from a stream (StockDataStream or FakeQuoteStream)"""
+        if self.quote_feed:
+            self.quote_feed.stop()
+        self.quote_feed = QuoteFeed(stream, self.quote_cache).start(symbols) if stream else None
+        return self.quote_feed
+    
+    def watch_symbols(self, symbols):
+        """Stream quotes for symbols ahead of their first trade"""
+        if self.quote_feed:
+            self.quote_feed.subscribe(symbols)
+    
+    def get_ask_price(self, symbol: str) -> float:
+        """Ask price from the quote cache, falling back to REST when stale"""
+        ask = self.quote_cache.get_ask(symbol)
+        if ask is not None:
+            return ask
+        
+        from alpaca.data.requests import StockLatestQuoteRequest
+        quote_request = StockLatestQuoteRequest(symbol_or_symbols=[symbol])
+        quote = self.data_client.get_stock_latest_quote(quote_request)[symbol]
+        self.rest_quote_requests += 1
+        self.quote_cache.update(symbol, quote.bid_price, quote.ask_price, quote.timestamp)
+        
+        # Stream this symbol from now on
+        self.watch_symbols([symbol])
+        return float(quote.ask_price)
+    
+    @property
+    def pending_orders(self):
+        """Orders submitted but not yet filled, cancelled or rejected"""
+        return self.order_tracker.open_orders()
+    
+    def set_trade_stream(self, stream):
+        """Follow order fills from a stream (TradingStream or FakeTradingStream)"""
+        if self.trade_feed:
+            self.trade_feed.stop()
+        self.trade_feed = TradeUpdateFeed(stream, self.order_tracker).start() if stream else None
+        return self.trade_feed
+    
+    def stop(self):
+        """Stop the order gateway, mark flusher and broker streams"""
+        self.disable_gateway()
+        self.disable_mark_flusher()
+        self.set_quote_stream(None)
+        self.set_trade_stream(None)
+    
     def _execute_stub_trade(self, signal: SignalEvent):
         """Fallback stub execution when Alpaca is not available"""
-        order_id = f"STUB_{signal.symbol}_{int(datetime.now().timestamp())}"
+        order_id = f"STUB_{signal.symbol}_{int(clock.now().timestamp())}"
         quantity = 100.0
         price = 100.0
         logger.warning(f"Using stub execution for {signal.symbol}")
@@ -152,20 +463,14 @@ class ExecutionEngine:
         
     def _execute_alpaca_trade(self, signal: SignalEvent):
         """Execute trade via Alpaca API"""
+        from alpaca.trading.requests import MarketOrderRequest
+        from alpaca.trading.enums import OrderSide, TimeInForce
         try:
-            # Calculate position size (2% of portfolio per trade)
-            position_value = self.portfolio_value * 0.02
-            
-            # Get current market price
-            from alpaca.data.historical import StockHistoricalDataClient
-            data_client = StockHistoricalDataClient(
-                api_key=self.alpaca_client._api_key,
-                secret_key=self.alpaca_client._secret_key
-            )
+            # Calculate position size (RISK_RULES max_position_size of portfolio)
+            position_value = get_position_size(self.portfolio_value)
             
-            quote_request = StockLatestQuoteRequest(symbol_or_symbols=[signal.symbol])
-            quotes = data_client.get_stock_latest_quote(quote_request)
-            current_price = float(quotes[signal.symbol].ask_price)
+            # Get current market price (cached stream quote, REST if stale)
+            current_price = self.get_ask_price(signal.symbol)
             
             # Calculate shares to buy
             quantity = int(position_value / current_price)
@@ -177,26 +482,28 @@ class ExecutionEngine:
             order_side = OrderSide.BUY if signal.action == "buy" else OrderSide.SELL
             
             # Create market order
+            client_order_id = f"elpyfi-{uuid.uuid4().hex}"
             market_order_data = MarketOrderRequest(
                 symbol=signal.symbol,
                 qty=quantity,
                 side=order_side,
-                time_in_force=TimeInForce.DAY
+                time_in_force=TimeInForce.DAY,
+                client_order_id=client_order_id
             )
             
-            # Submit order
-            market_order = self.alpaca_client.submit_order(
-                order_data=market_order_data
-            )
+            # Fills arrive on the trade-update stream, possibly before submit_order returns
+            self.order_tracker.expect(client_order_id, signal.symbol, signal.action, quantity, context=signal)
+            try:
+                market_order = self.alpaca_client.submit_order(
+                    order_data=market_order_data
+                )
+            except Exception:
+                self.order_tracker.forget(client_order_id)
+                raise
             
             logger.info(f"Alpaca order submitted: {market_order.id} - {quantity} shares of {signal.symbol}")
-            
-            # Track pending order
-            self.pending_orders[market_order.id] = {
-                'signal': signal,
-                'order': market_order,
-                'submitted_at': datetime.now()
-            }
+            self.order_tracker.track(market_order.id, signal.symbol, signal.action, quantity,
+                                     context=signal, client_order_id=client_order_id)
             
             return {
                 'order_id': market_order.id,
@@ -209,7 +516,14 @@ class ExecutionEngine:
             return None
             
     def get_order_status(self, order_id: str):
-        """Check order status from Alpaca"""
+        """Order status from the tracker, or from Alpaca for orders it no longer holds"""
+        tracked = self.order_tracker.get(order_id)
+        if tracked:
+            return {
+                'status': tracked.state,
+                'filled_qty': tracked.filled_qty,
+                'filled_avg_price': tracked.avg_fill_price
+            }
         if not self.alpaca_client:
             return None
             
@@ -225,5 +539,23 @@ class ExecutionEngine:
             return None
 
 
-# Global execution instance
-execution_engine = ExecutionEngine()
\ No newline at end of file
+# Global execution instance, built on first use
+_execution_engine: Optional[ExecutionEngine] = None
+_execution_engine_lock = threading.Lock()
+
+
+def get_execution_engine() -> ExecutionEngine:
+    """Get the global execution engine, creating it (and its bus subscriptions) on first call"""
+    global _execution_engine
+    if _execution_engine is None:
+        with _execution_engine_lock:
+            if _execution_engine is None:
+                _execution_engine = ExecutionEngine()
+    return _execution_engine
+
+
+def __getattr__(name):
+    # `from execution import execution_engine` still works, it just builds the engine then
+    if name == "execution_engine":
+        return get_execution_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Order Gateway
+
+Queues approved trades and submits them to the broker from a pool of
+worker threads, so a slow broker call doesn't hold up the event-bus
+callback that approved the trade. Submission is bounded by:
+
+- max_in_flight: broker calls running at once
+- rate_limit: orders per second (token bucket, 0 = unlimited)
+
+Each submission ends in an ORDER_SUBMITTED or ORDER_FAILED event.
+"""
+
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+from events import event_bus, EventType, OrderEvent, SignalEvent
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `burst`"""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class OrderGateway:
+    """Worker pool that submits orders under in-flight and rate limits.
+    
+    submit_order(signal) places the order and returns (order_id, quantity,
+    price); on_submitted(signal, order_id, quantity, price) runs after a
+    successful submission (e.g. to record the position).
+    """
+    
+    def __init__(self, submit_order: Callable, on_submitted: Optional[Callable] = None,
+                 workers: int = 8, max_in_flight: int = 8, rate_limit: float = 0,
+                 burst: Optional[int] = None, max_queue_size: int = 1000,
+                 latency_window: int = 1000, bus=None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.submit_order = submit_order
+        self.on_submitted = on_submitted
+        self.bus = bus or event_bus
+        self.max_in_flight = max_in_flight
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self.limiter = RateLimiter(rate_limit, burst)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._workers = []
+        self._num_workers = workers
+        
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.in_flight = 0
+        self.max_in_flight_seen = 0
+        self.queued = 0
+        self.submitted = 0
+        self.failed = 0
+        self.rejected = 0
+        self.rate_limited_seconds = 0.0
+    
+    def start(self):
+        """Start the worker threads"""
+        if self._workers:
+            return self
+        for i in range(self._num_workers):
+            worker = threading.Thread(target=self._run, daemon=True, name=f"OrderGateway-{i}")
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Order gateway started ({self._num_workers} workers, "
+                    f"{self.max_in_flight} in flight, rate limit {self.limiter.rate or 'none'})")
+        return self
+    
+    def submit(self, signal: SignalEvent) -> bool:
+        """Queue an approved trade. Returns False (and emits ORDER_FAILED) if the queue is full."""
+        try:
+            self.queue.put_nowait((time.perf_counter(), signal))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            logger.warning(f"Order gateway full - rejecting {signal.action} {signal.symbol}")
+            self._emit_failed(signal, "order gateway queue full", 0.0)
+            return False
+        with self._stats_lock:
+            self.queued += 1
+        return True
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._submit(*item)
+            finally:
+                self.queue.task_done()
+    
+    def _submit(self, enqueued_at: float, signal: SignalEvent):
+        waited = self.limiter.acquire()
+        with self._in_flight:
+            with self._stats_lock:
+                self.in_flight += 1
+                self.max_in_flight_seen = max(self.max_in_flight_seen, self.in_flight)
+                self.rate_limited_seconds += waited
+            started = time.perf_counter()
+            try:
+                order_id, quantity, price = self.submit_order(signal)
+                error = None
+            except Exception as e:
+                error = str(e)
+            latency = time.perf_counter() - started
+            with self._stats_lock:
+                self.in_flight -= 1
+                self._latencies.append(latency)
+                if error is None:
+                    self.submitted += 1
+                else:
+                    self.failed += 1
+        
+        queue_ms = (started - enqueued_at) * 1000
+        if error is not None:
+            logger.error(f"Order submission failed for {signal.symbol}: {error}")
+            self._emit_failed(signal, error, latency * 1000, queue_ms)
+            return
+        
+        if self.on_submitted:
+            try:
+                self.on_submitted(signal, order_id, quantity, price)
+            except Exception as e:
+                logger.error(f"Post-submission handler failed for {order_id}: {e}")
+        
+        self.bus.emit(EventType.ORDER_SUBMITTED, OrderEvent(
+            symbol=signal.symbol,
+            action=signal.action,
+            status="submitted",
+            timestamp=clock.now(),
+            order_id=order_id,
+            quantity=quantity,
+            price=price,
+            strategy=signal.strategy,
+            latency_ms=latency * 1000,
+            queue_ms=queue_ms
+        ))
+    
+    def _emit_failed(self, signal: SignalEvent, error: str, latency_ms: float, queue_ms: float = 0.0):
+        self.bus.emit(EventType.ORDER_FAILED, OrderEvent(
+            symbol=signal.symbol,
+            action=signal.action,
+            status="failed",
+            timestamp=clock.now(),
+            strategy=signal.strategy,
+            error=error,
+            latency_ms=latency_ms,
+            queue_ms=queue_ms,
+            signal_event=signal
+        ))
+    
+    def drain(self):
+        """Block until every queued order has been submitted"""
+        self.queue.join()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Submit what's already queued, then stop the workers"""
+        for _ in self._workers:
+            self.queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, outcome counts and submit-latency percentiles"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": len(self._workers),
+                "depth": self.queue.qsize(),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "max_in_flight_seen": self.max_in_flight_seen,
+                "queued": self.queued,
+                "submitted": self.submitted,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "rate_limited_ms": self.rate_limited_seconds * 1000,
+            }
+        for name, pct in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"submit_{name}_ms"] = _percentile(latencies, pct) * 1000
+        stats["submit_max_ms"] = latencies[-1] * 1000 if latencies else 0.0
+        return stats
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct * len(sorted_values)) - 1)
+    return sorted_values[index]
@@ -0,0 +1,379 @@
+"""
+Order Lifecycle Tracker
+
+Follows submitted orders through the broker's trade-update stream instead
+of polling get_order_by_id per order:
+
+    new -> partially_filled -> filled
+       \\-> cancelled / rejected
+
+Updates are applied in lifecycle order only (a late "new" never undoes a
+fill). Terminal orders leave the open set once their ORDER_UPDATED event
+has gone out; the most recent ones are kept (get_completed) so a late
+update or track() call finds them instead of starting a new order. After
+a stream reconnect, every open order is reconciled with one batched
+get_orders call.
+
+An update can arrive before submit_order has returned the order id.
+Callers register the order under its client_order_id first (expect()),
+and the update is matched to it by that id.
+
+The stream is alpaca.trading.stream.TradingStream in production;
+FakeTradingStream implements the same surface for tests.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from events import event_bus, EventType, OrderEvent, SignalEvent
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+class OrderState:
+    NEW = "new"
+    PARTIALLY_FILLED = "partially_filled"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
+    REJECTED = "rejected"
+
+
+TERMINAL_STATES = {OrderState.FILLED, OrderState.CANCELLED, OrderState.REJECTED}
+
+# Lifecycle position of each state; updates may only move forward
+STATE_RANK = {
+    OrderState.NEW: 0,
+    OrderState.PARTIALLY_FILLED: 1,
+    OrderState.FILLED: 2,
+    OrderState.CANCELLED: 2,
+    OrderState.REJECTED: 2,
+}
+
+# Broker trade-update events and order statuses mapped to our states
+BROKER_STATES = {
+    "new": OrderState.NEW,
+    "pending_new": OrderState.NEW,
+    "accepted": OrderState.NEW,
+    "partial_fill": OrderState.PARTIALLY_FILLED,
+    "partially_filled": OrderState.PARTIALLY_FILLED,
+    "fill": OrderState.FILLED,
+    "filled": OrderState.FILLED,
+    "canceled": OrderState.CANCELLED,
+    "expired": OrderState.CANCELLED,
+    "done_for_day": OrderState.CANCELLED,
+    "rejected": OrderState.REJECTED,
+    "suspended": OrderState.REJECTED,
+}
+
+
+def _value(enum_or_str) -> str:
+    return str(getattr(enum_or_str, "value", enum_or_str) or "")
+
+
+@dataclass
+class TrackedOrder:
+    """An open order and the fills seen for it so far"""
+    order_id: str
+    symbol: str
+    side: str
+    quantity: float
+    submitted_at: datetime
+    state: str = OrderState.NEW
+    filled_qty: float = 0.0
+    avg_fill_price: Optional[float] = None
+    fills: List[Tuple[float, float]] = field(default_factory=list)  # (qty, price) per execution
+    updated_at: Optional[datetime] = None
+    context: Any = None  # Caller data, e.g. the SignalEvent
+    client_order_id: Optional[str] = None
+    settled: bool = False  # Set by the caller once the final fills are booked
+    
+    @property
+    def is_terminal(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+
+class OrderTracker:
+    """State machine over broker trade updates for every open order"""
+    
+    def __init__(self, client=None, bus=None, completed_size: int = 1000):
+        self.client = client  # TradingClient used for reconciliation
+        self.bus = bus or event_bus
+        self.orders: Dict[str, TrackedOrder] = {}
+        self._expected: Dict[str, TrackedOrder] = {}  # client_order_id -> order not yet acknowledged
+        self._completed: "OrderedDict[str, TrackedOrder]" = OrderedDict()
+        self.completed_size = completed_size
+        self._lock = threading.Lock()
+        
+        # Metrics
+        self.updates = 0
+        self.ignored_updates = 0
+        self.completed = {state: 0 for state in TERMINAL_STATES}
+        self.reconciliations = 0
+        self.reconciled_orders = 0
+    
+    def expect(self, client_order_id: str, symbol: str, side: str, quantity: float,
+               context: Any = None) -> TrackedOrder:
+        """Register an order before submitting it, under the client_order_id sent with it"""
+        order = TrackedOrder("", symbol, side, float(quantity), clock.now(), context=context,
+                             client_order_id=client_order_id)
+        with self._lock:
+            self._expected[client_order_id] = order
+        return order
+    
+    def forget(self, client_order_id: str):
+        """Drop an expected order whose submission failed"""
+        with self._lock:
+            self._expected.pop(client_order_id, None)
+    
+    def track(self, order_id: str, symbol: str, side: str, quantity: float, context: Any = None,
+              client_order_id: Optional[str] = None) -> TrackedOrder:
+        """Start tracking a submitted order.
+        
+        If updates for it already arrived (the order may even be finished),
+        the existing entry is returned with context filled in.
+        """
+        order_id = str(order_id)
+        with self._lock:
+            expected = self._expected.pop(client_order_id, None) if client_order_id else None
+            order = self.orders.get(order_id) or self._completed.get(order_id)
+            if order is None:
+                order = expected or TrackedOrder(order_id, symbol, side, float(quantity), clock.now())
+                order.order_id = order_id
+                self.orders[order_id] = order
+            if order.context is None:
+                order.context = context
+            return order
+    
+    def get(self, order_id: str) -> Optional[TrackedOrder]:
+        with self._lock:
+            return self.orders.get(str(order_id))
+    
+    def get_completed(self, order_id: str) -> Optional[TrackedOrder]:
+        """A recently filled, cancelled or rejected order"""
+        with self._lock:
+            return self._completed.get(str(order_id))
+    
+    def open_orders(self) -> Dict[str, TrackedOrder]:
+        with self._lock:
+            return dict(self.orders)
+    
+    async def on_trade_update(self, update):
+        """TradingStream trade_updates handler"""
+        order = update.order
+        self.apply(
+            order_id=order.id,
+            state=BROKER_STATES.get(_value(update.event)),
+            symbol=order.symbol,
+            side=_value(order.side),
+            quantity=float(order.qty or 0),
+            fill_qty=float(update.qty) if update.qty is not None else None,
+            fill_price=float(update.price) if update.price is not None else None,
+            filled_qty=float(order.filled_qty or 0),
+            avg_fill_price=float(order.filled_avg_price) if order.filled_avg_price is not None else None,
+            client_order_id=getattr(order, "client_order_id", None),
+        )
+    
+    def apply(self, order_id, state: Optional[str], symbol: str = "", side: str = "",
+              quantity: float = 0.0, fill_qty: Optional[float] = None, fill_price: Optional[float] = None,
+              filled_qty: Optional[float] = None, avg_fill_price: Optional[float] = None,
+              client_order_id: Optional[str] = None) -> bool:
+        """Apply one broker update. Returns False if it was ignored."""
+        order_id = str(order_id)
+        with self._lock:
+            self.updates += 1
+            order = self.orders.get(order_id)
+            if order is None and client_order_id in self._expected:
+                # Submitted, but submit_order hasn't returned the id yet
+                order = self._expected.pop(client_order_id)
+                order.order_id = order_id
+                self.orders[order_id] = order
+            if state is None or order_id in self._completed \
+                    or (order and STATE_RANK[state] < STATE_RANK[order.state]):
+                self.ignored_updates += 1
+                return False
+            if order is None:
+                # Placed before a restart or outside the engine - follow it anyway
+                order = TrackedOrder(order_id, symbol, side, quantity, clock.now())
+                self.orders[order_id] = order
+            
+            if fill_qty and fill_price is not None:
+                order.fills.append((fill_qty, fill_price))
+            if filled_qty is not None:
+                order.filled_qty = max(order.filled_qty, filled_qty)
+            if avg_fill_price is not None:
+                order.avg_fill_price = avg_fill_price
+            elif order.fills:
+                total = sum(qty for qty, _ in order.fills)
+                order.avg_fill_price = sum(qty * price for qty, price in order.fills) / total
+            changed = state != order.state or fill_qty
+            order.state = state
+            order.updated_at = clock.now()
+            
+            if order.is_terminal:
+                del self.orders[order_id]
+                self._completed[order_id] = order
+                while len(self._completed) > self.completed_size:
+                    self._completed.popitem(last=False)
+                self.completed[state] += 1
+        
+        if changed:
+            self._emit(order)
+        return True
+    
+    def _emit(self, order: TrackedOrder):
+        self.bus.emit(EventType.ORDER_UPDATED, OrderEvent(
+            symbol=order.symbol,
+            action=order.side,
+            status=order.state,
+            timestamp=order.updated_at,
+            order_id=order.order_id,
+            quantity=order.filled_qty,
+            price=order.avg_fill_price,
+            strategy=getattr(order.context, "strategy", None),
+            signal_event=order.context if isinstance(order.context, SignalEvent) else None
+        ))
+    
+    def reconcile(self) -> int:
+        """Catch up on updates missed while disconnected with one get_orders call"""
+        with self._lock:
+            if not self.orders or self.client is None:
+                return 0
+            after = min(order.submitted_at for order in self.orders.values()) - timedelta(minutes=1)
+            tracked = set(self.orders)
+        
+        from alpaca.trading.enums import QueryOrderStatus
+        from alpaca.trading.requests import GetOrdersRequest
+        request = GetOrdersRequest(status=QueryOrderStatus.ALL, after=after, limit=500)
+        try:
+            broker_orders = self.client.get_orders(filter=request)
+        except Exception as e:
+            logger.warning(f"Order reconciliation failed: {e}")
+            return 0
+        
+        applied = 0
+        for order in broker_orders:
+            if str(order.id) not in tracked:
+                continue
+            if self.apply(
+                order_id=order.id,
+                state=BROKER_STATES.get(_value(order.status)),
+                filled_qty=float(order.filled_qty or 0),
+                avg_fill_price=float(order.filled_avg_price) if order.filled_avg_price is not None else None,
+            ):
+                applied += 1
+        with self._lock:
+            self.reconciliations += 1
+            self.reconciled_orders += applied
+        logger.info(f"Reconciled {applied} of {len(tracked)} open orders with the broker")
+        return applied
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get open order count and lifecycle metrics"""
+        with self._lock:
+            by_state = {}
+            for order in self.orders.values():
+                by_state[order.state] = by_state.get(order.state, 0) + 1
+            return {
+                "open_orders": len(self.orders),
+                "expected_orders": len(self._expected),
+                "open_by_state": by_state,
+                "updates": self.updates,
+                "ignored_updates": self.ignored_updates,
+                "filled": self.completed[OrderState.FILLED],
+                "cancelled": self.completed[OrderState.CANCELLED],
+                "rejected": self.completed[OrderState.REJECTED],
+                "reconciliations": self.reconciliations,
+                "reconciled_orders": self.reconciled_orders,
+            }
+
+
+class TradeUpdateFeed:
+    """Runs a trade-update stream on a background thread and feeds an OrderTracker"""
+    
+    def __init__(self, stream, tracker: OrderTracker):
+        self.stream = stream
+        self.tracker = tracker
+        self._thread = None
+        self.connects = 0
+        stream.subscribe_trade_updates(tracker.on_trade_update)
+        
+        # TradingStream reconnects internally through _start_ws with no public
+        # hook, so wrap it to reconcile after every (re)connect
+        start_ws = stream._start_ws
+        
+        async def start_ws_and_reconcile():
+            await start_ws()
+            self.connects += 1
+            if self.connects > 1:
+                await asyncio.get_running_loop().run_in_executor(None, tracker.reconcile)
+        
+        stream._start_ws = start_ws_and_reconcile
+    
+    def start(self):
+        """Start the stream thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="TradeUpdates")
+            self._thread.start()
+        return self
+    
+    def _run(self):
+        try:
+            self.stream.run()
+        except Exception as e:
+            logger.error(f"Trade update stream stopped: {e}")
+    
+    def stop(self):
+        """Stop the stream and wait for its thread"""
+        try:
+            self.stream.stop()
+        except Exception as e:
+            logger.debug(f"Error stopping trade update stream: {e}")
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class FakeTradingStream:
+    """In-process stand-in for TradingStream.
+    
+    push() delivers a trade update on the caller's thread; reconnect()
+    simulates the stream dropping and reconnecting.
+    """
+    
+    def __init__(self):
+        self.handler: Optional[Callable] = None
+        self._stopped = threading.Event()
+    
+    def subscribe_trade_updates(self, handler: Callable):
+        self.handler = handler
+    
+    async def _start_ws(self):
+        pass
+    
+    def run(self):
+        asyncio.run(self._start_ws())
+        self._stopped.wait()
+    
+    def reconnect(self):
+        asyncio.run(self._start_ws())
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def push(self, event: str, order_id: str, symbol: str = "AAPL", side: str = "buy",
+             qty: float = 10, fill_qty: Optional[float] = None, fill_price: Optional[float] = None,
+             filled_qty: float = 0, filled_avg_price: Optional[float] = None,
+             client_order_id: Optional[str] = None):
+        """Deliver a trade update as the stream would"""
+        order = SimpleNamespace(id=order_id, symbol=symbol, side=side, qty=qty,
+                                filled_qty=filled_qty, filled_avg_price=filled_avg_price,
+                                client_order_id=client_order_id)
+        update = SimpleNamespace(event=event, order=order, qty=fill_qty, price=fill_price,
+                                 timestamp=clock.now())
+        asyncio.run(self.handler(update))
@@ -0,0 +1,413 @@
+"""
+In-Memory Position Book
+
+Open positions live in parallel NumPy arrays (signed quantity, entry
+price, mark) with dict indexes by order id, symbol and strategy, so
+marking the whole book to a batch of quotes is one vectorized update and
+unrealized P&L by symbol or strategy is a bincount. Book totals (gross
+exposure, unrealized P&L, and exposure and net quantity per symbol) are
+kept up to date by every open, close and mark, so reading them is O(1).
+
+A fill against an opposite position (a sell against a long) is netted by
+reduce(), oldest position first, instead of being booked as a new row.
+
+Rows whose mark changed are flagged dirty. MarkFlusher periodically
+re-marks the book from the QuoteCache and writes the dirty rows to
+Postgres with one bulk UPDATE (DatabaseWriter.write_position_marks)
+instead of a row-by-row write per quote. Quantities are signed in the
+database too: shorts are stored negative.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BookPosition:
+    """Snapshot of one open position"""
+    order_id: str
+    symbol: str
+    strategy: str
+    quantity: float  # Negative for shorts
+    entry_price: float
+    mark: float
+    opened_at: datetime
+    
+    @property
+    def unrealized_pl(self) -> float:
+        return (self.mark - self.entry_price) * self.quantity
+
+
+class PositionBook:
+    """Open positions indexed by order id, symbol and strategy"""
+    
+    def __init__(self, capacity: int = 256):
+        self._lock = threading.Lock()
+        self.quantity = np.zeros(capacity)
+        self.entry_price = np.zeros(capacity)
+        self.mark = np.zeros(capacity)
+        self.symbol_code = np.zeros(capacity, dtype=np.int32)
+        self.strategy_code = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.dirty = np.zeros(capacity, dtype=bool)
+        self.order_ids: List[Optional[str]] = [None] * capacity
+        self.opened_at: List[Optional[datetime]] = [None] * capacity
+        self.open_seq = np.zeros(capacity, dtype=np.int64)  # Fill order, for oldest-first netting
+        self._next_seq = 0
+        self._size = 0  # Slots ever used; arrays are only scanned up to here
+        self._free: List[int] = []
+        
+        # Indexes
+        self._slots: Dict[str, int] = {}
+        self._symbols: Dict[str, int] = {}
+        self._symbol_names: List[str] = []
+        self._strategies: Dict[str, int] = {}
+        self._strategy_names: List[str] = []
+        self.by_symbol: Dict[str, Set[int]] = {}
+        self.by_strategy: Dict[str, Set[int]] = {}
+        
+        # Running totals
+        self.symbol_exposure = np.zeros(64)  # By symbol code
+        self.symbol_quantity = np.zeros(64)
+        self.gross_exposure = 0.0
+        self.total_unrealized = 0.0
+        
+        # Metrics
+        self.opened = 0
+        self.closed = 0
+        self.mark_updates = 0
+        self.marks_changed = 0
+    
+    def __len__(self) -> int:
+        return len(self._slots)
+    
+    def _code(self, codes: Dict[str, int], names: List[str], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+    
+    def symbol_code_for(self, symbol: str) -> int:
+        """Stable code for a symbol, indexing symbol_exposure and symbol_quantity"""
+        code = self._code(self._symbols, self._symbol_names, symbol)
+        if code >= len(self.symbol_exposure):
+            for name in ("symbol_exposure", "symbol_quantity"):
+                old = getattr(self, name)
+                new = np.zeros(len(old) * 2)
+                new[:len(old)] = old
+                setattr(self, name, new)
+        return code
+    
+    def _add_totals(self, slot: int, sign: float):
+        quantity, mark = self.quantity[slot], self.mark[slot]
+        code = self.symbol_code[slot]
+        self.symbol_exposure[code] += sign * abs(quantity) * mark
+        self.symbol_quantity[code] += sign * quantity
+        self.gross_exposure += sign * abs(quantity) * mark
+        self.total_unrealized += sign * (mark - self.entry_price[slot]) * quantity
+    
+    def _grow(self):
+        capacity = len(self.quantity) * 2
+        for name in ("quantity", "entry_price", "mark", "symbol_code", "strategy_code", "active", "dirty",
+                     "open_seq"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.order_ids.extend([None] * (capacity - len(self.order_ids)))
+        self.opened_at.extend([None] * (capacity - len(self.opened_at)))
+    
+    def open(self, order_id: str, symbol: str, strategy: str, quantity: float,
+             price: float, side: str = "buy") -> BookPosition:
+        """Add a filled entry to the book"""
+        order_id = str(order_id)
+        signed = float(quantity) if side == "buy" else -float(quantity)
+        with self._lock:
+            slot = self._slots.get(order_id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    if self._size == len(self.quantity):
+                        self._grow()
+                    slot = self._size
+                    self._size += 1
+                self._slots[order_id] = slot
+                self.by_symbol.setdefault(symbol, set()).add(slot)
+                self.by_strategy.setdefault(strategy, set()).add(slot)
+                self.opened += 1
+            else:
+                self._add_totals(slot, -1)
+            self.quantity[slot] = signed
+            self.entry_price[slot] = price
+            self.mark[slot] = price
+            self.symbol_code[slot] = self.symbol_code_for(symbol)
+            self.strategy_code[slot] = self._code(self._strategies, self._strategy_names, strategy)
+            self.active[slot] = True
+            self.dirty[slot] = False  # The insert already carries current_price = entry
+            self.order_ids[slot] = order_id
+            self.opened_at[slot] = clock.now()
+            self.open_seq[slot] = self._next_seq
+            self._next_seq += 1
+            self._add_totals(slot, 1)
+            return self._snapshot(slot)
+    
+    def close(self, order_id: str, exit_price: Optional[float] = None) -> Optional[float]:
+        """Remove a position. Returns realized P&L at exit_price (or the last mark)."""
+        with self._lock:
+            slot = self._slots.get(str(order_id), None)
+            if slot is None:
+                return None
+            price = self.mark[slot] if exit_price is None else exit_price
+            realized = float((price - self.entry_price[slot]) * self.quantity[slot])
+            self._remove(slot)
+            return realized
+    
+    def _remove(self, slot: int):
+        del self._slots[self.order_ids[slot]]
+        self._add_totals(slot, -1)
+        self.by_symbol[self._symbol_names[self.symbol_code[slot]]].discard(slot)
+        self.by_strategy[self._strategy_names[self.strategy_code[slot]]].discard(slot)
+        self.active[slot] = False
+        self.dirty[slot] = False
+        self.order_ids[slot] = None
+        self._free.append(slot)
+        self.closed += 1
+    
+    def reduce(self, symbol: str, quantity: float, price: float,
+               side: str) -> Tuple[List[Tuple[str, float, float, bool]], float]:
+        """Net a fill against opposite positions in a symbol, oldest first.
+        
+        A sell closes longs and a buy covers shorts. Returns
+        ([(order_id, quantity closed, realized P&L, fully closed)], quantity
+        left over), where the leftover is what the fill opens on its own.
+        """
+        direction = 1.0 if side == "buy" else -1.0
+        remaining = float(quantity)
+        fills = []
+        with self._lock:
+            slots = [slot for slot in self.by_symbol.get(symbol, ()) if self.quantity[slot] * direction < 0]
+            for slot in sorted(slots, key=lambda slot: self.open_seq[slot]):
+                if remaining <= 1e-9:
+                    break
+                held = abs(float(self.quantity[slot]))
+                taken = min(held, remaining)
+                realized = float((price - self.entry_price[slot]) * taken * -direction)
+                order_id = self.order_ids[slot]
+                fully_closed = taken >= held - 1e-9
+                if fully_closed:
+                    self._remove(slot)
+                else:
+                    self._add_totals(slot, -1)
+                    self.quantity[slot] += direction * taken
+                    self._add_totals(slot, 1)
+                    self.dirty[slot] = True  # Unrealized P&L changed with the size
+                remaining -= taken
+                fills.append((order_id, taken, realized, fully_closed))
+        return fills, max(remaining, 0.0)
+    
+    def update_marks(self, prices: Dict[str, float]) -> int:
+        """Mark every position in the quoted symbols. Returns the number of rows changed."""
+        with self._lock:
+            n = self._size
+            if not n or not prices:
+                return 0
+            lookup = np.full(len(self._symbol_names), np.nan)
+            for symbol, price in prices.items():
+                code = self._symbols.get(symbol)
+                if code is not None:
+                    lookup[code] = price
+            new = lookup[self.symbol_code[:n]]
+            changed = self.active[:n] & ~np.isnan(new) & (new != self.mark[:n])
+            
+            # Move the running totals by each changed row's mark delta
+            quantity = self.quantity[:n][changed]
+            delta = new[changed] - self.mark[:n][changed]
+            exposure_delta = np.abs(quantity) * delta
+            np.add.at(self.symbol_exposure, self.symbol_code[:n][changed], exposure_delta)
+            self.gross_exposure += float(exposure_delta.sum())
+            self.total_unrealized += float((quantity * delta).sum())
+            
+            self.mark[:n][changed] = new[changed]
+            self.dirty[:n] |= changed
+            count = int(changed.sum())
+            self.mark_updates += 1
+            self.marks_changed += count
+            return count
+    
+    def symbols(self) -> List[str]:
+        """Symbols with at least one open position"""
+        with self._lock:
+            return [symbol for symbol, slots in self.by_symbol.items() if slots]
+    
+    def _unrealized(self, n: int) -> np.ndarray:
+        return np.where(self.active[:n], (self.mark[:n] - self.entry_price[:n]) * self.quantity[:n], 0.0)
+    
+    def unrealized_pl(self) -> float:
+        """Unrealized P&L of the whole book"""
+        return self.total_unrealized
+    
+    def exposure(self, symbol: str) -> float:
+        """Gross marked exposure in one symbol"""
+        code = self._symbols.get(symbol)
+        return 0.0 if code is None else float(self.symbol_exposure[code])
+    
+    def net_quantity(self, symbol: str) -> float:
+        """Signed shares held in one symbol"""
+        code = self._symbols.get(symbol)
+        return 0.0 if code is None else float(self.symbol_quantity[code])
+    
+    def pnl_by_symbol(self) -> Dict[str, float]:
+        with self._lock:
+            return self._group(self.symbol_code, self._symbol_names, self.by_symbol)
+    
+    def pnl_by_strategy(self) -> Dict[str, float]:
+        with self._lock:
+            return self._group(self.strategy_code, self._strategy_names, self.by_strategy)
+    
+    def _group(self, codes: np.ndarray, names: List[str], index: Dict[str, Set[int]]) -> Dict[str, float]:
+        n = self._size
+        totals = np.bincount(codes[:n], weights=self._unrealized(n), minlength=len(names))
+        return {name: float(totals[code]) for code, name in enumerate(names) if index.get(name)}
+    
+    def _snapshot(self, slot: int) -> BookPosition:
+        return BookPosition(
+            order_id=self.order_ids[slot],
+            symbol=self._symbol_names[self.symbol_code[slot]],
+            strategy=self._strategy_names[self.strategy_code[slot]],
+            quantity=float(self.quantity[slot]),
+            entry_price=float(self.entry_price[slot]),
+            mark=float(self.mark[slot]),
+            opened_at=self.opened_at[slot]
+        )
+    
+    def get(self, order_id: str) -> Optional[BookPosition]:
+        with self._lock:
+            slot = self._slots.get(str(order_id))
+            return None if slot is None else self._snapshot(slot)
+    
+    def positions(self, symbol: Optional[str] = None, strategy: Optional[str] = None) -> List[BookPosition]:
+        """Open positions, optionally for one symbol and/or strategy"""
+        with self._lock:
+            if symbol is not None:
+                slots = set(self.by_symbol.get(symbol, ()))
+                if strategy is not None:
+                    slots &= self.by_strategy.get(strategy, set())
+            elif strategy is not None:
+                slots = self.by_strategy.get(strategy, set())
+            else:
+                slots = self._slots.values()
+            return [self._snapshot(slot) for slot in sorted(slots)]
+    
+    def take_dirty(self) -> List[Tuple[str, float, float, float]]:
+        """(order_id, mark, unrealized_pl, signed quantity) for rows marked since the last call"""
+        with self._lock:
+            n = self._size
+            slots = np.flatnonzero(self.dirty[:n])
+            if not len(slots):
+                return []
+            self.dirty[slots] = False
+            unrealized = (self.mark[slots] - self.entry_price[slots]) * self.quantity[slots]
+            return [(self.order_ids[slot], float(self.mark[slot]), float(pl), float(self.quantity[slot]))
+                    for slot, pl in zip(slots, unrealized)]
+    
+    def restore_dirty(self, order_ids):
+        """Flag rows again after a failed flush"""
+        with self._lock:
+            for order_id in order_ids:
+                slot = self._slots.get(order_id)
+                if slot is not None:
+                    self.dirty[slot] = True
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Get book size, P&L and mark metrics"""
+        with self._lock:
+            n = self._size
+            return {
+                "open_positions": len(self._slots),
+                "symbols": sum(1 for slots in self.by_symbol.values() if slots),
+                "gross_exposure": self.gross_exposure,
+                "unrealized_pl": self.total_unrealized,
+                "dirty": int(self.dirty[:n].sum()),
+                "opened": self.opened,
+                "closed": self.closed,
+                "mark_updates": self.mark_updates,
+                "marks_changed": self.marks_changed,
+            }
+
+
+class MarkFlusher:
+    """Re-marks a PositionBook from quotes and bulk-writes changed marks"""
+    
+    def __init__(self, book: PositionBook, get_writer: Callable, quotes=None, interval: float = 5.0):
+        self.book = book
+        self.get_writer = get_writer
+        self.quotes = quotes  # QuoteCache; None if marks are set with update_marks directly
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._flush_lock = threading.Lock()
+        
+        # Metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_failures = 0
+    
+    def start(self):
+        """Start the flush thread"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="MarkFlusher")
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the thread after one last flush"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+    
+    def flush(self) -> int:
+        """Mark the book to current quotes and write changed rows. Returns rows written."""
+        with self._flush_lock:
+            if self.quotes is not None:
+                self.book.update_marks(self.quotes.mid_prices(self.book.symbols()))
+            rows = self.book.take_dirty()
+            if not rows:
+                return 0
+            try:
+                written = self.get_writer().write_position_marks(rows)
+            except Exception as e:
+                logger.error(f"Failed to write position marks: {e}")
+                written = None
+            if written is None:
+                # Keep them dirty; the next flush writes the latest marks
+                self.book.restore_dirty(row[0] for row in rows)
+                self.flush_failures += 1
+                return 0
+            self.flushes += 1
+            self.rows_written += len(rows)
+            return len(rows)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get flush counts"""
+        return {
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "flush_failures": self.flush_failures,
+        }
@@ -0,0 +1,201 @@
+"""
+Live Quote Cache
+
+Keeps the latest bid/ask per symbol from a streaming quote feed so order
+sizing doesn't need a REST round-trip on every trade. Quotes older than
+max_age seconds (by local receipt time) are treated as missing and the
+caller falls back to REST.
+
+The feed is alpaca.data.live.StockDataStream in production. FakeQuoteStream
+implements the same subscribe/run/stop surface for tests and local runs.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, Optional
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedQuote:
+    """Latest quote for a symbol"""
+    symbol: str
+    bid_price: float
+    ask_price: float
+    timestamp: Optional[datetime]
+    received_at: float  # time.monotonic() when cached
+    
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.received_at
+
+
+class QuoteCache:
+    """Latest quote per symbol with a staleness bound"""
+    
+    def __init__(self, max_age: float = 2.0):
+        self.max_age = max_age
+        self._quotes: Dict[str, CachedQuote] = {}
+        self._lock = threading.Lock()
+        
+        # Metrics
+        self.updates = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def update(self, symbol: str, bid_price: float, ask_price: float,
+               timestamp: Optional[datetime] = None):
+        """Store the latest quote for a symbol"""
+        quote = CachedQuote(symbol, float(bid_price), float(ask_price), timestamp, time.monotonic())
+        with self._lock:
+            self._quotes[symbol] = quote
+            self.updates += 1
+    
+    async def on_quote(self, quote):
+        """StockDataStream quote handler"""
+        self.update(quote.symbol, quote.bid_price, quote.ask_price, getattr(quote, 'timestamp', None))
+    
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[CachedQuote]:
+        """Fresh quote for a symbol, or None if missing or stale"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            quote = self._quotes.get(symbol)
+            if quote is None:
+                self.misses += 1
+                return None
+            if quote.age > max_age:
+                self.stale += 1
+                return None
+            self.hits += 1
+            return quote
+    
+    def get_ask(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """Fresh ask price, or None if there's no usable quote"""
+        quote = self.get(symbol, max_age)
+        if quote is None or quote.ask_price <= 0:
+            return None
+        return quote.ask_price
+    
+    def symbols(self):
+        with self._lock:
+            return list(self._quotes)
+    
+    def mid_prices(self, symbols, max_age: float = float("inf")) -> Dict[str, float]:
+        """Mid price per symbol for marking positions (not counted as lookups)"""
+        prices = {}
+        with self._lock:
+            for symbol in symbols:
+                quote = self._quotes.get(symbol)
+                if quote is None or quote.ask_price <= 0 or quote.age > max_age:
+                    continue
+                prices[symbol] = (quote.bid_price + quote.ask_price) / 2 if quote.bid_price > 0 else quote.ask_price
+        return prices
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache hit/miss metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "symbols": len(self._quotes),
+                "updates": self.updates,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class QuoteFeed:
+    """Runs a quote stream on a background thread and feeds a QuoteCache"""
+    
+    def __init__(self, stream, cache: QuoteCache):
+        self.stream = stream
+        self.cache = cache
+        self.subscribed = set()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def start(self, symbols: Iterable[str] = ()):
+        """Subscribe to symbols and start the stream thread"""
+        self.subscribe(symbols)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="QuoteStream")
+            self._thread.start()
+        return self
+    
+    def _run(self):
+        try:
+            self.stream.run()
+        except Exception as e:
+            logger.error(f"Quote stream stopped: {e}")
+    
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def subscribe(self, symbols: Iterable[str]):
+        """Add symbols to the stream (safe while it is running)"""
+        with self._lock:
+            new = [symbol for symbol in symbols if symbol not in self.subscribed]
+            if not new:
+                return
+            self.subscribed.update(new)
+        try:
+            self.stream.subscribe_quotes(self.cache.on_quote, *new)
+            logger.info(f"Streaming quotes for {', '.join(new)}")
+        except Exception as e:
+            with self._lock:
+                self.subscribed.difference_update(new)
+            logger.warning(f"Failed to subscribe to quotes for {new}: {e}")
+    
+    def stop(self):
+        """Stop the stream and wait for its thread"""
+        try:
+            self.stream.stop()
+        except Exception as e:
+            logger.debug(f"Error stopping quote stream: {e}")
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class FakeQuoteStream:
+    """In-process stand-in for StockDataStream.
+    
+    push() delivers a quote to the subscribed handler on the caller's
+    thread; run() blocks until stop() like the real stream.
+    """
+    
+    def __init__(self):
+        self.handlers: Dict[str, Callable] = {}
+        self._stopped = threading.Event()
+    
+    def subscribe_quotes(self, handler: Callable, *symbols):
+        for symbol in symbols:
+            self.handlers[symbol] = handler
+    
+    def unsubscribe_quotes(self, *symbols):
+        for symbol in symbols:
+            self.handlers.pop(symbol, None)
+    
+    def run(self):
+        self._stopped.wait()
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def push(self, symbol: str, bid_price: float, ask_price: float):
+        """Deliver a quote as the stream would"""
+        handler = self.handlers.get(symbol) or self.handlers.get("*")
+        if handler is None:
+            return
+        quote = SimpleNamespace(symbol=symbol, bid_price=bid_price, ask_price=ask_price,
+                                timestamp=clock.now())
+        asyncio.run(handler(quote))
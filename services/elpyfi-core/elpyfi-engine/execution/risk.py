@@ -0,0 +1,188 @@
+"""
+Pre-Trade Risk Engine
+
+Enforces allocator.RISK_RULES between DAY_TRADE_APPROVED and order
+submission:
+
+- max_position_size: marked exposure in a symbol (held, reserved and
+  requested) may not exceed this fraction of the portfolio
+- max_open_positions: open plus in-flight positions
+- max_daily_loss: no new risk once realized + unrealized P&L for the
+  day is below -max_daily_loss of the portfolio
+
+Every input is a running total: the PositionBook keeps exposure per
+symbol and unrealized P&L, and this engine keeps realized P&L for the
+day and reservations for orders in flight, so a check is O(1). A batch
+of orders (check_batch, reserve_batch) is checked in one vectorized pass,
+in order:
+an order's symbol exposure counts every earlier order in that symbol
+(erring on the side of rejecting), and the position count counts the
+earlier orders that passed the size check.
+
+Orders that only reduce an existing position (a sell against a long,
+or a buy against a short) are always allowed.
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from allocator import RISK_RULES
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+class RiskEngine:
+    """Checks orders against RISK_RULES using running portfolio totals"""
+    
+    def __init__(self, book, rules: Optional[Dict[str, float]] = None, portfolio_value: float = 100000):
+        self.book = book  # PositionBook
+        self.rules = rules if rules is not None else RISK_RULES
+        self.portfolio_value = portfolio_value
+        self._lock = threading.Lock()
+        
+        # Running totals
+        self.realized_today = 0.0
+        self._day: Optional[date] = None
+        self.reserved_exposure = np.zeros(64)  # By book symbol code
+        self.reserved_count = 0
+        self._reservations: Dict[int, Tuple[int, float]] = {}  # token -> (symbol code, notional)
+        self._next_token = 0
+        
+        # Metrics
+        self.checks = 0
+        self.rejections: Dict[str, int] = {"position_size": 0, "open_positions": 0, "daily_loss": 0}
+    
+    def _roll_day(self):
+        today = clock.now().date()
+        if today != self._day:
+            self._day = today
+            self.realized_today = 0.0
+    
+    def record_realized(self, pnl: float):
+        """Add realized P&L from a closed position to today's total"""
+        with self._lock:
+            self._roll_day()
+            self.realized_today += pnl
+    
+    def daily_pnl(self) -> float:
+        """Realized today plus unrealized on the book"""
+        self._roll_day()
+        return self.realized_today + self.book.unrealized_pl()
+    
+    def check(self, symbol: str, action: str, notional: float) -> Tuple[bool, Optional[str]]:
+        """Check one order. Returns (approved, reason)."""
+        return self.check_batch([(symbol, action, notional)])[0]
+    
+    def check_batch(self, orders: List[Tuple[str, str, float]]) -> List[Tuple[bool, Optional[str]]]:
+        """Check (symbol, action, notional) orders together. Returns (approved, reason) per order."""
+        return [(approved, reason) for approved, reason, _ in self._check(orders, reserve=False)]
+    
+    def reserve_batch(self, orders: List[Tuple[str, str, float]]) -> List[Tuple[bool, Optional[str], Optional[int]]]:
+        """Like check_batch, but approved orders that add risk hold their
+        exposure and position slot until release(token) is called."""
+        return self._check(orders, reserve=True)
+    
+    def _check(self, orders, reserve: bool):
+        if not orders:
+            return []
+        book = self.book
+        codes = np.array([book.symbol_code_for(symbol) for symbol, _, _ in orders], dtype=np.int64)
+        notional = np.array([abs(n) for _, _, n in orders], dtype=float)
+        sells = np.array([action == "sell" for _, action, _ in orders])
+        
+        with self._lock:
+            self._roll_day()
+            self.checks += len(orders)
+            self._ensure_capacity(len(book.symbol_exposure))
+            limit = self.rules["max_position_size"] * self.portfolio_value
+            
+            held = book.symbol_quantity[codes]
+            reducing = np.where(sells, held > 0, held < 0)
+            opening = ~reducing
+            
+            # Exposure each order would leave in its symbol, counting earlier orders in the batch
+            projected = (book.symbol_exposure[codes] + self.reserved_exposure[codes] +
+                         _cumsum_by_group(codes, np.where(opening, notional, 0.0)))
+            size_ok = projected <= limit + 1e-9
+            
+            # Open positions if every earlier opening order that passed the size check fills
+            open_after = len(book) + self.reserved_count + np.cumsum(opening & size_ok)
+            count_ok = open_after <= self.rules["max_open_positions"]
+            
+            loss_ok = self.daily_pnl() > -self.rules["max_daily_loss"] * self.portfolio_value
+            
+            approved = reducing | (size_ok & count_ok & loss_ok)
+            results = []
+            for i in range(len(orders)):
+                if approved[i]:
+                    token = self._reserve(int(codes[i]), float(notional[i])) if reserve and opening[i] else None
+                    results.append((True, None, token))
+                elif not loss_ok:
+                    self.rejections["daily_loss"] += 1
+                    results.append((False, f"Daily loss limit reached ({self.daily_pnl():,.2f})", None))
+                elif not size_ok[i]:
+                    self.rejections["position_size"] += 1
+                    results.append((False, f"{orders[i][0]} exposure would be {projected[i]:,.2f} "
+                                           f"(limit {limit:,.2f})", None))
+                else:
+                    self.rejections["open_positions"] += 1
+                    results.append((False, f"Open position limit of {self.rules['max_open_positions']} reached", None))
+        return results
+    
+    def _ensure_capacity(self, size: int):
+        if size > len(self.reserved_exposure):
+            grown = np.zeros(size)
+            grown[:len(self.reserved_exposure)] = self.reserved_exposure
+            self.reserved_exposure = grown
+    
+    def _reserve(self, code: int, notional: float) -> int:
+        token = self._next_token
+        self._next_token += 1
+        self._reservations[token] = (code, notional)
+        self.reserved_exposure[code] += notional
+        self.reserved_count += 1
+        return token
+    
+    def release(self, token: Optional[int]):
+        """Drop a reservation once its order has filled (and is on the book) or failed"""
+        if token is None:
+            return
+        with self._lock:
+            reservation = self._reservations.pop(token, None)
+            if reservation is None:
+                return
+            code, notional = reservation
+            self.reserved_exposure[code] -= notional
+            self.reserved_count -= 1
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Get limits usage and rejection counts"""
+        with self._lock:
+            self._roll_day()
+            return {
+                "open_positions": len(self.book),
+                "reserved_orders": self.reserved_count,
+                "gross_exposure": self.book.gross_exposure,
+                "daily_pnl": self.daily_pnl(),
+                "realized_today": self.realized_today,
+                "checks": self.checks,
+                "rejections": dict(self.rejections),
+            }
+
+
+def _cumsum_by_group(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Running total of values within each group, in the original order"""
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    sorted_values = values[order]
+    running = np.cumsum(sorted_values)
+    starts = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    # Subtract the running total reached before each group began
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+    base = (running - sorted_values)[group_start]
+    result = np.empty_like(running)
+    result[order] = running - base
+    return result
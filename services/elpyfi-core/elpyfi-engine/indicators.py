@@ -0,0 +1,234 @@
+"""
+Streaming Indicator Engine
+
+Maintains per-symbol indicator state and updates it in O(1) per tick.
+Indicators are computed once per tick by the engine and shared by every
+strategy through MarketData.indicators.
+
+Indicators:
+- vwap: rolling volume-weighted average price
+- avg_volume: average volume of the previous bars (excludes the current
+  bar, so a spike is compared against what came before it)
+- sma / ema: simple and exponential moving averages of price
+- rsi: Wilder's relative strength index
+- macd / macd_signal / macd_hist
+- bb_upper / bb_middle / bb_lower: Bollinger bands
+"""
+
+import math
+from typing import Dict, Iterable, Optional
+import numpy as np
+from strategies.models import MarketData, MarketSnapshot
+
+
+class RollingWindow:
+    """Fixed-size NumPy ring buffer with running sum and sum of squares"""
+    
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError("window size must be at least 1")
+        self.size = size
+        self.values = np.zeros(size)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+    
+    def push(self, value: float):
+        """Add a value, evicting the oldest once the window is full"""
+        old = self.values[self.index]
+        if self.count == self.size:
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        
+        self.values[self.index] = value
+        self.total += value
+        self.total_sq += value * value
+        self.index += 1
+        
+        # Resync running sums once per wrap so float error can't accumulate
+        if self.index == self.size:
+            self.index = 0
+            self.total = float(self.values.sum())
+            self.total_sq = float(np.dot(self.values, self.values))
+    
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+    
+    @property
+    def std(self) -> Optional[float]:
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+
+class EMA:
+    """Exponential moving average seeded with the first value"""
+    
+    def __init__(self, period: int):
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+    
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class SymbolIndicators:
+    """Indicator state for one symbol"""
+    
+    def __init__(self, window: int = 20, rsi_period: int = 14, macd_fast: int = 12,
+                 macd_slow: int = 26, macd_signal: int = 9, bollinger_std: float = 2.0):
+        self.prices = RollingWindow(window)
+        self.volumes = RollingWindow(window)
+        self.price_volume = RollingWindow(window)
+        self.ema = EMA(window)
+        self.ema_fast = EMA(macd_fast)
+        self.ema_slow = EMA(macd_slow)
+        self.ema_signal = EMA(macd_signal)
+        self.rsi_period = rsi_period
+        self.bollinger_std = bollinger_std
+        
+        self.last_price = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.rsi_samples = 0
+        self.values: Dict[str, float] = {}
+    
+    def update(self, price: float, volume: float) -> Dict[str, float]:
+        """Advance every indicator by one tick and return the new values"""
+        # Average volume of prior bars, read before the current bar goes in
+        avg_volume = self.volumes.mean if self.volumes.count else volume
+        
+        self.prices.push(price)
+        self.volumes.push(volume)
+        self.price_volume.push(price * volume)
+        
+        sma = self.prices.mean
+        std = self.prices.std
+        vwap = self.price_volume.total / self.volumes.total if self.volumes.total > 0 else price
+        
+        ema_fast = self.ema_fast.update(price)
+        ema_slow = self.ema_slow.update(price)
+        macd = ema_fast - ema_slow
+        macd_signal = self.ema_signal.update(macd)
+        
+        values = {
+            "vwap": vwap,
+            "avg_volume": avg_volume,
+            "sma": sma,
+            "ema": self.ema.update(price),
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "macd_hist": macd - macd_signal,
+            "bb_upper": sma + self.bollinger_std * std,
+            "bb_middle": sma,
+            "bb_lower": sma - self.bollinger_std * std,
+        }
+        
+        rsi = self._update_rsi(price)
+        if rsi is not None:
+            values["rsi"] = rsi
+        
+        self.values = values
+        return values
+    
+    def _update_rsi(self, price: float) -> Optional[float]:
+        """Wilder-smoothed RSI; None until rsi_period changes have been seen"""
+        if self.last_price is None:
+            self.last_price = price
+            return None
+        
+        change = price - self.last_price
+        self.last_price = price
+        gain = max(change, 0.0)
+        loss = max(-change, 0.0)
+        
+        self.rsi_samples += 1
+        if self.rsi_samples <= self.rsi_period:
+            # Simple average over the seed period
+            self.avg_gain += (gain - self.avg_gain) / self.rsi_samples
+            self.avg_loss += (loss - self.avg_loss) / self.rsi_samples
+            if self.rsi_samples < self.rsi_period:
+                return None
+        else:
+            self.avg_gain = (self.avg_gain * (self.rsi_period - 1) + gain) / self.rsi_period
+            self.avg_loss = (self.avg_loss * (self.rsi_period - 1) + loss) / self.rsi_period
+        
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100.0 - 100.0 / (1.0 + rs)
+
+
+class IndicatorEngine:
+    """Keeps SymbolIndicators per symbol and fills MarketData.indicators"""
+    
+    def __init__(self, **settings):
+        self.settings = settings
+        self.symbols: Dict[str, SymbolIndicators] = {}
+    
+    def _state(self, symbol: str) -> SymbolIndicators:
+        state = self.symbols.get(symbol)
+        if state is None:
+            state = SymbolIndicators(**self.settings)
+            self.symbols[symbol] = state
+        return state
+    
+    def update(self, data: MarketData) -> Dict[str, float]:
+        """Update a symbol with one tick and fill in its indicators.
+        
+        Indicators already supplied by the data feed are left untouched.
+        """
+        values = self._state(data.symbol).update(data.current_price, data.volume)
+        if data.indicators is None:
+            data.indicators = dict(values)
+        else:
+            for name, value in values.items():
+                data.indicators.setdefault(name, value)
+        return values
+    
+    def update_snapshot(self, snapshot: MarketSnapshot):
+        """Update every symbol in a snapshot and add indicator columns"""
+        columns: Dict[str, np.ndarray] = {}
+        n = len(snapshot)
+        for i, symbol in enumerate(snapshot.symbols):
+            values = self._state(symbol).update(
+                float(snapshot.current_price[i]), float(snapshot.volume[i])
+            )
+            for name, value in values.items():
+                if name not in columns:
+                    columns[name] = np.full(n, np.nan)
+                columns[name][i] = value
+        
+        for name, column in columns.items():
+            existing = snapshot.indicators.get(name)
+            if existing is None:
+                snapshot.indicators[name] = column
+            else:
+                snapshot.indicators[name] = np.where(np.isnan(existing), column, existing)
+    
+    def seed(self, symbol: str, prices: Iterable[float], volumes: Iterable[float]):
+        """Warm up a symbol's state from historical closes and volumes"""
+        state = self._state(symbol)
+        for price, volume in zip(prices, volumes):
+            state.update(price, volume)
+    
+    def get(self, symbol: str) -> Dict[str, float]:
+        """Latest indicator values for a symbol"""
+        state = self.symbols.get(symbol)
+        return dict(state.values) if state else {}
+    
+    def reset(self, symbol: Optional[str] = None):
+        """Drop indicator state for one symbol, or all of them"""
+        if symbol is None:
+            self.symbols.clear()
+        else:
+            self.symbols.pop(symbol, None)
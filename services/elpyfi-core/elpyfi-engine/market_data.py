@@ -0,0 +1,564 @@
+"""
+Market Data Ingestion
+
+Feeds EventType.MARKET_DATA_RECEIVED from a pluggable source:
+
+- AlpacaBarSource: alpaca.data.live.StockDataStream bars (or trades)
+- ReplaySource: bar files via backtest.load_bars (CSV, Parquet, .bars)
+- SyntheticSource: random-walk bars for local runs
+
+The source runs on its own thread and every record is normalised into
+MarketData there, so decoding never happens on the strategy path. Ticks
+reach strategies through a bounded queue drained by a single consumer
+thread. When strategies fall behind the queue fills and backpressure
+kicks in according to the policy:
+
+- "block": the source waits up to block_timeout for room (None waits
+  forever, which makes file replay lossless), then the new tick is dropped
+- "drop_oldest": the oldest queued tick is discarded to make room, so a
+  live feed stays current
+
+Every dropped tick is counted against its symbol.
+
+TickConflator can sit between the feed and strategies that are slower than
+the tick rate: it keeps only the latest tick per symbol, so under a burst
+strategies see each symbol's freshest price instead of working through a
+backlog of stale ones.
+
+Usage:
+    feed = MarketDataFeed.from_config({'source': 'synthetic', 'symbols': ['AAPL']})
+    feed.start()
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+from events import event_bus, EventType
+from strategies.models import MarketData
+import clock
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("block", "drop_oldest")
+
+
+def _local_time(timestamp: Optional[datetime]) -> datetime:
+    """Match the engine clock: naive local time unless the clock is tz-aware"""
+    if timestamp is None:
+        return clock.now()
+    if timestamp.tzinfo is not None and clock.now().tzinfo is None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def normalize(record: Any) -> MarketData:
+    """Turn a bar, trade or dict from any source into MarketData.
+    
+    Raises ValueError (or TypeError/KeyError/AttributeError) for records
+    that can't be decoded.
+    """
+    if isinstance(record, MarketData):
+        return record
+    if hasattr(record, "to_market_data"):
+        return record.to_market_data()
+    if isinstance(record, dict):
+        get = record.get
+    else:
+        get = lambda name, default=None: getattr(record, name, default)
+    
+    symbol = get("symbol")
+    if not symbol:
+        raise ValueError("record has no symbol")
+    timestamp = _local_time(get("timestamp"))
+    
+    close = get("close")
+    if close is not None:
+        # Bar
+        return MarketData(
+            symbol=symbol,
+            timestamp=timestamp,
+            current_price=float(close),
+            volume=float(get("volume", 0) or 0),
+            high=float(get("high", close)),
+            low=float(get("low", close)),
+            open=float(get("open", close)),
+            close=float(close)
+        )
+    
+    # Trade: a single print
+    price = float(get("price"))
+    return MarketData(
+        symbol=symbol,
+        timestamp=timestamp,
+        current_price=price,
+        volume=float(get("size", 0) or 0),
+        high=price,
+        low=price,
+        open=price,
+        close=price
+    )
+
+
+class MarketDataSource:
+    """Base source interface.
+    
+    run(emit) delivers raw records by calling emit(record) until the
+    source is exhausted or stop() is called. It runs on the feed's ingest
+    thread, so emit() blocking is how backpressure reaches the source.
+    """
+    
+    name = "source"
+    
+    def __init__(self):
+        self._stopped = threading.Event()
+    
+    def run(self, emit: Callable[[Any], bool]):
+        raise NotImplementedError
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def is_alive(self) -> bool:
+        """Whether data can still arrive (for sources that depend on something else running)"""
+        return True
+
+
+class AlpacaBarSource(MarketDataSource):
+    """Live bars (or trades) from Alpaca's StockDataStream.
+    
+    Alpaca allows one market data connection per account, so when the
+    execution engine already streams quotes, pass its QuoteFeed as
+    stream_owner: bars are subscribed on that stream, which the owner
+    keeps running (and stopping).
+    """
+    
+    name = "alpaca"
+    
+    def __init__(self, symbols: Iterable[str], api_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, feed: str = "iex",
+                 channel: str = "bars", stream=None, stream_owner=None):
+        super().__init__()
+        if channel not in ("bars", "trades"):
+            raise ValueError(f"Unknown Alpaca channel: {channel}")
+        self.symbols = list(symbols)
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.feed = feed
+        self.channel = channel
+        self.stream_owner = stream_owner  # Anything with .stream and is_alive(), e.g. a QuoteFeed
+        self.stream = stream_owner.stream if stream_owner is not None else stream
+    
+    def _create_stream(self):
+        # The SDK is only loaded when a live feed is actually used
+        from alpaca.data.live import StockDataStream
+        from alpaca.data.enums import DataFeed
+        
+        api_key = self.api_key or os.environ.get('ALPACA_API_KEY')
+        secret_key = self.secret_key or os.environ.get('ALPACA_SECRET_KEY')
+        if not api_key or not secret_key:
+            raise RuntimeError("ALPACA_API_KEY and ALPACA_SECRET_KEY are required for live market data")
+        return StockDataStream(api_key, secret_key, feed=DataFeed(self.feed))
+    
+    def run(self, emit: Callable[[Any], bool]):
+        if self.stream is None:
+            self.stream = self._create_stream()
+        
+        async def on_record(record):
+            emit(record)
+        
+        if self.channel == "bars":
+            self.stream.subscribe_bars(on_record, *self.symbols)
+        else:
+            self.stream.subscribe_trades(on_record, *self.symbols)
+        logger.info(f"Streaming {self.channel} for {', '.join(self.symbols)}")
+        if self.stream_owner is not None:
+            self._stopped.wait()  # The owner's thread runs the stream
+        elif not self._stopped.is_set():
+            self.stream.run()
+    
+    def stop(self):
+        super().stop()
+        if self.stream is None:
+            return
+        try:
+            if self.stream_owner is None:
+                self.stream.stop()
+            elif self.channel == "bars":
+                self.stream.unsubscribe_bars(*self.symbols)
+            else:
+                self.stream.unsubscribe_trades(*self.symbols)
+        except Exception as e:
+            logger.debug(f"Error stopping market data stream: {e}")
+    
+    def is_alive(self) -> bool:
+        return self.stream_owner is None or self.stream_owner.is_alive()
+
+
+class ReplaySource(MarketDataSource):
+    """Bars from files, in timestamp order across files"""
+    
+    name = "replay"
+    
+    def __init__(self, paths: Iterable[str], speed: float = 0.0):
+        super().__init__()
+        self.paths = list(paths)
+        self.speed = speed  # 0 = as fast as the queue allows, 1 = real time
+    
+    def run(self, emit: Callable[[Any], bool]):
+        from backtest import load_bars
+        
+        previous = None
+        for bar in load_bars(self.paths):
+            if self._stopped.is_set():
+                return
+            if self.speed > 0 and previous is not None:
+                gap = (bar.timestamp - previous).total_seconds() / self.speed
+                if gap > 0 and self._stopped.wait(gap):
+                    return
+            previous = bar.timestamp
+            emit(bar)
+
+
+class SyntheticSource(MarketDataSource):
+    """Random-walk bars for every symbol, one round per interval"""
+    
+    name = "synthetic"
+    
+    def __init__(self, symbols: Iterable[str], interval: float = 1.0,
+                 start_price: float = 100.0, volatility: float = 0.002,
+                 volume: float = 100000, rounds: Optional[int] = None,
+                 seed: Optional[int] = None):
+        super().__init__()
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.volatility = volatility
+        self.volume = volume
+        self.rounds = rounds  # None = run until stopped
+        self.rng = random.Random(seed)
+        self.prices = {symbol: start_price for symbol in self.symbols}
+    
+    def run(self, emit: Callable[[Any], bool]):
+        completed = 0
+        while not self._stopped.is_set() and (self.rounds is None or completed < self.rounds):
+            now = clock.now()
+            for symbol in self.symbols:
+                open_price = self.prices[symbol]
+                close = max(0.01, open_price * (1 + self.rng.gauss(0, self.volatility)))
+                wick = abs(self.rng.gauss(0, self.volatility)) * close
+                self.prices[symbol] = close
+                emit({
+                    "symbol": symbol,
+                    "timestamp": now,
+                    "open": open_price,
+                    "high": max(open_price, close) + wick,
+                    "low": max(0.01, min(open_price, close) - wick),
+                    "close": close,
+                    "volume": self.volume * self.rng.uniform(0.5, 1.5),
+                })
+            completed += 1
+            if self.interval > 0 and self._stopped.wait(self.interval):
+                return
+
+
+SOURCES = {
+    "alpaca": AlpacaBarSource,
+    "replay": ReplaySource,
+    "synthetic": SyntheticSource,
+}
+
+
+class MarketDataFeed:
+    """Runs a source on an ingest thread and hands MarketData to a consumer
+    thread through a bounded queue"""
+    
+    def __init__(self, source: MarketDataSource,
+                 handler: Optional[Callable[[MarketData], None]] = None,
+                 max_queue_size: int = 10000, policy: str = "block",
+                 block_timeout: Optional[float] = 0.05):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy} (expected one of {POLICIES})")
+        self.source = source
+        self.handler = handler or (lambda data: event_bus.emit(EventType.MARKET_DATA_RECEIVED, data))
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_queue_size = max_queue_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._ingest_thread = None
+        self._consumer_thread = None
+        
+        # Counters
+        self._stats_lock = threading.Lock()
+        self.received = 0
+        self.delivered = 0
+        self.decode_errors = 0
+        self.handler_errors = 0
+        self.blocked = 0
+        self.dropped: Dict[str, int] = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any],
+                    handler: Optional[Callable[[MarketData], None]] = None) -> "MarketDataFeed":
+        """Build a feed from engine config: 'source' names the source, queue
+        settings go to the feed and everything else to the source."""
+        options = dict(config)
+        kind = options.pop("source")
+        if kind not in SOURCES:
+            raise ValueError(f"Unknown market data source: {kind} (expected one of {list(SOURCES)})")
+        feed_options = {name: options.pop(name) for name in ("max_queue_size", "policy", "block_timeout")
+                        if name in options}
+        return cls(SOURCES[kind](**options), handler=handler, **feed_options)
+    
+    def start(self):
+        """Start the consumer and ingest threads"""
+        if self._ingest_thread is not None:
+            return self
+        self._consumer_thread = threading.Thread(target=self._consume, daemon=True,
+                                                 name="MarketDataConsumer")
+        self._consumer_thread.start()
+        self._ingest_thread = threading.Thread(target=self._ingest, daemon=True,
+                                               name=f"MarketDataIngest-{self.source.name}")
+        self._ingest_thread.start()
+        logger.info(f"Market data feed started ({self.source.name}, queue size "
+                    f"{self.max_queue_size}, policy {self.policy})")
+        return self
+    
+    def _ingest(self):
+        try:
+            self.source.run(self.put)
+        except Exception as e:
+            logger.error(f"Market data source '{self.source.name}' stopped: {e}")
+        else:
+            logger.info(f"Market data source '{self.source.name}' finished")
+    
+    def put(self, record: Any) -> bool:
+        """Decode a raw record and queue it. Returns False if it was not queued."""
+        try:
+            data = normalize(record)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            with self._stats_lock:
+                self.decode_errors += 1
+            logger.debug(f"Undecodable market data record {record!r}: {e}")
+            return False
+        
+        with self._stats_lock:
+            self.received += 1
+        item = (time.perf_counter(), data)
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        
+        if self.policy == "drop_oldest":
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    pass
+                try:
+                    _, oldest = self.queue.get_nowait()
+                    self.queue.task_done()
+                    self._count_drop(oldest.symbol)
+                except queue.Empty:
+                    pass
+        
+        # "block": wait for the consumer, waking periodically to notice stop()
+        with self._stats_lock:
+            self.blocked += 1
+        deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+        while not self._stopped.is_set():
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if wait <= 0:
+                break
+            try:
+                self.queue.put(item, timeout=wait)
+                return True
+            except queue.Full:
+                continue
+        self._count_drop(data.symbol)
+        return False
+    
+    def _count_drop(self, symbol: str):
+        with self._stats_lock:
+            self.dropped[symbol] = self.dropped.get(symbol, 0) + 1
+            total = sum(self.dropped.values())
+        if total == 1 or total % 1000 == 0:
+            logger.warning(f"Market data queue full - strategies are falling behind "
+                           f"({total} ticks dropped)")
+    
+    def _consume(self):
+        while not self._stopped.is_set():
+            try:
+                enqueued_at, data = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                wait = time.perf_counter() - enqueued_at
+                self.handler(data)
+                with self._stats_lock:
+                    self.delivered += 1
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+            except Exception as e:
+                with self._stats_lock:
+                    self.handler_errors += 1
+                logger.error(f"Market data handler error for {data.symbol}: {e}")
+            finally:
+                self.queue.task_done()
+    
+    def is_alive(self) -> bool:
+        """Both threads running and the source still able to deliver"""
+        threads = (self._ingest_thread, self._consumer_thread)
+        return all(t is not None and t.is_alive() for t in threads) and self.source.is_alive()
+    
+    def drain(self, timeout: Optional[float] = None):
+        """Wait for the source to finish and every queued tick to be handled"""
+        if self._ingest_thread is not None:
+            self._ingest_thread.join(timeout)
+        self.queue.join()
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the source and both threads; ticks still queued are discarded"""
+        self.source.stop()
+        self._stopped.set()
+        for thread in (self._ingest_thread, self._consumer_thread):
+            if thread is not None:
+                thread.join(timeout)
+        self._ingest_thread = None
+        self._consumer_thread = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get throughput, backpressure and per-symbol drop counters"""
+        with self._stats_lock:
+            delivered = self.delivered
+            return {
+                "source": self.source.name,
+                "depth": self.queue.qsize(),
+                "max_queue_size": self.max_queue_size,
+                "policy": self.policy,
+                "received": self.received,
+                "delivered": delivered,
+                "decode_errors": self.decode_errors,
+                "handler_errors": self.handler_errors,
+                "blocked": self.blocked,
+                "dropped": sum(self.dropped.values()),
+                "dropped_by_symbol": dict(self.dropped),
+                "avg_wait_ms": (self.total_wait / delivered * 1000) if delivered else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+class TickConflator:
+    """Latest-tick-per-symbol stage in front of a slow consumer.
+    
+    put() replaces any tick still waiting for the same symbol, so a burst
+    costs one dict slot per symbol instead of a growing queue. The worker
+    swaps out the whole dirty set and processes the freshest tick for each
+    symbol in the order the symbols first became dirty, so a fast ticker
+    can't starve the others.
+    """
+    
+    def __init__(self, handler: Callable[[MarketData], None]):
+        self.handler = handler
+        self._dirty: Dict[str, tuple] = {}  # symbol -> (received_at, MarketData)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._busy = False
+        self._thread = None
+        
+        # Counters (under the condition's lock)
+        self.received = 0
+        self.processed = 0
+        self.handler_errors = 0
+        self.conflated: Dict[str, int] = {}
+        self.max_pending = 0
+        self.total_age = 0.0
+        self.max_age = 0.0
+    
+    def start(self):
+        """Start the worker thread"""
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, daemon=True, name="TickConflator")
+            self._thread.start()
+        return self
+    
+    def put(self, data: MarketData):
+        """Mark a symbol dirty with its latest tick (never blocks on the consumer)"""
+        with self._cond:
+            self.received += 1
+            if data.symbol in self._dirty:
+                self.conflated[data.symbol] = self.conflated.get(data.symbol, 0) + 1
+                # Keep the symbol's place in line, only swap in the newer tick
+                self._dirty[data.symbol] = (self._dirty[data.symbol][0], data)
+            else:
+                self._dirty[data.symbol] = (time.perf_counter(), data)
+                self.max_pending = max(self.max_pending, len(self._dirty))
+            self._cond.notify()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                batch, self._dirty = self._dirty, {}
+                self._busy = True
+            
+            for received_at, data in batch.values():
+                age = time.perf_counter() - received_at
+                try:
+                    self.handler(data)
+                    failed = 0
+                except Exception as e:
+                    failed = 1
+                    logger.error(f"Conflated market data handler error for {data.symbol}: {e}")
+                with self._cond:
+                    self.processed += 1
+                    self.handler_errors += failed
+                    self.total_age += age
+                    self.max_age = max(self.max_age, age)
+            
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+    
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every dirty symbol has been processed"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._dirty and not self._busy, timeout)
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker; ticks still pending are discarded"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get conflation counts and how stale processed ticks were"""
+        with self._cond:
+            processed = self.processed
+            return {
+                "received": self.received,
+                "processed": processed,
+                "pending": len(self._dirty),
+                "max_pending": self.max_pending,
+                "conflated": sum(self.conflated.values()),
+                "conflated_by_symbol": dict(self.conflated),
+                "handler_errors": self.handler_errors,
+                "avg_age_ms": (self.total_age / processed * 1000) if processed else 0.0,
+                "max_age_ms": self.max_age * 1000,
+            }
@@ -0,0 +1,306 @@
+"""
+Engine Metrics and Health Endpoint
+
+Counters and latency histograms in Prometheus text format, served with
+/health by a small embedded HTTP server (stdlib only):
+
+    GET /health   200 {"status": "ok", ...} while the engine (and its market
+                  data feed, if one is configured) is running, else 503
+    GET /metrics  Prometheus exposition format 0.0.4
+
+Recording never takes a lock: every thread writes to its own shard of a
+metric (a dict of plain lists it alone mutates), and a scrape sums the
+shards. A scrape can see one thread's observation half applied (bucket
+counted, sum not yet), which Prometheus tolerates; the tick path never
+waits on a scrape or on another thread. The only lock is taken once per
+thread per metric, the first time that thread records to it.
+
+Gauges are callbacks evaluated at scrape time, so queue depths are read
+from the queues themselves rather than tracked on the hot path.
+
+Usage:
+    from metrics import registry, ANALYZE_SECONDS
+    ANALYZE_SECONDS.observe(elapsed, "solar_flare")
+    MetricsServer(registry, port=9001, health=engine.health).start()
+"""
+
+import json
+import logging
+import math
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Seconds; tick-path work is sub-millisecond, broker and DB calls are tens of ms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _ShardedMetric:
+    """Per-thread shards of {label value: series}; scrapes merge them"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._local = threading.local()
+        self._shards: List[Dict[str, Any]] = []
+        self._shards_lock = threading.Lock()
+    
+    def _shard(self) -> Dict[str, Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+    
+    def _series(self) -> List[Tuple[str, Any]]:
+        """Every (label value, series) pair across threads"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        # list(dict.items()) copies in one step, so a writer adding a label can't break it
+        return [item for shard in shards for item in list(shard.items())]
+    
+    def _label_pairs(self, value: str) -> List[Tuple[str, str]]:
+        return [(self.label, value)] if self.label else []
+
+
+class Counter(_ShardedMetric):
+    """Monotonic count, optionally split by one label"""
+    
+    kind = "counter"
+    
+    def inc(self, label: str = "", amount: float = 1):
+        shard = getattr(self._local, "shard", None) or self._shard()
+        shard[label] = shard.get(label, 0) + amount
+    
+    def values(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for label, value in self._series():
+            totals[label] = totals.get(label, 0) + value
+        return totals
+    
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self._label_pairs(label))} {_format_value(value)}"
+                for label, value in sorted(self.values().items())]
+
+
+class Histogram(_ShardedMetric):
+    """Latency distribution with fixed buckets, optionally split by one label"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, label: Optional[str] = None,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, label)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, label: str = ""):
+        """Record one observation (in seconds for latency histograms)"""
+        shard = getattr(self._local, "shard", None) or self._shard()
+        series = shard.get(label)
+        if series is None:
+            # One count per bucket, one for +Inf, then the sum
+            series = shard[label] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+    
+    def snapshot(self) -> Dict[str, Tuple[List[int], float]]:
+        """Per-label (cumulative bucket counts incl. +Inf, sum)"""
+        merged: Dict[str, List[float]] = {}
+        for label, series in self._series():
+            total = merged.setdefault(label, [0] * len(series))
+            for i, value in enumerate(list(series)):
+                total[i] += value
+        result = {}
+        for label, total in merged.items():
+            cumulative, running = [], 0
+            for count in total[:-1]:
+                running += count
+                cumulative.append(running)
+            result[label] = (cumulative, total[-1])
+        return result
+    
+    def render(self) -> List[str]:
+        lines = []
+        for label, (cumulative, total) in sorted(self.snapshot().items()):
+            pairs = self._label_pairs(label)
+            for bound, count in zip(list(self.buckets) + [math.inf], cumulative):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {cumulative[-1]}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time.
+    
+    The callback returns a number, or a dict of label value -> number.
+    Totals some component already keeps (e.g. in get_stats()) are exposed
+    the same way with kind="counter".
+    """
+    
+    def __init__(self, name: str, help: str, read: Callable[[], Union[float, Dict[str, float], None]],
+                 label: Optional[str] = None, kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.kind = kind
+    
+    def render(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [f"{self.name}{_labels([(self.label, key)])} {_format_value(v)}"
+                    for key, v in sorted(value.items())]
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class MetricsRegistry:
+    """Named metrics rendered together for /metrics"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Gauge):
+                return existing
+            self._metrics[metric.name] = metric  # Gauges are re-pointed at the latest engine
+        return metric
+    
+    def counter(self, name: str, help: str, label: Optional[str] = None) -> Counter:
+        return self._register(Counter(name, help, label))
+    
+    def histogram(self, name: str, help: str, label: Optional[str] = None,
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, label, buckets))
+    
+    def gauge(self, name: str, help: str, read: Callable, label: Optional[str] = None,
+              kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, read, label, kind))
+    
+    def get(self, name: str):
+        return self._metrics.get(name)
+    
+    def render(self) -> str:
+        """All metrics in Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                body = metric.render()
+            except Exception as e:
+                logger.debug(f"Metric {metric.name} unavailable: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and the metrics recorded across the engine
+registry = MetricsRegistry()
+
+ANALYZE_SECONDS = registry.histogram(
+    "elpyfi_strategy_analyze_seconds", "Time spent in Strategy.analyze per tick", label="strategy")
+SIGNALS_EMITTED = registry.counter(
+    "elpyfi_signals_emitted_total", "Signals emitted by strategies", label="strategy")
+DB_WRITE_SECONDS = registry.histogram(
+    "elpyfi_db_write_seconds", "Database write latency including connection checkout", label="kind")
+ORDER_SUBMIT_SECONDS = registry.histogram(
+    "elpyfi_order_submit_seconds", "Broker order submission latency", label="broker")
+
+
+def _handler_class():
+    """Request handler for /health and /metrics (http.server is only loaded when serving)"""
+    from http.server import BaseHTTPRequestHandler
+    
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "elpyfi-engine"
+        
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                self._send(200, "text/plain; version=0.0.4; charset=utf-8", self.server.registry.render())
+            elif path == "/health":
+                healthy, details = self.server.health()
+                self._send(200 if healthy else 503, "application/json", json.dumps(details, default=str))
+            else:
+                self._send(404, "text/plain; charset=utf-8", "not found\n")
+        
+        def _send(self, status: int, content_type: str, body: str):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+    
+    return Handler
+
+
+class MetricsServer:
+    """Serves /health and /metrics on a background thread"""
+    
+    def __init__(self, registry: MetricsRegistry = registry, port: int = 9001, host: str = "0.0.0.0",
+                 health: Optional[Callable[[], Tuple[bool, Dict[str, Any]]]] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.health = health or (lambda: (True, {"status": "ok"}))
+        self._server = None
+        self._thread = None
+    
+    def start(self):
+        """Bind and start serving (port 0 picks a free port)"""
+        if self._server is not None:
+            return self
+        from http.server import ThreadingHTTPServer
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_class())
+        self._server.daemon_threads = True
+        self._server.registry = self.registry
+        self._server.health = self.health
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="MetricsServer")
+        self._thread.start()
+        logger.info(f"Health and metrics endpoint listening on {self.host}:{self.port}")
+        return self
+    
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join(timeout=5)
+        self._server = None
+        self._thread = None
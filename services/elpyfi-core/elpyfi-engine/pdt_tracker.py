@@ -2,14 +2,36 @@
 PDT (Pattern Day Trading) Tracker
 
 Tracks day trades to ensure compliance with the 3 trades per 5 business days rule.
+
+The window is rolling: today plus the previous 4 business days (weekends
+skipped, exchange holidays not). Trades are kept in open-time order in a
+deque, so expiring old ones is a pop from the left and the count is the
+deque length. A slot is taken when the trade is approved and given back if
+the order never reaches the market (risk rejected, submission failed, or
+cancelled/rejected by the broker with nothing filled). Set PDT_STATE_PATH (or pass state_path) to snapshot the
+window to disk so a restart doesn't reset the budget.
+
+get_pdt_tracker() creates the shared tracker (and its bus subscriptions)
+on first use rather than at import.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List
-from dataclasses import dataclass
-from events import event_bus, EventType
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta
+from typing import Deque, Dict, Optional, Tuple
+from dataclasses import asdict, dataclass
+from events import event_bus, EventType, SignalEvent
+import clock
 from allocator import PDTAllocator, RISK_RULES
 
+logger = logging.getLogger(__name__)
+
+MAX_DAY_TRADES = 3
+WINDOW_BUSINESS_DAYS = 5
+
 
 @dataclass
 class DayTrade:
@@ -20,40 +42,77 @@ class DayTrade:
     strategy: str
 
 
+def window_start(today: date, business_days: int = WINDOW_BUSINESS_DAYS) -> datetime:
+    """Midnight of the first business day in the rolling window ending today"""
+    day = today
+    counted = 1 if today.weekday() < 5 else 0
+    while counted < business_days:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            counted += 1
+    return datetime(day.year, day.month, day.day)
+
+
 class PDTTracker:
     """Tracks and enforces PDT rules"""
     
-    def __init__(self):
-        self.day_trades: List[DayTrade] = []
+    def __init__(self, state_path: Optional[str] = None):
+        self.day_trades: Deque[DayTrade] = deque()  # In open-time order
+        self.open_day_trades: Dict[str, Deque[DayTrade]] = defaultdict(deque)  # By symbol, oldest first
+        self._approved: Deque[Tuple[SignalEvent, DayTrade]] = deque()  # Slot taken for each approved signal
+        self.state_path = state_path
+        self._window_date = None
         self.week_start = self._get_week_start()
         self.allocator = PDTAllocator()
+        self._load_state()
         self._setup_listeners()
     
+    def subscriptions(self):
+        """(event type, handler) pairs the tracker listens on"""
+        return [
+            (EventType.DAY_TRADE_REQUESTED, self.handle_day_trade_request),
+            (EventType.POSITION_CLOSED, self.record_day_trade),
+            (EventType.RISK_REJECTED, self.release_day_trade),
+            (EventType.ORDER_FAILED, self.release_day_trade),
+            (EventType.ORDER_UPDATED, self.release_day_trade),
+        ]
+    
     def _setup_listeners(self):
         """Listen for trade events"""
-        event_bus.subscribe(EventType.DAY_TRADE_REQUESTED, self.handle_day_trade_request)
-        event_bus.subscribe(EventType.POSITION_CLOSED, self.record_day_trade)
+        for event_type, handler in self.subscriptions():
+            event_bus.subscribe(event_type, handler)
     
     def _get_week_start(self) -> datetime:
-        """Get the start of the current trading week (Monday)"""
-        today = datetime.now()
-        days_since_monday = today.weekday()
-        return today - timedelta(days=days_since_monday)
+        """Get the start of the rolling 5-business-day window (recomputed once per day)"""
+        today = clock.now().date()
+        if today != self._window_date:
+            self._window_date = today
+            self.week_start = window_start(today)
+        return self.week_start
+    
+    def _expire(self):
+        """Drop trades that have left the window"""
+        start = self._get_week_start()
+        expired = False
+        while self.day_trades and self.day_trades[0].open_time < start:
+            trade = self.day_trades.popleft()
+            open_trades = self.open_day_trades.get(trade.symbol)
+            if open_trades and open_trades[0] is trade:
+                open_trades.popleft()
+            expired = True
+        if expired:
+            while self._approved and self._approved[0][1].open_time < start:
+                self._approved.popleft()
+            self._save_state()
     
     def get_trades_this_week(self) -> int:
-        """Count day trades in the current week"""
-        current_week_start = self._get_week_start()
-        
-        # Reset if new week
-        if current_week_start > self.week_start:
-            self.week_start = current_week_start
-            self.day_trades = [t for t in self.day_trades if t.open_time >= current_week_start]
-        
-        return len([t for t in self.day_trades if t.open_time >= self.week_start])
+        """Count day trades in the rolling 5-business-day window"""
+        self._expire()
+        return len(self.day_trades)
     
     def get_remaining_trades(self) -> int:
-        """Get remaining day trades for the week"""
-        return max(0, 3 - self.get_trades_this_week())
+        """Get remaining day trades for the window"""
+        return max(0, MAX_DAY_TRADES - self.get_trades_this_week())
     
     def can_day_trade(self) -> bool:
         """Check if we can make another day trade"""
@@ -83,23 +142,28 @@ class PDTTracker:
             self._approve_trade(request_event, "Swing trade - no PDT restrictions")
     
     def _approve_trade(self, request_event, reason: str):
-        """Approve and record a trade"""
+        """Record and approve a trade"""
         from events import TradeApprovalEvent
+        if request_event.is_day_trade:
+            # Record the day trade first: a synchronous bus may reject the order inside emit()
+            now = clock.now()
+            trade = DayTrade(
+                symbol=request_event.signal_event.symbol,
+                open_time=now,
+                close_time=now,  # Will update when closed
+                strategy=request_event.signal_event.strategy
+            )
+            self.day_trades.append(trade)
+            self.open_day_trades[trade.symbol].append(trade)
+            self._approved.append((request_event.signal_event, trade))
+            self._save_state()
+        
         approval = TradeApprovalEvent(
             trade_request=request_event,
             approved=True,
             reason=reason
         )
         event_bus.emit(EventType.DAY_TRADE_APPROVED, approval)
-        
-        if request_event.is_day_trade:
-            # Record the day trade
-            self.day_trades.append(DayTrade(
-                symbol=request_event.signal_event.symbol,
-                open_time=datetime.now(),
-                close_time=datetime.now(),  # Will update when closed
-                strategy=request_event.signal_event.strategy
-            ))
     
     def _reject_trade(self, request_event, reason: str):
         """Reject a trade request"""
@@ -113,19 +177,122 @@ class PDTTracker:
     
     def record_day_trade(self, position_event):
         """Record when a day trade is closed"""
-        # Update close time for matching trades
-        for trade in self.day_trades:
-            if (trade.symbol == position_event.symbol and 
-                trade.close_time == trade.open_time):  # Not yet closed
-                trade.close_time = position_event.timestamp
+        realized = getattr(position_event, "realized_pl", None)
+        if realized is not None and position_event.strategy:
+            # Every close counts toward the strategy's win rate in the allocator
+            self.allocator.record_outcome(position_event.symbol, position_event.strategy, realized > 0, realized)
+        # Close the oldest open day trade in this symbol
+        open_trades = self.open_day_trades.get(position_event.symbol)
+        if open_trades:
+            open_trades.popleft().close_time = position_event.timestamp
+            if not open_trades:
+                del self.open_day_trades[position_event.symbol]
+            self._save_state()
+    
+    def release_day_trade(self, order_event):
+        """Give back the slot of an approved day trade whose order never filled"""
+        if order_event.status not in ("risk_rejected", "failed", "cancelled", "rejected"):
+            return
+        if order_event.quantity or order_event.signal_event is None:
+            return  # Something filled, or not an order we approved
+        for i, (signal, trade) in enumerate(self._approved):
+            if signal is order_event.signal_event:
                 break
+        else:
+            return  # Swing trade, or already released
+        del self._approved[i]
+        self.day_trades.remove(trade)
+        open_trades = self.open_day_trades.get(trade.symbol)
+        if open_trades and trade in open_trades:
+            open_trades.remove(trade)
+            if not open_trades:
+                del self.open_day_trades[trade.symbol]
+        logger.info(f"Released day trade slot for {trade.symbol}: {order_event.status}")
+        self._save_state()
+    
+    def snapshot(self) -> Dict:
+        """Copy of the recorded trades and allocator, for restore() (e.g. around a replay)"""
+        return {
+            "day_trades": deque(self.day_trades),
+            "open_day_trades": {symbol: deque(trades) for symbol, trades in self.open_day_trades.items()},
+            "approved": deque(self._approved),
+            "window_date": self._window_date,
+            "week_start": self.week_start,
+            "allocator": self.allocator,
+        }
+    
+    def restore(self, snapshot: Dict):
+        """Put back the state taken by snapshot()"""
+        self.day_trades = snapshot["day_trades"]
+        self.open_day_trades = defaultdict(deque, snapshot["open_day_trades"])
+        self._approved = snapshot["approved"]
+        self._window_date = snapshot["window_date"]
+        self.week_start = snapshot["week_start"]
+        self.allocator = snapshot["allocator"]
+        self._save_state()
+    
+    def reset(self):
+        """Forget every recorded day trade (e.g. before a replay)"""
+        self.day_trades.clear()
+        self.open_day_trades.clear()
+        self._approved.clear()
+        self._window_date = None
+        self._save_state()
+    
+    def _save_state(self):
+        """Snapshot the window to state_path (atomic replace)"""
+        if not self.state_path:
+            return
+        open_ids = {id(t) for trades in self.open_day_trades.values() for t in trades}
+        state = {
+            "day_trades": [
+                dict(asdict(t), open_time=t.open_time.isoformat(), close_time=t.close_time.isoformat(),
+                     open=id(t) in open_ids)
+                for t in self.day_trades
+            ]
+        }
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logger.error(f"Failed to save PDT state to {self.state_path}: {e}")
+    
+    def _load_state(self):
+        """Restore trades still inside the window from state_path"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            trades = sorted(
+                ((DayTrade(t["symbol"], datetime.fromisoformat(t["open_time"]),
+                           datetime.fromisoformat(t["close_time"]), t["strategy"]), t.get("open", False))
+                 for t in state.get("day_trades", [])),
+                key=lambda item: item[0].open_time
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Ignoring unreadable PDT state in {self.state_path}: {e}")
+            return
+        for trade, is_open in trades:
+            self.day_trades.append(trade)
+            if is_open:
+                self.open_day_trades[trade.symbol].append(trade)
+        self._expire()
+        logger.info(f"Restored {len(self.day_trades)} day trades from {self.state_path}")
     
     def get_status(self) -> Dict:
         """Get current PDT and risk status"""
+        trades_used = self.get_trades_this_week()
+        remaining = max(0, MAX_DAY_TRADES - trades_used)
+        recent = list(self.day_trades)[-5:]  # Last 5 trades
         return {
-            "trades_used": self.get_trades_this_week(),
-            "trades_remaining": self.get_remaining_trades(),
-            "can_day_trade": self.can_day_trade(),
+            "trades_used": trades_used,
+            "trades_remaining": remaining,
+            "can_day_trade": remaining > 0,
             "week_start": self.week_start.isoformat(),
             "recent_trades": [
                 {
@@ -133,13 +300,31 @@ class PDTTracker:
                     "strategy": t.strategy,
                     "time": t.open_time.isoformat()
                 }
-                for t in self.day_trades[-5:]  # Last 5 trades
+                for t in recent
             ],
             "risk_rules": RISK_RULES,
-            "pending_allocations": len(self.allocator.pending_requests),
+            "pending_allocations": self.allocator.get_stats()["pending"],
             "emergency_trades_reserved": self.allocator.emergency_reserve
         }
 
 
-# Global PDT tracker instance
-pdt_tracker = PDTTracker()
\ No newline at end of file
+# Global PDT tracker instance, built on first use
+_pdt_tracker: Optional[PDTTracker] = None
+_pdt_tracker_lock = threading.Lock()
+
+
+def get_pdt_tracker() -> PDTTracker:
+    """Get the global PDT tracker, creating it (and loading PDT_STATE_PATH) on first call"""
+    global _pdt_tracker
+    if _pdt_tracker is None:
+        with _pdt_tracker_lock:
+            if _pdt_tracker is None:
+                _pdt_tracker = PDTTracker(state_path=os.environ.get('PDT_STATE_PATH'))
+    return _pdt_tracker
+
+
+def __getattr__(name):
+    # `from pdt_tracker import pdt_tracker` still works, it just builds the tracker then
+    if name == "pdt_tracker":
+        return get_pdt_tracker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Symbol-Sharded Strategy Execution
+
+Runs strategies in N worker processes so tick processing can use more
+than one core. Each symbol is hashed to a fixed shard, every shard loads
+its own copy of the configured strategies, and emitted signals come back
+to the parent process where they are published on the event bus.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+from events import event_bus, EventBus, EventType, SignalEvent
+from strategies import load_strategies, MarketData
+import clock
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for_symbol(symbol: str, num_shards: int) -> int:
+    """Stable symbol -> shard mapping (built-in hash() is salted per process)"""
+    return zlib.crc32(symbol.encode()) % num_shards
+
+
+def _shard_worker(shard_id: int, strategy_config: Dict, inbox, outbox):
+    """Worker process: run every strategy against each batch of market data"""
+    strategies = load_strategies(strategy_config)
+    
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        
+        signals = []
+        for data in batch:
+            for strategy in strategies:
+                try:
+                    signal = strategy.analyze(data)
+                    if strategy.should_emit_signal(signal):
+                        # Plain tuples keep the return channel cheap to pickle
+                        signals.append((
+                            strategy.name,
+                            signal.symbol,
+                            signal.action,
+                            signal.confidence,
+                            strategy.estimate_profit(signal)
+                        ))
+                except Exception as e:
+                    logger.error(f"Shard {shard_id} strategy {strategy.name} error: {e}")
+        
+        outbox.put((shard_id, len(batch), signals))
+    
+    outbox.put((shard_id, 0, None))
+
+
+class ShardedStrategyRunner:
+    """Fans market data out to strategy worker processes by symbol"""
+    
+    def __init__(self, strategy_config: Dict, num_shards: int = 2,
+                 max_queue_size: int = 10000, bus: Optional[EventBus] = None):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.strategy_config = strategy_config
+        self.num_shards = num_shards
+        self.max_queue_size = max_queue_size
+        self.bus = bus or event_bus
+        self.processes: List[multiprocessing.Process] = []
+        self.inboxes = []
+        self.outbox = None
+        self.collector_thread = None
+        self.running = False
+        
+        # Per-shard counters (submitted by the caller, processed by the collector)
+        self.submitted = [0] * num_shards
+        self.processed = [0] * num_shards
+        self.signals_received = 0
+    
+    def start(self):
+        """Start worker processes and the signal collector thread"""
+        ctx = multiprocessing.get_context()
+        self.outbox = ctx.Queue()
+        
+        for shard_id in range(self.num_shards):
+            inbox = ctx.Queue(maxsize=self.max_queue_size)
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(shard_id, self.strategy_config, inbox, self.outbox),
+                daemon=True,
+                name=f"StrategyShard-{shard_id}"
+            )
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+        
+        self.running = True
+        self.collector_thread = threading.Thread(
+            target=self._collect_signals,
+            daemon=True,
+            name="ShardCollector"
+        )
+        self.collector_thread.start()
+        logger.info(f"Started {self.num_shards} strategy shards")
+    
+    def submit(self, data: MarketData):
+        """Route one market data update to its symbol's shard"""
+        self.submit_batch([data])
+    
+    def submit_batch(self, batch: List[MarketData]):
+        """Route a batch of updates, sending one message per shard"""
+        by_shard: Dict[int, List[MarketData]] = {}
+        for data in batch:
+            by_shard.setdefault(shard_for_symbol(data.symbol, self.num_shards), []).append(data)
+        
+        for shard_id, shard_batch in by_shard.items():
+            self.inboxes[shard_id].put(shard_batch)
+            self.submitted[shard_id] += len(shard_batch)
+    
+    def _collect_signals(self):
+        """Publish signals returned by the workers on the parent's event bus"""
+        finished = 0
+        while finished < self.num_shards:
+            shard_id, count, signals = self.outbox.get()
+            if signals is None:
+                finished += 1
+                continue
+            
+            # Stamped here: the parent owns the engine clock (simulated in replays)
+            timestamp = clock.now()
+            for strategy, symbol, action, confidence, estimated_profit in signals:
+                self.signals_received += 1
+                self.bus.emit(EventType.SIGNAL_GENERATED, SignalEvent(
+                    strategy=strategy,
+                    symbol=symbol,
+                    action=action,
+                    confidence=confidence,
+                    estimated_profit=estimated_profit,
+                    timestamp=timestamp
+                ))
+            self.processed[shard_id] += count
+    
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """Wait until every submitted update has been processed"""
+        deadline = time.monotonic() + timeout
+        while self.processed != self.submitted:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    
+    def stop(self, timeout: float = 5.0):
+        """Let workers finish queued data, then shut them down"""
+        if not self.running:
+            return
+        self.running = False
+        
+        for inbox in self.inboxes:
+            inbox.put(None)
+        if self.collector_thread:
+            self.collector_thread.join(timeout)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        
+        self.processes = []
+        self.inboxes = []
+        logger.info("Strategy shards stopped")
+    
+    def get_stats(self) -> Dict:
+        """Get per-shard throughput counters"""
+        return {
+            "num_shards": self.num_shards,
+            "submitted": list(self.submitted),
+            "processed": list(self.processed),
+            "backlog": [s - p for s, p in zip(self.submitted, self.processed)],
+            "signals_received": self.signals_received,
+        }
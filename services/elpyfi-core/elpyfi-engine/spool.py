@@ -0,0 +1,409 @@
+"""
+Write-Ahead Spool for Degraded Database Mode
+
+When Postgres is unreachable or its schema doesn't match, signal and
+position writes are appended to a local spool instead of being dropped.
+A background replayer drains the spool into the database once it is
+healthy again.
+
+On-disk layout (one JSON object per line):
+
+    <dir>/active.jsonl                     records being appended
+    <dir>/segment-<n>.jsonl                sealed segments waiting for replay
+    <dir>/segment-<n>.jsonl.offset         replay checkpoint (bytes consumed)
+    <dir>/rejected.jsonl                   records the database refused
+
+Appends are flushed to the OS immediately and fsynced in batches (every
+fsync_batch records or fsync_interval seconds). Replay is idempotent: a
+checkpoint is written after every committed batch, and the database side
+skips records it already has (see DatabaseWriter.replay_spooled).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import psycopg2
+from psycopg2.pool import PoolError
+import clock
+
+logger = logging.getLogger(__name__)
+
+SPOOL_KINDS = ("signal", "position.opened", "position.closed", "position.reduced")
+
+# Errors that mean "database unavailable" rather than "bad record"
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+ACTIVE_FILE = "active.jsonl"
+REJECTED_FILE = "rejected.jsonl"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class WriteSpool:
+    """Append-only JSONL spool with batched fsync and replay checkpoints"""
+    
+    def __init__(self, directory: str, fsync_batch: int = 64, fsync_interval: float = 0.5):
+        self.directory = directory
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._sync_stop = threading.Event()
+        self._sync_thread = None
+        
+        # Metrics
+        self.appended = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.fsyncs = 0
+    
+    @property
+    def active_path(self) -> str:
+        return os.path.join(self.directory, ACTIVE_FILE)
+    
+    # Appending
+    
+    def append(self, kind: str, data: Dict[str, Any]) -> str:
+        """Durably queue one write. Returns the record id used for idempotent replay."""
+        if kind not in SPOOL_KINDS:
+            raise ValueError(f"Unknown spool record kind: {kind}")
+        record_id = uuid.uuid4().hex
+        line = json.dumps({
+            "id": record_id,
+            "kind": kind,
+            "ts": clock.now().isoformat(),
+            "data": data,
+        }, default=str) + "\n"
+        
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.active_path, "a", encoding="utf-8")
+                self._start_sync_thread()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            self.appended += 1
+            if (self._unsynced >= self.fsync_batch
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._fsync()
+        return record_id
+    
+    def _fsync(self):
+        # Caller holds self._lock
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def sync(self):
+        """fsync any appended records that haven't been synced yet"""
+        with self._lock:
+            self._fsync()
+    
+    def _start_sync_thread(self):
+        # Bounds how long the last records of a burst stay unsynced
+        if self._sync_thread is None:
+            self._sync_stop.clear()
+            self._sync_thread = threading.Thread(target=self._sync_loop, daemon=True, name="SpoolSync")
+            self._sync_thread.start()
+    
+    def _sync_loop(self):
+        while not self._sync_stop.wait(self.fsync_interval):
+            self.sync()
+    
+    def close(self):
+        """Sync and close the active file"""
+        self._sync_stop.set()
+        if self._sync_thread:
+            self._sync_thread.join(timeout=5)
+            self._sync_thread = None
+        with self._lock:
+            self._fsync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
+    # Segments
+    
+    def seal(self) -> Optional[str]:
+        """Move the active file to a new segment so it can be replayed"""
+        with self._lock:
+            if self._file is not None:
+                self._fsync()
+                self._file.close()
+                self._file = None
+            if not os.path.exists(self.active_path) or os.path.getsize(self.active_path) == 0:
+                return None
+            segment = os.path.join(self.directory, f"{SEGMENT_PREFIX}{time.time_ns()}{SEGMENT_SUFFIX}")
+            os.replace(self.active_path, segment)
+            return segment
+    
+    def segments(self) -> List[str]:
+        """Sealed segments in append order"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+    
+    def read_segment(self, segment: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (offset after record, record) from the segment's checkpoint on"""
+        offset = self.checkpoint_of(segment)
+        with open(segment, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    # A torn write from a crash mid-append
+                    logger.warning(f"Skipping unreadable spool record in {segment} at byte {offset - len(line)}")
+    
+    def checkpoint_of(self, segment: str) -> int:
+        try:
+            with open(segment + ".offset") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+    
+    def checkpoint(self, segment: str, offset: int, replayed: int = 0):
+        """Record that the segment has been replayed up to offset"""
+        tmp = segment + ".offset.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, segment + ".offset")
+        self.replayed += replayed
+    
+    def remove_segment(self, segment: str):
+        """Delete a fully replayed segment and its checkpoint"""
+        for path in (segment, segment + ".offset"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def reject(self, record: Dict[str, Any], reason: str):
+        """Set aside a record the database refuses so replay can move on"""
+        with open(os.path.join(self.directory, REJECTED_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(record, error=reason), default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.rejected += 1
+    
+    def pending_bytes(self) -> int:
+        """Bytes of spooled records not yet replayed"""
+        total = 0
+        for segment in self.segments():
+            total += os.path.getsize(segment) - self.checkpoint_of(segment)
+        if os.path.exists(self.active_path):
+            total += os.path.getsize(self.active_path)
+        return total
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spool size and replay metrics"""
+        return {
+            "directory": self.directory,
+            "pending_bytes": self.pending_bytes(),
+            "segments": len(self.segments()),
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "rejected": self.rejected,
+            "fsyncs": self.fsyncs,
+        }
+
+
+class SpoolWriter:
+    """Stands in for DatabaseWriter while there is no database at all"""
+    
+    def __init__(self, spool: WriteSpool):
+        self.spool = spool
+        self.schema_validated = False
+        self.last_schema_error = None
+    
+    def write_signal(self, signal_event):
+        self.spool.append("signal", signal_record(signal_event))
+        return None
+    
+    def write_position_opened(self, symbol: str, quantity: float, entry_price: float,
+                              strategy: str, order_id: str):
+        self.spool.append("position.opened", {
+            "symbol": symbol,
+            "quantity": quantity,
+            "entry_price": entry_price,
+            "strategy": strategy,
+            "order_id": order_id,
+        })
+        return None
+    
+    def write_position_closed(self, position_id: int, exit_price: float, realized_pl: float):
+        self.spool.append("position.closed", {
+            "position_id": position_id,
+            "exit_price": exit_price,
+            "realized_pl": realized_pl,
+        })
+    
+    def write_position_reduced(self, order_id: str, quantity: float, exit_price: float,
+                               realized_pl: float, fully_closed: bool):
+        self.spool.append("position.reduced", {
+            "order_id": order_id,
+            "quantity": quantity,
+            "exit_price": exit_price,
+            "realized_pl": realized_pl,
+            "fully_closed": fully_closed,
+        })
+    
+    def write_position_marks(self, marks):
+        return None  # Not spooled; marks stay dirty and are rewritten once the database is back
+    
+    def attempt_schema_revalidation(self) -> bool:
+        return False
+
+
+def signal_record(signal_event) -> Dict[str, Any]:
+    """Spool payload for a SignalEvent"""
+    return {
+        "strategy": signal_event.strategy,
+        "symbol": signal_event.symbol,
+        "action": signal_event.action,
+        "confidence": signal_event.confidence,
+        "estimated_profit": getattr(signal_event, 'estimated_profit', None),
+        "metadata": getattr(signal_event, 'metadata', None),
+        "timestamp": signal_event.timestamp,
+    }
+
+
+class SpoolReplayer:
+    """Drains spool segments into the database on a background thread"""
+    
+    def __init__(self, spool: WriteSpool, get_writer: Callable, batch_size: int = 500,
+                 retry_interval: float = 30.0):
+        self.spool = spool
+        self.get_writer = get_writer
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._replay_lock = threading.Lock()
+        
+        # Metrics
+        self.replays = 0
+        self.replay_failures = 0
+        self.last_error = None
+    
+    def start(self):
+        """Start the replay thread"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="SpoolReplayer")
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop the replay thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+    
+    def trigger(self):
+        """Ask for a replay now (e.g. the schema monitor saw the database recover)"""
+        self._wake.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.retry_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self.spool.pending_bytes():
+                self.replay()
+    
+    def _writer(self):
+        """The current writer if it can take a replay, else None"""
+        try:
+            writer = self.get_writer()
+        except RuntimeError:
+            return None
+        if not getattr(writer, 'schema_validated', False) or not hasattr(writer, 'replay_spooled'):
+            return None
+        return writer
+    
+    def replay(self) -> int:
+        """Replay every sealed segment (sealing the active file first). Returns records written."""
+        writer = self._writer()
+        if writer is None:
+            return 0
+        
+        with self._replay_lock:
+            self.spool.seal()
+            replayed_before = self.spool.replayed
+            try:
+                for segment in self.spool.segments():
+                    self._replay_segment(writer, segment)
+                    self.spool.remove_segment(segment)
+                self.last_error = None
+            except psycopg2.Error as e:
+                self.replay_failures += 1
+                self.last_error = str(e)
+                logger.warning(f"Spool replay stopped, will retry: {e}")
+            self.replays += 1
+            # Counted at each checkpoint, so batches committed before a failure are included
+            written = self.spool.replayed - replayed_before
+            if written:
+                logger.info(f"Replayed {written} spooled writes into the database")
+            return written
+    
+    def _replay_segment(self, writer, segment: str):
+        batch = []
+        offset = self.spool.checkpoint_of(segment)
+        for offset, record in self.spool.read_segment(segment):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.spool.checkpoint(segment, offset, self._replay_batch(writer, batch))
+                batch = []
+        if batch:
+            self.spool.checkpoint(segment, offset, self._replay_batch(writer, batch))
+    
+    def _replay_batch(self, writer, batch: List[Dict[str, Any]]) -> int:
+        try:
+            return writer.replay_spooled(batch)
+        except CONNECTION_ERRORS:
+            raise  # Database went away again - keep the checkpoint and retry later
+        except psycopg2.Error:
+            # Find the offending records one at a time and set them aside
+            written = 0
+            for record in batch:
+                try:
+                    written += writer.replay_spooled([record])
+                except CONNECTION_ERRORS:
+                    raise
+                except psycopg2.Error as e:
+                    logger.error(f"Database rejected spooled {record.get('kind')} {record.get('id')}: {e}")
+                    self.spool.reject(record, str(e))
+            return written
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spool and replay metrics"""
+        stats = self.spool.get_stats()
+        stats.update({
+            "replays": self.replays,
+            "replay_failures": self.replay_failures,
+            "last_error": self.last_error,
+        })
+        return stats
@@ -9,7 +9,7 @@ from typing import Dict, List, Type
 
 # Base imports
 from strategies.base import Strategy
-from strategies.models import StrategyConfig, Signal, MarketData
+from strategies.models import StrategyConfig, Signal, MarketData, MarketSnapshot, BatchSignals
 
 # Import strategies
 from strategies.solar_flare import SolarFlareStrategy
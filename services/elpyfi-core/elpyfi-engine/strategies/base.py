@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any
-from strategies.models import StrategyConfig, Signal, MarketData
+import numpy as np
+from strategies.models import (
+    StrategyConfig, Signal, MarketData, MarketSnapshot, BatchSignals, ACTION_CODES
+)
 
 
 class Strategy(ABC):
@@ -41,6 +44,39 @@ class Strategy(ABC):
         """
         pass
     
+    def analyze_batch(self, snapshot: MarketSnapshot) -> BatchSignals:
+        """
+        Analyze many symbols at once.
+        
+        The default calls analyze() once per row. Override with a
+        vectorized implementation for strategies evaluated over large
+        symbol universes.
+        
+        Args:
+            snapshot: Columnar market data, one row per symbol
+            
+        Returns:
+            BatchSignals: Action codes and confidences aligned with snapshot rows
+        """
+        n = len(snapshot)
+        actions = np.zeros(n, dtype=np.int8)
+        confidence = np.zeros(n)
+        target_price = np.full(n, np.nan)
+        stop_price = np.full(n, np.nan)
+        row_metadata = [None] * n
+        
+        for i in range(n):
+            signal = self.analyze(snapshot.row(i))
+            actions[i] = ACTION_CODES[signal.action]
+            confidence[i] = signal.confidence
+            if signal.target_price is not None:
+                target_price[i] = signal.target_price
+            if signal.stop_price is not None:
+                stop_price[i] = signal.stop_price
+            row_metadata[i] = signal.metadata
+        
+        return BatchSignals(actions, confidence, target_price, stop_price, row_metadata=row_metadata)
+    
     @abstractmethod
     def estimate_profit(self, signal: Signal) -> float:
         """
@@ -0,0 +1,152 @@
+"""
+Planetary K-index Provider
+
+Keeps a cached K-index that is refreshed on a background thread, so
+strategies can read it on every tick without a network round-trip.
+Sources are pluggable: NOAA for live trading, a JSON file or a static
+value for offline runs and tests.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+NOAA_K_INDEX_URL = "https://services.swpc.noaa.gov/json/planetary_k_index_1m.json"
+
+
+def parse_noaa_k_index(data: List[Dict[str, Any]]) -> int:
+    """Get the latest K-index (last item) from NOAA's JSON feed, clamped to 1-9"""
+    if not data:
+        raise ValueError("K-index feed is empty")
+    latest_k = int(data[-1]['k_index'])
+    return max(1, min(9, latest_k))
+
+
+class NOAAKIndexSource:
+    """Fetches the K-index from the NOAA Space Weather API"""
+    
+    def __init__(self, url: str = NOAA_K_INDEX_URL, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+    
+    def fetch(self) -> int:
+        import requests  # Only live runs need the HTTP stack
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return parse_noaa_k_index(response.json())
+
+
+class FileKIndexSource:
+    """Reads a K-index feed saved in NOAA's JSON format"""
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    def fetch(self) -> int:
+        with open(self.path) as f:
+            return parse_noaa_k_index(json.load(f))
+
+
+class StaticKIndexSource:
+    """Always returns the same K-index (tests and demos)"""
+    
+    def __init__(self, k_index: int):
+        self.k_index = k_index
+    
+    def fetch(self) -> int:
+        return self.k_index
+
+
+class KIndexProvider:
+    """Serves a cached K-index and refreshes it in the background"""
+    
+    def __init__(self, source=None, ttl: float = 600.0, refresh_interval: float = 60.0):
+        self.source = source or NOAAKIndexSource()
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._cached = None  # (k_index, fetched_at) - swapped as one tuple, no lock needed
+        self._stop = threading.Event()
+        self._thread = None
+        
+        # Metrics
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.last_error = None
+    
+    def get(self) -> Optional[int]:
+        """Get the cached K-index, or None if it is missing or older than the TTL"""
+        cached = self._cached
+        if cached is None:
+            return None
+        k_index, fetched_at = cached
+        if time.monotonic() - fetched_at > self.ttl:
+            return None
+        return k_index
+    
+    def refresh(self) -> bool:
+        """Fetch a new value from the source. Keeps the old value on failure."""
+        try:
+            k_index = self.source.fetch()
+            self._cached = (k_index, time.monotonic())
+            self.refreshes += 1
+            self.last_error = None
+            logger.info(f"🌞 K-index refreshed: {k_index}")
+            return True
+        except Exception as e:
+            self.refresh_failures += 1
+            self.last_error = str(e)
+            logger.warning(f"Failed to refresh K-index: {e}")
+            return False
+    
+    def start(self):
+        """Start the background refresh thread (first refresh runs immediately)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="KIndexRefresh")
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache age and refresh metrics"""
+        cached = self._cached
+        age = time.monotonic() - cached[1] if cached else None
+        return {
+            "k_index": cached[0] if cached else None,
+            "cache_age_seconds": age,
+            "stale": age is None or age > self.ttl,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "last_error": self.last_error,
+        }
+
+
+# Shared provider used by every strategy instance
+k_index_provider = None
+_k_index_provider_lock = threading.Lock()
+
+def get_k_index_provider() -> KIndexProvider:
+    """Get the shared NOAA-backed provider, starting it on first use"""
+    global k_index_provider
+    if k_index_provider is None:
+        with _k_index_provider_lock:
+            if k_index_provider is None:
+                provider = KIndexProvider()
+                provider.start()
+                k_index_provider = provider  # Published only once started
+    return k_index_provider
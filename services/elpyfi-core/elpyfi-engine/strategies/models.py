@@ -1,6 +1,8 @@
-from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
 from datetime import datetime
+import numpy as np
+import clock
 
 
 @dataclass
@@ -72,4 +74,129 @@ class MarketData:
     @property
     def is_green_candle(self) -> bool:
         """Check if close > open"""
-        return self.close > self.open
\ No newline at end of file
+        return self.close > self.open
+
+
+# Action codes used by batch analysis
+ACTION_HOLD = 0
+ACTION_BUY = 1
+ACTION_SELL = -1
+ACTION_NAMES = {ACTION_HOLD: "hold", ACTION_BUY: "buy", ACTION_SELL: "sell"}
+ACTION_CODES = {name: code for code, name in ACTION_NAMES.items()}
+
+
+@dataclass
+class MarketSnapshot:
+    """Columnar (struct-of-arrays) market data for many symbols at one time"""
+    symbols: List[str]
+    timestamp: datetime
+    current_price: np.ndarray
+    volume: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    open: np.ndarray
+    close: np.ndarray
+    indicators: Dict[str, np.ndarray] = field(default_factory=dict)  # NaN = missing
+    
+    def __post_init__(self):
+        # Validate column shapes once for the whole batch
+        n = len(self.symbols)
+        for name in ("current_price", "volume", "high", "low", "open", "close"):
+            column = np.asarray(getattr(self, name), dtype=np.float64)
+            if column.shape != (n,):
+                raise ValueError(f"{name} must have one value per symbol")
+            setattr(self, name, column)
+        for name, column in self.indicators.items():
+            column = np.asarray(column, dtype=np.float64)
+            if column.shape != (n,):
+                raise ValueError(f"indicator {name} must have one value per symbol")
+            self.indicators[name] = column
+    
+    def __len__(self) -> int:
+        return len(self.symbols)
+    
+    @classmethod
+    def from_market_data(cls, rows: List[MarketData]) -> "MarketSnapshot":
+        """Build a snapshot from per-symbol MarketData (uses the first timestamp)"""
+        indicator_names = sorted({name for row in rows for name in (row.indicators or {})})
+        return cls(
+            symbols=[row.symbol for row in rows],
+            timestamp=rows[0].timestamp if rows else clock.now(),
+            current_price=np.array([row.current_price for row in rows], dtype=np.float64),
+            volume=np.array([row.volume for row in rows], dtype=np.float64),
+            high=np.array([row.high for row in rows], dtype=np.float64),
+            low=np.array([row.low for row in rows], dtype=np.float64),
+            open=np.array([row.open for row in rows], dtype=np.float64),
+            close=np.array([row.close for row in rows], dtype=np.float64),
+            indicators={
+                name: np.array([(row.indicators or {}).get(name, np.nan) for row in rows],
+                               dtype=np.float64)
+                for name in indicator_names
+            }
+        )
+    
+    def indicator(self, name: str, default: np.ndarray) -> np.ndarray:
+        """Get an indicator column, filling missing values from default"""
+        column = self.indicators.get(name)
+        if column is None:
+            return default
+        return np.where(np.isnan(column), default, column)
+    
+    def row(self, i: int) -> MarketData:
+        """Get a single symbol's data as MarketData"""
+        indicators = {
+            name: float(column[i])
+            for name, column in self.indicators.items()
+            if not np.isnan(column[i])
+        }
+        return MarketData(
+            symbol=self.symbols[i],
+            timestamp=self.timestamp,
+            current_price=float(self.current_price[i]),
+            volume=float(self.volume[i]),
+            high=float(self.high[i]),
+            low=float(self.low[i]),
+            open=float(self.open[i]),
+            close=float(self.close[i]),
+            indicators=indicators
+        )
+
+
+@dataclass
+class BatchSignals:
+    """Vectorized signals for a MarketSnapshot (one entry per symbol)"""
+    actions: np.ndarray                         # int8 ACTION_* codes
+    confidence: np.ndarray                      # 0.0-1.0
+    target_price: Optional[np.ndarray] = None   # NaN = no target
+    stop_price: Optional[np.ndarray] = None     # NaN = no stop
+    metadata: Optional[Dict[str, Any]] = None   # Shared by every row
+    row_metadata: Optional[List[Optional[Dict[str, Any]]]] = None  # Per row, overrides metadata
+    
+    @classmethod
+    def hold(cls, n: int) -> "BatchSignals":
+        """All-hold result for n symbols"""
+        return cls(actions=np.zeros(n, dtype=np.int8), confidence=np.zeros(n))
+    
+    def active_rows(self) -> np.ndarray:
+        """Indices of rows with a non-hold action and positive confidence"""
+        return np.nonzero((self.actions != ACTION_HOLD) & (self.confidence > 0.0))[0]
+    
+    def to_signal(self, i: int, symbol: str) -> Signal:
+        """Materialize a single row as a Signal"""
+        def optional(column):
+            if column is None or np.isnan(column[i]):
+                return None
+            return float(column[i])
+        
+        metadata = self.metadata
+        if self.row_metadata is not None and self.row_metadata[i] is not None:
+            metadata = self.row_metadata[i]
+        
+        return Signal(
+            action=ACTION_NAMES[int(self.actions[i])],
+            confidence=float(self.confidence[i]),
+            symbol=symbol,
+            target_price=optional(self.target_price),
+            stop_price=optional(self.stop_price),
+            metadata=dict(metadata) if metadata else None
+        )
@@ -6,10 +6,13 @@ We ride the electromagnetic waves to tendie town! 🌞⚡💰
 """
 
 from datetime import datetime
+from typing import Optional
 from strategies.base import Strategy
-from strategies.models import StrategyConfig, Signal, MarketData
-import random  # Fallback if API fails
-import requests
+from strategies.models import (
+    StrategyConfig, Signal, MarketData, MarketSnapshot, BatchSignals, ACTION_BUY, ACTION_SELL
+)
+from strategies.k_index import get_k_index_provider
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,7 @@ class SolarFlareStrategy(Strategy):
         self.fibonacci_levels = [0.236, 0.382, 0.618, 0.786, 1.0]
         self.solar_prime_hours = range(10, 15)  # 10 AM - 2 PM EST
         self.test_mode = kwargs.get('test_mode', False)  # Override for testing
+        self.k_index_provider = kwargs.get('k_index_provider')  # Defaults to shared NOAA provider
         
     @property
     def config(self) -> StrategyConfig:
@@ -41,11 +45,11 @@ class SolarFlareStrategy(Strategy):
             if current_hour not in self.solar_prime_hours:
                 return Signal("hold", 0.0, data.symbol)
         
-        # Get "K-index" (fake for demo - would call space weather API)
+        # Get cached K-index (None if we have no fresh space weather data)
         k_index = self._get_solar_k_index()
         
         # Need geomagnetic storm conditions (K-index > 5)
-        if k_index < 5:
+        if k_index is None or k_index < 5:
             return Signal("hold", 0.0, data.symbol)
         
         # Check VWAP deviation
@@ -56,12 +60,7 @@ class SolarFlareStrategy(Strategy):
         if (vwap_deviation > 0.002 and  # Price above VWAP by 0.2%
             data.volume > data.indicators.get('avg_volume', data.volume) * 1.5):  # Volume spike
             
-            # Calculate cosmic confidence
-            base_confidence = 0.75
-            solar_multiplier = min(k_index / 9.0, 1.0)  # Max out at K=9
-            aurora_bonus = 0.1 if k_index >= 7 else 0  # Aurora borealis visible!
-            
-            confidence = base_confidence * solar_multiplier + aurora_bonus
+            confidence = self._buy_confidence(k_index)
             
             # Set Fibonacci targets
             target_price = data.current_price * (1 + self.fibonacci_levels[1])  # 38.2% target
@@ -69,22 +68,18 @@ class SolarFlareStrategy(Strategy):
             
             return Signal(
                 action="buy",
-                confidence=min(confidence, 0.95),  # Cap at 95%
+                confidence=confidence,
                 symbol=data.symbol,
                 target_price=target_price,
                 stop_price=stop_price,
-                metadata={
-                    "k_index": k_index,
-                    "solar_status": self._get_solar_status(k_index),
-                    "electromagnetic_level": "MAXIMUM TENDIES" if k_index >= 8 else "Charged"
-                }
+                metadata=self._buy_metadata(k_index)
             )
         
         # Check for short opportunity during solar reversal
         elif (vwap_deviation < -0.002 and 
               data.volume > data.indicators.get('avg_volume', data.volume) * 1.5):
             
-            confidence = 0.65 * (k_index / 9.0)  # Lower confidence for shorts
+            confidence = self._sell_confidence(k_index)
             
             return Signal(
                 action="sell",
@@ -92,11 +87,86 @@ class SolarFlareStrategy(Strategy):
                 symbol=data.symbol,
                 target_price=data.current_price * (1 - self.fibonacci_levels[0]),  # 23.6% target
                 stop_price=data.current_price * 1.015,
-                metadata={"k_index": k_index, "solar_status": "Magnetic Reversal"}
+                metadata=self._sell_metadata(k_index)
             )
         
         return Signal("hold", 0.0, data.symbol)
     
+    def analyze_batch(self, snapshot: MarketSnapshot) -> BatchSignals:
+        """Vectorized VWAP-deviation / volume-spike rule over a whole snapshot"""
+        n = len(snapshot)
+        
+        # Time and K-index gates apply to the whole snapshot
+        if not self.test_mode and snapshot.timestamp.hour not in self.solar_prime_hours:
+            return BatchSignals.hold(n)
+        
+        k_index = self._get_solar_k_index()
+        if k_index is None or k_index < 5:
+            return BatchSignals.hold(n)
+        
+        price = snapshot.current_price
+        vwap = snapshot.indicator('vwap', price)
+        avg_volume = snapshot.indicator('avg_volume', snapshot.volume)
+        
+        vwap_deviation = (price - vwap) / vwap
+        volume_spike = snapshot.volume > avg_volume * 1.5
+        buy = (vwap_deviation > 0.002) & volume_spike
+        sell = (vwap_deviation < -0.002) & volume_spike
+        
+        actions = np.zeros(n, dtype=np.int8)
+        actions[buy] = ACTION_BUY
+        actions[sell] = ACTION_SELL
+        
+        confidence = np.zeros(n)
+        confidence[buy] = self._buy_confidence(k_index)
+        confidence[sell] = self._sell_confidence(k_index)
+        
+        target_price = np.full(n, np.nan)
+        target_price[buy] = price[buy] * (1 + self.fibonacci_levels[1])
+        target_price[sell] = price[sell] * (1 - self.fibonacci_levels[0])
+        
+        stop_price = np.full(n, np.nan)
+        stop_price[buy] = price[buy] * 0.985
+        stop_price[sell] = price[sell] * 1.015
+        
+        # Same metadata as analyze() gives each side (signals are sparse, so a list is cheap)
+        row_metadata = [None] * n
+        buy_metadata = self._buy_metadata(k_index)
+        sell_metadata = self._sell_metadata(k_index)
+        for i in np.nonzero(buy)[0]:
+            row_metadata[i] = buy_metadata
+        for i in np.nonzero(sell)[0]:
+            row_metadata[i] = sell_metadata
+        
+        return BatchSignals(
+            actions=actions,
+            confidence=confidence,
+            target_price=target_price,
+            stop_price=stop_price,
+            row_metadata=row_metadata
+        )
+    
+    def _buy_metadata(self, k_index: int) -> dict:
+        return {
+            "k_index": k_index,
+            "solar_status": self._get_solar_status(k_index),
+            "electromagnetic_level": "MAXIMUM TENDIES" if k_index >= 8 else "Charged"
+        }
+    
+    def _sell_metadata(self, k_index: int) -> dict:
+        return {"k_index": k_index, "solar_status": "Magnetic Reversal"}
+    
+    def _buy_confidence(self, k_index: int) -> float:
+        """Calculate cosmic confidence for a long breakout"""
+        base_confidence = 0.75
+        solar_multiplier = min(k_index / 9.0, 1.0)  # Max out at K=9
+        aurora_bonus = 0.1 if k_index >= 7 else 0  # Aurora borealis visible!
+        return min(base_confidence * solar_multiplier + aurora_bonus, 0.95)  # Cap at 95%
+    
+    def _sell_confidence(self, k_index: int) -> float:
+        """Lower confidence for shorts during solar reversal"""
+        return 0.65 * (k_index / 9.0)
+    
     def estimate_profit(self, signal: Signal) -> float:
         if signal.action == "buy":
             # Higher K-index = higher profit potential (more HFT disruption)
@@ -108,34 +178,15 @@ class SolarFlareStrategy(Strategy):
             return 0.01  # Conservative 1% for shorts
         return 0.0
     
-    def _get_solar_k_index(self) -> int:
-        """Get current planetary K-index from NOAA Space Weather API"""
+    def _get_solar_k_index(self) -> Optional[int]:
+        """Get current planetary K-index from the cached provider (never blocks)"""
         # Test mode: always return high K-index
         if self.test_mode:
-            logger.info("🌞 Test mode: Using K-index 7 (Aurora level!)")
+            logger.debug("🌞 Test mode: Using K-index 7 (Aurora level!)")
             return 7
-            
-        try:
-            # Real space weather data!
-            response = requests.get(
-                "https://services.swpc.noaa.gov/json/planetary_k_index_1m.json",
-                timeout=2
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data and len(data) > 0:
-                # Get the latest K-index (last item in array)
-                latest_k = int(data[-1]['k_index'])
-                logger.info(f"🌞 Real K-index from NOAA: {latest_k}")
-                return max(1, min(9, latest_k))  # Ensure 1-9 range
-                
-        except Exception as e:
-            logger.warning(f"Failed to get solar data: {e}, using random")
-        
-        # Fallback to weighted random if API fails
-        weights = [30, 25, 20, 10, 8, 4, 2, 0.8, 0.2]  # K-index 1-9 weights
-        return random.choices(range(1, 10), weights=weights)[0]
+        
+        provider = self.k_index_provider or get_k_index_provider()
+        return provider.get()
     
     def _get_solar_status(self, k_index: int) -> str:
         """Convert K-index to fun status"""
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the PDT allocator queue
+Tests top-K bounding, request aging, de-duplication and strategy success rates
+"""
+
+import time
+import unittest
+from datetime import datetime, timedelta
+from allocator import PDTAllocator, StrategyStats
+from clock import SimulatedClock, set_clock
+from events import SignalEvent, TradeRequestEvent
+
+
+def make_request(strategy, symbol, confidence=0.8, profit=100.0):
+    signal = SignalEvent(strategy, symbol, "buy", confidence, profit, datetime(2024, 1, 2))
+    return TradeRequestEvent(signal, True, 0.02)
+
+
+class TestAllocatorQueue(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedClock(datetime(2024, 1, 2, 10, 0))
+        self.previous = set_clock(self.sim)
+        self.allocator = PDTAllocator(max_pending=5)
+    
+    def tearDown(self):
+        set_clock(self.previous)
+    
+    def test_keeps_only_top_k(self):
+        """Test the queue is bounded and keeps the best requests"""
+        for i in range(20):
+            self.allocator.request_allocation(make_request("s", f"SYM{i}", profit=100 + i))
+        
+        pending = self.allocator.pending_requests
+        self.assertEqual([a.trade_request.signal_event.symbol for a in pending],
+                         ["SYM19", "SYM18", "SYM17", "SYM16", "SYM15"])
+        self.assertEqual(self.allocator.get_stats()["evicted"], 15)
+        
+        approved = self.allocator.get_weekly_allocations(available_trades=3)
+        self.assertEqual([r.signal_event.symbol for r in approved], ["SYM19", "SYM18"])
+        self.assertEqual(self.allocator.pending_requests, [])
+    
+    def test_stale_requests_decay(self):
+        """Test a day-old request loses to a fresh one worth more than half as much"""
+        self.allocator.request_allocation(make_request("s", "OLD", profit=100))
+        self.sim.advance(timedelta(days=1))
+        self.allocator.request_allocation(make_request("s", "NEW", profit=60))
+        
+        old = self.allocator.pending_requests[-1]
+        self.assertAlmostEqual(self.allocator.decayed_score(old), old.score / 2)
+        approved = self.allocator.get_weekly_allocations(available_trades=2)
+        self.assertEqual(approved[0].signal_event.symbol, "NEW")
+    
+    def test_expired_requests_are_dropped(self):
+        """Test requests older than max_age are never allocated"""
+        self.allocator.request_allocation(make_request("s", "AAPL"))
+        self.sim.advance(timedelta(days=6))
+        self.assertEqual(self.allocator.get_weekly_allocations(available_trades=3), [])
+        self.assertEqual(self.allocator.get_stats()["expired"], 1)
+    
+    def test_duplicate_replaces_queued_request(self):
+        """Test a repeat symbol/strategy request replaces the queued one"""
+        self.allocator.request_allocation(make_request("s", "AAPL", profit=500))
+        latest = make_request("s", "AAPL", profit=50)
+        self.allocator.request_allocation(latest)
+        self.allocator.request_allocation(make_request("other", "AAPL", profit=100))
+        
+        pending = self.allocator.pending_requests
+        self.assertEqual(len(pending), 2)
+        self.assertIs(pending[1].trade_request, latest)
+        self.assertEqual(self.allocator.get_stats()["replaced"], 1)
+        
+        # Replaced entries never come back through eviction
+        for i in range(10):
+            self.allocator.request_allocation(make_request("s", f"SYM{i}", profit=1000))
+        self.assertEqual(len(self.allocator.pending_requests), 5)
+        self.assertLessEqual(len(self.allocator._heap), 2 * 5 + 16)
+    
+    def test_strategy_success_rate_feeds_score(self):
+        """Test scores use the strategy's smoothed win rate"""
+        allocator = PDTAllocator(stats=StrategyStats(prior_success=0.8, prior_weight=5))
+        for _ in range(5):
+            allocator.record_outcome("AAPL", "loser", False, -100)
+        allocator.request_allocation(make_request("loser", "AAPL", confidence=1.0, profit=100))
+        allocator.request_allocation(make_request("newcomer", "MSFT", confidence=1.0, profit=100))
+        
+        scores = {a.trade_request.signal_event.strategy: a.score for a in allocator.pending_requests}
+        self.assertAlmostEqual(scores["loser"], 100 * 4 / 10)
+        self.assertAlmostEqual(scores["newcomer"], 80)
+        self.assertEqual(allocator.get_strategy_stats()["loser"]["total_pnl"], -500)
+    
+    def test_large_queue_stays_cheap(self):
+        """Test 100k competing requests are queued and allocated quickly"""
+        allocator = PDTAllocator()
+        requests = [make_request(f"s{i % 7}", f"SYM{i}", profit=i % 997 + 1) for i in range(100000)]
+        start = time.perf_counter()
+        for request in requests:
+            allocator.request_allocation(request)
+        approved = allocator.get_weekly_allocations(available_trades=3)
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertEqual([r.signal_event.estimated_profit for r in approved], [997, 997])
+
+
+if __name__ == "__main__":
+    unittest.main()
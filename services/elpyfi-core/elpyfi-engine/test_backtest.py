@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the historical backtest runner
+Replays small CSV files through the engine with simulated execution
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from backtest import BacktestRunner, load_bars, read_csv_bars
+from db_writer import get_db_writer, set_db_writer
+from events import event_bus, EventType
+from execution import execution_engine
+from pdt_tracker import pdt_tracker
+
+
+def write_bars(path, start_price, spike_at, symbol=None):
+    """Flat bars with one volume spike and price jump"""
+    start = datetime(2024, 1, 2, 10, 0)
+    with open(path, 'w') as f:
+        f.write("timestamp,symbol,open,high,low,close,volume\n" if symbol
+                else "timestamp,open,high,low,close,volume\n")
+        for i in range(30):
+            price = start_price * (1.01 if i == spike_at else 1.0)
+            volume = 5000000 if i == spike_at else 1000000
+            ts = (start + timedelta(minutes=i)).isoformat()
+            cols = [ts, symbol] if symbol else [ts]
+            cols += [price, price * 1.001, price * 0.999, price, volume]
+            f.write(",".join(str(c) for c in cols) + "\n")
+
+
+class TestBarLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def test_symbol_from_file_name(self):
+        """Test files without a symbol column use the file name"""
+        path = os.path.join(self.tmp, "aapl.csv")
+        write_bars(path, 150.0, spike_at=10)
+        bars = list(read_csv_bars(path))
+        self.assertEqual(len(bars), 30)
+        self.assertEqual(bars[0].symbol, "AAPL")
+    
+    def test_merge_is_time_ordered(self):
+        """Test several files merge into one timestamp-ordered stream"""
+        write_bars(os.path.join(self.tmp, "a.csv"), 100.0, 5, symbol="AAA")
+        write_bars(os.path.join(self.tmp, "b.csv"), 200.0, 5, symbol="BBB")
+        bars = list(load_bars([os.path.join(self.tmp, f) for f in ("a.csv", "b.csv")]))
+        
+        self.assertEqual(len(bars), 60)
+        timestamps = [bar.timestamp for bar in bars]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+
+class TestBacktestRunner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        write_bars(os.path.join(self.tmp, "AAPL.csv"), 150.0, spike_at=25)
+        write_bars(os.path.join(self.tmp, "MSFT.csv"), 300.0, spike_at=26)
+        # Runs swap in their own writer; start each test without one and put back whatever was there
+        self.addCleanup(set_db_writer, set_db_writer(None))
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def test_replay_through_engine(self):
+        """Test bars flow through strategies, PDT and simulated execution"""
+        paths = [os.path.join(self.tmp, f) for f in ("AAPL.csv", "MSFT.csv")]
+        runner = BacktestRunner({'solar_flare': {'test_mode': True}}, load_bars(paths))
+        result = runner.run()
+        
+        self.assertEqual(result.bars, 60)
+        self.assertEqual({s['symbol'] for s in result.signals}, {"AAPL", "MSFT"})
+        self.assertEqual(len(result.positions), 2)
+        
+        aapl = next(p for p in result.positions if p['symbol'] == "AAPL")
+        self.assertTrue(aapl['order_id'].startswith("SIM_AAPL"))
+        self.assertAlmostEqual(aapl['entry_price'], 151.5)
+        self.assertEqual(aapl['quantity'], int(100000 * 0.02 / 151.5))
+        
+        # Live components are restored afterwards
+        self.assertIsNone(execution_engine.broker)
+        self.assertRaises(RuntimeError, get_db_writer)
+    
+    def test_runs_are_independent(self):
+        """Test a second run starts from an empty book and leaves the live book alone"""
+        paths = [os.path.join(self.tmp, f) for f in ("AAPL.csv", "MSFT.csv")]
+        live_book = execution_engine.positions
+        first = BacktestRunner({'solar_flare': {'test_mode': True}}, load_bars(paths)).run()
+        second = BacktestRunner({'solar_flare': {'test_mode': True}}, load_bars(paths)).run()
+        
+        self.assertEqual(len(second.positions), len(first.positions))
+        self.assertEqual(len(second.signals), len(first.signals))
+        self.assertIs(execution_engine.positions, live_book)
+    
+    def test_live_pdt_window_and_lanes_survive_a_run(self):
+        """Test a run leaves the live PDT trades and async event lanes as it found them"""
+        from pdt_tracker import DayTrade
+        self.addCleanup(pdt_tracker.restore, pdt_tracker.snapshot())
+        live_trade = DayTrade("TSLA", datetime.now(), datetime.now(), "solar_flare")
+        pdt_tracker.day_trades.append(live_trade)
+        pdt_tracker.open_day_trades["TSLA"].append(live_trade)
+        allocator = pdt_tracker.allocator
+        event_bus.enable_async(EventType.METRICS_UPDATED)
+        self.addCleanup(event_bus.disable_async, EventType.METRICS_UPDATED)
+        
+        paths = [os.path.join(self.tmp, f) for f in ("AAPL.csv", "MSFT.csv")]
+        result = BacktestRunner({'solar_flare': {'test_mode': True}}, load_bars(paths)).run()
+        
+        self.assertNotIn("TSLA", [t['symbol'] for t in result.pdt_status['recent_trades']])
+        self.assertEqual(list(pdt_tracker.day_trades), [live_trade])
+        self.assertEqual(list(pdt_tracker.open_day_trades["TSLA"]), [live_trade])
+        self.assertIs(pdt_tracker.allocator, allocator)
+        self.assertIn(EventType.METRICS_UPDATED, event_bus.get_lane_stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
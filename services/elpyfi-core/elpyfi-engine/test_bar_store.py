@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the memory-mapped bar store
+Tests CSV import, date-range slicing and the engine-facing readers
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from bar_store import BarStore, BAR_DTYPE
+from indicators import IndicatorEngine
+
+START = datetime(2024, 1, 2, 9, 30)
+
+
+def make_bars(n, price=100.0, step=1):
+    bars = np.zeros(n, dtype=BAR_DTYPE)
+    bars["timestamp"] = [np.datetime64(START + timedelta(minutes=i * step), "ns") for i in range(n)]
+    bars["open"] = bars["close"] = price + np.arange(n)
+    bars["high"] = bars["close"] + 1
+    bars["low"] = bars["close"] - 1
+    bars["volume"] = 1000
+    return bars
+
+
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BarStore(self.root)
+        
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        
+    def test_fixed_width_records(self):
+        """Test each bar takes 48 bytes on disk"""
+        self.store.write("AAPL", make_bars(10))
+        self.assertEqual(os.path.getsize(self.store.path_for("AAPL")), 480)
+        self.assertEqual(self.store.symbols(), ["AAPL"])
+        
+    def test_slice_is_zero_copy_view(self):
+        """Test date-range slices are views on the memory map"""
+        self.store.write("AAPL", make_bars(100))
+        view = self.store.slice("AAPL", START + timedelta(minutes=10), START + timedelta(minutes=20))
+        
+        self.assertEqual(len(view), 10)
+        self.assertEqual(view["close"][0], 110.0)
+        self.assertTrue(np.shares_memory(view, self.store.open("AAPL")))
+        
+    def test_append_rejects_out_of_order(self):
+        """Test appends must continue the stored history"""
+        self.store.write("AAPL", make_bars(10))
+        with self.assertRaises(ValueError):
+            self.store.write("AAPL", make_bars(5), append=True)
+            
+    def test_import_csv_in_chunks(self):
+        """Test CSV import across several chunks per symbol"""
+        csv_path = os.path.join(self.root, "bars.csv")
+        with open(csv_path, "w") as f:
+            f.write("timestamp,symbol,open,high,low,close,volume\n")
+            for i in range(25):
+                ts = (START + timedelta(minutes=i)).isoformat()
+                for symbol in ("AAPL", "MSFT"):
+                    f.write(f"{ts},{symbol},{100 + i},{101 + i},{99 + i},{100 + i},{1000}\n")
+        
+        self.assertEqual(self.store.import_csv(csv_path, chunk_size=10), 50)
+        self.assertEqual(len(self.store.open("MSFT")), 25)
+        self.assertEqual(self.store.open("MSFT")["close"][-1], 124.0)
+        
+    def test_iter_market_data_batches(self):
+        """Test MarketData batches come out in timestamp order"""
+        self.store.write("AAPL", make_bars(30))
+        self.store.write("MSFT", make_bars(30, price=300.0))
+        batches = list(self.store.iter_market_data(["AAPL", "MSFT"], batch_size=25))
+        
+        self.assertEqual([len(b) for b in batches], [25, 25, 10])
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual([r.timestamp for r in rows], sorted(r.timestamp for r in rows))
+        self.assertEqual(rows[0].timestamp, START)
+        
+    def test_iter_snapshots(self):
+        """Test snapshots contain only symbols with a bar at that time"""
+        self.store.write("AAPL", make_bars(4))
+        self.store.write("MSFT", make_bars(2, price=300.0, step=2))
+        snapshots = list(self.store.iter_snapshots(["AAPL", "MSFT"]))
+        
+        self.assertEqual(len(snapshots), 4)
+        self.assertEqual(snapshots[0].symbols, ["AAPL", "MSFT"])
+        self.assertEqual(snapshots[1].symbols, ["AAPL"])
+        np.testing.assert_array_equal(snapshots[2].current_price, [102.0, 301.0])
+        
+    def test_warm_up_indicators(self):
+        """Test indicator warm-up uses only bars before the cutoff"""
+        self.store.write("AAPL", make_bars(50))
+        engine = IndicatorEngine(window=5)
+        self.store.warm_up(engine, ["AAPL"], end=START + timedelta(minutes=20), bars=10)
+        self.assertEqual(engine.get("AAPL")["sma"], np.mean([115, 116, 117, 118, 119]))
+
+
+if __name__ == "__main__":
+    unittest.main()
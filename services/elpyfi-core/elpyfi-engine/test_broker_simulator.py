@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the local broker simulator
+Tests quote-based fills, slippage, partial fills, rejections, latency and throughput
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from events import EventBus, EventType, SignalEvent
+from execution.orders import OrderTracker
+from execution.quotes import QuoteCache
+from execution.simulator import BrokerSimulator, FillModel, LatencyModel, OrderRejected
+
+
+def make_signal(symbol="AAPL", action="buy"):
+    return SignalEvent("solar_flare", symbol, action, 0.8, 10.0, datetime(2024, 1, 2))
+
+
+class TestBrokerSimulator(unittest.TestCase):
+    def test_fills_at_quote_plus_slippage(self):
+        """Test buys fill at the ask and sells at the bid, both with adverse slippage"""
+        quotes = QuoteCache()
+        quotes.update("AAPL", 99.0, 100.0)
+        broker = BrokerSimulator(quotes=quotes, fill_model=FillModel(slippage_bps=10))
+        
+        _, quantity, price = broker.execute(make_signal())
+        self.assertAlmostEqual(price, 100.0 * 1.001)
+        self.assertEqual(quantity, 20.0)
+        
+        _, _, price = broker.execute(make_signal(action="sell"))
+        self.assertAlmostEqual(price, 99.0 * 0.999)
+    
+    def test_synthetic_spread_from_last_price(self):
+        """Test update_price() gives a spread around the last price (backtest interface)"""
+        broker = BrokerSimulator(fill_model=FillModel(slippage_bps=0, spread_bps=20))
+        broker.update_price("AAPL", 100.0)
+        _, _, price = broker.execute(make_signal())
+        self.assertAlmostEqual(price, 100.1)
+        
+        with self.assertRaises(OrderRejected):
+            broker.execute(make_signal("MSFT"))
+    
+    def test_partial_fills_and_rejections(self):
+        """Test the configured rates show up across many orders"""
+        model = FillModel(partial_fill_prob=0.3, reject_prob=0.1)
+        broker = BrokerSimulator(fill_model=model, seed=7)
+        broker.update_price("AAPL", 100.0)
+        
+        rejected = 0
+        for _ in range(2000):
+            try:
+                _, quantity, _ = broker.execute(make_signal())
+                self.assertLessEqual(quantity, 20.0)
+            except OrderRejected:
+                rejected += 1
+        
+        stats = broker.get_stats()
+        self.assertEqual(stats["rejected"], rejected)
+        self.assertAlmostEqual(rejected / 2000, 0.1, delta=0.03)
+        self.assertAlmostEqual(stats["partially_filled"] / (2000 - rejected), 0.3, delta=0.05)
+    
+    def test_seed_is_reproducible(self):
+        """Test the same seed gives the same fills"""
+        def run():
+            broker = BrokerSimulator(fill_model=FillModel(partial_fill_prob=0.5), seed=42)
+            broker.update_price("AAPL", 100.0)
+            return [broker.execute(make_signal())[1] for _ in range(20)]
+        
+        self.assertEqual(run(), run())
+    
+    def test_latency_is_injected(self):
+        """Test each order waits for a sampled latency"""
+        broker = BrokerSimulator(latency=LatencyModel.constant(20))
+        broker.update_price("AAPL", 100.0)
+        start = time.perf_counter()
+        broker.execute(make_signal())
+        self.assertGreaterEqual(time.perf_counter() - start, 0.02)
+        
+        samples = [LatencyModel.lognormal(5, 0.5).sample(broker.rng) for _ in range(1000)]
+        self.assertAlmostEqual(sorted(samples)[500], 0.005, delta=0.001)
+    
+    def test_trade_updates_reach_tracker(self):
+        """Test fills are delivered to an OrderTracker like the trade-update stream"""
+        bus = EventBus()
+        updates = []
+        bus.subscribe(EventType.ORDER_UPDATED, updates.append)
+        tracker = OrderTracker(bus=bus)
+        broker = BrokerSimulator(fill_model=FillModel(partial_fill_prob=1.0), tracker=tracker, seed=1)
+        broker.update_price("AAPL", 100.0)
+        
+        order_id, quantity, price = broker.execute(make_signal())
+        self.assertEqual([u.status for u in updates], ["partially_filled", "cancelled"])
+        self.assertEqual(updates[-1].quantity, quantity)
+        self.assertEqual(updates[-1].price, price)
+        self.assertEqual(tracker.open_orders(), {})
+    
+    def test_engine_books_tracked_fills_once(self):
+        """Test an engine whose tracker the simulator feeds books each fill once, without a trade feed"""
+        from unittest.mock import Mock, patch
+        from events import event_bus
+        from execution import ExecutionEngine
+        db = Mock()
+        patcher = patch("execution.get_db_writer", return_value=db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, engine.handle_approved_trade)
+        self.addCleanup(event_bus.unsubscribe, EventType.ORDER_UPDATED, engine.handle_order_update)
+        broker = BrokerSimulator(fill_model=FillModel(partial_fill_prob=1.0), tracker=engine.order_tracker, seed=1)
+        broker.update_price("AAPL", 100.0)
+        engine.set_broker(broker)
+        
+        engine.execute_trade(make_signal())
+        self.assertIsNone(engine.trade_feed)
+        positions = engine.positions.positions()
+        self.assertEqual(len(positions), 1)
+        order = engine.order_tracker.get_completed(positions[0].order_id)
+        self.assertEqual(engine.positions.net_quantity("AAPL"), order.filled_qty)
+        db.write_position_opened.assert_called_once()
+    
+    def test_throughput(self):
+        """Test thousands of orders per second with no latency"""
+        broker = BrokerSimulator(fill_model=FillModel(partial_fill_prob=0.1, reject_prob=0.01))
+        broker.update_price("AAPL", 100.0)
+        signal = make_signal()
+        n = 5000
+        start = time.perf_counter()
+        for _ in range(n):
+            try:
+                broker.execute(signal)
+            except OrderRejected:
+                pass
+        self.assertGreater(n / (time.perf_counter() - start), 2000)
+
+
+class TestBacktestWithSimulator(unittest.TestCase):
+    def test_backtest_uses_fill_model(self):
+        """Test a backtest can fill through the simulator"""
+        from backtest import BacktestRunner, load_bars
+        from test_backtest import write_bars
+        
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, "AAPL.csv")
+        write_bars(path, 150.0, spike_at=25)
+        
+        broker = BrokerSimulator(fill_model=FillModel(slippage_bps=10, spread_bps=0))
+        result = BacktestRunner({'solar_flare': {'test_mode': True}}, load_bars([path]), broker=broker).run()
+        
+        self.assertEqual(len(result.positions), 1)
+        self.assertAlmostEqual(result.positions[0]['entry_price'], 151.5 * 1.001)
+        self.assertEqual(broker.get_stats()["orders"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the engine clock
+Tests simulated time and PDT week rollover driven by it
+"""
+
+import unittest
+from datetime import datetime, timedelta, timezone
+import clock
+from clock import SimulatedClock, WallClock, set_clock
+from events import event_bus, EventType, SignalEvent, TradeRequestEvent
+from pdt_tracker import PDTTracker
+
+
+class TestSimulatedClock(unittest.TestCase):
+    def test_set_and_advance(self):
+        """Test simulated time only moves when told to"""
+        start = datetime(2024, 1, 1, 9, 30)
+        sim = SimulatedClock(start)
+        self.assertEqual(sim.now(), start)
+        
+        sim.advance(timedelta(minutes=5))
+        self.assertEqual(sim.now(), start + timedelta(minutes=5))
+        
+        sim.set(start)  # Never moves backwards
+        self.assertEqual(sim.now(), start + timedelta(minutes=5))
+        
+        with self.assertRaises(ValueError):
+            sim.advance(timedelta(seconds=-1))
+            
+    def test_rejects_mixed_timezones(self):
+        """Test naive and aware datetimes can't be mixed"""
+        sim = SimulatedClock(datetime(2024, 1, 1, tzinfo=timezone.utc))
+        with self.assertRaises(ValueError):
+            sim.set(datetime(2024, 1, 2))
+            
+    def test_global_clock_swap(self):
+        """Test installing a clock changes clock.now() everywhere"""
+        sim = SimulatedClock(datetime(2024, 1, 1))
+        previous = set_clock(sim)
+        try:
+            self.assertEqual(clock.now(), datetime(2024, 1, 1))
+        finally:
+            set_clock(previous)
+        self.assertIsInstance(clock.get_clock(), WallClock)
+
+
+class TestPDTWithSimulatedClock(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedClock(datetime(2024, 1, 1, 10, 0))  # A Monday
+        self.previous = set_clock(self.sim)
+        self.tracker = PDTTracker()
+        
+    def tearDown(self):
+        set_clock(self.previous)
+        event_bus.unsubscribe(EventType.DAY_TRADE_REQUESTED, self.tracker.handle_day_trade_request)
+        event_bus.unsubscribe(EventType.POSITION_CLOSED, self.tracker.record_day_trade)
+        
+    def request_day_trade(self, symbol):
+        signal = SignalEvent("test", symbol, "buy", 0.8, 0.02, clock.now())
+        self.tracker.handle_day_trade_request(TradeRequestEvent(signal, True, 0.05))
+        
+    def test_week_rollover(self):
+        """Test the PDT budget resets on the next Monday, not before"""
+        for symbol in ["AAPL", "MSFT", "TSLA"]:
+            self.request_day_trade(symbol)
+            self.sim.advance(timedelta(hours=1))
+        self.assertFalse(self.tracker.can_day_trade())
+        
+        # Later the same week: still at the limit
+        self.sim.set(datetime(2024, 1, 5, 15, 0))
+        self.assertEqual(self.tracker.get_trades_this_week(), 3)
+        
+        # Next Monday before the original trade time: budget is back
+        self.sim.set(datetime(2024, 1, 8, 9, 0))
+        self.assertEqual(self.tracker.get_trades_this_week(), 0)
+        self.assertTrue(self.tracker.can_day_trade())
+        
+    def test_trades_stamped_with_engine_time(self):
+        """Test recorded trades use the simulated time"""
+        self.request_day_trade("AAPL")
+        self.assertEqual(self.tracker.day_trades[0].open_time, datetime(2024, 1, 1, 10, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batched database write pipeline
+Tests batching, coalesced notifications, queue-full policies and fallback
+"""
+
+import itertools
+import json
+import time
+import unittest
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import Mock, patch
+import psycopg2
+import db_pipeline
+from db_pipeline import WritePipeline, MAX_NOTIFY_BYTES
+from db_writer import DatabaseWriter
+from events import SignalEvent
+
+
+def make_writer():
+    """DatabaseWriter with a mocked connection and a fully known schema"""
+    with patch.object(DatabaseWriter, "_connect"), patch.object(DatabaseWriter, "_validate_schema"):
+        writer = DatabaseWriter("postgresql://test")
+    writer.available_columns = {
+        'signals': ['id', 'strategy', 'symbol', 'action', 'confidence', 'expected_profit', 'metadata'],
+        'positions': ['id', 'symbol', 'quantity', 'entry_price', 'current_price',
+                      'unrealized_pl', 'strategy', 'status', 'order_id'],
+    }
+    writer._refresh_statements()
+    writer.test_cursor = Mock()
+    
+    @contextmanager
+    def cursor():
+        yield writer.test_cursor
+    
+    writer.cursor = cursor
+    writer.write_signal = Mock(return_value=1)
+    writer.write_position_opened = Mock(return_value=1)
+    writer.write_position_closed = Mock()
+    return writer
+
+
+def make_signal(symbol="AAPL"):
+    return SignalEvent(
+        strategy="solar_flare",
+        symbol=symbol,
+        action="buy",
+        confidence=0.8,
+        estimated_profit=12.5,
+        timestamp=datetime(2024, 1, 2, 10, 0)
+    )
+
+
+class FakeExecuteValues:
+    """Records execute_values calls and returns sequential ids"""
+    
+    def __init__(self):
+        self.calls = []
+        self.ids = itertools.count(1)
+    
+    def __call__(self, cur, query, rows, template=None, page_size=100, fetch=False):
+        rows = list(rows)
+        self.calls.append((query, rows))
+        if query.strip().startswith("UPDATE"):
+            return [(row[0], "AAPL", 10, "solar_flare") for row in rows]
+        return [(next(self.ids),) for _ in rows]
+
+
+class FakePositionsTable:
+    """execute_values stand-in that keeps position rows by order_id"""
+    
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = {}
+        self.ids = itertools.count(1)
+    
+    def __call__(self, cur, query, rows, template=None, page_size=100, fetch=False):
+        if "INSERT INTO positions" in query:
+            ids = []
+            for values in rows:
+                row = dict(zip(self.columns, values), id=next(self.ids), realized_pl=0.0)
+                self.rows[row["order_id"]] = row
+                ids.append((row["id"],))
+            return ids
+        if "UPDATE positions" in query:
+            updated = []
+            for order_id, quantity, exit_price, realized_pl, fully_closed in rows:
+                row = self.rows.get(order_id)
+                if row is None or row["status"] != "open":
+                    continue
+                if fully_closed:
+                    row["status"] = "closed"
+                else:
+                    row["quantity"] -= quantity
+                row["current_price"] = exit_price
+                row["realized_pl"] += realized_pl
+                updated.append((order_id, row["id"], row["symbol"], row["quantity"], row["strategy"]))
+            return updated
+        return [(next(self.ids),) for _ in rows]
+
+
+class TestWritePipeline(unittest.TestCase):
+    def setUp(self):
+        self.writer = make_writer()
+        self.execute_values = FakeExecuteValues()
+        patcher = patch.object(db_pipeline, "execute_values", self.execute_values)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def executed(self):
+        return [call.args[0] for call in self.writer.test_cursor.execute.call_args_list]
+    
+    def notifications(self):
+        return [json.loads(call.args[1][0]) for call in self.writer.test_cursor.execute.call_args_list
+                if "pg_notify" in call.args[0]]
+    
+    def test_writes_return_immediately(self):
+        """Test writes are queued, not executed on the caller's thread"""
+        pipeline = WritePipeline(self.writer)
+        self.assertIsNone(pipeline.write_signal(make_signal()))
+        self.assertEqual(pipeline.get_stats()['queue_depth'], 1)
+        self.writer.test_cursor.execute.assert_not_called()
+        self.writer.write_signal.assert_not_called()
+    
+    def test_flush_is_one_transaction_with_one_notification(self):
+        """Test a flush does multi-row inserts inside BEGIN/COMMIT with one NOTIFY"""
+        pipeline = WritePipeline(self.writer)
+        for symbol in ("AAPL", "MSFT", "TSLA"):
+            pipeline.write_signal(make_signal(symbol))
+        pipeline.write_position_opened("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        pipeline.write_position_closed(7, 155.0, 50.0)
+        
+        self.assertEqual(pipeline.flush(), 5)
+        
+        statements = self.executed()
+        self.assertEqual(statements[0], "BEGIN")
+        self.assertEqual(statements[-1], "COMMIT")
+        self.assertEqual(len(self.notifications()), 1)
+        
+        # One statement per table, not per row
+        self.assertEqual(len(self.execute_values.calls), 3)
+        signal_query, signal_rows = self.execute_values.calls[0]
+        self.assertIn("INSERT INTO signals", signal_query)
+        self.assertEqual(len(signal_rows), 3)
+        
+        events = self.notifications()[0]['data']['events']
+        self.assertEqual(self.notifications()[0]['type'], "batch")
+        self.assertEqual([e['type'] for e in events],
+                         ["signal.generated"] * 3 + ["position.opened", "position.closed"])
+        self.assertEqual([e['data']['id'] for e in events[:3]], [1, 2, 3])
+        self.assertEqual(events[3]['data']['order_id'], "ORD_1")
+        self.assertEqual(events[4]['data']['id'], 7)
+        
+        stats = pipeline.get_stats()
+        self.assertEqual(stats['written'], 5)
+        self.assertEqual(stats['flushes'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+    
+    def test_flush_respects_flush_size(self):
+        """Test a large backlog is written in flush_size transactions"""
+        pipeline = WritePipeline(self.writer, flush_size=2)
+        for _ in range(5):
+            pipeline.write_signal(make_signal())
+        pipeline.flush()
+        
+        self.assertEqual(self.executed().count("COMMIT"), 3)
+        self.assertEqual(pipeline.get_stats()['max_batch_size'], 2)
+    
+    def test_large_batches_split_notifications(self):
+        """Test coalesced payloads stay under the NOTIFY size limit"""
+        pipeline = WritePipeline(self.writer)
+        for i in range(200):
+            pipeline.write_signal(make_signal(f"SYM{i}"))
+        pipeline.flush()
+        
+        payloads = [call.args[1][0] for call in self.writer.test_cursor.execute.call_args_list
+                    if "pg_notify" in call.args[0]]
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(p) < MAX_NOTIFY_BYTES for p in payloads))
+        total = sum(len(json.loads(p)['data']['events']) for p in payloads)
+        self.assertEqual(total, 200)
+    
+    def test_failed_batch_falls_back_to_individual_writes(self):
+        """Test a batch error rolls back and retries row by row"""
+        def fail(*args, **kwargs):
+            raise psycopg2.ProgrammingError("column does not exist")
+        
+        pipeline = WritePipeline(self.writer)
+        pipeline.write_signal(make_signal())
+        pipeline.write_position_opened("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        with patch.object(db_pipeline, "execute_values", fail):
+            pipeline.flush()
+        
+        self.assertIn("ROLLBACK", self.executed())
+        self.writer.write_signal.assert_called_once()
+        self.writer.write_position_opened.assert_called_once_with(
+            "AAPL", 10, 150.0, "solar_flare", "ORD_1"
+        )
+        self.assertEqual(pipeline.get_stats()['flush_failures'], 1)
+    
+    def test_unexpected_errors_dont_stop_the_flush_thread(self):
+        """Test non-database errors fall back to row writes and the thread keeps flushing"""
+        def fail(*args, **kwargs):
+            raise TypeError("can't adapt type")
+        
+        self.writer.write_signal.side_effect = [RuntimeError("boom"), 1]
+        pipeline = WritePipeline(self.writer, flush_size=1, flush_interval=0.01)
+        with patch.object(db_pipeline, "execute_values", fail):
+            pipeline.start()
+            try:
+                pipeline.write_signal(make_signal())
+                pipeline.write_signal(make_signal("MSFT"))
+                deadline = time.monotonic() + 2
+                while pipeline.get_stats()['flushes'] < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(pipeline._thread.is_alive())
+            finally:
+                pipeline.stop()
+        
+        stats = pipeline.get_stats()
+        self.assertEqual((stats['flush_failures'], stats['write_errors'], stats['written']), (2, 1, 1))
+        self.assertEqual(self.writer.write_signal.call_count, 2)
+    
+    def test_drop_policy(self):
+        """Test writes are dropped and counted when the queue is full"""
+        pipeline = WritePipeline(self.writer, max_queue_size=2, queue_full_policy="drop")
+        for _ in range(5):
+            pipeline.write_signal(make_signal())
+        
+        stats = pipeline.get_stats()
+        self.assertEqual(stats['enqueued'], 2)
+        self.assertEqual(stats['dropped'], 3)
+        self.writer.write_signal.assert_not_called()
+    
+    def test_sync_policy(self):
+        """Test overflow writes go straight to the writer"""
+        pipeline = WritePipeline(self.writer, max_queue_size=1, queue_full_policy="sync")
+        for _ in range(3):
+            pipeline.write_signal(make_signal())
+        
+        self.assertEqual(self.writer.write_signal.call_count, 2)
+        self.assertEqual(pipeline.get_stats()['sync_writes'], 2)
+        self.assertEqual(pipeline.get_stats()['dropped'], 0)
+    
+    def test_invalid_policy(self):
+        """Test unknown queue-full policies are rejected"""
+        with self.assertRaises(ValueError):
+            WritePipeline(self.writer, queue_full_policy="spill")
+    
+    def test_background_thread_flushes(self):
+        """Test the flush thread writes queued records and reports lag"""
+        pipeline = WritePipeline(self.writer, flush_size=10, flush_interval=0.01).start()
+        try:
+            for _ in range(3):
+                pipeline.write_signal(make_signal())
+            deadline = time.monotonic() + 2
+            while pipeline.get_stats()['written'] < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            pipeline.stop()
+        
+        stats = pipeline.get_stats()
+        self.assertEqual(stats['written'], 3)
+        self.assertGreater(stats['max_lag_ms'], 0)
+        self.assertIsNone(pipeline._thread)
+    
+    def test_stop_flushes_pending_writes(self):
+        """Test stop() writes whatever is still queued"""
+        pipeline = WritePipeline(self.writer, flush_interval=0.05)
+        pipeline.write_signal(make_signal())
+        pipeline.start()
+        pipeline.stop()
+        self.assertEqual(pipeline.get_stats()['written'], 1)
+    
+    def test_engine_closes_positions_through_the_pipeline(self):
+        """Test a position opened and closed in pipeline mode ends up closed in the table"""
+        from events import event_bus, EventType
+        from execution import ExecutionEngine
+        table = FakePositionsTable(self.writer._statements["insert_position"].columns)
+        patcher = patch.object(db_pipeline, "execute_values", table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pipeline = WritePipeline(self.writer)
+        patcher = patch("execution.get_db_writer", return_value=pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, engine.handle_approved_trade)
+        self.addCleanup(event_bus.unsubscribe, EventType.ORDER_UPDATED, engine.handle_order_update)
+        
+        sell = SignalEvent("solar_flare", "AAPL", "sell", 0.8, 10.0, datetime(2024, 1, 2, 10, 0))
+        engine.record_position(make_signal(), "ORD_1", 10, 100.0)
+        engine.record_position(sell, "ORD_2", 4, 110.0)
+        pipeline.flush()
+        row = table.rows["ORD_1"]
+        self.assertEqual((row["status"], row["quantity"], row["realized_pl"]), ("open", 6, 40.0))
+        
+        engine.record_position(sell, "ORD_3", 6, 120.0)
+        pipeline.flush()
+        self.assertEqual((row["status"], row["realized_pl"]), ("closed", 160.0))
+        self.assertEqual(list(table.rows), ["ORD_1"])
+        self.assertEqual(pipeline.get_stats()['write_errors'], 0)
+    
+    def test_forwards_other_attributes(self):
+        """Test the pipeline stands in for the writer everywhere else"""
+        self.writer.schema_validated = True
+        pipeline = WritePipeline(self.writer)
+        self.assertTrue(pipeline.schema_validated)
+        self.assertIs(pipeline.available_columns, self.writer.available_columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
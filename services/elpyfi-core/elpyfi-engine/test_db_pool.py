@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the DatabaseWriter connection pool
+Tests per-call checkout, bounded concurrency, broken-connection recovery and stats
+"""
+
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+import psycopg2
+import psycopg2.pool
+import db_writer
+from db_writer import DatabaseWriter
+from events import SignalEvent
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.cursors = []
+        self.fail_ping = False
+    
+    def cursor(self):
+        cur = Mock()
+        cur.connection = self
+        cur.fetchone.return_value = (42,)
+        cur.__enter__ = Mock(return_value=cur)
+        cur.__exit__ = Mock(return_value=False)
+        if self.fail_ping:
+            cur.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+        self.cursors.append(cur)
+        return cur
+
+
+class FakePool:
+    """Stands in for ThreadedConnectionPool without a server"""
+    
+    def __init__(self, minconn, maxconn, dsn):
+        self.maxconn = maxconn
+        self._pool = []
+        self._used = {}
+        self.created = 0
+        self.closed_on_return = 0
+    
+    def getconn(self):
+        conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            if len(self._used) >= self.maxconn:
+                raise psycopg2.pool.PoolError("connection pool exhausted")
+            conn = FakeConnection()
+            self.created += 1
+        self._used[id(conn)] = conn
+        return conn
+    
+    def putconn(self, conn, close=False):
+        del self._used[id(conn)]
+        if close:
+            conn.closed = 1
+            self.closed_on_return += 1
+        else:
+            self._pool.append(conn)
+    
+    def closeall(self):
+        self._pool.clear()
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(db_writer, "ThreadedConnectionPool", FakePool),
+            patch.object(DatabaseWriter, "_validate_schema", lambda self, force=False: None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def make_writer(self, **settings):
+        writer = DatabaseWriter("postgresql://test", **settings)
+        writer.available_columns = {
+            'signals': ['strategy', 'symbol', 'action', 'confidence'],
+        }
+        writer._refresh_statements()
+        return writer
+    
+    def test_checkout_returns_connection(self):
+        """Test connections are autocommit and go back to the pool"""
+        writer = self.make_writer()
+        with writer.connection() as conn:
+            self.assertTrue(conn.autocommit)
+            self.assertEqual(writer.get_pool_stats()['in_use'], 1)
+        
+        stats = writer.get_pool_stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['checkouts'], 1)
+        
+        # Reused, not reopened
+        with writer.connection():
+            pass
+        self.assertEqual(writer.pool.created, 1)
+    
+    def test_write_uses_one_cursor_for_insert_and_notify(self):
+        """Test the insert and its notification share the checked-out cursor"""
+        writer = self.make_writer()
+        signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+        self.assertEqual(writer.write_signal(signal), 42)
+        
+        conn = writer.pool._pool[0]
+        self.assertEqual(len(conn.cursors), 1)
+        statements = [call.args[0] for call in conn.cursors[0].execute.call_args_list]
+        self.assertIn("INSERT INTO signals", statements[0])
+        self.assertIn("pg_notify", statements[-1])
+        conn.cursors[0].close.assert_called_once()
+    
+    def test_checkout_is_bounded(self):
+        """Test callers wait for a free connection and time out when none frees up"""
+        writer = self.make_writer(max_connections=2, checkout_timeout=0.05)
+        held = threading.Event()
+        release = threading.Event()
+        
+        def hold():
+            with writer.connection():
+                held.set()
+                release.wait(2)
+        
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for t in threads:
+            t.start()
+        held.wait(1)
+        time.sleep(0.05)
+        
+        with self.assertRaises(psycopg2.pool.PoolError):
+            with writer.connection():
+                pass
+        self.assertEqual(writer.get_pool_stats()['checkout_timeouts'], 1)
+        
+        release.set()
+        for t in threads:
+            t.join()
+        with writer.connection():
+            pass
+        self.assertLessEqual(writer.pool.created, 2)
+    
+    def test_broken_connection_is_discarded(self):
+        """Test a connection error closes the connection instead of pooling it"""
+        writer = self.make_writer()
+        with self.assertRaises(psycopg2.OperationalError):
+            with writer.connection():
+                raise psycopg2.OperationalError("server closed the connection")
+        
+        self.assertEqual(writer.pool.closed_on_return, 1)
+        self.assertEqual(writer.get_pool_stats()['discarded_connections'], 1)
+        self.assertEqual(writer.get_pool_stats()['idle'], 0)
+    
+    def test_write_survives_connection_loss(self):
+        """Test a failed write returns None and the next write reconnects"""
+        writer = self.make_writer()
+        signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+        
+        with patch.object(FakeConnection, "cursor", side_effect=psycopg2.OperationalError("gone")):
+            self.assertIsNone(writer.write_signal(signal))
+        self.assertEqual(writer.get_pool_stats()['discarded_connections'], 1)
+        
+        self.assertEqual(writer.write_signal(signal), 42)
+        self.assertEqual(writer.pool.created, 2)
+    
+    def test_closed_connection_is_replaced(self):
+        """Test connections closed while idle are not handed out"""
+        writer = self.make_writer()
+        with writer.connection() as conn:
+            first = conn
+        first.closed = 1
+        
+        with writer.connection() as conn:
+            self.assertIsNot(conn, first)
+            self.assertFalse(conn.closed)
+    
+    def test_idle_connection_health_check(self):
+        """Test idle connections are pinged and replaced if the ping fails"""
+        writer = self.make_writer(health_check_interval=0)
+        with writer.connection() as conn:
+            first = conn
+        first.fail_ping = True
+        
+        with writer.connection() as conn:
+            self.assertIsNot(conn, first)
+        self.assertEqual(writer.get_pool_stats()['health_check_failures'], 1)
+    
+    def test_close(self):
+        """Test close() shuts the pool and further checkouts fail cleanly"""
+        writer = self.make_writer()
+        writer.close()
+        self.assertIsNone(writer.pool)
+        with self.assertRaises(psycopg2.OperationalError):
+            with writer.connection():
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Unit tests for fingerprinted schema validation
+Tests the single catalog query, the fingerprint cache and error-storm rate limiting
+"""
+
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+from psycopg2 import errors as pg_errors
+import db_writer
+from db_writer import DatabaseWriter, SchemaMismatchError
+from events import SignalEvent
+from test_db_pool import FakePool
+
+
+def catalog_rows(schema):
+    return [(table, column) for table in sorted(schema) for column in schema[table]]
+
+
+FULL_SCHEMA = {table: list(columns) for table, columns in DatabaseWriter.EXPECTED_SCHEMA.items()}
+
+
+class FakeCatalogConnection:
+    """Connection whose cursors answer the catalog query from a schema dict"""
+    
+    def __init__(self, catalog):
+        self.closed = 0
+        self.autocommit = True
+        self.catalog = catalog
+    
+    def cursor(self):
+        cur = Mock()
+        cur.connection = self
+        state = {}
+        
+        def execute(sql, params=None):
+            state['sql'] = sql
+            if "pg_catalog.pg_class" in sql:
+                self.catalog.queries += 1
+            elif sql.startswith("EXECUTE") and self.catalog.fail_writes:
+                raise pg_errors.UndefinedColumn('column "metadata" of relation "signals" does not exist')
+        
+        cur.execute.side_effect = execute
+        cur.fetchall.side_effect = lambda: catalog_rows(self.catalog.schema)
+        cur.fetchone.return_value = (1,)
+        return cur
+
+
+class FakeCatalog:
+    def __init__(self, schema):
+        self.schema = {t: list(c) for t, c in schema.items()}
+        self.queries = 0
+        self.fail_writes = False
+
+
+class TestSchemaValidation(unittest.TestCase):
+    def setUp(self):
+        self.catalog = FakeCatalog(FULL_SCHEMA)
+        catalog = self.catalog
+        
+        class CatalogPool(FakePool):
+            def getconn(pool):
+                conn = pool._pool.pop() if pool._pool else FakeCatalogConnection(catalog)
+                pool._used[id(conn)] = conn
+                return conn
+        
+        patcher = patch.object(db_writer, "ThreadedConnectionPool", CatalogPool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def make_writer(self, **settings):
+        return DatabaseWriter("postgresql://test", **settings)
+    
+    def test_one_query_validates_every_table(self):
+        """Test startup validation is a single catalog query"""
+        writer = self.make_writer()
+        self.assertTrue(writer.schema_validated)
+        self.assertEqual(self.catalog.queries, 1)
+        self.assertEqual(set(writer.available_columns), set(DatabaseWriter.EXPECTED_SCHEMA))
+        self.assertIn('order_id', writer.available_columns['positions'])
+        self.assertIsNotNone(writer.schema_fingerprint)
+    
+    def test_missing_column(self):
+        """Test a missing column raises with the per-table details"""
+        self.catalog.schema['positions'].remove('order_id')
+        with self.assertRaises(SchemaMismatchError) as ctx:
+            self.make_writer()
+        self.assertEqual(ctx.exception.schema_issues, {'positions': ['order_id']})
+        self.assertEqual(ctx.exception.missing_tables, [])
+    
+    def test_missing_table(self):
+        """Test a missing table is reported as such"""
+        del self.catalog.schema['signals']
+        with self.assertRaises(SchemaMismatchError) as ctx:
+            self.make_writer()
+        self.assertEqual(ctx.exception.missing_tables, ['signals'])
+    
+    def test_repeated_checks_are_rate_limited(self):
+        """Test checks inside the interval reuse the last result"""
+        writer = self.make_writer(min_schema_check_interval=60)
+        for _ in range(10):
+            writer._validate_schema()
+        self.assertEqual(self.catalog.queries, 1)
+        self.assertEqual(writer.get_schema_stats()['checks_skipped'], 10)
+        
+        writer._validate_schema(force=True)
+        self.assertEqual(self.catalog.queries, 2)
+    
+    def test_unchanged_fingerprint_keeps_statements(self):
+        """Test revalidating an unchanged schema doesn't recompile statements"""
+        writer = self.make_writer(min_schema_check_interval=0)
+        version = writer.schema_version
+        writer._validate_schema()
+        writer._validate_schema()
+        self.assertEqual(writer.schema_version, version)
+        self.assertEqual(writer.get_schema_stats()['cached_shapes'], 1)
+    
+    def test_changed_schema_uses_fingerprint_cache(self):
+        """Test a schema change recompiles, and a known shape is served from cache"""
+        writer = self.make_writer(min_schema_check_interval=0)
+        original = writer.schema_fingerprint
+        version = writer.schema_version
+        
+        self.catalog.schema['signals'].remove('metadata')
+        with self.assertRaises(SchemaMismatchError):
+            writer._validate_schema()
+        self.assertFalse(writer.schema_validated)
+        self.assertNotEqual(writer.schema_fingerprint, original)
+        self.assertNotIn('metadata', writer._statements["insert_signal"].columns)
+        self.assertEqual(writer.schema_version, version + 1)
+        
+        # Column restored: the first snapshot is reused, not rebuilt
+        self.catalog.schema['signals'] = list(FULL_SCHEMA['signals'])
+        with patch.object(DatabaseWriter, "_build_schema_snapshot") as build:
+            writer._validate_schema()
+            build.assert_not_called()
+        self.assertTrue(writer.schema_validated)
+        self.assertEqual(writer.schema_fingerprint, original)
+        self.assertEqual(writer.get_schema_stats()['cached_shapes'], 2)
+    
+    def test_write_error_storm_costs_one_query(self):
+        """Test many schema-mismatch write errors trigger one catalog query"""
+        writer = self.make_writer(min_schema_check_interval=60)
+        self.catalog.fail_writes = True
+        signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+        
+        self.catalog.schema['signals'].remove('metadata')
+        writer._last_schema_check -= 60  # let the first error through
+        for _ in range(50):
+            self.assertIsNone(writer.write_signal(signal))
+        
+        self.assertEqual(self.catalog.queries, 2)
+        self.assertFalse(writer.schema_validated)
+    
+    def test_revalidation_after_fix(self):
+        """Test the schema monitor path picks up a fixed schema"""
+        self.catalog.schema['positions'].remove('order_id')
+        with self.assertRaises(SchemaMismatchError):
+            self.make_writer(min_schema_check_interval=0)
+        
+        # initialize_db_writer re-raises, so build the degraded writer directly
+        with patch.object(DatabaseWriter, "_validate_schema"):
+            writer = self.make_writer(min_schema_check_interval=0)
+        self.assertFalse(writer.attempt_schema_revalidation())
+        
+        self.catalog.schema['positions'].append('order_id')
+        self.assertTrue(writer.attempt_schema_revalidation())
+        self.assertTrue(writer.schema_validated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Unit tests for DatabaseWriter's compiled write statements
+Tests prepare-once reuse, recompilation on schema change and fallbacks
+"""
+
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from psycopg2 import errors as pg_errors
+import db_writer
+from db_writer import DatabaseWriter
+from events import SignalEvent
+from test_db_pool import FakePool, FakeConnection
+
+FULL_SCHEMA = {table: list(columns) for table, columns in DatabaseWriter.EXPECTED_SCHEMA.items()}
+
+
+class TestCompiledStatements(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(db_writer, "ThreadedConnectionPool", FakePool),
+            patch.object(DatabaseWriter, "_validate_schema", lambda self, force=False: None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+    
+    def make_writer(self, schema=None, **settings):
+        writer = DatabaseWriter("postgresql://test", **settings)
+        writer.available_columns = {t: list(c) for t, c in (schema or FULL_SCHEMA).items()}
+        writer._refresh_statements()
+        return writer
+    
+    def statements(self, writer):
+        conn = writer.pool._pool[0]
+        return [call.args[0] for cur in conn.cursors for call in cur.execute.call_args_list]
+    
+    def test_prepared_once_per_connection(self):
+        """Test the INSERT is prepared on first use and then only executed"""
+        writer = self.make_writer()
+        for _ in range(3):
+            writer.write_signal(self.signal)
+        
+        executed = self.statements(writer)
+        prepares = [s for s in executed if s.startswith("PREPARE")]
+        executes = [s for s in executed if s.startswith("EXECUTE")]
+        self.assertEqual(len(prepares), 1)
+        self.assertIn("INSERT INTO signals", prepares[0])
+        self.assertIn("$6", prepares[0])
+        self.assertEqual(len(executes), 3)
+    
+    def test_unchanged_schema_keeps_statements(self):
+        """Test revalidation with the same columns doesn't recompile"""
+        writer = self.make_writer()
+        version = writer.schema_version
+        statement = writer._statements["insert_signal"]
+        
+        self.assertFalse(writer._refresh_statements())
+        self.assertEqual(writer.schema_version, version)
+        self.assertIs(writer._statements["insert_signal"], statement)
+    
+    def test_schema_change_recompiles(self):
+        """Test a changed column set compiles new statements and re-prepares"""
+        writer = self.make_writer()
+        writer.write_signal(self.signal)
+        version = writer.schema_version
+        
+        writer.available_columns['signals'].remove('metadata')
+        self.assertTrue(writer._refresh_statements())
+        self.assertEqual(writer.schema_version, version + 1)
+        self.assertNotIn('metadata', writer._statements["insert_signal"].columns)
+        
+        writer.write_signal(self.signal)
+        executed = self.statements(writer)
+        self.assertIn("DEALLOCATE ALL", executed)
+        prepares = [s for s in executed if s.startswith("PREPARE")]
+        self.assertEqual(len(prepares), 2)
+        self.assertNotIn("metadata", prepares[1])
+    
+    def test_optional_columns_follow_schema(self):
+        """Test optional columns are only written when the table has them"""
+        schema = dict(FULL_SCHEMA, positions=[c for c in FULL_SCHEMA['positions'] if c != 'order_id'])
+        writer = self.make_writer(schema)
+        columns, values = writer._position_record("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        self.assertNotIn('order_id', columns)
+        self.assertEqual(len(columns), len(values))
+        self.assertEqual(dict(zip(columns, values))['current_price'], 150.0)
+    
+    def test_unprepared_mode(self):
+        """Test prepare_statements=False runs the cached plain SQL"""
+        writer = self.make_writer(prepare_statements=False)
+        writer.write_signal(self.signal)
+        executed = self.statements(writer)
+        self.assertFalse(any(s.startswith(("PREPARE", "EXECUTE")) for s in executed))
+        self.assertIn("%s", executed[0])
+    
+    def test_reprepares_when_server_forgets(self):
+        """Test a missing prepared statement is prepared again and retried"""
+        writer = self.make_writer()
+        
+        calls = []
+        
+        def execute(sql, params=None):
+            calls.append(sql)
+            if sql.startswith("EXECUTE") and calls.count(sql) == 1:
+                raise pg_errors.InvalidSqlStatementName("prepared statement does not exist")
+        
+        original_cursor = FakeConnection.cursor
+        
+        def cursor(conn):
+            cur = original_cursor(conn)
+            cur.execute.side_effect = execute
+            return cur
+        
+        with patch.object(FakeConnection, "cursor", cursor):
+            self.assertEqual(writer.write_signal(self.signal), 42)
+        self.assertEqual(sum(1 for sql in calls if sql.startswith("PREPARE")), 2)
+    
+    def test_missing_order_id_column_recompiles(self):
+        """Test an order_id UndefinedColumn error recompiles without it and retries"""
+        writer = self.make_writer()
+        
+        def execute(sql, params=None):
+            if sql.startswith("EXECUTE elpyfi_insert_position_v1"):
+                raise pg_errors.UndefinedColumn('column "order_id" of relation "positions" does not exist')
+        
+        original_cursor = FakeConnection.cursor
+        
+        def cursor(conn):
+            cur = original_cursor(conn)
+            cur.execute.side_effect = execute
+            return cur
+        
+        with patch.object(FakeConnection, "cursor", cursor):
+            position_id = writer.write_position_opened("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        
+        self.assertEqual(position_id, 42)
+        self.assertEqual(writer.schema_version, 2)
+        self.assertNotIn('order_id', writer._statements["insert_position"].columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Unit tests for async EventBus lanes
+Tests queued dispatch, drops or backpressure on a full lane, stopping, and lane stats
+"""
+
+import unittest
+import threading
+import time
+from unittest.mock import Mock
+from events import EventBus, EventType
+
+
+class TestEventLanes(unittest.TestCase):
+    def setUp(self):
+        """Create fresh EventBus for each test"""
+        self.bus = EventBus()
+    
+    def tearDown(self):
+        self.bus.disable_async()
+    
+    def test_emit_returns_before_slow_handler(self):
+        """Test emit does not wait for handlers on an async lane"""
+        release = threading.Event()
+        handler = Mock(side_effect=lambda data: release.wait(1))
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, handler)
+        self.bus.enable_async(EventType.SIGNAL_GENERATED, workers=1)
+        
+        start = time.perf_counter()
+        self.bus.emit(EventType.SIGNAL_GENERATED, "signal")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        
+        release.set()
+        self.bus.drain()
+        handler.assert_called_once_with("signal")
+    
+    def test_inline_dispatch_unchanged(self):
+        """Test event types without a lane are still handled inline"""
+        handler = Mock()
+        self.bus.subscribe(EventType.MARKET_DATA_RECEIVED, handler)
+        self.bus.enable_async(EventType.SIGNAL_GENERATED)
+        
+        self.bus.emit(EventType.MARKET_DATA_RECEIVED, "tick")
+        handler.assert_called_once_with("tick")
+    
+    def test_full_lane_drops_events(self):
+        """Test a full lane drops instead of blocking the emitter"""
+        release = threading.Event()
+        self.bus.subscribe(EventType.DAY_TRADE_APPROVED, lambda data: release.wait(1))
+        self.bus.enable_async(EventType.DAY_TRADE_APPROVED, workers=1, max_queue_size=2)
+        
+        for i in range(10):
+            self.bus.emit(EventType.DAY_TRADE_APPROVED, i)
+        
+        release.set()
+        self.bus.drain()
+        stats = self.bus.get_lane_stats()[EventType.DAY_TRADE_APPROVED]
+        self.assertGreater(stats['dropped'], 0)
+        self.assertEqual(stats['processed'] + stats['dropped'], 10)
+    
+    def test_blocking_lane_keeps_every_event(self):
+        """Test a blocking lane makes the emitter wait instead of dropping"""
+        received = []
+        release = threading.Event()
+        self.bus.subscribe(EventType.DAY_TRADE_APPROVED, lambda data: (release.wait(5), received.append(data)))
+        self.bus.enable_async(EventType.DAY_TRADE_APPROVED, workers=1, max_queue_size=2, block=True)
+        
+        def emit_all():
+            for i in range(10):
+                self.bus.emit(EventType.DAY_TRADE_APPROVED, i)
+        
+        emitter = threading.Thread(target=emit_all)
+        emitter.start()
+        time.sleep(0.1)
+        self.assertTrue(emitter.is_alive())  # Waiting on the full lane
+        release.set()
+        emitter.join(5)
+        self.bus.drain()
+        
+        self.assertEqual(received, list(range(10)))
+        stats = self.bus.get_lane_stats()[EventType.DAY_TRADE_APPROVED]
+        self.assertEqual(stats['dropped'], 0)
+        self.assertGreater(stats['blocked'], 0)
+    
+    def test_stop_times_out_on_full_stuck_lane(self):
+        """Test stop(timeout) returns even when a stuck handler keeps the queue full"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, lambda data: release.wait(5))
+        self.bus.enable_async(EventType.SIGNAL_GENERATED, workers=1, max_queue_size=1)
+        for i in range(3):
+            self.bus.emit(EventType.SIGNAL_GENERATED, i)
+        
+        start = time.perf_counter()
+        self.bus.disable_async(EventType.SIGNAL_GENERATED, timeout=0.2)
+        self.assertLess(time.perf_counter() - start, 2.0)
+    
+    def test_lane_stats(self):
+        """Test lane counters after processing"""
+        def bad_handler(data):
+            raise ValueError("Handler error")
+        
+        good_handler = Mock()
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, bad_handler)
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, good_handler)
+        self.bus.enable_async(EventType.SIGNAL_GENERATED, workers=2)
+        
+        for i in range(5):
+            self.bus.emit(EventType.SIGNAL_GENERATED, i)
+        self.bus.drain()
+        
+        stats = self.bus.get_lane_stats()[EventType.SIGNAL_GENERATED]
+        self.assertEqual(stats['workers'], 2)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['processed'], 5)
+        self.assertEqual(stats['errors'], 5)
+        self.assertEqual(good_handler.call_count, 5)
+        self.assertGreaterEqual(stats['max_wait_ms'], stats['avg_wait_ms'])
+    
+    def test_disable_async_drains_queue(self):
+        """Test disabling a lane handles queued events and restores inline dispatch"""
+        handler = Mock()
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, handler)
+        self.bus.enable_async(EventType.SIGNAL_GENERATED)
+        
+        for i in range(3):
+            self.bus.emit(EventType.SIGNAL_GENERATED, i)
+        self.bus.disable_async(EventType.SIGNAL_GENERATED)
+        self.assertEqual(handler.call_count, 3)
+        self.assertEqual(self.bus.get_lane_stats(), {})
+        
+        self.bus.emit(EventType.SIGNAL_GENERATED, "inline")
+        handler.assert_called_with("inline")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming indicator engine
+Checks incremental values against direct NumPy calculations
+"""
+
+import unittest
+from datetime import datetime
+import numpy as np
+from indicators import IndicatorEngine, RollingWindow, SymbolIndicators
+from strategies.models import MarketData, MarketSnapshot
+
+
+class TestRollingWindow(unittest.TestCase):
+    def test_mean_and_std_over_window(self):
+        """Test running sums match the last N values after many wraps"""
+        window = RollingWindow(5)
+        values = np.random.default_rng(1).normal(100, 5, 53)
+        for v in values:
+            window.push(v)
+        
+        self.assertAlmostEqual(window.mean, values[-5:].mean())
+        self.assertAlmostEqual(window.std, values[-5:].std())
+        self.assertEqual(window.count, 5)
+
+
+class TestSymbolIndicators(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.prices = 100 + np.cumsum(rng.normal(0, 0.5, 60))
+        self.volumes = rng.uniform(1e5, 1e6, 60)
+        self.state = SymbolIndicators(window=20)
+        for p, v in zip(self.prices, self.volumes):
+            self.values = self.state.update(p, v)
+            
+    def test_vwap_and_avg_volume(self):
+        """Test rolling VWAP and prior-bar average volume"""
+        p, v = self.prices[-20:], self.volumes[-20:]
+        self.assertAlmostEqual(self.values['vwap'], (p * v).sum() / v.sum())
+        self.assertAlmostEqual(self.values['avg_volume'], self.volumes[-21:-1].mean())
+        
+    def test_bollinger(self):
+        """Test Bollinger bands around the SMA"""
+        p = self.prices[-20:]
+        self.assertAlmostEqual(self.values['bb_middle'], p.mean())
+        self.assertAlmostEqual(self.values['bb_upper'], p.mean() + 2 * p.std())
+        self.assertAlmostEqual(self.values['bb_lower'], p.mean() - 2 * p.std())
+        
+    def test_macd(self):
+        """Test MACD against a direct EMA recurrence"""
+        def ema(series, period):
+            alpha = 2 / (period + 1)
+            out = [series[0]]
+            for x in series[1:]:
+                out.append(out[-1] + alpha * (x - out[-1]))
+            return np.array(out)
+        
+        macd = ema(self.prices, 12) - ema(self.prices, 26)
+        self.assertAlmostEqual(self.values['macd'], macd[-1])
+        self.assertAlmostEqual(self.values['macd_signal'], ema(macd, 9)[-1])
+        
+    def test_rsi(self):
+        """Test Wilder RSI warm-up and range"""
+        state = SymbolIndicators(rsi_period=14)
+        for i in range(14):
+            self.assertNotIn('rsi', state.update(100.0 + i, 1000))
+        self.assertEqual(state.update(114.0, 1000)['rsi'], 100.0)  # Only gains so far
+        self.assertTrue(0 <= self.values['rsi'] <= 100)
+
+
+class TestIndicatorEngine(unittest.TestCase):
+    def make_tick(self, symbol, price, volume, indicators=None):
+        return MarketData(symbol, datetime(2024, 1, 2, 12), price, volume,
+                          price * 1.01, price * 0.99, price, price, indicators=indicators)
+        
+    def test_fills_indicators_per_symbol(self):
+        """Test each symbol keeps its own state"""
+        engine = IndicatorEngine(window=3)
+        engine.update(self.make_tick("AAPL", 100.0, 1000))
+        tick = self.make_tick("MSFT", 300.0, 5000)
+        engine.update(tick)
+        
+        self.assertEqual(tick.indicators['vwap'], 300.0)
+        self.assertEqual(engine.get("AAPL")['vwap'], 100.0)
+        
+    def test_feed_indicators_take_precedence(self):
+        """Test indicators supplied by the feed are not overwritten"""
+        engine = IndicatorEngine()
+        tick = self.make_tick("AAPL", 100.0, 1000, indicators={"vwap": 99.0})
+        engine.update(tick)
+        self.assertEqual(tick.indicators['vwap'], 99.0)
+        self.assertIn('avg_volume', tick.indicators)
+        
+    def test_update_snapshot(self):
+        """Test snapshot updates add indicator columns"""
+        engine = IndicatorEngine()
+        snapshot = MarketSnapshot.from_market_data([
+            self.make_tick("AAPL", 100.0, 1000), self.make_tick("MSFT", 300.0, 5000)
+        ])
+        engine.update_snapshot(snapshot)
+        np.testing.assert_array_equal(snapshot.indicators['vwap'], [100.0, 300.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
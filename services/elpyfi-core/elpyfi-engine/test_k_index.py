@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cached K-index provider
+Tests offline sources, TTL expiry, refresh metrics and strategy usage
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import Mock
+from strategies.k_index import (
+    KIndexProvider, FileKIndexSource, StaticKIndexSource, parse_noaa_k_index
+)
+from strategies import SolarFlareStrategy
+from strategies.models import MarketData
+
+
+class TestKIndexProvider(unittest.TestCase):
+    def test_empty_until_refreshed(self):
+        """Test provider serves nothing before the first refresh"""
+        provider = KIndexProvider(StaticKIndexSource(6))
+        self.assertIsNone(provider.get())
+        self.assertTrue(provider.get_stats()['stale'])
+        
+        self.assertTrue(provider.refresh())
+        self.assertEqual(provider.get(), 6)
+        self.assertEqual(provider.get_stats()['refreshes'], 1)
+    
+    def test_file_source(self):
+        """Test reading a saved NOAA feed"""
+        feed = [{"time_tag": "2024-01-02T12:00:00", "k_index": 3},
+                {"time_tag": "2024-01-02T12:01:00", "k_index": 12}]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(feed, f)
+        try:
+            self.assertEqual(FileKIndexSource(f.name).fetch(), 9)  # Clamped to 1-9
+        finally:
+            os.unlink(f.name)
+    
+    def test_failed_refresh_keeps_value(self):
+        """Test failures are counted and the last good value is kept"""
+        source = Mock()
+        source.fetch.side_effect = [5, ConnectionError("NOAA down")]
+        provider = KIndexProvider(source)
+        
+        provider.refresh()
+        self.assertFalse(provider.refresh())
+        
+        stats = provider.get_stats()
+        self.assertEqual(provider.get(), 5)
+        self.assertEqual(stats['refresh_failures'], 1)
+        self.assertIn("NOAA down", stats['last_error'])
+    
+    def test_ttl_expiry(self):
+        """Test values older than the TTL are not served"""
+        provider = KIndexProvider(StaticKIndexSource(7), ttl=0.05)
+        provider.refresh()
+        self.assertEqual(provider.get(), 7)
+        time.sleep(0.1)
+        self.assertIsNone(provider.get())
+        self.assertGreater(provider.get_stats()['cache_age_seconds'], 0.05)
+    
+    def test_background_refresh(self):
+        """Test the refresh thread populates the cache"""
+        provider = KIndexProvider(StaticKIndexSource(8), refresh_interval=0.01)
+        provider.start()
+        try:
+            deadline = time.time() + 2
+            while provider.get() is None and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(provider.get(), 8)
+        finally:
+            provider.stop()
+    
+    def test_shared_provider_built_once(self):
+        """Test concurrent first calls to get_k_index_provider build and start one provider"""
+        import threading
+        from unittest.mock import patch
+        from strategies import k_index
+        
+        def slow_provider():
+            time.sleep(0.01)  # Widen the race between the check and the assignment
+            return Mock()
+        
+        with patch.object(k_index, "k_index_provider", None), \
+             patch.object(k_index, "KIndexProvider", side_effect=slow_provider) as provider_class:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(k_index.get_k_index_provider()))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        self.assertEqual(provider_class.call_count, 1)
+        self.assertEqual(len({id(provider) for provider in results}), 1)
+        results[0].start.assert_called_once()
+    
+    def test_parse_empty_feed(self):
+        """Test an empty feed is an error, not a silent default"""
+        with self.assertRaises(ValueError):
+            parse_noaa_k_index([])
+
+
+class TestSolarFlareWithProvider(unittest.TestCase):
+    def make_spike(self):
+        return MarketData(
+            symbol="AAPL", timestamp=datetime(2024, 1, 2, 12, 0), current_price=150.5,
+            volume=2000000, high=151, low=149, open=150, close=150.5,
+            indicators={"vwap": 150.0, "avg_volume": 1000000}
+        )
+    
+    def test_uses_cached_k_index(self):
+        """Test the strategy reads the provider instead of calling NOAA"""
+        provider = KIndexProvider(StaticKIndexSource(8))
+        provider.refresh()
+        strategy = SolarFlareStrategy(k_index_provider=provider)
+        
+        signal = strategy.analyze(self.make_spike())
+        self.assertEqual(signal.action, "buy")
+        self.assertEqual(signal.metadata["k_index"], 8)
+    
+    def test_stale_k_index_holds(self):
+        """Test no fresh space weather data means no trade"""
+        strategy = SolarFlareStrategy(k_index_provider=KIndexProvider(StaticKIndexSource(8)))
+        self.assertEqual(strategy.analyze(self.make_spike()).action, "hold")
+
+
+if __name__ == "__main__":
+    unittest.main()
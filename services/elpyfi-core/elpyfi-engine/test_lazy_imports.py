@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Unit tests for side-effect-free imports
+Tests that importing the engine builds no singletons and loads no broker SDK
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_probe(code):
+    env = dict(os.environ)
+    env.pop("ALPACA_API_KEY", None)
+    env.pop("ALPACA_SECRET_KEY", None)
+    result = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env,
+                            capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return result.stdout.strip().splitlines()[-1]
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_engine_is_side_effect_free(self):
+        """Test `import engine` builds nothing and leaves alpaca, pandas and requests unloaded"""
+        out = run_probe(
+            "import sys, engine, execution, pdt_tracker\n"
+            "from events import event_bus, EventType\n"
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'alpaca', 'pandas', 'requests'}),\n"
+            "      execution._execution_engine, pdt_tracker._pdt_tracker,\n"
+            "      len(event_bus._subscribers.get(EventType.DAY_TRADE_REQUESTED, [])))\n"
+        )
+        self.assertEqual(out, "[] None None 0")
+    
+    def test_singletons_built_on_first_use(self):
+        """Test get_*() and the old module attributes return one shared instance"""
+        out = run_probe(
+            "import execution, pdt_tracker\n"
+            "from execution import execution_engine\n"
+            "from pdt_tracker import pdt_tracker as tracker\n"
+            "print(execution.get_execution_engine() is execution_engine,\n"
+            "      pdt_tracker.get_pdt_tracker() is tracker)\n"
+        )
+        self.assertEqual(out, "True True")
+    
+    def test_engine_initialize_builds_singletons(self):
+        """Test TradingEngine.initialize() wires PDT approvals and execution onto the bus"""
+        out = run_probe(
+            "from engine import TradingEngine\n"
+            "from events import event_bus, EventType\n"
+            "engine = TradingEngine({'database': False, 'strategies': {}})\n"
+            "engine.initialize()\n"
+            "print(engine.pdt_tracker is not None, engine.execution_engine is not None,\n"
+            "      len(event_bus._subscribers.get(EventType.DAY_TRADE_REQUESTED, [])))\n"
+        )
+        self.assertEqual(out, "True True 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Unit tests for market data ingestion
+Tests normalisation, sources, backpressure policies, conflation and engine wiring
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from events import event_bus, EventType
+from market_data import (
+    MarketDataFeed, MarketDataSource, AlpacaBarSource, ReplaySource, SyntheticSource, TickConflator,
+    normalize
+)
+from strategies.models import MarketData
+
+
+class ListSource(MarketDataSource):
+    """Emits a fixed list of records"""
+    
+    name = "list"
+    
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+        self.accepted = []
+    
+    def run(self, emit):
+        for record in self.records:
+            self.accepted.append(emit(record))
+
+
+class FakeBarStream:
+    """Stand-in for StockDataStream's bar subscription surface"""
+    
+    def __init__(self):
+        self.handler = None
+        self.symbols = ()
+        self._stopped = threading.Event()
+    
+    def subscribe_bars(self, handler, *symbols):
+        self.handler = handler
+        self.symbols = symbols
+    
+    def unsubscribe_bars(self, *symbols):
+        self.handler = None
+        self.symbols = ()
+    
+    def run(self):
+        self._stopped.wait()
+    
+    def stop(self):
+        self._stopped.set()
+    
+    def push(self, **fields):
+        asyncio.run(self.handler(SimpleNamespace(**fields)))
+
+
+class TestNormalize(unittest.TestCase):
+    def test_bar_trade_and_dict(self):
+        """Test bars, trades and dicts all become MarketData"""
+        bar = normalize(SimpleNamespace(symbol="AAPL", timestamp=datetime(2024, 1, 2, 10, 0),
+                                        open=150, high=151, low=149, close=150.5, volume=1000))
+        self.assertEqual((bar.current_price, bar.high, bar.volume), (150.5, 151.0, 1000.0))
+        
+        trade = normalize(SimpleNamespace(symbol="AAPL", timestamp=None, price=150.25, size=10))
+        self.assertEqual((trade.open, trade.close, trade.volume), (150.25, 150.25, 10.0))
+        
+        row = normalize({"symbol": "MSFT", "close": 300.0, "volume": 5})
+        self.assertEqual(row.low, 300.0)
+    
+    def test_aware_timestamps_match_naive_clock(self):
+        """Test UTC stream timestamps are converted to naive local time"""
+        data = normalize({"symbol": "AAPL", "close": 1.0,
+                          "timestamp": datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc)})
+        self.assertIsNone(data.timestamp.tzinfo)
+    
+    def test_bad_records_raise(self):
+        """Test undecodable records raise instead of producing bad data"""
+        for record in ({"close": 1.0}, {"symbol": "AAPL", "close": -1.0}, {"symbol": "AAPL"}):
+            with self.assertRaises((ValueError, TypeError)):
+                normalize(record)
+
+
+class TestMarketDataFeed(unittest.TestCase):
+    def test_delivers_in_order(self):
+        """Test every decoded tick reaches the handler in order and bad ones are counted"""
+        received = []
+        records = [{"symbol": "AAPL", "close": 100.0 + i} for i in range(50)] + [{"symbol": "AAPL"}]
+        feed = MarketDataFeed(ListSource(records), handler=received.append).start()
+        feed.drain(timeout=5)
+        feed.stop()
+        
+        self.assertEqual([d.close for d in received], [100.0 + i for i in range(50)])
+        stats = feed.get_stats()
+        self.assertEqual((stats["delivered"], stats["decode_errors"], stats["dropped"]), (50, 1, 0))
+    
+    def test_block_policy_drops_after_timeout(self):
+        """Test a stalled consumer makes the source wait, then drop, counting per symbol"""
+        release = threading.Event()
+        source = ListSource([{"symbol": s, "close": 1.0} for s in ["AAPL", "MSFT", "AAPL", "AAPL"]])
+        feed = MarketDataFeed(source, handler=lambda data: release.wait(5), max_queue_size=1,
+                              policy="block", block_timeout=0.05).start()
+        feed._ingest_thread.join(5)
+        release.set()
+        feed.drain(timeout=5)
+        feed.stop()
+        
+        stats = feed.get_stats()
+        self.assertGreater(stats["blocked"], 0)
+        self.assertEqual(stats["delivered"] + stats["dropped"], 4)
+        self.assertEqual(sum(stats["dropped_by_symbol"].values()), stats["dropped"])
+        self.assertEqual(source.accepted.count(False), stats["dropped"])
+    
+    def test_drop_oldest_keeps_latest(self):
+        """Test drop_oldest evicts queued ticks so the newest one is delivered"""
+        feed = MarketDataFeed(ListSource([]), handler=lambda data: None,
+                              max_queue_size=2, policy="drop_oldest")
+        for i in range(5):
+            self.assertTrue(feed.put({"symbol": "AAPL" if i % 2 else "MSFT", "close": 100.0 + i}))
+        
+        queued = [feed.queue.get_nowait()[1].close for _ in range(2)]
+        self.assertEqual(queued, [103.0, 104.0])
+        self.assertEqual(feed.get_stats()["dropped_by_symbol"], {"MSFT": 2, "AAPL": 1})
+    
+    def test_from_config(self):
+        """Test config splits into source and queue settings"""
+        feed = MarketDataFeed.from_config({"source": "synthetic", "symbols": ["AAPL"],
+                                           "interval": 0, "max_queue_size": 7, "policy": "drop_oldest"})
+        self.assertIsInstance(feed.source, SyntheticSource)
+        self.assertEqual((feed.max_queue_size, feed.policy), (7, "drop_oldest"))
+        with self.assertRaises(ValueError):
+            MarketDataFeed.from_config({"source": "carrier_pigeon"})
+        with self.assertRaises(ValueError):
+            MarketDataFeed(ListSource([]), policy="drop_newest")
+
+
+class TestSources(unittest.TestCase):
+    def test_synthetic(self):
+        """Test the synthetic source emits valid bars for every symbol per round"""
+        received = []
+        source = SyntheticSource(["AAPL", "MSFT"], interval=0, rounds=10, seed=1)
+        feed = MarketDataFeed(source, handler=received.append, policy="block", block_timeout=None).start()
+        feed.drain(timeout=5)
+        feed.stop()
+        self.assertEqual(len(received), 20)
+        self.assertTrue(all(d.low <= d.close <= d.high for d in received))
+    
+    def test_replay(self):
+        """Test file replay delivers bars from several files in timestamp order"""
+        with tempfile.TemporaryDirectory() as tmp:
+            for symbol, minutes in (("AAPL", (0, 2)), ("MSFT", (1, 3))):
+                with open(os.path.join(tmp, f"{symbol}.csv"), "w") as f:
+                    f.write("timestamp,open,high,low,close,volume\n")
+                    for m in minutes:
+                        f.write(f"2024-01-02T10:0{m}:00,100,101,99,100.5,1000\n")
+            received = []
+            paths = [os.path.join(tmp, "AAPL.csv"), os.path.join(tmp, "MSFT.csv")]
+            feed = MarketDataFeed(ReplaySource(paths), handler=received.append, block_timeout=None).start()
+            feed.drain(timeout=5)
+            feed.stop()
+        self.assertEqual([d.symbol for d in received], ["AAPL", "MSFT", "AAPL", "MSFT"])
+    
+    def test_alpaca_stream(self):
+        """Test streamed bars are decoded and stop() ends the stream thread"""
+        stream = FakeBarStream()
+        received = []
+        done = threading.Event()
+        
+        def handler(data):
+            received.append(data)
+            done.set()
+        
+        feed = MarketDataFeed(AlpacaBarSource(["AAPL"], stream=stream), handler=handler).start()
+        while stream.handler is None:
+            threading.Event().wait(0.01)
+        stream.push(symbol="AAPL", timestamp=datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc),
+                    open=150, high=151, low=149, close=150.5, volume=1000)
+        self.assertTrue(done.wait(5))
+        feed.stop()
+        
+        self.assertEqual(stream.symbols, ("AAPL",))
+        self.assertIsInstance(received[0], MarketData)
+        self.assertIsNone(feed._ingest_thread)
+    
+    def test_alpaca_shares_quote_stream(self):
+        """Test bars ride on a stream someone else runs, and the feed follows its health"""
+        stream = FakeBarStream()
+        owner = SimpleNamespace(stream=stream, alive=True)
+        owner.is_alive = lambda: owner.alive
+        received = []
+        
+        feed = MarketDataFeed(AlpacaBarSource(["AAPL"], stream_owner=owner), handler=received.append).start()
+        while stream.handler is None:
+            threading.Event().wait(0.01)
+        stream.push(symbol="AAPL", timestamp=None, open=150, high=151, low=149, close=150.5, volume=1000)
+        feed.drain(timeout=0.1)
+        self.assertTrue(feed.is_alive())
+        owner.alive = False
+        self.assertFalse(feed.is_alive())
+        feed.stop()
+        
+        self.assertEqual([d.close for d in received], [150.5])
+        self.assertIsNone(stream.handler)  # Bars unsubscribed...
+        self.assertFalse(stream._stopped.is_set())  # ...but the owner's stream keeps running
+
+
+class TestTickConflator(unittest.TestCase):
+    def tick(self, symbol, price):
+        return MarketData(symbol, datetime(2024, 1, 2, 10, 0), price, 100, price, price, price, price)
+    
+    def test_keeps_latest_per_symbol(self):
+        """Test a burst behind a slow handler collapses to the freshest tick per symbol"""
+        started, release = threading.Event(), threading.Event()
+        received = []
+        
+        def slow_handler(data):
+            received.append((data.symbol, data.close))
+            started.set()
+            release.wait(5)
+        
+        conflator = TickConflator(slow_handler).start()
+        self.addCleanup(conflator.stop)
+        conflator.put(self.tick("AAPL", 100.0))
+        self.assertTrue(started.wait(5))
+        
+        # Handler is busy: queue a burst for two symbols
+        for i in range(1, 101):
+            conflator.put(self.tick("AAPL", 100.0 + i))
+            if i % 10 == 0:
+                conflator.put(self.tick("MSFT", 300.0 + i))
+        self.assertEqual(conflator.get_stats()["pending"], 2)
+        release.set()
+        self.assertTrue(conflator.drain(timeout=5))
+        
+        self.assertEqual(received, [("AAPL", 100.0), ("AAPL", 200.0), ("MSFT", 400.0)])
+        stats = conflator.get_stats()
+        self.assertEqual(stats["conflated_by_symbol"], {"AAPL": 99, "MSFT": 9})
+        self.assertEqual((stats["received"], stats["processed"], stats["max_pending"]), (111, 3, 2))
+    
+    def test_handler_errors_dont_stop_worker(self):
+        """Test a failing handler is counted and later ticks still flow"""
+        received = []
+        
+        def handler(data):
+            if data.symbol == "BAD":
+                raise RuntimeError("boom")
+            received.append(data.symbol)
+        
+        conflator = TickConflator(handler).start()
+        self.addCleanup(conflator.stop)
+        conflator.put(self.tick("BAD", 1.0))
+        self.assertTrue(conflator.drain(timeout=5))
+        conflator.put(self.tick("AAPL", 1.0))
+        self.assertTrue(conflator.drain(timeout=5))
+        
+        self.assertEqual(received, ["AAPL"])
+        self.assertEqual(conflator.get_stats()["handler_errors"], 1)
+    
+    def test_engine_conflation(self):
+        """Test the engine routes market data through the conflator when configured"""
+        from engine import TradingEngine
+        engine = TradingEngine({'database': False, 'strategies': {}, 'conflation': {}})
+        engine.initialize()
+        self.addCleanup(engine.conflator.stop)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.conflator.put)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.indicator_engine.update)
+        
+        engine.inject_market_data("AAPL", 150.0, 1000)
+        self.assertTrue(engine.conflator.drain(timeout=5))
+        self.assertEqual(engine.conflator.get_stats()["processed"], 1)
+        self.assertIn("AAPL", engine.indicator_engine.symbols)
+    
+    def test_indicators_count_conflated_ticks(self):
+        """Test volume from ticks replaced in the conflator still reaches the indicators"""
+        from engine import TradingEngine
+        engine = TradingEngine({'database': False, 'strategies': {}, 'conflation': {}})
+        engine.initialize()
+        self.addCleanup(engine.conflator.stop)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.conflator.put)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.indicator_engine.update)
+        started, release = threading.Event(), threading.Event()
+        seen = []
+        
+        def slow_strategies(data):
+            seen.append(data)
+            started.set()
+            release.wait(5)
+        
+        engine.conflator.handler = slow_strategies
+        engine.inject_market_data("AAPL", 100.0, 1000)
+        self.assertTrue(started.wait(5))
+        for price in (101.0, 102.0, 103.0):
+            engine.inject_market_data("AAPL", price, 1000)
+        release.set()
+        self.assertTrue(engine.conflator.drain(timeout=5))
+        
+        self.assertEqual([d.close for d in seen], [100.0, 103.0])
+        self.assertEqual(engine.conflator.get_stats()["conflated_by_symbol"], {"AAPL": 2})
+        self.assertAlmostEqual(engine.indicator_engine.get("AAPL")["vwap"], (100 + 101 + 102 + 103) / 4)
+
+
+class TestEngineWiring(unittest.TestCase):
+    def test_feed_drives_strategies(self):
+        """Test TradingEngine.start runs the configured feed until stop()"""
+        from engine import TradingEngine
+        engine = TradingEngine({'database': False, 'strategies': {},
+                                'market_data': {'source': 'synthetic', 'symbols': ['AAPL'], 'interval': 0.01}})
+        engine.initialize()
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.process_market_data)
+        
+        seen = threading.Event()
+        seen_handler = lambda data: seen.set()
+        event_bus.subscribe(EventType.MARKET_DATA_RECEIVED, seen_handler)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, seen_handler)
+        
+        runner = threading.Thread(target=engine.start, daemon=True)
+        runner.start()
+        self.assertTrue(seen.wait(5))
+        engine.stop()
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        self.assertGreater(engine.market_data_feed.get_stats()["delivered"], 0)
+    
+    def test_health_needs_live_feed(self):
+        """Test health() fails once a configured feed's source has died"""
+        from engine import TradingEngine
+        
+        class BrokenSource(MarketDataSource):
+            def run(self, emit):
+                raise ConnectionError("stream closed")
+        
+        engine = TradingEngine({'database': False, 'strategies': {}})
+        engine.running = True
+        self.assertTrue(engine.health()[0])
+        
+        engine.market_data_feed = MarketDataFeed(BrokenSource(), handler=lambda data: None).start()
+        self.addCleanup(engine.market_data_feed.stop)
+        engine.market_data_feed._ingest_thread.join(5)
+        healthy, details = engine.health()
+        self.assertFalse(healthy)
+        self.assertEqual((details["status"], details["market_data_alive"]), ("market data down", False))
+    
+    def test_alpaca_feed_shares_execution_quote_stream(self):
+        """Test the engine hands the execution engine's quote feed to the Alpaca source"""
+        from engine import TradingEngine
+        from execution import execution_engine
+        from execution.quotes import FakeQuoteStream
+        quote_feed = execution_engine.set_quote_stream(FakeQuoteStream())
+        self.addCleanup(execution_engine.set_quote_stream, None)
+        
+        engine = TradingEngine({'database': False, 'strategies': {},
+                                'market_data': {'source': 'alpaca', 'symbols': ['AAPL']}})
+        engine.initialize()
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.process_market_data)
+        
+        source = engine.market_data_feed.source
+        self.assertIs(source.stream_owner, quote_feed)
+        self.assertIs(source.stream, quote_feed.stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Unit tests for engine metrics and the health endpoint
+Tests lock-free histograms, Prometheus rendering, /health, /metrics and engine instrumentation
+"""
+
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from db_writer import DatabaseWriter
+from events import event_bus, EventType, SignalEvent
+from strategies.models import MarketData, MarketSnapshot
+from metrics import (
+    MetricsRegistry, MetricsServer, ANALYZE_SECONDS, DB_WRITE_SECONDS, ORDER_SUBMIT_SECONDS, SIGNALS_EMITTED
+)
+
+
+def count(histogram, label):
+    snapshot = histogram.snapshot().get(label)
+    return snapshot[0][-1] if snapshot else 0
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+    
+    def test_histogram_buckets(self):
+        """Test observations land in cumulative le buckets with sum and count"""
+        histogram = self.registry.histogram("op_seconds", "Op latency", label="op", buckets=(0.01, 0.1))
+        for value in (0.005, 0.01, 0.05, 2.0):
+            histogram.observe(value, "read")
+        
+        lines = histogram.render()
+        self.assertEqual(lines, [
+            'op_seconds_bucket{op="read",le="0.01"} 2',
+            'op_seconds_bucket{op="read",le="0.1"} 3',
+            'op_seconds_bucket{op="read",le="+Inf"} 4',
+            'op_seconds_sum{op="read"} 2.065',
+            'op_seconds_count{op="read"} 4',
+        ])
+    
+    def test_threads_record_without_losing_counts(self):
+        """Test per-thread shards add up exactly under concurrent recording"""
+        histogram = self.registry.histogram("tick_seconds", "Tick latency", label="strategy")
+        counter = self.registry.counter("ticks_total", "Ticks", label="strategy")
+        
+        def record():
+            for i in range(5000):
+                histogram.observe(0.001, f"s{i % 2}")
+                counter.inc(f"s{i % 2}")
+        
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(counter.values(), {"s0": 20000, "s1": 20000})
+        self.assertEqual(count(histogram, "s0"), 20000)
+        self.assertEqual(len(histogram._shards), 8)
+    
+    def test_render_and_gauges(self):
+        """Test HELP/TYPE headers, labelled gauges and escaping"""
+        self.registry.counter("signals_total", "Signals", label="strategy").inc('odd"name')
+        self.registry.gauge("depth", "Queue depth", lambda: {"signal_generated": 3}, label="event_type")
+        self.registry.gauge("missing", "Not configured", lambda: None)
+        text = self.registry.render()
+        
+        self.assertIn("# TYPE signals_total counter\n", text)
+        self.assertIn('signals_total{strategy="odd\\"name"} 1\n', text)
+        self.assertIn('depth{event_type="signal_generated"} 3\n', text)
+        self.assertIn("# TYPE missing gauge\n", text)
+        self.assertTrue(text.endswith("\n"))
+    
+    def test_registering_twice_returns_the_same_metric(self):
+        """Test modules sharing a metric name share one series"""
+        first = self.registry.counter("orders_total", "Orders")
+        self.assertIs(self.registry.counter("orders_total", "Orders"), first)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def test_health_and_metrics(self):
+        """Test /health follows readiness and /metrics serves Prometheus text"""
+        registry = MetricsRegistry()
+        registry.counter("ticks_total", "Ticks").inc()
+        ready = {"value": False}
+        server = MetricsServer(registry, port=0, host="127.0.0.1",
+                               health=lambda: (ready["value"], {"status": "ok" if ready["value"] else "starting"}))
+        server.start()
+        self.addCleanup(server.stop)
+        base = f"http://127.0.0.1:{server.port}"
+        
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/health", timeout=5)
+        self.assertEqual(error.exception.code, 503)
+        
+        ready["value"] = True
+        with urllib.request.urlopen(f"{base}/health", timeout=5) as response:
+            self.assertEqual(json.loads(response.read())["status"], "ok")
+        
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            self.assertIn("ticks_total 1", response.read().decode())
+        
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/nope", timeout=5)
+        self.assertEqual(error.exception.code, 404)
+
+
+class FakeStrategy:
+    """Always signals a buy"""
+    name = "fake"
+    
+    def analyze(self, data):
+        return SimpleNamespace(symbol=data.symbol, action="buy", confidence=0.9)
+    
+    def analyze_batch(self, snapshot):
+        return SimpleNamespace(active_rows=lambda: [])
+    
+    def should_emit_signal(self, signal):
+        return True
+    
+    def estimate_profit(self, signal):
+        return 10.0
+
+
+class TestEngineInstrumentation(unittest.TestCase):
+    def test_engine_records_tick_path_metrics(self):
+        """Test analyze latency, signals and order submit latency are recorded and served"""
+        from engine import TradingEngine
+        engine = TradingEngine({'database': False, 'strategies': {},
+                                'http': {'port': 0, 'host': '127.0.0.1'}})
+        engine.initialize()
+        self.addCleanup(engine.metrics_server.stop)
+        self.addCleanup(event_bus.unsubscribe, EventType.MARKET_DATA_RECEIVED, engine.process_market_data)
+        engine.strategies = [FakeStrategy()]
+        
+        analyzed, emitted = count(ANALYZE_SECONDS, "fake"), SIGNALS_EMITTED.values().get("fake", 0)
+        with patch.object(event_bus, "emit"):
+            engine.process_market_data(MarketData("AAPL", datetime(2024, 1, 2, 10, 0), 150.0, 1000,
+                                                  150.0, 150.0, 150.0, 150.0))
+        self.assertEqual(count(ANALYZE_SECONDS, "fake"), analyzed + 1)
+        self.assertEqual(SIGNALS_EMITTED.values()["fake"], emitted + 1)
+        
+        # Batch analysis is timed the same way, once per strategy per snapshot
+        engine.process_market_snapshot(MarketSnapshot.from_market_data([
+            MarketData(symbol, datetime(2024, 1, 2, 10, 1), 150.0, 1000, 150.0, 150.0, 150.0, 150.0)
+            for symbol in ("AAPL", "MSFT")
+        ]))
+        self.assertEqual(count(ANALYZE_SECONDS, "fake"), analyzed + 2)
+        
+        submitted = count(ORDER_SUBMIT_SECONDS, "stub")
+        engine.execution_engine.place_order(SignalEvent("fake", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2)))
+        self.assertEqual(count(ORDER_SUBMIT_SECONDS, "stub"), submitted + 1)
+        
+        url = f"http://127.0.0.1:{engine.metrics_server.port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+        self.assertIn('elpyfi_strategy_analyze_seconds_count{strategy="fake"}', text)
+        self.assertIn('elpyfi_signals_emitted_total{strategy="fake"}', text)
+        self.assertIn("elpyfi_engine_running 0", text)
+    
+    def test_db_writes_are_timed(self):
+        """Test every DatabaseWriter cursor block is observed as a statement"""
+        with patch.object(DatabaseWriter, "_connect"), patch.object(DatabaseWriter, "_validate_schema"):
+            writer = DatabaseWriter("postgresql://test")
+        
+        @contextmanager
+        def connection():
+            yield Mock()
+        
+        writer.connection = connection
+        before = count(DB_WRITE_SECONDS, "statement")
+        with writer.cursor() as cur:
+            cur.execute("SELECT 1")
+        self.assertEqual(count(DB_WRITE_SECONDS, "statement"), before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
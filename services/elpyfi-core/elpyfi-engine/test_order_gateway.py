@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the order gateway
+Tests parallel submission, in-flight and rate limits, outcome events and latency stats
+"""
+
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+from events import EventBus, EventType, SignalEvent, TradeApprovalEvent, TradeRequestEvent, event_bus
+from execution import ExecutionEngine
+from execution.gateway import OrderGateway, RateLimiter, _percentile
+
+
+def make_signal(symbol="AAPL"):
+    return SignalEvent("solar_flare", symbol, "buy", 0.8, 10.0, datetime(2024, 1, 2))
+
+
+class SlowBroker:
+    """Broker that takes `delay` seconds per order and tracks concurrency"""
+    
+    def __init__(self, delay=0.02, fail_symbols=()):
+        self.delay = delay
+        self.fail_symbols = set(fail_symbols)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.orders = []
+    
+    def execute(self, signal):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if signal.symbol in self.fail_symbols:
+                raise RuntimeError("insufficient buying power")
+            with self.lock:
+                self.orders.append(signal.symbol)
+                return f"ORD_{len(self.orders)}", 10.0, 100.0
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class TestOrderGateway(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+        self.submitted = []
+        self.failed = []
+        self.bus.subscribe(EventType.ORDER_SUBMITTED, self.submitted.append)
+        self.bus.subscribe(EventType.ORDER_FAILED, self.failed.append)
+    
+    def make_gateway(self, broker, **config):
+        gateway = OrderGateway(broker.execute, bus=self.bus, **config).start()
+        self.addCleanup(gateway.stop)
+        return gateway
+    
+    def test_burst_goes_out_in_parallel(self):
+        """Test a burst across symbols is submitted concurrently"""
+        broker = SlowBroker(delay=0.05)
+        gateway = self.make_gateway(broker, workers=8, max_in_flight=8)
+        
+        start = time.perf_counter()
+        for i in range(16):
+            self.assertTrue(gateway.submit(make_signal(f"SYM{i}")))
+        gateway.drain()
+        elapsed = time.perf_counter() - start
+        
+        self.assertEqual(len(self.submitted), 16)
+        self.assertGreater(broker.max_active, 1)
+        self.assertLess(elapsed, 16 * 0.05 / 2)
+        self.assertEqual(gateway.get_stats()["submitted"], 16)
+    
+    def test_in_flight_limit(self):
+        """Test no more than max_in_flight broker calls run at once"""
+        broker = SlowBroker(delay=0.02)
+        gateway = self.make_gateway(broker, workers=8, max_in_flight=3)
+        for i in range(12):
+            gateway.submit(make_signal(f"SYM{i}"))
+        gateway.drain()
+        
+        self.assertLessEqual(broker.max_active, 3)
+        self.assertEqual(gateway.get_stats()["max_in_flight_seen"], broker.max_active)
+    
+    def test_rate_limit(self):
+        """Test submissions beyond the burst are paced to the rate limit"""
+        broker = SlowBroker(delay=0)
+        gateway = self.make_gateway(broker, workers=4, rate_limit=50, burst=2)
+        
+        start = time.perf_counter()
+        for i in range(6):
+            gateway.submit(make_signal(f"SYM{i}"))
+        gateway.drain()
+        
+        # 2 go immediately, the other 4 wait ~20ms each
+        self.assertGreaterEqual(time.perf_counter() - start, 0.07)
+        self.assertGreater(gateway.get_stats()["rate_limited_ms"], 0)
+    
+    def test_failures_become_events(self):
+        """Test broker errors come back as ORDER_FAILED events"""
+        broker = SlowBroker(delay=0, fail_symbols={"TSLA"})
+        gateway = self.make_gateway(broker)
+        gateway.submit(make_signal("AAPL"))
+        gateway.submit(make_signal("TSLA"))
+        gateway.drain()
+        
+        self.assertEqual([e.symbol for e in self.submitted], ["AAPL"])
+        self.assertEqual(self.submitted[0].order_id, "ORD_1")
+        self.assertEqual(self.failed[0].symbol, "TSLA")
+        self.assertIn("buying power", self.failed[0].error)
+        self.assertEqual(gateway.get_stats()["failed"], 1)
+    
+    def test_full_queue_rejects(self):
+        """Test a full queue rejects the order with an ORDER_FAILED event"""
+        broker = SlowBroker(delay=0)
+        gateway = OrderGateway(broker.execute, bus=self.bus, max_queue_size=1)  # Not started
+        self.assertTrue(gateway.submit(make_signal("AAPL")))
+        self.assertFalse(gateway.submit(make_signal("MSFT")))
+        self.assertEqual(self.failed[0].error, "order gateway queue full")
+        self.assertEqual(gateway.get_stats()["rejected"], 1)
+    
+    def test_latency_percentiles(self):
+        """Test submit latency percentiles are reported"""
+        broker = SlowBroker(delay=0.01)
+        gateway = self.make_gateway(broker, workers=2)
+        for i in range(10):
+            gateway.submit(make_signal(f"SYM{i}"))
+        gateway.drain()
+        
+        stats = gateway.get_stats()
+        self.assertGreaterEqual(stats["submit_p50_ms"], 10)
+        self.assertGreaterEqual(stats["submit_p99_ms"], stats["submit_p50_ms"])
+        self.assertEqual(_percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(_percentile([1, 2, 3, 4], 0.99), 4)
+
+
+class TestExecutionGateway(unittest.TestCase):
+    def setUp(self):
+        self.engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, self.engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, self.engine.handle_approved_trade)
+        self.addCleanup(self.engine.stop)
+        self.broker = SlowBroker(delay=0.05)
+        self.engine.set_broker(self.broker)
+    
+    def approve(self, symbol):
+        request = TradeRequestEvent(make_signal(symbol), is_day_trade=False, requested_size=0.05)
+        self.engine.handle_approved_trade(TradeApprovalEvent(request, approved=True))
+    
+    def test_approval_returns_before_submission(self):
+        """Test approved trades are queued and positions recorded by the workers"""
+        db = Mock()
+        self.engine.enable_gateway(workers=4, max_in_flight=4)
+        with patch("execution.get_db_writer", return_value=db):
+            start = time.perf_counter()
+            for symbol in ("AAPL", "MSFT", "TSLA", "NVDA"):
+                self.approve(symbol)
+            self.assertLess(time.perf_counter() - start, 0.05)
+            self.engine.gateway.drain()
+        
+        self.assertEqual(db.write_position_opened.call_count, 4)
+        self.assertEqual(sorted(self.broker.orders), ["AAPL", "MSFT", "NVDA", "TSLA"])
+    
+    def test_alpaca_failure_is_not_stubbed(self):
+        """Test a failed Alpaca order fails instead of recording a stub fill"""
+        self.engine.set_broker(None)
+        self.engine.alpaca_client = Mock()
+        with patch.object(self.engine, "_execute_alpaca_trade", return_value=None):
+            with self.assertRaises(RuntimeError):
+                self.engine.place_order(make_signal(), fallback_to_stub=False)
+            order_id, _, _ = self.engine.place_order(make_signal())
+        self.assertTrue(order_id.startswith("STUB_"))
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_unlimited(self):
+        """Test a zero rate never waits"""
+        limiter = RateLimiter(0)
+        self.assertEqual(sum(limiter.acquire() for _ in range(100)), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the order lifecycle tracker
+Tests state transitions, fill prices, terminal cleanup and reconnect reconciliation
+"""
+
+import time
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from events import EventBus, EventType, SignalEvent, event_bus
+from execution.orders import OrderTracker, OrderState, TradeUpdateFeed, FakeTradingStream
+
+
+def broker_order(order_id, status, filled_qty=0, filled_avg_price=None):
+    return SimpleNamespace(id=order_id, status=status, filled_qty=filled_qty,
+                           filled_avg_price=filled_avg_price)
+
+
+class TestOrderTracker(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+        self.updates = []
+        self.bus.subscribe(EventType.ORDER_UPDATED, self.updates.append)
+        self.tracker = OrderTracker(bus=self.bus)
+        self.stream = FakeTradingStream()
+        self.feed = TradeUpdateFeed(self.stream, self.tracker).start()
+        self.addCleanup(self.feed.stop)
+    
+    def test_partial_then_full_fill(self):
+        """Test fills move the order forward and record actual prices"""
+        self.tracker.track("ORD_1", "AAPL", "buy", 10)
+        self.stream.push("new", "ORD_1")
+        self.stream.push("partial_fill", "ORD_1", fill_qty=4, fill_price=150.10, filled_qty=4)
+        order = self.tracker.get("ORD_1")
+        self.assertEqual(order.state, OrderState.PARTIALLY_FILLED)
+        self.assertEqual(order.avg_fill_price, 150.10)
+        
+        self.stream.push("fill", "ORD_1", fill_qty=6, fill_price=150.20, filled_qty=10)
+        self.assertIsNone(self.tracker.get("ORD_1"))  # Terminal orders are dropped
+        
+        self.assertEqual([u.status for u in self.updates], ["partially_filled", "filled"])
+        filled = self.updates[-1]
+        self.assertEqual(filled.quantity, 10)
+        self.assertAlmostEqual(filled.price, (4 * 150.10 + 6 * 150.20) / 10)
+        self.assertEqual(self.tracker.get_stats()["filled"], 1)
+    
+    def test_broker_average_price_wins(self):
+        """Test the broker's filled_avg_price is used when provided"""
+        self.tracker.track("ORD_1", "AAPL", "buy", 10)
+        self.stream.push("fill", "ORD_1", fill_qty=10, fill_price=150.0,
+                         filled_qty=10, filled_avg_price=150.05)
+        self.assertEqual(self.updates[-1].price, 150.05)
+    
+    def test_cancel_and_reject_are_terminal(self):
+        """Test cancelled and rejected orders leave memory"""
+        self.tracker.track("ORD_1", "AAPL", "buy", 10)
+        self.tracker.track("ORD_2", "MSFT", "buy", 5)
+        self.stream.push("canceled", "ORD_1")
+        self.stream.push("rejected", "ORD_2", symbol="MSFT")
+        
+        self.assertEqual(self.tracker.open_orders(), {})
+        stats = self.tracker.get_stats()
+        self.assertEqual((stats["cancelled"], stats["rejected"]), (1, 1))
+    
+    def test_out_of_order_updates_are_ignored(self):
+        """Test a late 'new' doesn't undo a partial fill"""
+        self.tracker.track("ORD_1", "AAPL", "buy", 10)
+        self.stream.push("partial_fill", "ORD_1", fill_qty=4, fill_price=150.0, filled_qty=4)
+        self.stream.push("new", "ORD_1")
+        self.stream.push("some_future_event", "ORD_1")
+        
+        self.assertEqual(self.tracker.get("ORD_1").state, OrderState.PARTIALLY_FILLED)
+        self.assertEqual(self.tracker.get_stats()["ignored_updates"], 2)
+    
+    def test_untracked_orders_are_adopted(self):
+        """Test updates for orders placed before a restart are followed"""
+        self.stream.push("new", "ORD_9", symbol="TSLA", qty=3)
+        order = self.tracker.get("ORD_9")
+        self.assertEqual((order.symbol, order.quantity), ("TSLA", 3))
+    
+    def test_fill_before_submit_returns(self):
+        """Test an update that beats submit_order is matched by client_order_id and track() merges into it"""
+        context = object()
+        self.tracker.expect("C1", "AAPL", "buy", 10, context=context)
+        self.stream.push("fill", "ORD_1", fill_qty=10, fill_price=150.0, filled_qty=10, client_order_id="C1")
+        self.assertEqual(self.updates[-1].status, OrderState.FILLED)
+        
+        order = self.tracker.track("ORD_1", "AAPL", "buy", 10, context=context, client_order_id="C1")
+        self.assertEqual((order.state, order.filled_qty), (OrderState.FILLED, 10))
+        self.assertIs(order.context, context)
+        self.assertEqual(self.tracker.open_orders(), {})
+        self.assertEqual(self.tracker.get_stats()["expected_orders"], 0)
+    
+    def test_track_after_terminal_update_doesnt_leak(self):
+        """Test track() and late updates for a finished order don't reopen it"""
+        self.stream.push("rejected", "ORD_1")
+        self.tracker.track("ORD_1", "AAPL", "buy", 10)
+        self.stream.push("new", "ORD_1")
+        
+        self.assertEqual(self.tracker.open_orders(), {})
+        self.assertEqual(self.tracker.get_completed("ORD_1").state, OrderState.REJECTED)
+    
+    def test_reconcile_on_reconnect(self):
+        """Test a reconnect reconciles every open order with one get_orders call"""
+        client = Mock()
+        client.get_orders.return_value = [
+            broker_order("ORD_1", "filled", 10, 150.0),
+            broker_order("ORD_2", "partially_filled", 2, 300.0),
+            broker_order("OTHER", "filled", 1, 10.0),
+        ]
+        self.tracker.client = client
+        for order_id in ("ORD_1", "ORD_2", "ORD_3"):
+            self.tracker.track(order_id, "AAPL", "buy", 10)
+        
+        # The first connect doesn't reconcile; reconnects do
+        deadline = time.monotonic() + 2
+        while self.feed.connects < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.get_orders.assert_not_called()
+        self.stream.reconnect()
+        
+        client.get_orders.assert_called_once()
+        self.assertEqual(set(self.tracker.open_orders()), {"ORD_2", "ORD_3"})
+        self.assertEqual(self.tracker.get("ORD_2").filled_qty, 2)
+        self.assertIsNone(self.tracker.get("OTHER"))
+        self.assertEqual(self.tracker.get_stats()["reconciled_orders"], 2)
+
+
+
+class TestExecutionFills(unittest.TestCase):
+    def setUp(self):
+        from execution import ExecutionEngine
+        self.engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, self.engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, self.engine.handle_approved_trade)
+        self.addCleanup(event_bus.unsubscribe, EventType.ORDER_UPDATED, self.engine.handle_order_update)
+        self.stream = FakeTradingStream()
+        self.engine.set_trade_stream(self.stream)
+        self.addCleanup(self.engine.set_trade_stream, None)
+        self.engine.get_ask_price = lambda symbol: 100.0
+        self.engine.alpaca_client = Mock()
+        self.db = Mock()
+        patcher = patch("execution.get_db_writer", return_value=self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def submit(self, *updates):
+        """Submit a buy whose trade updates arrive while submit_order is still running"""
+        def submit_order(order_data):
+            for event, kwargs in updates:
+                self.stream.push(event, "ORD_1", client_order_id=order_data.client_order_id, **kwargs)
+            return SimpleNamespace(id="ORD_1")
+        
+        self.engine.alpaca_client.submit_order.side_effect = submit_order
+        signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+        self.engine.submit_approved([signal])
+    
+    def test_books_actual_fill(self):
+        """Test the position is booked at the broker's fill price and quantity, not the estimate"""
+        self.submit(("partial_fill", dict(fill_qty=5, fill_price=101.0, filled_qty=5)))
+        self.assertEqual(len(self.engine.positions), 0)  # Nothing booked until the order finishes
+        self.assertEqual(self.engine.risk.reserved_count, 1)
+        
+        self.stream.push("canceled", "ORD_1", filled_qty=5, filled_avg_price=101.0)
+        position = self.engine.positions.get("ORD_1")
+        self.assertEqual((position.quantity, position.entry_price), (5, 101.0))
+        self.db.write_position_opened.assert_called_once_with(
+            symbol="AAPL", quantity=5, entry_price=101.0, strategy="solar_flare", order_id="ORD_1")
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+    
+    def test_fill_before_submit_returns_is_booked_once(self):
+        """Test a fill that arrives before submit_order returns is booked exactly once"""
+        self.submit(("fill", dict(fill_qty=20, fill_price=99.5, filled_qty=20, filled_avg_price=99.5)))
+        self.assertEqual(len(self.engine.positions), 1)
+        self.assertEqual(self.engine.positions.get("ORD_1").entry_price, 99.5)
+        self.assertEqual(self.engine.pending_orders, {})
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+    
+    def test_rejection_releases_reservation(self):
+        """Test a rejected order books nothing and frees its risk reservation"""
+        self.submit()
+        self.assertEqual(self.engine.risk.reserved_count, 1)
+        self.stream.push("rejected", "ORD_1")
+        
+        self.assertEqual(len(self.engine.positions), 0)
+        self.db.write_position_opened.assert_not_called()
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
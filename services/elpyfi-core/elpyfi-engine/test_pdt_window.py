@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the rolling PDT window
+Tests business-day expiry, open-trade indexing and snapshot persistence
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+import clock
+from clock import SimulatedClock, set_clock
+from events import event_bus, EventType, PositionEvent, SignalEvent, TradeRequestEvent
+from pdt_tracker import PDTTracker, window_start
+
+
+class TestWindowStart(unittest.TestCase):
+    def test_skips_weekends(self):
+        """Test the window covers today plus the previous 4 business days"""
+        self.assertEqual(window_start(date(2024, 1, 5)), datetime(2024, 1, 1))   # Fri -> Mon
+        self.assertEqual(window_start(date(2024, 1, 10)), datetime(2024, 1, 4))  # Wed -> Thu
+        self.assertEqual(window_start(date(2024, 1, 8)), datetime(2024, 1, 2))   # Mon -> Tue
+        self.assertEqual(window_start(date(2024, 1, 6)), datetime(2024, 1, 1))   # Sat -> Mon
+
+
+class TestRollingPDTWindow(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedClock(datetime(2024, 1, 3, 10, 0))  # A Wednesday
+        self.previous = set_clock(self.sim)
+        self.tmp = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tmp, "pdt.json")
+        self.trackers = []
+    
+    def tearDown(self):
+        set_clock(self.previous)
+        for tracker in self.trackers:
+            event_bus.unsubscribe(EventType.DAY_TRADE_REQUESTED, tracker.handle_day_trade_request)
+            event_bus.unsubscribe(EventType.POSITION_CLOSED, tracker.record_day_trade)
+        shutil.rmtree(self.tmp)
+    
+    def make_tracker(self):
+        tracker = PDTTracker(state_path=self.state_path)
+        self.trackers.append(tracker)
+        return tracker
+    
+    def request_day_trade(self, tracker, symbol):
+        signal = SignalEvent("test", symbol, "buy", 0.8, 0.02, clock.now())
+        tracker.handle_day_trade_request(TradeRequestEvent(signal, True, 0.05))
+    
+    def close(self, tracker, symbol):
+        tracker.record_day_trade(PositionEvent(symbol, "closed", 10, 100.0, clock.now(), "ORD"))
+    
+    def test_rolling_not_weekly(self):
+        """Test a Wednesday trade still counts the next Monday and expires on Wednesday"""
+        tracker = self.make_tracker()
+        self.request_day_trade(tracker, "AAPL")
+        
+        self.sim.set(datetime(2024, 1, 8, 9, 0))  # Monday: a Monday-based week would reset here
+        self.assertEqual(tracker.get_trades_this_week(), 1)
+        self.sim.set(datetime(2024, 1, 9, 16, 0))  # Tuesday: 5th business day
+        self.assertEqual(tracker.get_trades_this_week(), 1)
+        self.sim.set(datetime(2024, 1, 10, 9, 0))  # Wednesday: dropped
+        self.assertEqual(tracker.get_trades_this_week(), 0)
+        self.assertEqual(tracker.get_status()["week_start"], "2024-01-04T00:00:00")
+    
+    def test_close_matches_oldest_open_trade(self):
+        """Test closes pair with the oldest open day trade in the symbol"""
+        tracker = self.make_tracker()
+        self.request_day_trade(tracker, "AAPL")
+        self.sim.advance(timedelta(minutes=5))
+        self.request_day_trade(tracker, "AAPL")
+        self.sim.advance(timedelta(minutes=5))
+        self.close(tracker, "AAPL")
+        
+        first, second = tracker.day_trades
+        self.assertEqual(first.close_time, clock.now())
+        self.assertEqual(second.close_time, second.open_time)
+        self.assertEqual(len(tracker.open_day_trades["AAPL"]), 1)
+        
+        self.close(tracker, "AAPL")
+        self.close(tracker, "AAPL")  # Nothing left to close
+        self.assertNotIn("AAPL", tracker.open_day_trades)
+    
+    def test_budget_survives_restart(self):
+        """Test a new tracker restores the window from the snapshot"""
+        tracker = self.make_tracker()
+        for symbol in ("AAPL", "MSFT", "TSLA"):
+            self.request_day_trade(tracker, symbol)
+        self.close(tracker, "MSFT")
+        self.assertFalse(tracker.can_day_trade())
+        
+        restarted = self.make_tracker()
+        self.assertEqual(restarted.get_trades_this_week(), 3)
+        self.assertFalse(restarted.can_day_trade())
+        self.assertEqual(set(restarted.open_day_trades), {"AAPL", "TSLA"})
+    
+    def test_expired_trades_are_not_restored(self):
+        """Test trades that left the window while down are dropped on load"""
+        tracker = self.make_tracker()
+        self.request_day_trade(tracker, "AAPL")
+        
+        self.sim.set(datetime(2024, 1, 12, 9, 0))
+        restarted = self.make_tracker()
+        self.assertEqual(restarted.get_trades_this_week(), 0)
+        with open(self.state_path) as f:
+            self.assertEqual(json.load(f)["day_trades"], [])
+    
+    def test_unreadable_snapshot_is_ignored(self):
+        """Test a corrupt snapshot doesn't stop the tracker from starting"""
+        with open(self.state_path, "w") as f:
+            f.write("{not json")
+        tracker = self.make_tracker()
+        self.assertEqual(tracker.get_trades_this_week(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-memory position book
+Tests indexes, vectorized marks, P&L aggregation and bulk mark flushing
+"""
+
+import time
+import unittest
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import Mock, patch
+import psycopg2
+import db_writer
+from db_writer import DatabaseWriter
+from events import event_bus, EventType, SignalEvent
+from execution.positions import PositionBook, MarkFlusher
+from execution.quotes import QuoteCache
+
+
+def make_writer(with_order_id=True):
+    """DatabaseWriter with a mocked cursor"""
+    with patch.object(DatabaseWriter, "_connect"), patch.object(DatabaseWriter, "_validate_schema"):
+        writer = DatabaseWriter("postgresql://test")
+    columns = ['id', 'symbol', 'quantity', 'entry_price', 'current_price',
+               'unrealized_pl', 'strategy', 'status']
+    writer.available_columns = {'positions': columns + (['order_id'] if with_order_id else [])}
+    writer._refresh_statements()
+    writer.test_cursor = Mock(rowcount=2)
+    
+    @contextmanager
+    def cursor():
+        yield writer.test_cursor
+    
+    writer.cursor = cursor
+    return writer
+
+
+class TestPositionBook(unittest.TestCase):
+    def setUp(self):
+        self.book = PositionBook(capacity=2)
+        self.book.open("ORD_1", "AAPL", "solar_flare", 10, 150.0)
+        self.book.open("ORD_2", "AAPL", "momentum", 5, 152.0)
+        self.book.open("ORD_3", "MSFT", "solar_flare", 4, 300.0, side="sell")
+    
+    def test_indexes(self):
+        """Test lookups by order id, symbol and strategy"""
+        self.assertEqual(len(self.book), 3)
+        self.assertEqual(self.book.get("ORD_3").quantity, -4)
+        self.assertEqual([p.order_id for p in self.book.positions(symbol="AAPL")], ["ORD_1", "ORD_2"])
+        self.assertEqual([p.order_id for p in self.book.positions(strategy="solar_flare")], ["ORD_1", "ORD_3"])
+        self.assertEqual([p.order_id for p in self.book.positions("AAPL", "momentum")], ["ORD_2"])
+    
+    def test_marks_and_pnl(self):
+        """Test one mark update reprices every position in the quoted symbols"""
+        changed = self.book.update_marks({"AAPL": 155.0, "MSFT": 290.0, "TSLA": 200.0})
+        self.assertEqual(changed, 3)
+        
+        self.assertAlmostEqual(self.book.unrealized_pl(), 50 + 15 + 40)
+        self.assertEqual(self.book.pnl_by_symbol(), {"AAPL": 65.0, "MSFT": 40.0})
+        self.assertEqual(self.book.pnl_by_strategy(), {"solar_flare": 90.0, "momentum": 15.0})
+        
+        # Unchanged prices aren't dirtied again
+        self.book.take_dirty()
+        self.assertEqual(self.book.update_marks({"AAPL": 155.0}), 0)
+        self.assertEqual(self.book.take_dirty(), [])
+    
+    def test_close_frees_slot(self):
+        """Test closing returns realized P&L and leaves the indexes"""
+        self.book.update_marks({"AAPL": 151.0})
+        self.assertAlmostEqual(self.book.close("ORD_1"), 10.0)
+        self.assertAlmostEqual(self.book.close("ORD_3", exit_price=310.0), -40.0)
+        self.assertIsNone(self.book.close("ORD_1"))
+        
+        self.assertEqual(self.book.symbols(), ["AAPL"])
+        self.assertEqual(self.book.pnl_by_strategy(), {"momentum": -5.0})
+        
+        self.book.open("ORD_4", "TSLA", "momentum", 1, 200.0)
+        self.assertEqual(self.book.get_stats()["open_positions"], 2)
+        self.assertEqual(self.book._size, 3)  # Reused a freed slot
+    
+    def test_take_dirty(self):
+        """Test dirty rows are handed out once, with signed quantities, and can be restored"""
+        self.book.update_marks({"AAPL": 155.0, "MSFT": 290.0})
+        rows = self.book.take_dirty()
+        self.assertEqual(sorted(rows), [("ORD_1", 155.0, 50.0, 10.0), ("ORD_2", 155.0, 15.0, 5.0),
+                                        ("ORD_3", 290.0, 40.0, -4.0)])
+        self.assertEqual(self.book.take_dirty(), [])
+        
+        self.book.restore_dirty(["ORD_2"])
+        self.assertEqual(self.book.take_dirty(), [("ORD_2", 155.0, 15.0, 5.0)])
+    
+    def test_vectorized_mark_speed(self):
+        """Test marking 20k positions takes milliseconds, not a Python loop per row"""
+        book = PositionBook()
+        for i in range(20000):
+            book.open(f"ORD_{i}", f"SYM{i % 500}", f"s{i % 5}", 10, 100.0)
+        prices = {f"SYM{i}": 101.0 for i in range(500)}
+        start = time.perf_counter()
+        self.assertEqual(book.update_marks(prices), 20000)
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertAlmostEqual(book.unrealized_pl(), 20000 * 10.0)
+
+
+class TestMarkFlusher(unittest.TestCase):
+    def setUp(self):
+        self.book = PositionBook()
+        self.book.open("ORD_1", "AAPL", "solar_flare", 10, 150.0)
+        self.book.open("ORD_2", "MSFT", "solar_flare", 5, 300.0)
+        self.quotes = QuoteCache()
+    
+    def test_flush_is_one_bulk_update(self):
+        """Test changed marks go out in a single UPDATE ... FROM (VALUES ...)"""
+        writer = make_writer()
+        calls = []
+        with patch.object(db_writer, "execute_values", lambda cur, sql, rows, **kw: calls.append((sql, rows))):
+            flusher = MarkFlusher(self.book, lambda: writer, quotes=self.quotes)
+            self.quotes.update("AAPL", 154.0, 156.0)
+            self.quotes.update("MSFT", 304.0, 306.0)
+            self.assertEqual(flusher.flush(), 2)
+            self.assertEqual(flusher.flush(), 0)  # Nothing changed since
+        
+        self.assertEqual(len(calls), 1)
+        sql, rows = calls[0]
+        self.assertIn("UPDATE positions", sql)
+        self.assertEqual(sorted(rows), [("ORD_1", 155.0, 50.0, 10.0), ("ORD_2", 305.0, 25.0, 5.0)])
+    
+    def test_failed_flush_is_retried(self):
+        """Test rows stay dirty when the write fails"""
+        writer = Mock()
+        writer.write_position_marks.side_effect = [None, 1]
+        flusher = MarkFlusher(self.book, lambda: writer)
+        self.book.update_marks({"AAPL": 151.0})
+        
+        self.assertEqual(flusher.flush(), 0)
+        self.assertEqual(flusher.flush(), 1)
+        self.assertEqual(writer.write_position_marks.call_args_list[1].args[0], [("ORD_1", 151.0, 10.0, 10.0)])
+        self.assertEqual(flusher.get_stats()["flush_failures"], 1)
+    
+    def test_writer_errors(self):
+        """Test database errors report a retry and a missing order_id column skips the write"""
+        writer = make_writer()
+        with patch.object(db_writer, "execute_values", side_effect=psycopg2.OperationalError("down")):
+            self.assertIsNone(writer.write_position_marks([("ORD_1", 151.0, 10.0, 10.0)]))
+        
+        self.assertEqual(make_writer(with_order_id=False).write_position_marks([("ORD_1", 151.0, 10.0, 10.0)]), 0)
+
+
+class TestExecutionEngineBook(unittest.TestCase):
+    def test_executed_trades_enter_book(self):
+        """Test record_position adds the fill to the position book"""
+        from execution import ExecutionEngine
+        engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, engine.handle_approved_trade)
+        
+        db = Mock()
+        with patch("execution.get_db_writer", return_value=db):
+            signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+            engine.record_position(signal, "ORD_1", 10, 150.0)
+        
+        self.assertEqual(engine.positions.get("ORD_1").entry_price, 150.0)
+        db.write_position_opened.assert_called_once()
+    
+    def test_short_rows_are_stored_negative(self):
+        """Test a short is written with a negative quantity, as the book holds it"""
+        from execution import ExecutionEngine
+        engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, engine.handle_approved_trade)
+        self.addCleanup(event_bus.unsubscribe, EventType.ORDER_UPDATED, engine.handle_order_update)
+        
+        db = Mock()
+        with patch("execution.get_db_writer", return_value=db):
+            signal = SignalEvent("solar_flare", "AAPL", "sell", 0.8, 10.0, datetime(2024, 1, 2))
+            engine.record_position(signal, "ORD_1", 10, 150.0)
+        
+        self.assertEqual(db.write_position_opened.call_args.kwargs["quantity"], -10)
+        engine.positions.update_marks({"AAPL": 140.0})
+        self.assertEqual(engine.positions.take_dirty(), [("ORD_1", 140.0, 100.0, -10.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
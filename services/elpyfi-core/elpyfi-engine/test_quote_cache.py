@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the live quote cache
+Tests staleness, the fake quote stream and REST fallback in ExecutionEngine
+"""
+
+import time
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+from events import event_bus, EventType, SignalEvent
+from execution import ExecutionEngine
+from execution.quotes import QuoteCache, QuoteFeed, FakeQuoteStream
+
+
+def rest_quote(ask_price, bid_price=None):
+    return SimpleNamespace(ask_price=ask_price, bid_price=bid_price or ask_price - 0.01,
+                           timestamp=datetime(2024, 1, 2, 10, 0))
+
+
+class TestQuoteCache(unittest.TestCase):
+    def test_fresh_quote_is_returned(self):
+        """Test a recent quote is served from the cache"""
+        cache = QuoteCache(max_age=5)
+        cache.update("AAPL", 149.99, 150.01)
+        self.assertEqual(cache.get_ask("AAPL"), 150.01)
+        self.assertEqual(cache.get_stats()["hits"], 1)
+    
+    def test_missing_and_stale_quotes(self):
+        """Test missing or old quotes are not used"""
+        cache = QuoteCache(max_age=0.01)
+        self.assertIsNone(cache.get_ask("AAPL"))
+        cache.update("AAPL", 149.99, 150.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get_ask("AAPL"))
+        
+        stats = cache.get_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["stale"], 1)
+    
+    def test_zero_ask_is_unusable(self):
+        """Test a one-sided quote with no ask isn't used for sizing"""
+        cache = QuoteCache()
+        cache.update("AAPL", 149.99, 0)
+        self.assertIsNone(cache.get_ask("AAPL"))
+    
+    def test_fake_stream_feeds_cache(self):
+        """Test quotes pushed through the stream land in the cache"""
+        cache = QuoteCache()
+        stream = FakeQuoteStream()
+        feed = QuoteFeed(stream, cache).start(["AAPL"])
+        try:
+            stream.push("AAPL", 149.99, 150.01)
+            stream.push("MSFT", 399.0, 400.0)  # Not subscribed
+            self.assertEqual(cache.get_ask("AAPL"), 150.01)
+            self.assertIsNone(cache.get_ask("MSFT"))
+            
+            feed.subscribe(["MSFT", "AAPL"])
+            stream.push("MSFT", 399.0, 400.0)
+            self.assertEqual(cache.get_ask("MSFT"), 400.0)
+            self.assertEqual(feed.subscribed, {"AAPL", "MSFT"})
+        finally:
+            feed.stop()
+        self.assertIsNone(feed._thread)
+
+
+class TestExecutionQuotes(unittest.TestCase):
+    def setUp(self):
+        self.engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, self.engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, self.engine.handle_approved_trade)
+        self.engine.data_client = Mock()
+        self.engine.data_client.get_stock_latest_quote.side_effect = (
+            lambda request: {symbol: rest_quote(151.0) for symbol in request.symbol_or_symbols}
+        )
+        self.stream = FakeQuoteStream()
+        self.engine.set_quote_stream(self.stream, ["AAPL"])
+        self.addCleanup(self.engine.stop)
+    
+    def test_cached_ask_skips_rest(self):
+        """Test sizing uses the streamed ask without a REST call"""
+        self.stream.push("AAPL", 149.99, 150.01)
+        self.assertEqual(self.engine.get_ask_price("AAPL"), 150.01)
+        self.engine.data_client.get_stock_latest_quote.assert_not_called()
+    
+    def test_rest_fallback_when_stale(self):
+        """Test a stale cache falls back to REST once and subscribes the symbol"""
+        self.assertEqual(self.engine.get_ask_price("TSLA"), 151.0)
+        self.assertEqual(self.engine.rest_quote_requests, 1)
+        self.assertIn("TSLA", self.engine.quote_feed.subscribed)
+        
+        # The REST quote is cached too
+        self.assertEqual(self.engine.get_ask_price("TSLA"), 151.0)
+        self.assertEqual(self.engine.rest_quote_requests, 1)
+        
+        self.engine.quote_cache.max_age = 0
+        self.engine.get_ask_price("TSLA")
+        self.assertEqual(self.engine.rest_quote_requests, 2)
+    
+    def test_alpaca_trade_sizes_from_cache(self):
+        """Test order quantity comes from the cached ask"""
+        self.engine.alpaca_client = Mock()
+        self.engine.alpaca_client.submit_order.return_value = SimpleNamespace(id="ORD_1")
+        self.engine.portfolio_value = 100000
+        self.stream.push("AAPL", 99.99, 100.0)
+        
+        signal = SignalEvent("solar_flare", "AAPL", "buy", 0.8, 10.0, datetime(2024, 1, 2))
+        result = self.engine._execute_alpaca_trade(signal)
+        
+        self.assertEqual(result["quantity"], 20.0)
+        self.assertEqual(result["price"], 100.0)
+        self.engine.data_client.get_stock_latest_quote.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
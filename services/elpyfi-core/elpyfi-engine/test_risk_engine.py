@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pre-trade risk engine
+Tests RISK_RULES limits, batch checks, reservations and the execution hook
+"""
+
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from clock import SimulatedClock, set_clock
+from events import event_bus, EventType, SignalEvent, TradeRequestEvent, TradeApprovalEvent
+from execution.positions import PositionBook
+from execution.risk import RiskEngine
+
+RULES = {"max_position_size": 0.02, "max_daily_loss": 0.05, "max_open_positions": 3}
+
+
+class TestRiskEngine(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimulatedClock(datetime(2024, 1, 2, 10, 0))
+        self.previous = set_clock(self.sim)
+        self.book = PositionBook()
+        self.risk = RiskEngine(self.book, rules=RULES, portfolio_value=100000)
+    
+    def tearDown(self):
+        set_clock(self.previous)
+    
+    def test_position_size_limit(self):
+        """Test exposure per symbol is capped at max_position_size of the portfolio"""
+        self.assertEqual(self.risk.check("AAPL", "buy", 2000), (True, None))
+        self.book.open("ORD_1", "AAPL", "s", 10, 150.0)
+        approved, reason = self.risk.check("AAPL", "buy", 1000)
+        self.assertFalse(approved)
+        self.assertIn("AAPL exposure", reason)
+        self.assertTrue(self.risk.check("MSFT", "buy", 2000)[0])
+    
+    def test_open_position_limit(self):
+        """Test new positions stop at max_open_positions"""
+        for i, symbol in enumerate(("AAPL", "MSFT", "TSLA")):
+            self.book.open(f"ORD_{i}", symbol, "s", 1, 100.0)
+        approved, reason = self.risk.check("NVDA", "buy", 500)
+        self.assertFalse(approved)
+        self.assertIn("Open position limit", reason)
+    
+    def test_reducing_orders_always_pass(self):
+        """Test a sell against a long is allowed even past every limit"""
+        for i, symbol in enumerate(("AAPL", "MSFT", "TSLA")):
+            self.book.open(f"ORD_{i}", symbol, "s", 100, 100.0)
+        self.book.update_marks({"AAPL": 40.0})  # -6,000: past the daily loss limit
+        self.assertEqual(self.risk.check("AAPL", "sell", 2000), (True, None))
+        self.assertFalse(self.risk.check("NVDA", "sell", 2000)[0])  # Opens a short
+    
+    def test_daily_loss_limit_resets_next_day(self):
+        """Test realized losses block new risk until the day rolls over"""
+        self.risk.record_realized(-5000)
+        approved, reason = self.risk.check("AAPL", "buy", 1000)
+        self.assertFalse(approved)
+        self.assertIn("Daily loss", reason)
+        
+        self.sim.advance(timedelta(days=1))
+        self.assertTrue(self.risk.check("AAPL", "buy", 1000)[0])
+        self.assertEqual(self.risk.get_stats()["rejections"]["daily_loss"], 1)
+    
+    def test_batch_counts_earlier_orders(self):
+        """Test one pass over a batch applies limits cumulatively, in order"""
+        orders = [("AAPL", "buy", 1500), ("MSFT", "buy", 1500), ("AAPL", "buy", 1000),
+                  ("TSLA", "buy", 500), ("NVDA", "buy", 500)]
+        results = self.risk.check_batch(orders)
+        self.assertEqual([approved for approved, _ in results], [True, True, False, True, False])
+        self.assertIn("AAPL exposure", results[2][1])
+        self.assertIn("Open position limit", results[4][1])
+    
+    def test_reservations_hold_until_released(self):
+        """Test in-flight orders count against limits until released"""
+        (approved, _, token), = self.risk.reserve_batch([("AAPL", "buy", 2000)])
+        self.assertTrue(approved)
+        self.assertFalse(self.risk.check("AAPL", "buy", 100)[0])
+        self.risk.release(token)
+        self.risk.release(token)  # Second release is a no-op
+        self.assertTrue(self.risk.check("AAPL", "buy", 100)[0])
+        self.assertEqual(self.risk.get_stats()["reserved_orders"], 0)
+    
+    def test_batch_is_vectorized(self):
+        """Test a large batch of approvals is checked quickly"""
+        risk = RiskEngine(self.book, rules=dict(RULES, max_open_positions=100000), portfolio_value=1e9)
+        orders = [(f"SYM{i % 2000}", "buy", 1000.0) for i in range(20000)]
+        start = time.perf_counter()
+        results = risk.check_batch(orders)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertTrue(all(approved for approved, _ in results))
+
+
+class TestExecutionRiskStage(unittest.TestCase):
+    def setUp(self):
+        from execution import ExecutionEngine
+        self.engine = ExecutionEngine()
+        self.addCleanup(event_bus.unsubscribe, EventType.SIGNAL_GENERATED, self.engine.handle_signal)
+        self.addCleanup(event_bus.unsubscribe, EventType.DAY_TRADE_APPROVED, self.engine.handle_approved_trade)
+        self.engine.risk.rules = RULES
+        self.rejected = []
+        event_bus.subscribe(EventType.RISK_REJECTED, self.rejected.append)
+        self.addCleanup(event_bus.unsubscribe, EventType.RISK_REJECTED, self.rejected.append)
+        patcher = patch("execution.get_db_writer", return_value=Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def pdt_tracker(self):
+        from pdt_tracker import PDTTracker
+        tracker = PDTTracker()
+        for event_type, handler in tracker.subscriptions():
+            self.addCleanup(event_bus.unsubscribe, event_type, handler)
+        return tracker
+    
+    def approval(self, symbol, action="buy"):
+        signal = SignalEvent("solar_flare", symbol, action, 0.8, 10.0, datetime(2024, 1, 2))
+        return TradeApprovalEvent(TradeRequestEvent(signal, False, 0.02), True)
+    
+    def test_batch_of_approvals(self):
+        """Test approvals past the limits never reach the broker"""
+        self.engine.submit_approved([self.approval(s).trade_request.signal_event
+                                     for s in ("AAPL", "MSFT", "AAPL", "TSLA", "NVDA")])
+        
+        self.assertEqual(sorted(p.symbol for p in self.engine.positions.positions()), ["AAPL", "MSFT", "TSLA"])
+        self.assertEqual([e.symbol for e in self.rejected], ["AAPL", "NVDA"])
+        self.assertEqual(self.rejected[0].status, "risk_rejected")
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+    
+    def test_signal_approved_twice_releases_both_reservations(self):
+        """Test each approval of the same signal object holds and releases its own reservation"""
+        signal = self.approval("AAPL").trade_request.signal_event
+        self.engine.risk.rules = dict(RULES, max_position_size=1.0)
+        self.engine.gateway = Mock(submit=Mock(return_value=True))  # Both orders queued, neither filled
+        self.engine.submit_approved([signal])
+        self.engine.submit_approved([signal])
+        self.assertEqual(self.engine.risk.reserved_count, 2)
+        
+        # A third approval executed inline releases only its own reservation
+        self.engine.gateway = None
+        self.engine.submit_approved([signal])
+        self.assertEqual(self.engine.risk.reserved_count, 2)
+        
+        for order_id in ("ORD_1", "ORD_2"):
+            self.engine.record_position(signal, order_id, 10, 100.0)
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+        self.assertEqual(self.engine._risk_tokens, {})
+    
+    def test_closing_feeds_daily_loss(self):
+        """Test realized losses from closed positions count toward the daily limit"""
+        self.engine.handle_approved_trade(self.approval("AAPL"))
+        order_id = self.engine.positions.positions()[0].order_id
+        self.assertAlmostEqual(self.engine.close_position(order_id, 40.0), -6000.0)
+        
+        self.engine.handle_approved_trade(self.approval("MSFT"))
+        self.assertEqual(len(self.engine.positions), 0)
+        self.assertIn("Daily loss", self.rejected[-1].error)
+
+    
+    def test_sell_closes_long_and_symbol_reopens(self):
+        """Test buy, sell, buy: the sell closes the long, realizes P&L and frees the symbol"""
+        closed = []
+        event_bus.subscribe(EventType.POSITION_CLOSED, closed.append)
+        self.addCleanup(event_bus.unsubscribe, EventType.POSITION_CLOSED, closed.append)
+        fills = iter([("ORD_1", 10, 100.0), ("ORD_2", 10, 95.0), ("ORD_3", 10, 100.0)])
+        self.engine.place_order = lambda signal, fallback_to_stub=True: next(fills)
+        
+        self.engine.handle_approved_trade(self.approval("AAPL"))
+        self.engine.handle_approved_trade(self.approval("AAPL", "sell"))
+        book = self.engine.positions
+        self.assertEqual((len(book), book.exposure("AAPL"), book.net_quantity("AAPL")), (0, 0.0, 0.0))
+        self.assertEqual(self.engine.risk.realized_today, -50.0)
+        self.assertEqual([(e.order_id, e.size) for e in closed], [("ORD_1", 10)])
+        
+        self.engine.handle_approved_trade(self.approval("AAPL"))
+        self.assertEqual(self.rejected, [])
+        self.assertEqual([p.order_id for p in book.positions()], ["ORD_3"])
+        self.assertEqual((closed[0].strategy, closed[0].realized_pl), ("solar_flare", -50.0))
+    
+    def test_closed_positions_feed_allocator_win_rate(self):
+        """Test realized P&L from POSITION_CLOSED updates the PDT allocator's strategy stats"""
+        tracker = self.pdt_tracker()
+        fills = iter([("ORD_1", 10, 100.0), ("ORD_2", 10, 95.0), ("ORD_3", 10, 100.0), ("ORD_4", 10, 110.0)])
+        self.engine.place_order = lambda signal, fallback_to_stub=True: next(fills)
+        for action in ("buy", "sell", "buy", "sell"):
+            self.engine.handle_approved_trade(self.approval("AAPL", action))
+        
+        stats = tracker.allocator.get_strategy_stats()["solar_flare"]
+        self.assertEqual((stats["trades"], stats["wins"], stats["total_pnl"]), (2, 1, 50.0))
+    
+    def test_partial_and_oversized_reductions(self):
+        """Test a sell nets oldest longs first and only the excess opens a short"""
+        book = self.engine.positions
+        book.open("ORD_1", "AAPL", "s", 10, 100.0)
+        book.open("ORD_2", "AAPL", "s", 10, 110.0)
+        fills, remaining = book.reduce("AAPL", 15, 120.0, "sell")
+        self.assertEqual(fills, [("ORD_1", 10, 200.0, True), ("ORD_2", 5, 50.0, False)])
+        self.assertEqual(remaining, 0.0)
+        self.assertEqual(book.get("ORD_2").quantity, 5)
+        
+        signal = SignalEvent("s", "AAPL", "sell", 0.8, 10.0, datetime(2024, 1, 2))
+        self.engine.record_position(signal, "ORD_3", 8, 120.0)
+        self.assertEqual([(p.order_id, p.quantity) for p in book.positions()], [("ORD_3", -3.0)])
+        self.assertEqual(book.net_quantity("AAPL"), -3.0)
+    
+    def test_rejected_day_trade_gives_back_pdt_slot(self):
+        """Test a day trade rejected by risk or failed at the broker doesn't use up a PDT slot"""
+        tracker = self.pdt_tracker()
+        
+        def request(symbol, is_day_trade=True):
+            signal = SignalEvent("solar_flare", symbol, "buy", 0.8, 10.0, datetime(2024, 1, 2))
+            tracker.handle_day_trade_request(TradeRequestEvent(signal, is_day_trade, 0.02))
+        
+        self.engine.risk.rules = dict(RULES, max_open_positions=0)
+        request("AAPL")
+        self.assertEqual(self.rejected[-1].status, "risk_rejected")
+        self.assertEqual(tracker.get_remaining_trades(), 3)
+        
+        self.engine.risk.rules = RULES
+        self.engine.place_order = Mock(side_effect=RuntimeError("broker down"))
+        request("MSFT")
+        self.assertEqual(tracker.get_remaining_trades(), 3)
+        self.assertEqual(self.engine.risk.reserved_count, 0)
+        
+        # A filled day trade keeps its slot; a rejected swing trade doesn't free it
+        self.engine.place_order = Mock(return_value=("ORD_1", 10, 100.0))
+        request("TSLA")
+        self.assertEqual(tracker.get_remaining_trades(), 2)
+        self.engine.risk.rules = dict(RULES, max_open_positions=0)
+        request("NVDA", is_day_trade=False)
+        self.assertEqual(self.rejected[-1].symbol, "NVDA")
+        self.assertEqual(tracker.get_remaining_trades(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
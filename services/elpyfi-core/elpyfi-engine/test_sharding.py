@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Unit tests for symbol-sharded strategy execution
+Tests shard routing and signal delivery back to the parent event bus
+"""
+
+import unittest
+from datetime import datetime
+from events import EventBus, EventType
+from sharding import ShardedStrategyRunner, shard_for_symbol
+from strategies.models import MarketData
+
+
+def make_tick(symbol: str, spike: bool) -> MarketData:
+    """Build a tick that does (spike) or doesn't trigger solar flare"""
+    price = 100.5 if spike else 100.0
+    return MarketData(
+        symbol=symbol, timestamp=datetime(2024, 1, 2, 12, 0), current_price=price,
+        volume=2000000 if spike else 1000000, high=101, low=99, open=100, close=price,
+        indicators={"vwap": 100.0, "avg_volume": 1000000}
+    )
+
+
+class TestShardRouting(unittest.TestCase):
+    def test_shard_for_symbol_is_stable(self):
+        """Test the same symbol always maps to the same shard"""
+        for symbol in ["AAPL", "MSFT", "TSLA"]:
+            shard = shard_for_symbol(symbol, 4)
+            self.assertEqual(shard, shard_for_symbol(symbol, 4))
+            self.assertTrue(0 <= shard < 4)
+    
+    def test_symbols_spread_across_shards(self):
+        """Test many symbols use every shard"""
+        shards = {shard_for_symbol(f"SYM{i}", 4) for i in range(100)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+
+
+class TestShardedStrategyRunner(unittest.TestCase):
+    def setUp(self):
+        self.bus = EventBus()
+        self.signals = []
+        self.bus.subscribe(EventType.SIGNAL_GENERATED, self.signals.append)
+        self.runner = ShardedStrategyRunner(
+            {'solar_flare': {'test_mode': True}}, num_shards=2, bus=self.bus
+        )
+        self.runner.start()
+    
+    def tearDown(self):
+        self.runner.stop()
+    
+    def test_signals_return_to_parent_bus(self):
+        """Test signals from worker processes are emitted in the parent"""
+        symbols = [f"SYM{i}" for i in range(20)]
+        self.runner.submit_batch([make_tick(s, spike=True) for s in symbols])
+        self.runner.submit_batch([make_tick(s, spike=False) for s in symbols])
+        
+        self.assertTrue(self.runner.wait_idle(timeout=30))
+        self.assertEqual(sorted(s.symbol for s in self.signals), sorted(symbols))
+        self.assertTrue(all(s.action == "buy" for s in self.signals))
+        self.assertTrue(all(s.strategy == "SolarFlareStrategy" for s in self.signals))
+        
+        stats = self.runner.get_stats()
+        self.assertEqual(sum(stats['processed']), 40)
+        self.assertEqual(stats['backlog'], [0, 0])
+        self.assertEqual(stats['signals_received'], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
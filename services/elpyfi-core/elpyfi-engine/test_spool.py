@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the degraded-mode write spool
+Tests append/seal/checkpoint, idempotent replay, rejects and DatabaseWriter spooling
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import psycopg2
+import db_writer
+from db_writer import DatabaseWriter
+from events import SignalEvent
+from spool import WriteSpool, SpoolWriter, SpoolReplayer
+from test_db_pool import FakePool, FakeConnection
+
+
+def make_signal(symbol="AAPL"):
+    return SignalEvent("solar_flare", symbol, "buy", 0.8, 10.0, datetime(2024, 1, 2, 10, 0))
+
+
+class FakeReplayWriter:
+    """Keeps replayed records keyed by spool id, like the guarded inserts do"""
+    
+    def __init__(self):
+        self.schema_validated = True
+        self.rows = {}
+        self.calls = 0
+        self.fail_with = None
+        self.bad_ids = set()
+    
+    def replay_spooled(self, records):
+        self.calls += 1
+        if self.fail_with is not None:
+            raise self.fail_with
+        if any(r["id"] in self.bad_ids for r in records):
+            raise psycopg2.DataError("invalid input syntax")
+        for record in records:
+            self.rows.setdefault(record["id"], record)
+        return len(records)
+
+
+class TestWriteSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.spool = WriteSpool(self.directory, fsync_batch=2, fsync_interval=60)
+        self.addCleanup(self.spool.close)
+    
+    def test_append_writes_jsonl(self):
+        """Test records are framed one JSON object per line"""
+        first = self.spool.append("signal", {"symbol": "AAPL"})
+        self.spool.append("position.closed", {"position_id": 7})
+        
+        with open(self.spool.active_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["kind"] for r in records], ["signal", "position.closed"])
+        self.assertEqual(records[0]["id"], first)
+        self.assertEqual(records[1]["data"], {"position_id": 7})
+        self.assertEqual(self.spool.fsyncs, 1)  # One fsync for the batch of two
+    
+    def test_unknown_kind(self):
+        """Test only known record kinds are accepted"""
+        with self.assertRaises(ValueError):
+            self.spool.append("order", {})
+    
+    def test_seal_and_checkpoint(self):
+        """Test sealed segments resume from their checkpoint"""
+        for symbol in ("AAPL", "MSFT", "TSLA"):
+            self.spool.append("signal", {"symbol": symbol})
+        segment = self.spool.seal()
+        self.assertEqual(self.spool.segments(), [segment])
+        self.assertIsNone(self.spool.seal())
+        
+        offset, record = next(self.spool.read_segment(segment))
+        self.assertEqual(record["data"]["symbol"], "AAPL")
+        self.spool.checkpoint(segment, offset, 1)
+        
+        remaining = [r["data"]["symbol"] for _, r in self.spool.read_segment(segment)]
+        self.assertEqual(remaining, ["MSFT", "TSLA"])
+        self.assertEqual(self.spool.pending_bytes(), os.path.getsize(segment) - offset)
+    
+    def test_torn_record_is_skipped(self):
+        """Test a partial line from a crash doesn't stop the replay"""
+        self.spool.append("signal", {"symbol": "AAPL"})
+        self.spool.close()
+        with open(self.spool.active_path, "a") as f:
+            f.write('{"id": "torn", "kind": "sig\n')
+        segment = self.spool.seal()
+        records = [r for _, r in self.spool.read_segment(segment)]
+        self.assertEqual(len(records), 1)
+
+
+class TestSpoolReplayer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.spool = WriteSpool(self.directory)
+        self.addCleanup(self.spool.close)
+        self.writer = FakeReplayWriter()
+        self.replayer = SpoolReplayer(self.spool, lambda: self.writer, batch_size=2)
+    
+    def test_replay_drains_spool(self):
+        """Test every record is replayed in batches and segments are removed"""
+        for i in range(5):
+            self.spool.append("signal", {"symbol": f"SYM{i}"})
+        
+        self.assertEqual(self.replayer.replay(), 5)
+        self.assertEqual(self.writer.calls, 3)
+        self.assertEqual(len(self.writer.rows), 5)
+        self.assertEqual(self.spool.segments(), [])
+        self.assertEqual(self.spool.pending_bytes(), 0)
+        self.assertEqual(self.replayer.get_stats()["replayed"], 5)
+    
+    def test_connection_loss_keeps_checkpoint(self):
+        """Test an outage mid-replay resumes after the last committed batch"""
+        for i in range(4):
+            self.spool.append("signal", {"symbol": f"SYM{i}"})
+        real = self.writer.replay_spooled
+        calls = []
+        
+        def flaky(records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise psycopg2.OperationalError("server closed the connection")
+            return real(records)
+        
+        self.writer.replay_spooled = flaky
+        self.assertEqual(self.replayer.replay(), 2)
+        self.assertEqual(self.replayer.replay_failures, 1)
+        self.assertEqual(len(self.spool.segments()), 1)
+        
+        self.assertEqual(self.replayer.replay(), 2)
+        self.assertEqual(len(self.writer.rows), 4)
+        self.assertEqual(self.spool.segments(), [])
+    
+    def test_rejected_records_are_set_aside(self):
+        """Test a record the database refuses doesn't block the rest"""
+        ids = [self.spool.append("signal", {"symbol": f"SYM{i}"}) for i in range(3)]
+        self.writer.bad_ids = {ids[1]}
+        
+        self.assertEqual(self.replayer.replay(), 2)
+        self.assertEqual(set(self.writer.rows), {ids[0], ids[2]})
+        with open(os.path.join(self.directory, "rejected.jsonl")) as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([r["id"] for r in rejected], [ids[1]])
+        self.assertIn("invalid input syntax", rejected[0]["error"])
+    
+    def test_waits_for_validated_writer(self):
+        """Test nothing is replayed into a spool writer or an unvalidated schema"""
+        self.spool.append("signal", {"symbol": "AAPL"})
+        self.replayer.get_writer = lambda: SpoolWriter(self.spool)
+        self.assertEqual(self.replayer.replay(), 0)
+        self.assertGreater(self.spool.pending_bytes(), 0)
+    
+    def test_spool_writer(self):
+        """Test the stand-in writer spools every write"""
+        writer = SpoolWriter(self.spool)
+        self.assertIsNone(writer.write_signal(make_signal()))
+        writer.write_position_opened("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        writer.write_position_closed(7, 155.0, 50.0)
+        self.assertFalse(writer.attempt_schema_revalidation())
+        
+        segment = self.spool.seal()
+        kinds = [r["kind"] for _, r in self.spool.read_segment(segment)]
+        self.assertEqual(kinds, ["signal", "position.opened", "position.closed"])
+
+
+class TestDatabaseWriterSpooling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.spool = WriteSpool(self.directory)
+        self.addCleanup(self.spool.close)
+        patchers = [
+            patch.object(db_writer, "ThreadedConnectionPool", FakePool),
+            patch.object(DatabaseWriter, "_validate_schema", lambda self, force=False: None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        
+        self.writer = DatabaseWriter("postgresql://test", spool=self.spool)
+        self.writer.available_columns = {
+            'signals': ['id', 'strategy', 'symbol', 'action', 'confidence',
+                        'expected_profit', 'metadata', 'created_at'],
+            'positions': ['id', 'symbol', 'quantity', 'entry_price', 'current_price',
+                          'unrealized_pl', 'strategy', 'status', 'order_id'],
+        }
+        self.writer._refresh_statements()
+    
+    def spooled(self):
+        segment = self.spool.seal()
+        return [r for _, r in self.spool.read_segment(segment)] if segment else []
+    
+    def test_connection_error_spools_write(self):
+        """Test a write the database can't take is kept for replay"""
+        with patch.object(FakeConnection, "cursor", side_effect=psycopg2.OperationalError("gone")):
+            self.assertIsNone(self.writer.write_signal(make_signal()))
+            self.writer.write_position_opened("AAPL", 10, 150.0, "solar_flare", "ORD_1")
+        
+        records = self.spooled()
+        self.assertEqual([r["kind"] for r in records], ["signal", "position.opened"])
+        self.assertEqual(records[0]["data"]["symbol"], "AAPL")
+        self.assertEqual(records[1]["data"]["order_id"], "ORD_1")
+    
+    def test_bad_record_is_not_spooled(self):
+        """Test errors caused by the record itself are not retried later"""
+        with patch.object(FakeConnection, "cursor", side_effect=psycopg2.DataError("bad value")):
+            self.writer.write_signal(make_signal())
+        self.assertEqual(self.spooled(), [])
+    
+    def test_replay_spooled_is_guarded(self):
+        """Test replay is one transaction of inserts that skip already-written records"""
+        self.spool.append("signal", {"strategy": "solar_flare", "symbol": "AAPL", "action": "buy",
+                                     "confidence": 0.8, "estimated_profit": 10.0,
+                                     "metadata": {"k": 7}, "timestamp": "2024-01-02T10:00:00"})
+        self.spool.append("position.opened", {"symbol": "AAPL", "quantity": 10, "entry_price": 150.0,
+                                              "strategy": "solar_flare", "order_id": "ORD_1"})
+        self.spool.append("position.closed", {"position_id": 7, "exit_price": 155.0, "realized_pl": 50.0})
+        records = self.spooled()
+        
+        batches = []
+        with patch.object(db_writer, "execute_batch",
+                          lambda cur, sql, rows, page_size=100: batches.append((sql, list(rows)))):
+            self.assertEqual(self.writer.replay_spooled(records), 3)
+        
+        conn = self.writer.pool._pool[0]
+        statements = [call.args[0] for call in conn.cursors[0].execute.call_args_list]
+        self.assertEqual(statements, ["BEGIN", "COMMIT"])
+        
+        signal_sql, signal_rows = batches[0]
+        self.assertIn("metadata->>'spool_id'", signal_sql)
+        self.assertEqual(signal_rows[0][-1], records[0]["id"])
+        self.assertEqual(json.loads(signal_rows[0][-3]), {"k": 7, "spool_id": records[0]["id"]})
+        self.assertEqual(signal_rows[0][-2], "2024-01-02T10:00:00")
+        
+        position_sql, position_rows = batches[1]
+        self.assertIn("WHERE order_id = %s", position_sql)
+        self.assertEqual(position_rows[0][-1], "ORD_1")
+        
+        close_sql, close_rows = batches[2]
+        self.assertIn("status <> 'closed'", close_sql)
+        self.assertEqual(close_rows, [(155.0, 50.0, 7)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Unit tests for batch strategy analysis
+Tests MarketSnapshot, the per-row analyze_batch fallback and the
+vectorized SolarFlareStrategy implementation
+"""
+
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+from strategies import Strategy, SolarFlareStrategy
+from strategies.models import MarketData, MarketSnapshot, BatchSignals, ACTION_HOLD, ACTION_BUY, ACTION_SELL
+from benchmarks import make_snapshot
+
+
+class TestMarketSnapshot(unittest.TestCase):
+    def test_from_market_data_round_trip(self):
+        """Test rows survive conversion to columns and back"""
+        rows = [
+            MarketData("AAPL", datetime(2024, 1, 2, 12), 150.0, 1e6, 151, 149, 150, 150,
+                       indicators={"vwap": 149.5}),
+            MarketData("MSFT", datetime(2024, 1, 2, 12), 300.0, 2e6, 301, 299, 300, 300),
+        ]
+        snapshot = MarketSnapshot.from_market_data(rows)
+        
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.row(0), rows[0])
+        self.assertEqual(snapshot.row(1).indicators, {})  # NaN means missing
+        np.testing.assert_array_equal(snapshot.indicator('vwap', snapshot.current_price),
+                                      [149.5, 300.0])
+    
+    def test_column_length_validation(self):
+        """Test mismatched column lengths are rejected"""
+        with self.assertRaises(ValueError):
+            MarketSnapshot(["AAPL"], datetime.now(), [1.0, 2.0], [1.0], [1.0], [1.0], [1.0], [1.0])
+
+
+class TestSolarFlareBatch(unittest.TestCase):
+    def setUp(self):
+        self.strategy = SolarFlareStrategy(test_mode=True)
+    
+    def test_vectorized_matches_per_row(self):
+        """Test analyze_batch agrees with the per-row analyze fallback"""
+        snapshot = make_snapshot(500)
+        fast = self.strategy.analyze_batch(snapshot)
+        slow = Strategy.analyze_batch(self.strategy, snapshot)
+        
+        np.testing.assert_array_equal(fast.actions, slow.actions)
+        np.testing.assert_allclose(fast.confidence, slow.confidence)
+        np.testing.assert_allclose(fast.target_price, slow.target_price)
+        np.testing.assert_allclose(fast.stop_price, slow.stop_price)
+        
+        # Make sure the sample actually exercises every branch
+        for action in (ACTION_HOLD, ACTION_BUY, ACTION_SELL):
+            self.assertIn(action, fast.actions)
+    
+    def test_batch_signals_match_analyze(self):
+        """Test every row materializes to the same Signal, metadata included, on both paths"""
+        snapshot = make_snapshot(500)
+        fast = self.strategy.analyze_batch(snapshot)
+        slow = Strategy.analyze_batch(self.strategy, snapshot)
+        
+        for i in range(len(snapshot)):
+            expected = self.strategy.analyze(snapshot.row(i))
+            for batch in (fast, slow):
+                signal = batch.to_signal(i, snapshot.symbols[i])
+                self.assertEqual((signal.action, signal.metadata), (expected.action, expected.metadata))
+                self.assertAlmostEqual(signal.confidence, expected.confidence)
+        self.assertIn("Magnetic Reversal", {fast.to_signal(i, "X").metadata["solar_status"]
+                                            for i in fast.active_rows()})
+    
+    def test_shared_metadata_fallback(self):
+        """Test rows without their own metadata use the shared dict"""
+        batch = BatchSignals(np.array([ACTION_BUY, ACTION_SELL], dtype=np.int8), np.array([0.8, 0.6]),
+                             metadata={"source": "shared"}, row_metadata=[None, {"source": "row"}])
+        self.assertEqual(batch.to_signal(0, "AAPL").metadata, {"source": "shared"})
+        self.assertEqual(batch.to_signal(1, "MSFT").metadata, {"source": "row"})
+    
+    def test_to_signal(self):
+        """Test active rows materialize as Signals with their metadata"""
+        snapshot = make_snapshot(200)
+        batch = self.strategy.analyze_batch(snapshot)
+        
+        for i in batch.active_rows():
+            signal = batch.to_signal(i, snapshot.symbols[i])
+            self.assertIn(signal.action, ("buy", "sell"))
+            self.assertEqual(signal.metadata["k_index"], 7)
+            self.assertGreater(self.strategy.estimate_profit(signal), 0)
+    
+    def test_outside_prime_hours_holds(self):
+        """Test the time gate applies to the whole snapshot"""
+        strategy = SolarFlareStrategy()
+        snapshot = make_snapshot(50)
+        snapshot.timestamp = datetime(2024, 1, 2, 16, 0)
+        
+        with patch.object(strategy, '_get_solar_k_index') as k_index:
+            batch = strategy.analyze_batch(snapshot)
+            k_index.assert_not_called()
+        self.assertEqual(len(batch.active_rows()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()